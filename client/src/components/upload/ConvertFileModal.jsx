@@ -19,6 +19,7 @@ import { useState } from "react";
 import { Button, Form, Modal, Spinner } from "react-bootstrap";
 import downloadMidi from "../../utils/downloadMidi";
 import downloadXml from "../../utils/downloadXml";
+import waitForMidi from "../../utils/waitForMidi";
 
 export default function ConvertFileModal(props) {
   // Whether a file is in the process of being converted
@@ -60,12 +61,14 @@ export default function ConvertFileModal(props) {
     })
       .then((response) => {
         // console.log("Posting file to backend...");
+        // The conversion runs in the background: wait for its job to finish
+        if (response.status === 202) {
+          return response.json().then((job) => waitForMidi(apiUrl, job.job_id));
+        }
+
         const expectedStatus = 201;
 
-        if (response.status === expectedStatus) {
-          setConversionComplete(true);
-          setIsConverting(false);
-        } else {
+        if (response.status !== expectedStatus) {
           throw new Error(
             `Expected status ${expectedStatus} but received ${response.status}`,
           );
@@ -76,6 +79,8 @@ export default function ConvertFileModal(props) {
       .then((data) => {
         // console.log("Temporary data response:", data);
         setBackendResponse(data);
+        setConversionComplete(true);
+        setIsConverting(false);
       })
       .catch((error) => {
         setIsConverting(false);
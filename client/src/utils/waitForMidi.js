@@ -0,0 +1,46 @@
+/******************************************************************************
+ * Filename: waitForMidi.js
+ * Purpose:  Waits for a background conversion job and fetches its MIDI.
+ * Author:   Benjamin Goh
+ *
+ * Description:
+ * The backend converts uploads in the background: POST /api/v1/midis replies
+ * with a job ID straight away. This module polls GET /api/v1/jobs/<id> until
+ * the job succeeds or fails, then fetches the converted MIDI entry.
+ *
+ * Usage:
+ * Import the `waitForMidi` function from this module and call it with the
+ * API URL and the job ID from the upload response:
+ *
+ * ```javascript
+ * import waitForMidi from './waitForMidi';
+ *
+ * waitForMidi(apiUrl, jobId).then((midi) => console.log(midi.title));
+ * ```
+ *
+ * Notes:
+ * - The returned promise rejects if the job fails or a request errors.
+ ******************************************************************************/
+
+// Delay between job status requests, in milliseconds
+export const pollInterval = 1000;
+
+export default function waitForMidi(apiUrl, jobId, interval = pollInterval) {
+  return fetch(`${apiUrl}/api/v1/jobs/${jobId}`)
+    .then((response) => response.json())
+    .then((job) => {
+      if (job.status === "succeeded") {
+        return fetch(`${apiUrl}/api/v1/midis/${job.midi_id}`).then(
+          (response) => response.json(),
+        );
+      }
+      if (job.status === "failed") {
+        throw new Error(`Conversion job ${jobId} failed: ${job.error}`);
+      }
+
+      // Still queued or running: check again after a delay
+      return new Promise((resolve) => setTimeout(resolve, interval)).then(() =>
+        waitForMidi(apiUrl, jobId, interval),
+      );
+    });
+}
@@ -0,0 +1,42 @@
+/******************************************************************************
+ * Filename: waitForMidi.test.js
+ * Purpose:  Tests the waitForMidi utility function.
+ * Author:   Benjamin Goh
+ *
+ * Description:
+ * This file contains tests for the waitForMidi utility function. The tests
+ * mock fetch to check that the function polls the job status until the job
+ * is done, then returns the converted MIDI or rejects with the job error.
+ *
+ * Usage:
+ * Run the tests using the command `npm test`.
+ ******************************************************************************/
+
+import waitForMidi from "./waitForMidi";
+
+const mockResponse = (body) => Promise.resolve({ json: () => body });
+
+describe("waitForMidi", () => {
+  it("should poll until the job succeeds and return the MIDI", async () => {
+    global.fetch = jest
+      .fn()
+      .mockReturnValueOnce(mockResponse({ status: "running" }))
+      .mockReturnValueOnce(mockResponse({ status: "succeeded", midi_id: 3 }))
+      .mockReturnValueOnce(mockResponse({ midi_id: 3, title: "mockTitle" }));
+
+    const midi = await waitForMidi("http://api", 7, 0);
+
+    expect(midi).toEqual({ midi_id: 3, title: "mockTitle" });
+    expect(global.fetch).toHaveBeenNthCalledWith(1, "http://api/api/v1/jobs/7");
+    expect(global.fetch).toHaveBeenNthCalledWith(2, "http://api/api/v1/jobs/7");
+    expect(global.fetch).toHaveBeenNthCalledWith(3, "http://api/api/v1/midis/3");
+  });
+
+  it("should reject when the job fails", async () => {
+    global.fetch = jest.fn(() =>
+      mockResponse({ status: "failed", error: "bad audio" }),
+    );
+
+    await expect(waitForMidi("http://api", 7, 0)).rejects.toThrow("bad audio");
+  });
+});
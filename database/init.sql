@@ -40,6 +40,8 @@ Attributes:
     title: the title of the MIDI file
     date: the date it was recorded
     midi_data (bytes): the midi data
+    xml_data (bytes): the musicxml rendering of the midi data
+    version(integer): the number of times the midi was written
 */
 CREATE TABLE IF NOT EXISTS midis (
     midi_id INT AUTO_INCREMENT PRIMARY KEY,
@@ -47,5 +49,41 @@ CREATE TABLE IF NOT EXISTS midis (
     title VARCHAR(255),
     date DATETIME,
     midi_data LONGBLOB,
+    xml_data LONGBLOB,
+    version INT NOT NULL DEFAULT 1,
     FOREIGN KEY (user_id) REFERENCES users(user_id)
-);
\ No newline at end of file
+);
+
+/*
+Creates the Jobs table in the database
+Attributes:
+    job_id(integer): the job id
+    status(string): queued, running, succeeded or failed
+    name(string): the user name
+    email(string): the user email
+    title: the title of the MIDI file
+    audio_path(string): the path to the uploaded audio file
+    profile(string): the name of the conversion profile
+    attempts(integer): the number of times the conversion was started
+    cache_key(string): the key of the result in the conversion cache
+    midi_id(integer): the midi created by the job
+    error(string): the reason the job failed
+    created: the date the job was submitted
+    updated: the date of the latest status change
+*/
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id INT AUTO_INCREMENT PRIMARY KEY,
+    status VARCHAR(16),
+    name VARCHAR(255),
+    email VARCHAR(255),
+    title VARCHAR(255),
+    audio_path VARCHAR(1024),
+    profile VARCHAR(32),
+    attempts INT,
+    cache_key CHAR(64),
+    midi_id INT,
+    error TEXT,
+    created DATETIME,
+    updated DATETIME,
+    FOREIGN KEY (midi_id) REFERENCES midis(midi_id)
+);
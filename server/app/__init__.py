@@ -18,11 +18,32 @@
 
 import os
 from dotenv import load_dotenv
+
+# librosa's numba kernels look up their cache directory when librosa is
+# imported, so persist compiled kernels across restarts before importing it.
+# The default is in the server directory, whatever the working directory.
+load_dotenv()
+os.environ.setdefault(
+    "NUMBA_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "numba_cache"),
+)
+
 from flask import Flask
 from flask_cors import CORS
 from app.routes.midi_routes import midi_bp
 from app.routes.user_routes import user_bp
+from app.routes.job_routes import job_bp
+from app.routes.cache_routes import cache_bp
+from app.routes.health_routes import health_bp
+from app.routes.metrics_routes import metrics_bp
+from app.routes.live_routes import live_bp
 from app.database import db
+from app.utils.artifact_cache import artifact_cache
+from app.utils.conversion_cache import conversion_cache
+from app.utils.conversion_profiles import default_profile
+from app.utils.job_queue import job_queue
+from app.utils.live_sessions import live_sessions
+from app.utils.metrics import metrics
 
 
 def create_app(config_object=None):
@@ -45,6 +66,11 @@ def create_app(config_object=None):
         app.config["SQLALCHEMY_DATABASE_URI"] = str(os.environ.get("DATABASE_URL"))
         app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
+    # Conversion profile used when an upload does not name one
+    app.config.setdefault(
+        "CONVERSION_PROFILE", os.environ.get("CONVERSION_PROFILE", default_profile)
+    )
+
     CORS(
         app,
         resources={r"/api/*": {"origins": "*"}},
@@ -52,9 +78,20 @@ def create_app(config_object=None):
     )
 
     db.init_app(app)
+    conversion_cache.init_app(app)
+    artifact_cache.init_app(app)
+    # Last, since it resumes the jobs left unfinished by the previous process
+    job_queue.init_app(app)
+    metrics.init_app(app)
+    live_sessions.init_app(app)
 
     # Register blueprints
     app.register_blueprint(midi_bp)
     app.register_blueprint(user_bp)
+    app.register_blueprint(job_bp)
+    app.register_blueprint(cache_bp)
+    app.register_blueprint(health_bp)
+    app.register_blueprint(metrics_bp)
+    app.register_blueprint(live_bp)
 
     return app
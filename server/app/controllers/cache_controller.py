@@ -0,0 +1,46 @@
+################################################################################
+# Filename: cache_controller.py
+# Purpose:  Handles RESTful API routes for the conversion cache
+# Author:   Livia Chandra
+#
+# Description:
+# This module is responsible for defining and handling the RESTful API routes
+# that report on the conversion cache, which stores the MIDI and MusicXML
+# generated for previously uploaded audio, and on the artifact cache, which
+# holds the MusicXML rendered on read for MIDI entries stored without it.
+#
+# Usage (Optional):
+# This module is not intended to be run as a standalone script. Instead, it should
+# be imported and used in conjunction with a Flask application. For example:
+#
+#     from cache_controller import get_cache_stats
+#     app.route('/cache', methods=['GET'])(get_cache_stats)
+#
+# Notes:
+# The counters are kept per server process.
+################################################################################
+
+from app.utils.artifact_cache import artifact_cache
+from app.utils.conversion_cache import conversion_cache
+from app.utils.status_codes import OK
+from flask import jsonify
+
+
+def get_cache_stats():
+    """
+    Retrieve the conversion cache counters.
+
+    Returns:
+        tuple: A JSON representation of the cache counters and the HTTP status code OK (200).
+    """
+    return jsonify(conversion_cache.stats()), OK
+
+
+def get_artifact_cache_stats():
+    """
+    Retrieve the artifact cache counters.
+
+    Returns:
+        tuple: A JSON representation of the cache counters and the HTTP status code OK (200).
+    """
+    return jsonify(artifact_cache.stats()), OK
@@ -0,0 +1,37 @@
+################################################################################
+# Filename: health_controller.py
+# Purpose:  Handles RESTful API routes for server readiness
+# Author:   Livia Chandra
+#
+# Description:
+# This module is responsible for defining and handling the RESTful API route
+# that reports whether the server has finished warming up its analysis
+# pipeline and is ready to convert recordings at full speed.
+#
+# Usage (Optional):
+# This module is not intended to be run as a standalone script. Instead, it should
+# be imported and used in conjunction with a Flask application. For example:
+#
+#     from health_controller import get_readiness
+#     app.route('/ready', methods=['GET'])(get_readiness)
+#
+# Notes:
+# Point the readiness probe of the container at this route so that traffic
+# only arrives once warm-up has finished.
+################################################################################
+
+from app.utils.status_codes import OK, SERVICE_UNAVAILABLE
+from app.utils.warmup import warmup
+from flask import jsonify
+
+
+def get_readiness():
+    """
+    Report whether the server has finished warming up.
+
+    Returns:
+        tuple: A JSON representation of the warm-up status and the HTTP status code OK (200)
+               once ready, or SERVICE UNAVAILABLE (503) while warming up.
+    """
+    status = warmup.status()
+    return jsonify(status), OK if status["ready"] else SERVICE_UNAVAILABLE
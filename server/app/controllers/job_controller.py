@@ -0,0 +1,50 @@
+################################################################################
+# Filename: job_controller.py
+# Purpose:  Handles RESTful API routes for conversion job operations
+# Author:   Benjamin Goh
+#
+# Description:
+# This module is responsible for defining and handling the RESTful API routes
+# that report the progress of background audio to MIDI conversions started
+# by the MIDI controller.
+#
+# Usage (Optional):
+# This module is not intended to be run as a standalone script. Instead, it should
+# be imported and used in conjunction with a Flask application. For example:
+#
+#     from job_controller import get_job
+#     app.route('/jobs/<int:job_id>', methods=['GET'])(get_job)
+#
+# Notes:
+# Once a job has succeeded, the converted MIDI can be retrieved from the MIDI
+# routes using the midi_id in the job response.
+################################################################################
+
+from app.database import db
+from app.models.job_model import ConversionJob
+from app.utils.status_codes import OK, NOT_FOUND
+from flask import jsonify
+
+
+def get_job(job_id):
+    """
+    Retrieve the status of a conversion job by its ID.
+
+    Args:
+        job_id (int): The ID of the job to retrieve.
+
+    Returns:
+        tuple: A JSON representation of the job and the HTTP status code OK (200).
+    """
+    job = db.session.get(ConversionJob, job_id)
+    if job:
+        job_data = {
+            "job_id": job.job_id,
+            "status": job.status,
+            "title": job.title,
+            "midi_id": job.midi_id,
+            "error": job.error,
+        }
+        return jsonify(job_data), OK
+    else:
+        return jsonify({"message": "Job not found"}), NOT_FOUND
@@ -0,0 +1,166 @@
+################################################################################
+# Filename: live_controller.py
+# Purpose:  Handles RESTful API routes for live recording transcription
+# Author:   Benjamin Goh
+#
+# Description:
+# This module is responsible for defining and handling the RESTful API routes
+# that transcribe a recording while it is being made. The client starts a
+# session, posts each chunk its MediaRecorder emits and receives the
+# provisional notes of the latest few seconds in return. When the recording
+# stops, the session is finished and the MIDI entry is stored straight away,
+# since the audio has already been decoded and mostly analysed.
+#
+# Usage (Optional):
+# This module is not intended to be run as a standalone script. Instead, it should
+# be imported and used in conjunction with a Flask application. For example:
+#
+#     from live_controller import start_live_session
+#     app.route('/live', methods=['POST'])(start_live_session)
+#
+# Notes:
+# Chunks are posted as the raw request body, one request at a time and in
+# the order they were recorded.
+################################################################################
+
+from app.utils.base64_converter import BinaryConverter
+from app.utils.conversion_profiles import get_profile
+from app.utils.job_queue import create_midi_entry
+from app.utils.live_sessions import LiveSession, live_sessions
+from app.utils.metrics import record_stage
+from app.utils.status_codes import OK, CREATED, NO_CONTENT, BAD_REQUEST, NOT_FOUND
+from flask import current_app, jsonify, request
+import time
+
+
+def start_live_session():
+    """
+    Start transcribing a new live recording.
+
+    Returns:
+        tuple: A JSON representation of the session and the HTTP status code CREATED (201),
+               or BAD_REQUEST (400) if the request is invalid.
+    """
+    name = request.form.get("name")
+    email = request.form.get("email")
+    title = request.form.get("title")
+    if not name or not email or not title:
+        return jsonify({"message": "A name, an email and a title are required"}), BAD_REQUEST
+
+    # Conversion profile, from the request or the server configuration
+    profile = get_profile(
+        request.form.get("profile", current_app.config.get("CONVERSION_PROFILE"))
+    )
+    if profile is None:
+        return jsonify({"message": "Unknown conversion profile"}), BAD_REQUEST
+
+    # Imported here so that the API boots without loading librosa
+    from app.utils.live_transcription import LiveTranscription
+
+    session = LiveSession(name, email, title, LiveTranscription(profile))
+    session_id = live_sessions.add(session)
+
+    return (
+        jsonify({"session_id": session_id, "profile": profile.name}),
+        CREATED,
+        {"Location": f"/api/v1/live/{session_id}"},
+    )
+
+
+def push_live_chunk(session_id):
+    """
+    Decode the next chunk of a live recording and return its provisional notes.
+
+    Returns:
+        tuple: The provisional notes of the latest window and the HTTP status code OK (200),
+               BAD_REQUEST (400) if the chunk cannot be decoded or the recording is too long,
+               or NOT_FOUND (404) if there is no such session.
+    """
+    session = live_sessions.get(session_id)
+    if session is None:
+        return jsonify({"message": "Live session not found"}), NOT_FOUND
+
+    chunk = request.get_data()
+    with session.lock:
+        transcription = session.transcription
+        if transcription.duration > live_sessions.max_seconds:
+            return jsonify({"message": "Recording is too long"}), BAD_REQUEST
+        result = transcription.push(chunk)
+        duration = transcription.duration
+    if result is None:
+        return jsonify({"message": "Chunk could not be decoded"}), BAD_REQUEST
+
+    window_start, notes = result
+    return (
+        jsonify(
+            {
+                "session_id": session_id,
+                "duration": duration,
+                "window_start": window_start,
+                "notes": notes,
+            }
+        ),
+        OK,
+    )
+
+
+def finish_live_session(session_id):
+    """
+    Stop a live recording and store its MIDI entry.
+
+    Returns:
+        tuple: A JSON representation of the new MIDI entry and the HTTP status code CREATED (201),
+               BAD_REQUEST (400) if no audio could be decoded,
+               or NOT_FOUND (404) if there is no such session.
+    """
+    session = live_sessions.pop(session_id)
+    if session is None:
+        return jsonify({"message": "Live session not found"}), NOT_FOUND
+
+    with session.lock:
+        midi_data = session.transcription.finish()
+    if midi_data is None:
+        return jsonify({"message": "No audio could be decoded"}), BAD_REQUEST
+
+    # Convert midi to music xml
+    from app.utils.midi_to_musicxml import midi_to_musicxml
+
+    start = time.perf_counter()
+    xml_data = midi_to_musicxml(midi_data)
+    record_stage("musicxml", time.perf_counter() - start)
+
+    new_midi = create_midi_entry(
+        session.name, session.email, session.title, midi_data, xml_data
+    )
+
+    return (
+        jsonify(
+            {
+                "midi_id": new_midi.midi_id,
+                "name": session.name,
+                "email": session.email,
+                "title": new_midi.title,
+                "date": new_midi.date.isoformat(),
+                "midi_data": BinaryConverter.encode_binary(midi_data),
+                "xml_data": BinaryConverter.encode_binary(xml_data),
+            }
+        ),
+        CREATED,
+    )
+
+
+def cancel_live_session(session_id):
+    """
+    Stop a live recording without storing it.
+
+    Returns:
+        tuple: A JSON message confirming cancellation and the HTTP status code NO_CONTENT (204),
+               or NOT_FOUND (404) if there is no such session.
+    """
+    session = live_sessions.pop(session_id)
+    if session is None:
+        return jsonify({"message": "Live session not found"}), NOT_FOUND
+
+    with session.lock:
+        session.transcription.cancel()
+    return jsonify({"message": f"Live session {session_id} cancelled"}), NO_CONTENT
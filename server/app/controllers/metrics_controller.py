@@ -0,0 +1,37 @@
+################################################################################
+# Filename: metrics_controller.py
+# Purpose:  Handles RESTful API routes for server metrics
+# Author:   Livia Chandra
+#
+# Description:
+# This module is responsible for defining and handling the RESTful API route
+# that exposes the metrics registry to Prometheus: request latency per route,
+# database query time, conversion stage time and conversion queue depth.
+#
+# Usage (Optional):
+# This module is not intended to be run as a standalone script. Instead, it should
+# be imported and used in conjunction with a Flask application. For example:
+#
+#     from metrics_controller import get_metrics
+#     app.route('/metrics', methods=['GET'])(get_metrics)
+#
+# Notes:
+# The metrics are kept per server process.
+################################################################################
+
+from app.utils.metrics import metrics
+from app.utils.status_codes import OK
+from flask import Response
+
+# Content type of the Prometheus text exposition format
+metrics_content_type = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def get_metrics():
+    """
+    Retrieve the server metrics in the Prometheus text format.
+
+    Returns:
+        Response: The metrics text with the HTTP status code OK (200).
+    """
+    return Response(metrics.render(), status=OK, content_type=metrics_content_type)
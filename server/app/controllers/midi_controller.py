@@ -24,14 +24,22 @@
 from app.database import db
 from app.models.midi_model import MIDI
 from app.models.user_model import User
-from app.utils.status_codes import OK, CREATED, NO_CONTENT, NOT_FOUND
+from app.models.job_model import ConversionJob
+from app.utils.status_codes import OK, CREATED, ACCEPTED, NO_CONTENT, MULTI_STATUS, BAD_REQUEST, NOT_FOUND
+from app.utils.artifact_cache import artifact_cache, artifact_key
 from app.utils.base64_converter import BinaryConverter
-from app.utils.isodate_converter import DateConverter
-from flask import jsonify, request
-from app.utils.conversion import wav_to_midi
-from app.utils.midi_to_musicxml import midi_to_musicxml
+from flask import current_app, jsonify, request
+from app.utils.conversion_cache import cache_key, conversion_cache, pipeline_parameters
+from app.utils.conversion_profiles import get_profile
+from app.utils.job_queue import create_midi_entries, create_midi_entry, job_queue
+from app.utils.metrics import record_stage
 from werkzeug.utils import secure_filename
 import os
+import time
+import uuid
+
+# Default maximum number of files in one batch upload
+default_max_batch_files = 20
 
 def get_all_midis():
     """
@@ -74,6 +82,8 @@ def get_midi(midi_id):
         tuple: A JSON representation of the MIDI file and the HTTP status code OK (200).
     """
     midi = db.session.get(MIDI, midi_id)
+    if midi is None:
+        return jsonify({"message": "MIDI not found"}), NOT_FOUND
 
     # Parse date
     midi_date = midi.date.isoformat()
@@ -81,55 +91,113 @@ def get_midi(midi_id):
     # Retrieve user
     user = db.session.get(User, midi.user_id)
 
+    # The MusicXML is stored when the MIDI is created; entries that predate
+    # it are rendered here, without writing to the database on a read, until
+    # backfill_musicxml.py stores theirs. The rendering is reused by later
+    # reads of the same version.
+    xml_data = midi.xml_data
+    if xml_data is None:
+        key = artifact_key(midi.midi_id, midi.version)
+        xml_data = artifact_cache.get(key)
+        if xml_data is None:
+            xml_data = render_musicxml(midi.midi_data)
+            artifact_cache.put(key, xml_data)
+
     # Parse binary data
     midi_encode = BinaryConverter.encode_binary(midi.midi_data)
+    xml_data_encoded = BinaryConverter.encode_binary(xml_data)
+
+    midi_data = {
+        "midi_id": midi.midi_id,
+        "name": user.name,
+        "email": user.email,
+        "title": midi.title,
+        "date": midi_date,
+        "midi_data": midi_encode,  # Return the base64-encoded MIDI data
+        "xml_data": xml_data_encoded  # Return the base64-encoded MusicXML data
+    }
+    return jsonify(midi_data), OK
 
-    # Save file
-    # Decode Base64 encoded data
-    midi_binary = BinaryConverter.decode_binary(midi_encode)
 
-    # Save the decoded MIDI data to a file
-    midi_file_path = f'./app/utils/midi_output/{midi.title}.mid'  # Construct a file name with MIDI ID
-    with open(midi_file_path, 'wb') as midi_file:
-        midi_file.write(midi_binary)
+def render_musicxml(midi_data):
+    """
+    Render the MusicXML of a MIDI entry that has none stored.
+
+    Args:
+        midi_data (bytes): Content of the MIDI file.
 
+    Returns:
+        bytes: Content of the MusicXML file.
+    """
+    # Imported here so that the API boots without loading the MIDI parser
+    from app.utils.midi_to_musicxml import midi_to_musicxml
 
     # Convert midi to music xml
-    xml_output_path = midi_to_musicxml(midi_file_path)
-    with open(xml_output_path, 'rb') as binary_file:
-        xml_output_file = binary_file.read()
-    xml_data_encoded = BinaryConverter.encode_binary(xml_output_file)
-
-    if midi:
-        midi_data = {
-            "midi_id": midi.midi_id,
-            "name": user.name,
-            "email": user.email,
-            "title": midi.title,
-            "date": midi_date,
-            "midi_data": midi_encode,  # Return the base64-encoded MIDI data
-            "xml_data": xml_data_encoded  # Return the base64-encoded MIDI data
-        }
-        return jsonify(midi_data), OK
-    else:
-        return jsonify({"message": "MIDI not found"}), NOT_FOUND
+    start = time.perf_counter()
+    xml_data = midi_to_musicxml(midi_data)
+    record_stage("musicxml", time.perf_counter() - start)
+    return xml_data
 
 
-def create_midi():
+def cached_midi_response(name, email, title, midi_data, xml_data):
     """
-    Create a new MIDI entry in the database.
+    Create a MIDI entry from a cached conversion result.
+
+    Args:
+        name (str): Name of the user.
+        email (str): Email address of the user.
+        title (str): Title of the song.
+        midi_data (bytes): Content of the cached MIDI file.
+        xml_data (bytes): Content of the cached MusicXML file.
 
     Returns:
         tuple: A JSON representation of the newly created MIDI entry and the HTTP status code CREATED (201).
     """
+    new_midi = create_midi_entry(name, email, title, midi_data, xml_data)
+
+    return (
+        jsonify(
+            {
+                "midi_id": new_midi.midi_id,
+                "name": name,
+                "email": email,
+                "title": new_midi.title,
+                "date": new_midi.date.isoformat(),
+                "midi_data": BinaryConverter.encode_binary(midi_data),
+                "xml_data": BinaryConverter.encode_binary(xml_data),
+            }
+        ),
+        CREATED,
+    )
+
+
+def create_midi():
+    """
+    Queue the conversion of an uploaded recording to a new MIDI entry.
+
+    If the same audio was converted before, the cached result is stored
+    straight away instead.
+
+    Returns:
+        tuple: A JSON representation of the conversion job and the HTTP status code ACCEPTED (202),
+               or of the new MIDI entry and the HTTP status code CREATED (201) on a cache hit.
+    """
     name = request.form['name']
     email = request.form['email']
     title = request.form['title']
     audio_file = request.files['file']
 
-    # Process file 
-    # Define file path for saving the audio file
-    safe_filename = secure_filename(audio_file.filename)
+    # Conversion profile, from the request or the server configuration
+    profile = get_profile(
+        request.form.get('profile', current_app.config.get("CONVERSION_PROFILE"))
+    )
+    if profile is None:
+        return jsonify({"message": "Unknown conversion profile"}), BAD_REQUEST
+
+    # Process file
+    # Define file path for saving the audio file, prefixed so that concurrent
+    # uploads with the same name do not overwrite each other
+    safe_filename = uuid.uuid4().hex + "_" + secure_filename(audio_file.filename)
     audio_file_path = os.path.join('./app/utils/audio_sample', safe_filename)
     # Ensure the directory exists
     os.makedirs(os.path.dirname(audio_file_path), exist_ok=True)
@@ -137,53 +205,115 @@ def create_midi():
     # Save the file
     audio_file.save(audio_file_path)
 
-    output_filename = wav_to_midi(audio_file_path)
-
-    with open(output_filename, 'rb') as binary_file:
-        output_file = binary_file.read()
-
-
-    midi_data_encoded = BinaryConverter.encode_binary(output_file)
-
-    # Remove the file
-    os.remove(audio_file_path)
-
-
-    # Convert midi to music xml
-    xml_output_path = midi_to_musicxml(output_filename)
-    with open(xml_output_path, 'rb') as binary_file:
-        xml_output_file = binary_file.read()
-    xml_data_encoded = BinaryConverter.encode_binary(xml_output_file)
+    # Reuse the result of an earlier conversion of the same file
+    key = cache_key(audio_file_path, pipeline_parameters(profile))
+    cached = conversion_cache.get(key)
+    if cached is not None:
+        os.remove(audio_file_path)
+        return cached_midi_response(name, email, title, *cached)
+
+    # Create job
+    new_job = ConversionJob(
+        name=name,
+        email=email,
+        title=title,
+        audio_path=os.path.abspath(audio_file_path),
+        profile=profile.name,
+        cache_key=key,
+    )
+    db.session.add(new_job)
+    db.session.commit()
 
+    # Convert in the background
+    job_queue.submit(new_job)
 
-    # Create User
-    new_user = User(name=name, email=email)
-    db.session.add(new_user)
-    db.session.commit()
+    return (
+        jsonify({"job_id": new_job.job_id, "status": new_job.status}),
+        ACCEPTED,
+        {"Location": f"/api/v1/jobs/{new_job.job_id}"},
+    )
 
-    # Create MIDI
-    user_id = new_user.user_id
-    date = DateConverter.current_time()
 
-    new_midi = MIDI(user_id=user_id, title=title, midi_data=output_file, date=date)
+def create_midis_batch():
+    """
+    Convert several uploaded recordings of one user in a single request.
 
-    db.session.add(new_midi)
-    db.session.commit()
+    The recordings are converted concurrently and every successful result is
+    stored in one transaction. Each file is reported separately, so some
+    files may fail while the others are stored.
 
-    return (
-        jsonify(
-            {
-                "midi_id": new_midi.midi_id,
-                "name": new_user.name,
-                "email": new_user.email,
-                "title": new_midi.title,
-                "date": new_midi.date.isoformat(),
-                "midi_data": midi_data_encoded,  # Return the base64-encoded MIDI data
-                "xml_data": xml_data_encoded  # Return the base64-encoded MIDI data
-            }
-        ),
-        CREATED,
+    Returns:
+        tuple: A JSON list with the result of each file and the HTTP status code
+               CREATED (201) if every file was converted, else MULTI_STATUS (207),
+               or BAD_REQUEST (400) if the request is invalid.
+    """
+    name = request.form.get("name")
+    email = request.form.get("email")
+    audio_files = request.files.getlist("files")
+    titles = request.form.getlist("titles")
+    if not name or not email or not audio_files:
+        return jsonify({"message": "A name, an email and files are required"}), BAD_REQUEST
+
+    max_files = int(current_app.config.get("MAX_BATCH_FILES", default_max_batch_files))
+    if len(audio_files) > max_files:
+        return jsonify({"message": f"At most {max_files} files per batch"}), BAD_REQUEST
+    if titles and len(titles) != len(audio_files):
+        return jsonify({"message": "Give one title per file or none"}), BAD_REQUEST
+
+    profile = get_profile(
+        request.form.get("profile", current_app.config.get("CONVERSION_PROFILE"))
     )
+    if profile is None:
+        return jsonify({"message": "Unknown conversion profile"}), BAD_REQUEST
+
+    # Save every upload under a unique name, as create_midi does
+    audio_file_paths = []
+    for audio_file in audio_files:
+        safe_filename = uuid.uuid4().hex + "_" + secure_filename(audio_file.filename)
+        audio_file_path = os.path.abspath(
+            os.path.join("./app/utils/audio_sample", safe_filename)
+        )
+        os.makedirs(os.path.dirname(audio_file_path), exist_ok=True)
+        audio_file.save(audio_file_path)
+        audio_file_paths.append(audio_file_path)
+
+    try:
+        conversions = job_queue.convert_batch(audio_file_paths, profile.name)
+    finally:
+        for audio_file_path in audio_file_paths:
+            if os.path.exists(audio_file_path):
+                os.remove(audio_file_path)
+
+    # Store the successful conversions together
+    results = []
+    converted = []
+    for index, (audio_file, conversion) in enumerate(zip(audio_files, conversions)):
+        title = titles[index] if titles else os.path.splitext(audio_file.filename)[0]
+        result = {"file": audio_file.filename, "title": title}
+        if isinstance(conversion, Exception):
+            # Report the error under the uploaded name, not the saved one
+            error = str(conversion) or "Conversion failed"
+            error = error.replace(os.path.basename(audio_file_paths[index]), audio_file.filename)
+            result.update(status="failed", error=error)
+        else:
+            converted.append((result, (title, *conversion)))
+        results.append(result)
+
+    if converted:
+        new_midis = create_midi_entries(
+            name, email, [entry for _, entry in converted]
+        )
+        for (result, (_, midi_data, xml_data)), new_midi in zip(converted, new_midis):
+            result.update(
+                status="created",
+                midi_id=new_midi.midi_id,
+                date=new_midi.date.isoformat(),
+                midi_data=BinaryConverter.encode_binary(midi_data),
+                xml_data=BinaryConverter.encode_binary(xml_data),
+            )
+
+    status = CREATED if len(converted) == len(results) else MULTI_STATUS
+    return jsonify(results), status
 
 
 def update_midi(midi_id):
@@ -0,0 +1,80 @@
+################################################################################
+# Filename: job_model.py
+# Purpose:  Define the ConversionJob model for tracking background conversions.
+# Author:   Benjamin Goh
+#
+# Description:
+# This file contains the definition of the ConversionJob class, which records
+# the state of an audio to MIDI conversion that runs in the background. The
+# class holds the details submitted with the upload, the path of the saved
+# audio file, the job status and, once the job succeeds, the ID of the MIDI
+# it created.
+#
+# Usage (Optional):
+# Jobs are created by the MIDI controller and updated by the job queue.
+#
+# Notes:
+# Job state lives in the database rather than in the worker processes, so
+# jobs that were queued or running when the server stopped can be picked up
+# again when it restarts.
+#
+###############################################################################
+
+from app.database import db
+from sqlalchemy import Integer, String, DateTime, ForeignKey
+from sqlalchemy.orm import Mapped, mapped_column
+from datetime import datetime
+
+# Job statuses
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+class ConversionJob(db.Model):
+    """
+    ConversionJob class representing background conversions in the database.
+
+    Attributes:
+        job_id (int): The unique identifier for the job.
+        status (str): One of queued, running, succeeded or failed.
+        name (str): Name of the user who uploaded the recording.
+        email (str): Email address of the user who uploaded the recording.
+        title (str): Title of the song.
+        audio_path (str): The path to the uploaded audio file.
+        profile (str): Name of the conversion profile to convert with.
+        attempts (int): Number of times the conversion has been started.
+        cache_key (str): Key the result is stored under in the conversion cache.
+        midi_id (int): The MIDI created by the job, once it succeeds.
+        error (str): Reason the job failed, if it did.
+        created (DateTime): The job submission date.
+        updated (DateTime): The date of the latest status change.
+    """
+
+    __tablename__ = "jobs"
+    job_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    status: Mapped[str] = mapped_column(String(16), default=QUEUED, nullable=False)
+    name: Mapped[str] = mapped_column(String, nullable=False)
+    email: Mapped[str] = mapped_column(String, nullable=False)
+    title: Mapped[str] = mapped_column(String, nullable=False)
+    audio_path: Mapped[str] = mapped_column(String, nullable=False)
+    profile: Mapped[str] = mapped_column(String(32), default="default", nullable=False)
+    attempts: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    cache_key: Mapped[str] = mapped_column(String(64), nullable=True)
+    midi_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("midis.midi_id"), nullable=True
+    )
+    error: Mapped[str] = mapped_column(String, nullable=True)
+    created: Mapped[datetime] = mapped_column(
+        DateTime, default=datetime.utcnow, nullable=False
+    )
+    updated: Mapped[datetime] = mapped_column(
+        DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False
+    )
+
+    def __repr__(self):
+        """
+        Return a string representation of the ConversionJob object.
+        """
+        return f"<ConversionJob(job_id={self.job_id}, status='{self.status}', midi_id={self.midi_id})>"
@@ -23,6 +23,7 @@ from app.database import db
 from sqlalchemy import Integer, String, LargeBinary, DateTime, ForeignKey
 from sqlalchemy.orm import Mapped, mapped_column
 from datetime import datetime
+from typing import Optional
 
 
 class MIDI(db.Model):
@@ -35,6 +36,10 @@ class MIDI(db.Model):
         title (str): Title of the song.
         date (DateTime): The MIDI file generation date.
         midi_data (LargeBinary): The raw MIDI data.
+        xml_data (LargeBinary): The MusicXML rendering of the MIDI data, or
+                                None for entries that predate it.
+        version (int): Number of times the entry was written through the ORM,
+                       counting from 1.
     """
 
     __tablename__ = "midis"
@@ -47,6 +52,11 @@ class MIDI(db.Model):
         DateTime, default=datetime.utcnow, nullable=False
     )
     midi_data: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    xml_data: Mapped[Optional[bytes]] = mapped_column(LargeBinary, nullable=True)
+    version: Mapped[int] = mapped_column(Integer, nullable=False, server_default="1")
+
+    # The ORM increments the version on every update of the entry
+    __mapper_args__ = {"version_id_col": version}
 
     def __repr__(self):
         """
@@ -0,0 +1,31 @@
+################################################################################
+# Filename: cache_routes.py
+# Purpose:  Define routes for the conversion cache in the Flask application.
+# Author:   Livia Chandra
+#
+# Description:
+# This file creates a Blueprint for the conversion and artifact caches and
+# defines the endpoints that report their hit, miss, store and eviction
+# counters. The
+# routes are associated with corresponding view functions in the
+# cache_controller module.
+#
+# Usage (Optional):
+# Import this Blueprint in the main application and register it to add the
+# cache routes to the application. For example:
+#   from cache_routes import cache_bp
+#   app.register_blueprint(cache_bp)
+#
+###############################################################################
+
+from flask import Blueprint
+from app.controllers import cache_controller
+
+# Create a Blueprint instance for cache routes
+cache_bp = Blueprint("cache_bp", __name__, url_prefix="/api/v1")
+
+# Define routes for the conversion cache
+cache_bp.route("/cache", methods=["GET"])(cache_controller.get_cache_stats)
+cache_bp.route("/cache/artifacts", methods=["GET"])(
+    cache_controller.get_artifact_cache_stats
+)
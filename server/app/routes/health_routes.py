@@ -0,0 +1,26 @@
+################################################################################
+# Filename: health_routes.py
+# Purpose:  Define routes for server readiness in the Flask application.
+# Author:   Livia Chandra
+#
+# Description:
+# This file creates a Blueprint for server health and defines the endpoint
+# that reports whether warm-up has finished. The routes are associated with
+# corresponding view functions in the health_controller module.
+#
+# Usage (Optional):
+# Import this Blueprint in the main application and register it to add the
+# health routes to the application. For example:
+#   from health_routes import health_bp
+#   app.register_blueprint(health_bp)
+#
+###############################################################################
+
+from flask import Blueprint
+from app.controllers import health_controller
+
+# Create a Blueprint instance for health routes
+health_bp = Blueprint("health_bp", __name__, url_prefix="/api/v1")
+
+# Define routes for server health
+health_bp.route("/ready", methods=["GET"])(health_controller.get_readiness)
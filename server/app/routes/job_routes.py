@@ -0,0 +1,29 @@
+################################################################################
+# Filename: job_routes.py
+# Purpose:  Define routes for conversion job actions in the Flask application.
+# Author:   Benjamin Goh
+#
+# Description:
+# This file creates a Blueprint for conversion job routes and defines the
+# endpoint that reports the status of a background conversion. The routes are
+# associated with corresponding view functions in the job_controller module.
+#
+# Usage (Optional):
+# Import this Blueprint in the main application and register it to add the
+# job routes to the application. For example:
+#   from job_routes import job_bp
+#   app.register_blueprint(job_bp)
+#
+# Notes:
+# Jobs are created by POST /api/v1/midis, which responds with the job ID.
+#
+###############################################################################
+
+from flask import Blueprint
+from app.controllers import job_controller
+
+# Create a Blueprint instance for job routes
+job_bp = Blueprint("job_bp", __name__, url_prefix="/api/v1")
+
+# Define routes for conversion job resources
+job_bp.route("/jobs/<int:job_id>", methods=["GET"])(job_controller.get_job)
@@ -0,0 +1,43 @@
+################################################################################
+# Filename: live_routes.py
+# Purpose:  Define routes for live recording transcription in the Flask application.
+# Author:   Benjamin Goh
+#
+# Description:
+# This file creates a Blueprint for live recording routes and defines the
+# endpoints that start a live session, receive the chunks of the recording,
+# and finish or cancel the session. The routes are associated with
+# corresponding view functions in the live_controller module.
+#
+# Usage (Optional):
+# Import this Blueprint in the main application and register it to add the
+# live recording routes to the application. For example:
+#   from live_routes import live_bp
+#   app.register_blueprint(live_bp)
+#
+# Notes:
+# Finishing a session stores its MIDI entry, which is then available from
+# the MIDI routes.
+#
+###############################################################################
+
+from flask import Blueprint
+from app.controllers import live_controller
+
+# Create a Blueprint instance for live recording routes
+live_bp = Blueprint("live_bp", __name__, url_prefix="/api/v1")
+
+# Define routes for live recording sessions
+live_bp.route("/live", methods=["POST"])(live_controller.start_live_session)
+
+live_bp.route("/live/<session_id>/chunks", methods=["POST"])(
+    live_controller.push_live_chunk
+)
+
+live_bp.route("/live/<session_id>/finish", methods=["POST"])(
+    live_controller.finish_live_session
+)
+
+live_bp.route("/live/<session_id>", methods=["DELETE"])(
+    live_controller.cancel_live_session
+)
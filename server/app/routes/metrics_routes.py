@@ -0,0 +1,26 @@
+################################################################################
+# Filename: metrics_routes.py
+# Purpose:  Define routes for server metrics in the Flask application.
+# Author:   Livia Chandra
+#
+# Description:
+# This file creates a Blueprint for server metrics and defines the endpoint
+# Prometheus scrapes. The routes are associated with corresponding view
+# functions in the metrics_controller module.
+#
+# Usage (Optional):
+# Import this Blueprint in the main application and register it to add the
+# metrics routes to the application. For example:
+#   from metrics_routes import metrics_bp
+#   app.register_blueprint(metrics_bp)
+#
+###############################################################################
+
+from flask import Blueprint
+from app.controllers import metrics_controller
+
+# Create a Blueprint instance for metrics routes
+metrics_bp = Blueprint("metrics_bp", __name__, url_prefix="/api/v1")
+
+# Define routes for server metrics
+metrics_bp.route("/metrics", methods=["GET"])(metrics_controller.get_metrics)
@@ -21,3 +21,5 @@ class TestingConfig:
     TESTING = True
     SQLALCHEMY_DATABASE_URI = "sqlite:///:memory:"
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    CONVERSION_WORKERS = 0
+    WARMUP = False
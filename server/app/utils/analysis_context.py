@@ -0,0 +1,712 @@
+################################################################################
+# Filename: analysis_context.py
+# Purpose:  Share spectral features of one recording between analysis stages.
+# Author:   Livia Chandra
+#
+# Description:
+# This file contains the AnalysisContext class used by wav_to_midi. The
+# pitch, tempo, key and segment stages all read their inputs from one
+# context, which computes every feature the first time it is requested and
+# reuses it afterwards. The power spectrogram is computed once and feeds the
+# onset envelope used for beat tracking, instead of each librosa call
+# framing and transforming the same audio again.
+#
+# Usage (Optional):
+#   context = AnalysisContext(audio_data, sample_rate)
+#   tempo, beat_frames = context.beats
+#   print(context.timings)
+#
+# Notes:
+# - librosa.yin frames the time-domain signal itself, so the pitch stage
+#   does not read the spectrogram; its result is still memoized for the key
+#   stage.
+# - timings records the seconds spent computing each feature, excluding the
+#   features it depends on.
+# - compute_all computes the features wav_to_midi needs with a StageGraph,
+#   so the pitch and key features are computed on one thread while beats
+#   and segment frequencies are computed on others. Every feature is
+#   computed once even when several threads request it.
+#
+###############################################################################
+
+import threading
+import time
+import librosa
+import numpy as np
+from app.utils.conversion_profiles import hop_length, n_fft
+from app.utils.pitch_range import (
+    adaptive_search,
+    coarse_framing,
+    coarse_pitch,
+    decimate,
+    estimate_pitch_range,
+    fmin,
+    full_search,
+    pitch_fmax,
+    pitch_range,
+    range_frame_length,
+)
+from app.utils.segment_analysis import segment_median_frequencies
+from app.utils.stage_graph import StageGraph
+
+# Onset envelope frames per tempogram chunk, which bounds the memory used by
+# tempo estimation on long recordings
+tempogram_chunk_frames = 512
+
+# Map MIDI note number modulo 12 to key signature, spelling the black keys
+# the way MIDI key signature messages accept them
+key_map = {
+    0: "C",
+    1: "C#",
+    2: "D",
+    3: "Eb",
+    4: "E",
+    5: "F",
+    6: "F#",
+    7: "G",
+    8: "Ab",
+    9: "A",
+    10: "Bb",
+    11: "B",
+}
+
+
+def tempogram_window(sample_rate):
+    """
+    Helper function to calculate the autocorrelation window of the tempogram.
+
+    Args:
+        sample_rate (int): Number of samples per second (Hz) of the audio data.
+
+    Returns:
+        int: Number of onset envelope frames in the window (8 seconds).
+    """
+    return librosa.time_to_frames(8.0, sr=sample_rate, hop_length=hop_length).item()
+
+
+def tempogram_sum(onset_envelope, sample_rate):
+    """
+    Sum the tempogram of an onset envelope over all of its frames.
+
+    The sum is accumulated in chunks of frames instead of building the whole
+    tempogram, which needs hundreds of bytes per frame. Sums of consecutive
+    parts of a recording add up to the sum of the whole recording, apart
+    from the windows that straddle the parts.
+
+    Args:
+        onset_envelope (ndarray): Onset strength envelope.
+        sample_rate (int): Number of samples per second (Hz) of the audio data.
+
+    Returns:
+        ndarray: Autocorrelation of each lag, summed over the frames.
+    """
+    win_length = tempogram_window(sample_rate)
+
+    # Centre the autocorrelation windows as librosa.feature.tempogram does
+    frame_count = len(onset_envelope)
+    padded_envelope = np.pad(
+        onset_envelope, win_length // 2, mode="linear_ramp", end_values=0
+    )
+
+    total = np.zeros(win_length)
+    for start in range(0, frame_count, tempogram_chunk_frames):
+        stop = min(start + tempogram_chunk_frames, frame_count)
+        tempogram = librosa.feature.tempogram(
+            onset_envelope=padded_envelope[start : stop + win_length - 1],
+            sr=sample_rate,
+            hop_length=hop_length,
+            win_length=win_length,
+            center=False,
+        )
+        total += tempogram.sum(axis=-1)
+    return total
+
+
+def tempo_from_tempogram(total, frame_count, sample_rate):
+    """
+    Estimate the global tempo from a tempogram summed over its frames.
+
+    Args:
+        total (ndarray): Tempogram sum, from tempogram_sum.
+        frame_count (int): Number of onset envelope frames summed.
+        sample_rate (int): Number of samples per second (Hz) of the audio data.
+
+    Returns:
+        float64: Estimated tempo in beats per minute (BPM).
+    """
+    return librosa.feature.tempo(
+        tg=(total / frame_count)[:, np.newaxis],
+        sr=sample_rate,
+        hop_length=hop_length,
+        aggregate=None,
+    ).item()
+
+
+def estimate_tempo(onset_envelope, sample_rate):
+    """
+    Estimate the global tempo from the onset envelope.
+
+    Equivalent to librosa.feature.tempo, which averages the tempogram over
+    all frames, but accumulates that average with tempogram_sum.
+
+    Args:
+        onset_envelope (ndarray): Onset strength envelope.
+        sample_rate (int): Number of samples per second (Hz) of the audio data.
+
+    Returns:
+        float64: Estimated tempo in beats per minute (BPM).
+    """
+    return tempo_from_tempogram(
+        tempogram_sum(onset_envelope, sample_rate), len(onset_envelope), sample_rate
+    )
+
+
+def track_beats(onset_envelope, sample_rate, bpm=None):
+    """
+    Estimate tempo and track beats from the onset envelope.
+
+    Args:
+        onset_envelope (ndarray): Onset strength envelope.
+        sample_rate (int): Number of samples per second (Hz) of the audio data.
+        bpm (float64): Tempo to track the beats at, or None to estimate it.
+
+    Returns:
+        tuple: Estimated tempo (BPM) and beat frame indices.
+    """
+    # librosa returns no beats for an envelope without onsets
+    if bpm is None and onset_envelope.any():
+        bpm = estimate_tempo(onset_envelope, sample_rate)
+
+    return librosa.beat.beat_track(
+        onset_envelope=onset_envelope, sr=sample_rate, hop_length=hop_length, bpm=bpm
+    )
+
+
+class FrameCarry:
+    """
+    Frame a stream of blocks exactly like a centred array.
+
+    The stream is padded with half a frame of zeros on both ends, and only
+    the samples of the next partial frame are carried between blocks.
+
+    Attributes:
+        frame_length (int): Samples per frame.
+        hop_length (int): Samples between consecutive frames.
+        carry (ndarray): Samples not yet covered by a whole frame.
+    """
+
+    def __init__(self, frame_length, hop_length):
+        self.frame_length = frame_length
+        self.hop_length = hop_length
+        self.carry = np.zeros(frame_length // 2, dtype=np.float32)
+
+    def push(self, block):
+        """
+        Add a block and return the samples of every frame it completes.
+
+        Args:
+            block (ndarray): The next 1D array of samples.
+
+        Returns:
+            ndarray: Samples spanning a whole number of frames, or None if
+                     the block completes no frame.
+        """
+        buffer = np.concatenate((self.carry, block))
+        if len(buffer) < self.frame_length:
+            self.carry = buffer
+            return None
+
+        count = (len(buffer) - self.frame_length) // self.hop_length + 1
+        self.carry = buffer[count * self.hop_length :]
+        return buffer[: (count - 1) * self.hop_length + self.frame_length]
+
+    def finish(self):
+        """
+        Pad the end of the stream and return the frames that completes.
+
+        Returns:
+            ndarray: Samples spanning a whole number of frames, or None.
+        """
+        return self.push(np.zeros(self.frame_length // 2, dtype=np.float32))
+
+
+class AnalysisContext:
+    """
+    Lazily computed, memoized spectral features of one recording.
+
+    Attributes:
+        audio_data (ndarray): 1D array that contains audio signal information.
+        sample_rate (int): Number of samples per second (Hz) of audio_data.
+        yin_frame_length (int): Samples per YIN analysis frame.
+        yin_hop_length (int): Samples between consecutive YIN frames.
+        pitch_search (str): "adaptive" to search only the register found by
+                            a coarse pass, or "full" to search C1 to C8.
+        features (dict): Features computed so far, keyed by name.
+        timings (dict): Seconds spent computing each feature, keyed by name.
+    """
+
+    def __init__(
+        self,
+        audio_data,
+        sample_rate,
+        yin_frame_length=n_fft,
+        yin_hop_length=hop_length,
+        pitch_search=full_search,
+        pitch_range=None,
+    ):
+        """
+        Create an analysis context for audio data.
+
+        Args:
+            audio_data (ndarray): 1D array that contains audio signal information.
+            sample_rate (int): Number of samples per second (Hz) of audio_data.
+            yin_frame_length (int): Samples per YIN analysis frame.
+            yin_hop_length (int): Samples between consecutive YIN frames.
+            pitch_search (str): "adaptive" or "full" pitch search.
+            pitch_range (tuple): Register (Hz) the adaptive search uses instead
+                                 of estimating it from audio_data, such as
+                                 that of the recording audio_data is part of.
+        """
+        self.audio_data = audio_data
+        self.sample_rate = sample_rate
+        self.yin_frame_length = yin_frame_length
+        self.yin_hop_length = yin_hop_length
+        self.pitch_search = pitch_search
+        self.features = {}
+        if pitch_range is not None:
+            self.features["pitch_range"] = pitch_range
+        self.timings = {}
+        self.lock = threading.Lock()
+        self.feature_locks = {}
+        self.dependency_time = threading.local()
+
+    def compute(self, name, function):
+        """
+        Return a feature, computing and timing it on first use.
+
+        Args:
+            name (str): Name of the feature.
+            function (callable): Computes the feature when it is not cached.
+
+        Returns:
+            The value of the feature.
+        """
+        if name in self.features:
+            return self.features[name]
+
+        # Threads that request the same feature wait for one computation
+        with self.lock:
+            feature_lock = self.feature_locks.setdefault(name, threading.Lock())
+        with feature_lock:
+            if name not in self.features:
+                # Time only this feature, not the features it computes on
+                # this thread first
+                outer_time = getattr(self.dependency_time, "seconds", 0.0)
+                self.dependency_time.seconds = 0.0
+                start = time.perf_counter()
+                try:
+                    value = function()
+                finally:
+                    elapsed = time.perf_counter() - start
+                    inner_time = self.dependency_time.seconds
+                    self.dependency_time.seconds = outer_time + elapsed
+                self.timings[name] = elapsed - inner_time
+                self.features[name] = value
+        return self.features[name]
+
+    def compute_all(self, threads=None):
+        """
+        Compute every feature wav_to_midi needs, running independent features concurrently.
+
+        Args:
+            threads (int): Number of threads, defaults to the ANALYSIS_THREADS setting.
+        """
+        graph = StageGraph()
+        graph.add("key_signature", lambda: self.key_signature)
+        graph.add("beats", lambda: self.beats)
+        graph.add("beat_times", lambda: self.beat_times, ("beats",))
+        graph.add("segment_frequencies", lambda: self.segment_frequencies, ("beats",))
+        graph.run(threads)
+
+    @property
+    def power_spectrogram(self):
+        """
+        ndarray: Power spectrogram of the audio data.
+        """
+        return self.compute(
+            "power_spectrogram",
+            lambda: np.abs(
+                librosa.stft(self.audio_data, n_fft=n_fft, hop_length=hop_length)
+            )
+            ** 2,
+        )
+
+    @property
+    def onset_envelope(self):
+        """
+        ndarray: Onset strength envelope, derived from the power spectrogram.
+        """
+
+        def onset_strength():
+            mel_spectrogram = librosa.feature.melspectrogram(
+                S=self.power_spectrogram, sr=self.sample_rate
+            )
+            return librosa.onset.onset_strength(
+                S=librosa.power_to_db(mel_spectrogram),
+                sr=self.sample_rate,
+                hop_length=hop_length,
+                aggregate=np.median,
+            )
+
+        return self.compute("onset_envelope", onset_strength)
+
+    @property
+    def beats(self):
+        """
+        tuple: Estimated tempo (BPM) and beat frame indices.
+        """
+        return self.compute(
+            "beats",
+            lambda: track_beats(self.onset_envelope, self.sample_rate),
+        )
+
+    @property
+    def beat_times(self):
+        """
+        ndarray: Time in seconds of each beat.
+        """
+        return self.compute(
+            "beat_times",
+            lambda: librosa.frames_to_time(
+                self.beats[1], sr=self.sample_rate, hop_length=hop_length
+            ),
+        )
+
+    @property
+    def pitch_range(self):
+        """
+        tuple: Lowest and highest frequency (Hz) the pitch stage searches.
+        """
+        if self.pitch_search == full_search:
+            return fmin, pitch_fmax(self.sample_rate)
+
+        return self.compute(
+            "pitch_range",
+            lambda: estimate_pitch_range(
+                self.audio_data,
+                self.sample_rate,
+                self.yin_frame_length,
+                self.yin_hop_length,
+            ),
+        )
+
+    @property
+    def pitch_frame_length(self):
+        """
+        int: Samples per YIN frame, shortened to the adaptive pitch range.
+        """
+        if self.pitch_search == full_search:
+            return self.yin_frame_length
+        return range_frame_length(
+            self.sample_rate, self.pitch_range[0], self.yin_frame_length
+        )
+
+    @property
+    def pitch(self):
+        """
+        ndarray: Fundamental frequency of each frame, estimated with YIN.
+        """
+
+        def pitch():
+            low, high = self.pitch_range
+            return librosa.yin(
+                y=self.audio_data,
+                sr=self.sample_rate,
+                fmin=low,
+                fmax=high,
+                frame_length=self.pitch_frame_length,
+                hop_length=self.yin_hop_length,
+            )
+
+        return self.compute("pitch", pitch)
+
+    @property
+    def key_signature(self):
+        """
+        str: Key signature determined from the dominant pitch.
+        """
+
+        def key_signature():
+            # Find the most frequent pitch
+            dominant_pitch = np.argmax(self.pitch)
+
+            # Determine key signature by mapping MIDI note number
+            return key_map[int(dominant_pitch) % 12]
+
+        return self.compute("key_signature", key_signature)
+
+    @property
+    def segment_frequencies(self):
+        """
+        ndarray: Weighted median frequency of each two-beat segment.
+        """
+        return self.compute(
+            "segment_frequencies",
+            lambda: segment_median_frequencies(
+                self.audio_data, self.sample_rate, self.beats[0]
+            ),
+        )
+
+
+class StreamingAnalysis:
+    """
+    Tempo, beat and key analysis of a recording fed in consecutive blocks.
+
+    Frames are laid out exactly as in AnalysisContext, once for the STFT,
+    once for the coarse pitch pass and once for YIN, each with a FrameCarry.
+    Besides the carried samples, only one onset strength value and the last
+    spectrum per frame, and two values per coarse frame, are kept, so memory
+    stays flat however long the recording is.
+
+    The recording is fed twice. The first pass, feed and finish, estimates
+    tempo, beats and the pitch range. The second pass, feed_pitch and
+    finish_pitch, runs YIN over that range to find the key signature.
+
+    Attributes:
+        sample_rate (int): Number of samples per second (Hz) of the stream.
+        yin_frame_length (int): Samples per YIN analysis frame.
+        yin_hop_length (int): Samples between consecutive YIN frames.
+        pitch_search (str): "adaptive" or "full" pitch search.
+        sample_count (int): Number of samples fed so far.
+        frame_count (int): Number of STFT frames analysed so far.
+        pitch_frame_count (int): Number of YIN frames analysed so far.
+        tempo (float64): Estimated tempo (BPM), set by finish.
+        beat_times (ndarray): Time in seconds of each beat, set by finish.
+        pitch_range (tuple): Lowest and highest frequency (Hz) to search, set by finish.
+        key_signature (str): Key signature from the dominant pitch, set by finish_pitch.
+        timings (dict): Seconds spent on each feature, keyed by name.
+    """
+
+    def __init__(
+        self,
+        sample_rate,
+        yin_frame_length=n_fft,
+        yin_hop_length=hop_length,
+        pitch_search=full_search,
+    ):
+        """
+        Create a streaming analysis.
+
+        Args:
+            sample_rate (int): Number of samples per second (Hz) of the stream.
+            yin_frame_length (int): Samples per YIN analysis frame.
+            yin_hop_length (int): Samples between consecutive YIN frames.
+            pitch_search (str): "adaptive" or "full" pitch search.
+        """
+        self.sample_rate = sample_rate
+        self.yin_frame_length = yin_frame_length
+        self.yin_hop_length = yin_hop_length
+        self.pitch_search = pitch_search
+        self.sample_count = 0
+        self.frame_count = 0
+        self.pitch_frame_count = 0
+        self.tempo = None
+        self.beat_times = None
+        self.pitch_range = None
+        self.key_signature = None
+        self.timings = {}
+
+        # Onset state: previous log-mel spectrum, running maximum for the
+        # 80 dB floor of power_to_db and the spectral flux of every frame
+        self.spectrum_frames = FrameCarry(n_fft, hop_length)
+        self.previous_spectrum = None
+        self.max_db = -np.inf
+        self.spectral_flux = []
+
+        # Coarse pitch state: odd sample left over from decimation, and the
+        # pitch and level of every coarse frame
+        self.coarse_rate, coarse_frame, coarse_hop = coarse_framing(
+            sample_rate, yin_frame_length, yin_hop_length
+        )
+        self.coarse_frames = FrameCarry(coarse_frame, coarse_hop)
+        self.decimation_carry = np.zeros(0, dtype=np.float32)
+        self.coarse_pitch = []
+        self.coarse_rms = []
+
+        # Pitch state: highest YIN estimate so far and its frame index
+        self.pitch_frames = None
+        self.max_pitch = -np.inf
+        self.max_pitch_frame = 0
+
+    def time(self, name, start):
+        """
+        Helper function to add the time elapsed since start to a feature timing.
+
+        Args:
+            name (str): Name of the feature.
+            start (float): Value of time.perf_counter when the work started.
+        """
+        self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - start
+
+    def feed(self, block):
+        """
+        Analyse every whole onset and coarse pitch frame the next block completes.
+
+        Args:
+            block (ndarray): The next 1D array of audio data.
+        """
+        self.sample_count += len(block)
+
+        frames = self.spectrum_frames.push(block)
+        if frames is not None:
+            self.analyze_frames(frames)
+
+        if self.pitch_search == adaptive_search:
+            # Decimate whole pairs and carry an odd sample to the next block
+            buffer = np.concatenate((self.decimation_carry, block))
+            whole_length = len(buffer) // 2 * 2
+            self.decimation_carry = buffer[whole_length:]
+            frames = self.coarse_frames.push(decimate(buffer[:whole_length]))
+            if frames is not None:
+                self.analyze_coarse_frames(frames)
+
+    def analyze_frames(self, frames):
+        """
+        Update onset state with a run of whole frames.
+
+        Args:
+            frames (ndarray): Samples spanning a whole number of frames.
+        """
+        # Log-mel spectrum of each frame, as librosa.onset.onset_strength
+        # computes it, floored 80 dB below the loudest frame seen so far
+        start = time.perf_counter()
+        power = (
+            np.abs(
+                librosa.stft(frames, n_fft=n_fft, hop_length=hop_length, center=False)
+            )
+            ** 2
+        )
+        self.time("power_spectrogram", start)
+
+        start = time.perf_counter()
+        mel_db = librosa.power_to_db(
+            librosa.feature.melspectrogram(S=power, sr=self.sample_rate), top_db=None
+        )
+        self.max_db = max(self.max_db, mel_db.max())
+        mel_db = np.maximum(mel_db, self.max_db - 80.0)
+
+        # Spectral flux against the previous frame, carried across blocks
+        if self.previous_spectrum is not None:
+            mel_db = np.concatenate((self.previous_spectrum, mel_db), axis=1)
+        flux = np.median(np.maximum(0.0, np.diff(mel_db, axis=1)), axis=0)
+        self.spectral_flux.append(flux.astype(np.float32))
+        self.previous_spectrum = mel_db[:, -1:]
+        self.frame_count += power.shape[1]
+        self.time("onset_envelope", start)
+
+    def analyze_coarse_frames(self, frames):
+        """
+        Record the coarse pitch and level of a run of whole coarse frames.
+
+        Args:
+            frames (ndarray): Decimated samples spanning a whole number of frames.
+        """
+        start = time.perf_counter()
+        pitch, rms = coarse_pitch(
+            frames,
+            self.coarse_rate,
+            self.coarse_frames.frame_length,
+            self.coarse_frames.hop_length,
+        )
+        self.coarse_pitch.append(pitch)
+        self.coarse_rms.append(rms)
+        self.time("pitch_range", start)
+
+    def finish(self):
+        """
+        Analyse the remaining frames and estimate tempo, beats and pitch range.
+        """
+        # Pad the end of the stream with half a frame of zeros
+        frames = self.spectrum_frames.finish()
+        if frames is not None:
+            self.analyze_frames(frames)
+
+        # Onset envelope delayed by the lag and centre padding, as librosa does
+        start = time.perf_counter()
+        onset_envelope = np.concatenate(
+            [np.zeros(1 + n_fft // (2 * hop_length), dtype=np.float32)]
+            + self.spectral_flux
+        )[: self.frame_count]
+        self.tempo, beat_frames = track_beats(onset_envelope, self.sample_rate)
+        self.beat_times = librosa.frames_to_time(
+            beat_frames, sr=self.sample_rate, hop_length=hop_length
+        )
+        self.time("beats", start)
+
+        # Bound the register for the second pass
+        self.pitch_range = fmin, pitch_fmax(self.sample_rate)
+        if self.pitch_search == adaptive_search:
+            frames = self.coarse_frames.finish()
+            if frames is not None:
+                self.analyze_coarse_frames(frames)
+            if self.coarse_pitch:
+                self.pitch_range = pitch_range(
+                    np.concatenate(self.coarse_pitch),
+                    np.concatenate(self.coarse_rms),
+                    self.sample_rate,
+                )
+
+        frame_length = self.yin_frame_length
+        if self.pitch_search == adaptive_search:
+            frame_length = range_frame_length(
+                self.sample_rate, self.pitch_range[0], frame_length
+            )
+        self.pitch_frames = FrameCarry(frame_length, self.yin_hop_length)
+
+    def feed_pitch(self, block):
+        """
+        Run YIN over every whole frame the next block completes.
+
+        Args:
+            block (ndarray): The next 1D array of audio data.
+        """
+        frames = self.pitch_frames.push(block)
+        if frames is not None:
+            self.analyze_pitch(frames)
+
+    def analyze_pitch(self, frames):
+        """
+        Update pitch state with a run of whole YIN frames.
+
+        Args:
+            frames (ndarray): Samples spanning a whole number of YIN frames.
+        """
+        # Highest pitch estimate and the first frame it occurs in
+        start = time.perf_counter()
+        low, high = self.pitch_range
+        pitch = librosa.yin(
+            y=frames,
+            sr=self.sample_rate,
+            fmin=low,
+            fmax=high,
+            frame_length=self.pitch_frames.frame_length,
+            hop_length=self.yin_hop_length,
+            center=False,
+        )
+        frame = int(np.argmax(pitch))
+        if pitch[frame] > self.max_pitch:
+            self.max_pitch = pitch[frame]
+            self.max_pitch_frame = self.pitch_frame_count + frame
+        self.pitch_frame_count += len(pitch)
+        self.time("pitch", start)
+
+    def finish_pitch(self):
+        """
+        Analyse the remaining YIN frames and determine the key signature.
+        """
+        frames = self.pitch_frames.finish()
+        if frames is not None:
+            self.analyze_pitch(frames)
+
+        # Determine key signature by mapping MIDI note number
+        self.key_signature = key_map[self.max_pitch_frame % 12]
@@ -0,0 +1,237 @@
+################################################################################
+# Filename: artifact_cache.py
+# Purpose:  Cache the MusicXML get_midi renders for legacy MIDI entries.
+# Author:   Livia Chandra
+#
+# Description:
+# This file contains the ArtifactCache class, an in-process LRU cache of the
+# MusicXML rendered on read for MIDI entries created before it was stored
+# with them. Rendering takes milliseconds to tens of milliseconds per entry,
+# against microseconds for a lookup, so a popular legacy entry is rendered
+# once per version rather than on every read. Entries are keyed by the MIDI
+# ID together with the version of the row, which the ORM increments on
+# every update, so a changed entry never serves a stale rendering. Entries
+# are also dropped when their MIDI entry is updated or deleted through the
+# ORM.
+#
+# Usage (Optional):
+#   key = artifact_key(midi.midi_id, midi.version)
+#   xml_data = artifact_cache.get(key)
+#   if xml_data is None:
+#       xml_data = render_musicxml(midi.midi_data)
+#       artifact_cache.put(key, xml_data)
+#
+# Notes:
+# - Entries whose MusicXML is stored are served from the database and never
+#   cached; backfill_musicxml.py stores it for the legacy entries.
+# - The total size of the cached artifacts is bounded by ARTIFACT_CACHE_BYTES
+#   (64 MB by default); the least recently used entries are evicted first.
+#   A size of 0 disables the cache.
+# - Invalidation listens to the ORM's update and delete events, which bulk
+#   query updates and deletes do not emit.
+# - Hit, miss, store, eviction and invalidation counts are kept per process.
+#
+###############################################################################
+
+import os
+import threading
+from collections import OrderedDict
+
+# Default size bound
+default_artifact_cache_bytes = 64 * 1024 * 1024
+
+
+def artifact_key(midi_id, version):
+    """
+    Build the cache key of the artifacts derived from a MIDI entry.
+
+    Args:
+        midi_id (int): The ID of the MIDI entry.
+        version (int): The version of the MIDI entry.
+
+    Returns:
+        tuple: The MIDI ID and version.
+    """
+    return midi_id, version
+
+
+class ArtifactCache:
+    """
+    Thread-safe, size-bounded LRU cache of MusicXML rendered from MIDI entries.
+
+    Attributes:
+        max_bytes (int): Maximum total size of the cached artifacts.
+        total_bytes (int): Total size of the cached artifacts.
+        hits (int): Number of lookups that found an entry.
+        misses (int): Number of lookups that found no entry.
+        stores (int): Number of entries stored.
+        evictions (int): Number of entries removed to respect max_bytes.
+        invalidations (int): Number of entries removed because their MIDI
+                             entry changed.
+    """
+
+    def __init__(self, max_bytes=default_artifact_cache_bytes):
+        self.lock = threading.Lock()
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.keys_by_midi = {}
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.model_listeners = False
+
+    def init_app(self, app):
+        """
+        Read the cache size from the application configuration and invalidate
+        entries when MIDI entries change.
+
+        The cache is emptied, since the application may use another database
+        whose MIDI IDs refer to other entries.
+
+        Args:
+            app (Flask): The application to configure the cache for.
+        """
+        with self.lock:
+            self.max_bytes = int(
+                app.config.get(
+                    "ARTIFACT_CACHE_BYTES",
+                    os.environ.get(
+                        "ARTIFACT_CACHE_BYTES", default_artifact_cache_bytes
+                    ),
+                )
+            )
+        self.clear()
+        self.listen_to_model()
+        app.extensions["artifact_cache"] = self
+
+    def listen_to_model(self):
+        """
+        Invalidate the artifacts of MIDI entries updated or deleted through
+        the ORM, once per process.
+        """
+        from sqlalchemy import event
+        from app.models.midi_model import MIDI
+
+        with self.lock:
+            if self.model_listeners:
+                return
+            self.model_listeners = True
+
+        def invalidate_midi(mapper, connection, target):
+            self.invalidate(target.midi_id)
+
+        event.listen(MIDI, "after_update", invalidate_midi)
+        event.listen(MIDI, "after_delete", invalidate_midi)
+
+    def get(self, key):
+        """
+        Look up the artifact for a key.
+
+        Args:
+            key (tuple): The cache key, from artifact_key.
+
+        Returns:
+            bytes: The cached artifact, or None on a miss.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, artifact):
+        """
+        Store the artifact for a key and evict old entries beyond the size bound.
+
+        Args:
+            key (tuple): The cache key, from artifact_key.
+            artifact (bytes): The artifact, such as rendered MusicXML.
+        """
+        size = len(artifact)
+        with self.lock:
+            if size > self.max_bytes:
+                return
+            self.remove(key)
+            self.entries[key] = (artifact, size)
+            self.keys_by_midi.setdefault(key[0], set()).add(key)
+            self.total_bytes += size
+            self.stores += 1
+            self.evict()
+
+    def invalidate(self, midi_id):
+        """
+        Drop every entry derived from a MIDI entry.
+
+        Args:
+            midi_id (int): The ID of the MIDI entry.
+        """
+        with self.lock:
+            for key in list(self.keys_by_midi.get(midi_id, ())):
+                self.remove(key)
+                self.invalidations += 1
+
+    def clear(self):
+        """
+        Drop every entry.
+        """
+        with self.lock:
+            self.entries.clear()
+            self.keys_by_midi.clear()
+            self.total_bytes = 0
+
+    def remove(self, key):
+        """
+        Helper function to drop an entry. The caller must hold the lock.
+
+        Args:
+            key (tuple): The cache key.
+
+        Returns:
+            bool: True if the entry was cached.
+        """
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return False
+        self.total_bytes -= entry[1]
+        keys = self.keys_by_midi[key[0]]
+        keys.discard(key)
+        if not keys:
+            del self.keys_by_midi[key[0]]
+        return True
+
+    def evict(self):
+        """
+        Helper function to drop the least recently used entries beyond the
+        size bound. The caller must hold the lock.
+        """
+        while self.total_bytes > self.max_bytes:
+            self.remove(next(iter(self.entries)))
+            self.evictions += 1
+
+    def stats(self):
+        """
+        Report the cache counters and size.
+
+        Returns:
+            dict: Counter names and values.
+        """
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "stores": self.stores,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "entries": len(self.entries),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+artifact_cache = ArtifactCache()
@@ -0,0 +1,686 @@
+################################################################################
+# Filename: chunked_conversion.py
+# Purpose:  Convert very long recordings as chunks spread over worker processes.
+# Author:   Livia Chandra
+#
+# Description:
+# This file contains convert_chunked, a map-reduce version of convert_job for
+# recordings long enough that a single worker would keep one core busy for
+# minutes. One worker decodes the recording into a shared memory file,
+# picks split points in the quietest frame near each even split and
+# estimates the register of the whole recording. The other workers map only
+# their chunk of that file, so no audio is pickled:
+#
+# 1. Each chunk computes its onset envelope, its share of the tempogram and
+#    its YIN pitch track in that register.
+# 2. One task adds the tempogram shares up to the global tempo and tracks
+#    the beats over the joined onset envelope.
+# 3. Each chunk, with its split moved to the nearest two-beat segment
+#    boundary of that tempo, computes the frequency of its segments.
+# 4. One task joins the segments in order and writes the MIDI and MusicXML,
+#    with the key of the highest pitch over all chunks.
+#
+# Every chunk starts on an analysis frame boundary and every segment chunk on
+# a segment boundary, so notes keep their absolute position in the
+# recording. The pitch frames of a chunk are computed with half a frame of
+# its neighbours, so they match an unsplit conversion exactly; only the
+# tempogram windows and onset frames right at a split differ slightly.
+#
+# Usage (Optional):
+#   if recording_seconds(audio_file_path) >= default_chunked_seconds:
+#       midi_data, xml_data, timings = convert_chunked(
+#           audio_file_path, executor, workers, profile
+#       )
+#
+# Notes:
+# - The shared memory file lives in /dev/shm where it exists, otherwise in
+#   the temporary directory, and is removed by the process that started the
+#   conversion once every task is done. The recording is decoded into it a
+#   block at a time and gated in place, so it is the only copy of the audio.
+# - The server process only coordinates: decoding, analysis and MIDI writing
+#   all run in the pool, so the server never loads librosa or mido.
+# - Chunks are at least min_chunk_seconds long, so short recordings use
+#   fewer chunks than there are workers.
+#
+###############################################################################
+
+import functools
+import os
+import subprocess
+import tempfile
+import time
+import numpy as np
+from app.utils.metrics import record_stage, recording_stages
+from app.utils.pitch_range import (
+    coarse_framing,
+    coarse_pitch,
+    decimate,
+    fmin,
+    pitch_fmax,
+    pitch_range,
+)
+from app.utils.thread_governor import ThreadAllocation, available_cpus, limit_threads
+from app.utils.voicing_gate import (
+    frame_rms,
+    gate_hop_length,
+    gate_in_place,
+    segment_rests,
+)
+from app.utils.wav_mapping import read_wav_header
+
+# Recordings at least this long are converted in chunks, in seconds
+default_chunked_seconds = 600
+
+# Shortest chunk in seconds
+min_chunk_seconds = 30
+
+# Seconds either side of an even split searched for the quietest frame
+split_search_seconds = 5.0
+
+# Directory backed by memory on Linux, for the shared memory files
+shared_memory_directory = "/dev/shm"
+
+# Bytes per sample of the shared memory files
+sample_size = np.dtype(np.float32).itemsize
+
+# Samples decimated at a time by the register estimate, an even number
+range_block_size = 1 << 17
+
+
+class ChunkPlan:
+    """
+    Decoded recording in a shared memory file and the chunks it is split into.
+
+    Attributes:
+        path (str): The shared memory file of float32 samples.
+        file_name (str): File name to name the converted MIDI file.
+        sample_count (int): Number of samples in the file.
+        sample_rate (int): Number of samples per second (Hz) of the samples.
+        split_points (list): First sample of each chunk, then the sample count.
+        regions (list): Active regions kept by the voicing gate, or None if
+                        the recording was not gated.
+        pitch_range (tuple): Register (Hz) of the whole recording, or None
+                             to search the full range.
+    """
+
+    def __init__(
+        self,
+        path,
+        file_name,
+        sample_count,
+        sample_rate,
+        split_points,
+        regions=None,
+        pitch_range=None,
+    ):
+        self.path = path
+        self.file_name = file_name
+        self.sample_count = sample_count
+        self.sample_rate = sample_rate
+        self.split_points = split_points
+        self.regions = regions
+        self.pitch_range = pitch_range
+
+    def __repr__(self):
+        """
+        Return a string representation of the ChunkPlan object.
+        """
+        return f"<ChunkPlan(file_name='{self.file_name}', sample_count={self.sample_count}, sample_rate={self.sample_rate}, chunks={len(self.split_points) - 1})>"
+
+    def chunks(self):
+        """
+        List the chunks of the recording.
+
+        Returns:
+            list: First and past-the-end sample of each chunk, in order.
+        """
+        return list(zip(self.split_points[:-1], self.split_points[1:]))
+
+    def samples(self, start, stop):
+        """
+        Map the samples of one chunk from the shared memory file.
+
+        Args:
+            start (int): First sample of the chunk.
+            stop (int): Past-the-end sample of the chunk.
+
+        Returns:
+            ndarray: Read-only 1D float32 array backed by the file.
+        """
+        if stop <= start:
+            return np.zeros(0, dtype=np.float32)
+        return np.asarray(
+            np.memmap(
+                self.path,
+                dtype=np.float32,
+                mode="r",
+                offset=start * sample_size,
+                shape=(stop - start,),
+            )
+        )
+
+
+def recording_seconds(audio_file, timeout=None):
+    """
+    Read the duration of a recording without decoding it.
+
+    WAV files are read from their header, other formats by ffprobe.
+
+    Args:
+        audio_file (str): The path to the audio file.
+        timeout (float): Seconds to wait for ffprobe, or None to wait for it
+                         to finish.
+
+    Returns:
+        float: Duration in seconds, or None if it cannot be read.
+    """
+    if os.path.splitext(audio_file)[1].lower() == ".wav":
+        header = read_wav_header(audio_file)
+        if header is not None:
+            return header.frame_count / header.sample_rate
+
+    command = [
+        "ffprobe",
+        "-v",
+        "error",
+        "-show_entries",
+        "format=duration",
+        "-of",
+        "csv=p=0",
+        audio_file,
+    ]
+    try:
+        result = subprocess.run(
+            command, capture_output=True, text=True, timeout=timeout
+        )
+        return float(result.stdout.strip())
+    except (OSError, ValueError, subprocess.TimeoutExpired) as e:
+        print("An error occurred during duration probing:", e)
+        return None
+
+
+def split_points(audio_data, sample_rate, chunk_count):
+    """
+    Split a recording into chunks at the quietest frame near each even split.
+
+    Args:
+        audio_data (ndarray): 1D array that contains audio signal information.
+        sample_rate (int): Number of samples per second (Hz) of audio_data.
+        chunk_count (int): Number of chunks wanted.
+
+    Returns:
+        list: First sample of each chunk, on analysis frame boundaries, then
+              the number of samples.
+    """
+    chunk_count = max(
+        1, min(chunk_count, int(len(audio_data) / (min_chunk_seconds * sample_rate)))
+    )
+    rms = frame_rms(audio_data)
+    search_frames = int(split_search_seconds * sample_rate / gate_hop_length)
+
+    points = [0]
+    for index in range(1, chunk_count):
+        target = index * (len(rms) - 1) // chunk_count
+        low = max(target - search_frames, 1)
+        high = min(target + search_frames + 1, len(rms) - 1)
+        points.append(int(low + np.argmin(rms[low:high])) * gate_hop_length)
+    points.append(len(audio_data))
+    return points
+
+
+def segment_split_points(plan, segment_length):
+    """
+    Helper function to move the split points to the nearest segment boundary.
+
+    Args:
+        plan (ChunkPlan): The recording and its split points.
+        segment_length (int): Number of samples in each segment.
+
+    Returns:
+        list: First sample of each chunk, on segment boundaries, then the
+              number of samples.
+    """
+    points = [0]
+    for point in plan.split_points[1:-1]:
+        boundary = int(round(point / segment_length)) * segment_length
+        if points[-1] < boundary < plan.sample_count:
+            points.append(boundary)
+    points.append(plan.sample_count)
+    return points
+
+
+def coarse_runs(audio_data, frames):
+    """
+    Helper function to decimate a recording a block at a time into coarse frames.
+
+    Args:
+        audio_data (ndarray): 1D array that contains audio signal information.
+        frames (FrameCarry): Collects the decimated samples into coarse frames.
+
+    Yields:
+        ndarray: Decimated samples spanning a whole number of coarse frames.
+    """
+    for start in range(0, len(audio_data), range_block_size):
+        run = frames.push(decimate(audio_data[start : start + range_block_size]))
+        if run is not None:
+            yield run
+    run = frames.finish()
+    if run is not None:
+        yield run
+
+
+def recording_pitch_range(audio_data, sample_rate, profile):
+    """
+    Estimate the register of a whole recording a block at a time.
+
+    Runs the coarse pass of estimate_pitch_range over blocks of the
+    recording, so that no decimated copy of the whole recording is made.
+
+    Args:
+        audio_data (ndarray): 1D array that contains audio signal information.
+        sample_rate (int): Number of samples per second (Hz) of audio_data.
+        profile (ConversionProfile): Profile the recording is converted with.
+
+    Returns:
+        tuple: Lowest and highest frequency (Hz) to search.
+    """
+    from app.utils.analysis_context import FrameCarry
+
+    coarse_rate, coarse_frame, coarse_hop = coarse_framing(
+        sample_rate, profile.yin_frame_length, profile.yin_hop_length
+    )
+    pitches, levels = [], []
+    for run in coarse_runs(audio_data, FrameCarry(coarse_frame, coarse_hop)):
+        pitch, rms = coarse_pitch(run, coarse_rate, coarse_frame, coarse_hop)
+        pitches.append(pitch)
+        levels.append(rms)
+
+    if not pitches:
+        return fmin, pitch_fmax(sample_rate)
+    return pitch_range(np.concatenate(pitches), np.concatenate(levels), sample_rate)
+
+
+def prepare_chunks(audio_file, profile, chunk_count, allocation=None):
+    """
+    Decode a recording into a shared memory file and plan its chunks, inside a worker.
+
+    The recording is decoded a block at a time straight into the file and
+    gated in place there, so the file is the only copy of the audio.
+
+    Args:
+        audio_file (str): The path to the audio file.
+        profile (ConversionProfile): Profile the recording is converted with.
+        chunk_count (int): Number of chunks wanted.
+        allocation (ThreadAllocation): Thread budget of the task.
+
+    Returns:
+        tuple: The ChunkPlan, or None if the audio file cannot be decoded,
+               and the seconds spent in each conversion stage.
+    """
+    from app.utils.conversion import audio_file_name, stream_audio
+    from app.utils.conversion_profiles import adaptive_search
+
+    with limit_threads(allocation), recording_stages() as timings:
+        file_name = audio_file_name(audio_file)
+        if file_name is None:
+            return None, timings
+
+        directory = shared_memory_directory
+        if not os.path.isdir(directory):
+            directory = tempfile.gettempdir()
+        descriptor, path = tempfile.mkstemp(suffix=".f32", dir=directory)
+
+        start = time.perf_counter()
+        try:
+            with os.fdopen(descriptor, "wb") as shared_file:
+                for block in stream_audio(
+                    audio_file, profile.sample_rate, resampler=profile.resampler
+                ):
+                    block.tofile(shared_file)
+        except OSError:
+            os.remove(path)
+            raise
+        sample_rate = profile.sample_rate
+        sample_count = os.path.getsize(path) // sample_size
+        if sample_count == 0:
+            os.remove(path)
+            return None, timings
+        record_stage("decode", time.perf_counter() - start)
+
+        # Analyse only the active regions of the recording, moved to the
+        # start of the file, which is then cut to their length
+        regions = None
+        if profile.voicing_gate:
+            start = time.perf_counter()
+            shared = np.memmap(path, dtype=np.float32, mode="r+", shape=(sample_count,))
+            sample_count, regions = gate_in_place(shared, sample_rate)
+            shared.flush()
+            del shared
+            os.truncate(path, sample_count * sample_size)
+            record_stage("voicing_gate", time.perf_counter() - start)
+
+        plan = ChunkPlan(path, file_name, sample_count, sample_rate, None, regions)
+        audio_data = plan.samples(0, sample_count)
+        plan.split_points = split_points(audio_data, sample_rate, chunk_count)
+
+        # Every chunk searches the register of the whole recording
+        if profile.pitch_search == adaptive_search:
+            start = time.perf_counter()
+            plan.pitch_range = recording_pitch_range(audio_data, sample_rate, profile)
+            record_stage("yin", time.perf_counter() - start)
+    return plan, timings
+
+
+def analyze_chunk(plan, start, stop, profile, allocation=None):
+    """
+    Compute the onset envelope, tempogram share and pitch of a chunk, inside a worker.
+
+    Args:
+        plan (ChunkPlan): The recording and its chunks.
+        start (int): First sample of the chunk.
+        stop (int): Past-the-end sample of the chunk.
+        profile (ConversionProfile): Profile the recording is converted with.
+        allocation (ThreadAllocation): Thread budget of the task.
+
+    Returns:
+        tuple: Onset envelope, tempogram sum, highest pitch and its frame
+               index in the recording, and the seconds spent in each stage.
+    """
+    from app.utils.analysis_context import AnalysisContext, tempogram_sum
+    from app.utils.metrics import record_feature_stages
+
+    hop = profile.yin_hop_length
+    with limit_threads(allocation), recording_stages() as timings:
+        context = AnalysisContext(plan.samples(start, stop), plan.sample_rate)
+        onset_envelope = context.onset_envelope
+        record_feature_stages(context.timings)
+
+        # The last frame of a chunk is centred on the first sample of the next
+        if stop < plan.sample_count:
+            onset_envelope = onset_envelope[:-1]
+
+        start_time = time.perf_counter()
+        tempogram = tempogram_sum(onset_envelope, plan.sample_rate)
+        record_stage("beat_track", time.perf_counter() - start_time)
+
+        # YIN frames are centred, so the pitch is computed with half a frame
+        # of the neighbouring chunks either side and only the frames centred
+        # in this chunk are kept, which match those of the whole recording
+        margin = -(-profile.yin_frame_length // 2 // hop) * hop
+        before = min(margin, start)
+        after = min(margin, plan.sample_count - stop)
+        pitch_context = AnalysisContext(
+            plan.samples(start - before, stop + after),
+            plan.sample_rate,
+            profile.yin_frame_length,
+            hop,
+            profile.pitch_search,
+            plan.pitch_range,
+        )
+        pitch = pitch_context.pitch[before // hop :]
+        if stop < plan.sample_count:
+            pitch = pitch[: -(-(stop - start) // hop)]
+        record_feature_stages(pitch_context.timings)
+
+    peak = int(np.argmax(pitch))
+    return (
+        onset_envelope,
+        tempogram,
+        float(pitch[peak]),
+        start // hop + peak,
+        timings,
+    )
+
+
+def track_chunked_beats(plan, onset_envelopes, tempogram_sums, allocation=None):
+    """
+    Join the onset envelopes of the chunks and track the beats, inside a worker.
+
+    Args:
+        plan (ChunkPlan): The recording and its chunks.
+        onset_envelopes (list): Onset envelope of each chunk, in order.
+        tempogram_sums (list): Tempogram sum of each chunk.
+        allocation (ThreadAllocation): Thread budget of the task.
+
+    Returns:
+        tuple: Estimated tempo (BPM), time in seconds of each beat, split
+               points on the segment boundaries of that tempo, and the
+               seconds spent in each stage.
+    """
+    import librosa
+    from app.utils.analysis_context import (
+        hop_length,
+        tempo_from_tempogram,
+        track_beats,
+    )
+    from app.utils.segment_analysis import segment_length
+
+    sample_rate = plan.sample_rate
+    with limit_threads(allocation), recording_stages() as timings:
+        start = time.perf_counter()
+        onset_envelope = np.concatenate(onset_envelopes)
+        bpm = None
+        if onset_envelope.any():
+            bpm = tempo_from_tempogram(
+                np.sum(tempogram_sums, axis=0), len(onset_envelope), sample_rate
+            )
+        tempo, beat_frames = track_beats(onset_envelope, sample_rate, bpm)
+        beat_times = librosa.frames_to_time(
+            beat_frames, sr=sample_rate, hop_length=hop_length
+        )
+        record_stage("beat_track", time.perf_counter() - start)
+
+    segment_points = segment_split_points(plan, segment_length(sample_rate, tempo))
+    return tempo, beat_times, segment_points, timings
+
+
+def chunk_segment_frequencies(plan, start, stop, tempo, allocation=None):
+    """
+    Compute the frequency of the two-beat segments of a chunk, inside a worker.
+
+    Args:
+        plan (ChunkPlan): The recording and its chunks.
+        start (int): First sample of the chunk, on a segment boundary.
+        stop (int): Past-the-end sample of the chunk.
+        tempo (float64): Estimated tempo of the recording in beats per minute (BPM)
+        allocation (ThreadAllocation): Thread budget of the task.
+
+    Returns:
+        tuple: Weighted median frequency of each segment, and the seconds
+               spent in each stage.
+    """
+    from app.utils.segment_analysis import segment_median_frequencies
+
+    with limit_threads(allocation), recording_stages() as timings:
+        start_time = time.perf_counter()
+        frequency_list = segment_median_frequencies(
+            plan.samples(start, stop), plan.sample_rate, tempo
+        )
+        record_stage("segment_stft", time.perf_counter() - start_time)
+    return frequency_list, timings
+
+
+def write_chunked_midi(
+    plan, peaks, peak_frames, tempo, beat_times, frequency_lists, allocation=None
+):
+    """
+    Join the segments of the chunks into one MIDI and MusicXML file, inside a worker.
+
+    Args:
+        plan (ChunkPlan): The recording and its chunks.
+        peaks (tuple): Highest pitch of each chunk.
+        peak_frames (tuple): Frame index in the recording of each highest pitch.
+        tempo (float64): Estimated tempo of the recording in beats per minute (BPM)
+        beat_times (ndarray): Time in seconds of each beat.
+        frequency_lists (list): Segment frequencies of each chunk, in order.
+        allocation (ThreadAllocation): Thread budget of the task.
+
+    Returns:
+        tuple: Content of the MIDI and MusicXML files, and the seconds spent
+               in each stage.
+    """
+    from app.utils.analysis_context import key_map
+    from app.utils.conversion import (
+        append_midi_notes,
+        beat_note_times,
+        create_midi_track,
+        midi_to_bytes,
+    )
+    from app.utils.midi_to_musicxml import midi_to_musicxml
+    from app.utils.segment_analysis import segment_length
+
+    with limit_threads(allocation), recording_stages() as timings:
+        # The key of the highest pitch, which np.argmax finds first
+        key_signature = key_map[int(peak_frames[int(np.argmax(peaks))]) % 12]
+        frequency_list = np.concatenate(frequency_lists)
+
+        # Silence cut out before each segment, to keep the notes in place
+        rests = None
+        if plan.regions is not None:
+            rests = segment_rests(
+                plan.regions,
+                segment_length(plan.sample_rate, tempo),
+                len(frequency_list),
+                plan.sample_rate,
+            )
+
+        midi, track = create_midi_track(key_signature, tempo)
+        note_times = iter(beat_note_times(beat_times, tempo))
+        append_midi_notes(
+            midi, track, frequency_list, note_times, tempo, plan.sample_rate, rests
+        )
+        midi_data = midi_to_bytes(midi)
+
+        start = time.perf_counter()
+        xml_data = midi_to_musicxml(midi_data)
+        record_stage("musicxml", time.perf_counter() - start)
+    return midi_data, xml_data, timings
+
+
+def merge_timings(total, timings):
+    """
+    Helper function to add the stage timings of a task to a running total.
+
+    Args:
+        total (dict): Seconds spent in each stage so far.
+        timings (dict): Seconds spent in each stage by the task.
+    """
+    for stage, seconds in timings.items():
+        total[stage] = total.get(stage, 0.0) + seconds
+
+
+def submit_task(executor, governor, allocation, task, *args):
+    """
+    Helper function to run a task in the pool within a thread budget.
+
+    With a governor, the task gets a budget of its own, which is released
+    as soon as the task finishes.
+
+    Args:
+        executor (Executor): Process pool the task is submitted to.
+        governor (ThreadGovernor): Hands out the thread budget, or None.
+        allocation (ThreadAllocation): Thread budget of the task when there
+                                       is no governor.
+        task (callable): Function to run, which takes the budget last.
+        *args: Other arguments of the function.
+
+    Returns:
+        Future: The result of the task.
+    """
+    if governor is None:
+        return executor.submit(task, *args, allocation)
+
+    allocation = governor.acquire()
+    try:
+        future = executor.submit(task, *args, allocation)
+    except BaseException:
+        governor.release(allocation)
+        raise
+    future.add_done_callback(lambda _: governor.release(allocation))
+    return future
+
+
+def convert_chunked(audio_file, executor, workers, profile=None, governor=None):
+    """
+    Convert a long recording to MIDI with its chunks spread over a process pool.
+
+    Args:
+        audio_file (str): The path to the audio file.
+        executor (Executor): Process pool the tasks are submitted to.
+        workers (int): Number of processes in the pool.
+        profile (str or ConversionProfile): Conversion profile, or its name.
+                                            Defaults to the default profile.
+        governor (ThreadGovernor): Hands out the thread budget of each task.
+                                   Without one, each task gets an equal
+                                   share of the cores.
+
+    Returns:
+        tuple: Content of the generated MIDI and MusicXML files, and the
+               seconds spent in each conversion stage, summed over the tasks.
+    """
+    from app.utils.conversion_profiles import get_profile
+
+    profile = get_profile(profile)
+    if profile is None:
+        raise RuntimeError("Conversion failed for " + os.path.basename(audio_file))
+
+    # Without a governor, each task of a phase gets an equal share of the cores
+    workers = max(1, workers)
+    allocation = ThreadAllocation(0, max(1, len(available_cpus()) // workers))
+    submit = functools.partial(submit_task, executor, governor, allocation)
+
+    timings = {}
+    plan, prepare_timings = submit(prepare_chunks, audio_file, profile, workers).result()
+    merge_timings(timings, prepare_timings)
+    if plan is None or plan.sample_count == 0:
+        if plan is not None:
+            os.remove(plan.path)
+        raise RuntimeError("Conversion failed for " + os.path.basename(audio_file))
+
+    try:
+        # Map: onset envelope, tempogram and pitch of each chunk
+        analyses = [
+            future.result()
+            for future in [
+                submit(analyze_chunk, plan, start, stop, profile)
+                for start, stop in plan.chunks()
+            ]
+        ]
+        onset_envelopes, tempogram_sums, peaks, peak_frames, chunk_timings = zip(
+            *analyses
+        )
+        for task_timings in chunk_timings:
+            merge_timings(timings, task_timings)
+
+        # Reduce: global tempo and beats
+        tempo, beat_times, segment_points, beat_timings = submit(
+            track_chunked_beats, plan, onset_envelopes, tempogram_sums
+        ).result()
+        merge_timings(timings, beat_timings)
+
+        # Map: segment frequencies, with chunks on segment boundaries
+        segment_results = [
+            future.result()
+            for future in [
+                submit(chunk_segment_frequencies, plan, start, stop, tempo)
+                for start, stop in zip(segment_points[:-1], segment_points[1:])
+            ]
+        ]
+        for _, task_timings in segment_results:
+            merge_timings(timings, task_timings)
+
+        # Reduce: key signature and the notes of every segment in order
+        midi_data, xml_data, write_timings = submit(
+            write_chunked_midi,
+            plan,
+            peaks,
+            peak_frames,
+            tempo,
+            beat_times,
+            [frequency_list for frequency_list, _ in segment_results],
+        ).result()
+        merge_timings(timings, write_timings)
+    finally:
+        os.remove(plan.path)
+
+    return midi_data, xml_data, timings
@@ -7,11 +7,17 @@
 # This file contains functions for audio processing tasks, including conversion
 # of audio files to MIDI format. It includes helper functions for audio file
 # conversion to WAV file, frequency segmentation, and MIDI file generation.
+# Audio is decoded into memory with ffmpeg, either whole or in fixed-size
+# blocks for the streaming mode used on long recordings. In-memory
+# conversions with a gated profile analyse only the active regions of the
+# audio and put the silence back as rests before the notes; streaming
+# conversions reject gated profiles.
 #
 # Usage (Optional):
 # User can use the provided functions to convert audio files to MIDI format.
-# Ensure that the required dependencies, such as pydub, librosa, numpy, scipy,
-# and mido, are installed in user's Python environment.
+# Ensure that the required dependencies, such as librosa, numpy, scipy, and
+# mido, are installed in user's Python environment. pydub is only needed by
+# the legacy audio_to_wav.
 #
 # Notes:
 # - This file supports audio files in the format of MP3, M4A, WAV and WEBM.
@@ -25,60 +31,88 @@
 import io
 import os
 import subprocess
-import pydub
-import librosa
+import time
 import numpy as np
-import scipy.signal as signal
 import math
 import mido
+from app.utils.analysis_context import AnalysisContext, StreamingAnalysis
+from app.utils.conversion_profiles import get_profile, resampler_options
+from app.utils.metrics import record_feature_stages, record_stage
+from app.utils.segment_analysis import segment_length, stream_segment_median_frequencies
+from app.utils.voicing_gate import gate_audio, segment_rests
+from app.utils.wav_mapping import frames_to_mono, map_wav, wav_samples
 
 # Path to where midi file is being stored
 midi_folder = "midi_output"
 
+# List of accepted audio file type
+available_extension = ["m4a", "mp3", "wav", "webm"]
 
-def convert_webm_to_mp3(webm_file, mp3_file):
+# Sample rate (Hz) used for audio analysis, matching librosa's default
+analysis_sample_rate = 22050
+
+# Number of bytes read from the ffmpeg pipe at a time
+pipe_block_size = 1 << 16
+
+# Number of samples decoded per block in streaming mode (about 6 s)
+stream_block_size = 1 << 17
+
+
+def convert_webm_to_wav(webm_file, wav_file):
     """
-    Helper function to convert WEBM file into MP3 file.
+    Helper function to decode WEBM file straight into WAV file.
+
+    The Opus audio in browser recordings is decoded to PCM in a single step,
+    without an intermediate lossy MP3 encode.
 
     Args:
         webm_file (string): The path to obtain WEBM file.
+        wav_file (string): The path to store WAV file.
+
+    Returns:
+        bool: True if ffmpeg wrote the WAV file, False if it failed.
     """
 
-    # Command to convert the WEBM file to MP3
+    # Command to decode the first audio stream of the WEBM file to WAV
     command = [
         "ffmpeg",
+        "-nostdin",
+        "-loglevel",
+        "error",
         "-i",
         webm_file,
-        "-vn",
-        "-ab",
-        "192k",
-        "-ar",
-        "44100",
+        "-map",
+        "0:a:0",
+        "-acodec",
+        "pcm_s16le",
         "-y",
-        mp3_file,
+        wav_file,
     ]
 
     # Run the command through the subprocess module
     try:
-        result = subprocess.run(command, check=True)
-    except subprocess.CalledProcessError as e:
+        subprocess.run(command, check=True)
+    except (OSError, subprocess.CalledProcessError) as e:
         print("An error occurred during audio file conversion:", e)
+        return False
+    return True
 
 
 def audio_to_wav(audio_file):
     """
     Helper function to convert audio file into WAV file for MIDI conversion.
 
+    Legacy: conversions decode with decode_audio instead, without writing a
+    WAV copy. Only the decode benchmark still compares against this path.
+
     Args:
         audio_file (string): The path to obtain audio file.
 
     Returns:
         file_name (string): File name to name converted MIDI file.
-        wav_file (string): The path to obtain audio file with wav extension.
+        wav_file (string): The path to obtain audio file with wav extension,
+                           or None if the file cannot be converted.
     """
-    # List of accepted audio file type
-    available_extension = ["m4a", "mp3", "wav", "webm"]
-
     # Get the name and the extension type of the input audio file
     file_name, extension = os.path.splitext(audio_file)
     file_name = file_name.split("/")[-1]
@@ -94,20 +128,211 @@ def audio_to_wav(audio_file):
     # Get current directory
     current_directory = os.getcwd()
 
-    # Convert WEBM file to MP3 file
+    # Convert WEBM file straight to WAV file
+    wav_file_path = os.path.join(current_directory, file_name + ".wav")
     if extension[1:] == "webm":
-        mp3_file_path = os.path.join(current_directory, file_name + ".mp3")
-        convert_webm_to_mp3(audio_file, mp3_file_path)
-        audio_file = mp3_file_path
-        _, extension = os.path.splitext(audio_file)
+        if not convert_webm_to_wav(audio_file, wav_file_path):
+            return None
+        return file_name, wav_file_path
+
+    # Imported here so that only the legacy path loads pydub
+    import pydub
 
     # Convert MP3 and M4A file to WAV file
-    wav_file_path = os.path.join(current_directory, file_name + ".wav")
-    wav_file = pydub.AudioSegment.from_file(audio_file, extension[1:]).export(
+    pydub.AudioSegment.from_file(audio_file, extension[1:]).export(
         wav_file_path, format="wav"
-    )
+    ).close()
 
-    return file_name, wav_file
+    return file_name, wav_file_path
+
+
+def audio_file_name(audio_file):
+    """
+    Helper function to validate the extension of audio file and get its name.
+
+    Args:
+        audio_file (string): The path to obtain audio file.
+
+    Returns:
+        file_name (string): File name to name converted MIDI file, or None if
+                            the extension is not accepted.
+    """
+    # Get the name and the extension type of the input audio file
+    file_name, extension = os.path.splitext(audio_file)
+    file_name = file_name.split("/")[-1]
+
+    # Check the extension of the input audio file
+    try:
+        if extension[1:].lower() not in available_extension:
+            raise ValueError("Extension not available")
+    except ValueError as e:
+        print("An error occurred during audio decoding:", e)
+        return None
+
+    return file_name
+
+
+def decode_command(audio_file, sample_rate, resampler="default"):
+    """
+    Helper function to build the ffmpeg command that decodes audio file.
+
+    The first audio stream is decoded into mono 32-bit float PCM on stdout,
+    skipping any video track or cover art.
+
+    Args:
+        audio_file (string): The path to obtain audio file.
+        sample_rate (int): Target sample rate (Hz) of the decoded audio.
+        resampler (string): Resampler quality, a key of resampler_options.
+
+    Returns:
+        list: The ffmpeg command.
+    """
+    # Select the resampler used to reach the target sample rate
+    resample_filter = []
+    if resampler_options[resampler]:
+        resample_filter = [
+            "-af",
+            f"aresample={sample_rate}:{resampler_options[resampler]}",
+        ]
+
+    return [
+        "ffmpeg",
+        "-nostdin",
+        "-loglevel",
+        "error",
+        "-i",
+        audio_file,
+        "-map",
+        "0:a:0",
+        *resample_filter,
+        "-f",
+        "f32le",
+        "-acodec",
+        "pcm_f32le",
+        "-ac",
+        "1",
+        "-ar",
+        str(sample_rate),
+        "pipe:1",
+    ]
+
+
+def decode_audio(audio_file, sample_rate=analysis_sample_rate, resampler="default"):
+    """
+    Decode audio file into a mono float32 array without writing to disk.
+
+    ffmpeg decodes, downmixes and resamples the input in a single pass and
+    streams raw PCM over a pipe, which is read straight into a NumPy buffer.
+    WEBM recordings from the browser are decoded from Opus in the same pass,
+    without the MP3 transcode used by audio_to_wav previously. WAV files
+    already at the target sample rate skip ffmpeg and are read through a
+    memory map instead.
+
+    Args:
+        audio_file (string): The path to obtain audio file.
+        sample_rate (int): Target sample rate (Hz) of the decoded audio.
+        resampler (string): Resampler quality, a key of resampler_options.
+
+    Returns:
+        file_name (string): File name to name converted MIDI file.
+        audio_data (ndarray): 1D float32 array that contains audio signal information.
+        sample_rate (int): Number of samples per second (Hz) of audio_data.
+    """
+    file_name = audio_file_name(audio_file)
+    if file_name is None:
+        return None
+
+    # Read WAV files that need no resampling straight from the file
+    mapped = map_wav(audio_file, sample_rate)
+    if mapped is not None:
+        return file_name, wav_samples(mapped), sample_rate
+
+    # Stream the decoded samples from the pipe into a growing buffer
+    try:
+        process = subprocess.Popen(
+            decode_command(audio_file, sample_rate, resampler),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+    except OSError as e:
+        print("An error occurred during audio decoding:", e)
+        return None
+
+    buffer = bytearray()
+    while True:
+        block = process.stdout.read(pipe_block_size)
+        if not block:
+            break
+        buffer += block
+    error_output = process.stderr.read()
+    process.wait()
+
+    if process.returncode != 0:
+        print("An error occurred during audio decoding:", error_output.decode().strip())
+        return None
+
+    # View the buffer as samples without copying it
+    audio_data = np.frombuffer(buffer, dtype=np.float32)
+
+    return file_name, audio_data, sample_rate
+
+
+def stream_audio(
+    audio_file,
+    sample_rate=analysis_sample_rate,
+    block_size=stream_block_size,
+    resampler="default",
+):
+    """
+    Decode audio file into mono float32 blocks of fixed size.
+
+    Only one block is held in memory at a time, however long the recording.
+    WAV files already at the target sample rate are read through a memory
+    map, as in decode_audio.
+
+    Args:
+        audio_file (string): The path to obtain audio file.
+        sample_rate (int): Target sample rate (Hz) of the decoded audio.
+        block_size (int): Number of samples in each block.
+        resampler (string): Resampler quality, a key of resampler_options.
+
+    Yields:
+        ndarray: Blocks of audio data, the last of which may be shorter.
+    """
+    mapped = map_wav(audio_file, sample_rate)
+    if mapped is not None:
+        for start in range(0, len(mapped), block_size):
+            yield frames_to_mono(mapped[start : start + block_size])
+        return
+
+    try:
+        process = subprocess.Popen(
+            decode_command(audio_file, sample_rate, resampler),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+    except OSError as e:
+        print("An error occurred during audio decoding:", e)
+        return
+
+    try:
+        while True:
+            block = process.stdout.read(block_size * 4)
+            if not block:
+                break
+            yield np.frombuffer(block, dtype=np.float32)
+    except GeneratorExit:
+        # Stop ffmpeg when the consumer stops reading early
+        process.kill()
+        raise
+    finally:
+        process.stdout.close()
+        error_output = process.stderr.read()
+        process.stderr.close()
+        process.wait()
+
+    if process.returncode != 0:
+        print("An error occurred during audio decoding:", error_output.decode().strip())
 
 
 def divide_audio_data(audio_data, sample_rate, tempo):
@@ -138,102 +363,18 @@ def divide_audio_data(audio_data, sample_rate, tempo):
         return None
 
 
-def wav_to_midi(audio_file):
+def create_midi_track(key_signature, tempo):
     """
-    Convert audio file to MIDI format.
+    Helper function to create a MIDI file with a single track for the melody.
 
     Args:
-        audio_file (str): The path to the audio file.
+        key_signature (str): Key signature of the melody.
+        tempo (float64): Estimated tempo of the audio signal in beats per minute (BPM)
 
     Returns:
-        str: The path to the generated MIDI file.
-    """
-
-    # Convert audio file into WAV file
-    file_name, wav_file = audio_to_wav(audio_file)
-
-    # Load audio file using librosa
-    audio_data, sample_rate = librosa.load(wav_file)
-
-    # Set min and max frequencies for pitch detection
-    fmin = librosa.note_to_hz("C1")
-    fmax = librosa.note_to_hz("C8")
-
-    # Perform pitch detection to identify dominant pitch
-    pitch = librosa.yin(y=audio_data, sr=sample_rate, fmin=fmin, fmax=fmax)
-
-    # Find the most frequent pitch
-    dominant_pitch = np.argmax(pitch)
-
-    # Determine key signature by mapping MIDI note number
-    key_map = {
-        0: "C",
-        1: "C#",
-        2: "D",
-        3: "D#",
-        4: "E",
-        5: "F",
-        6: "F#",
-        7: "G",
-        8: "G#",
-        9: "A",
-        10: "A#",
-        11: "B",
-    }
-    key_signature = key_map[int(dominant_pitch) % 12]
-
-    # Obtain BPM
-    tempo, beat_frames = librosa.beat.beat_track(y=audio_data, sr=sample_rate)
-
-    # Obtain time
-    beat_times = librosa.frames_to_time(beat_frames, sr=sample_rate)
-
-    # Divide audio into segments with variable length based on BPM
-    trimmed_frequency = list(divide_audio_data(audio_data, sample_rate, tempo))
-
-    # STFT Parameters
-    window_size = 512  # Window size
-    hop_length = 128  # Hop length
-
-    # Analyze frequency for each time frame
-    frequency_list = []
-
-    # Compute STFT for each segment
-    for frequency in trimmed_frequency:
-
-        # Adjust nperseg and noverlap based on the length of the segment
-        nperseg = min(len(frequency), window_size)
-        noverlap = nperseg - hop_length
-        _, _, stft = signal.stft(
-            frequency, fs=sample_rate, nperseg=nperseg, noverlap=noverlap
-        )
-
-        # Sum across time axis to get magnitude spectrum
-        magnitude_spectrum = np.abs(stft).mean(axis=1)
-
-        # Convert to frequency domain
-        frequency_bins = np.fft.fftfreq(len(magnitude_spectrum)) * sample_rate
-
-        # Weighted median frequency
-        median_freq_index = np.argmax(
-            np.cumsum(magnitude_spectrum) >= np.sum(magnitude_spectrum) / 2
-        )
-        median_freq = frequency_bins[median_freq_index]
-
-        frequency_list.append(median_freq)
-
-    # Filter out invalid frequencies
-    filtered_frequency_list = [freq for freq in frequency_list if freq > 0]
-
-    # Set the velocity to determine the volume of output midi file
-    velocity = 127
-
-    # Calculate MIDI notes
-    midi_note = [
-        (int(12 * math.log(freq / 440.0) / math.log(2)) + 69)
-        for freq in filtered_frequency_list
-    ]
-
+        midi (MidiFile): The new MIDI file.
+        track (MidiTrack): The track of the MIDI file to append notes to.
+    """
     # Create a new MIDI file and track
     midi = mido.MidiFile()
     track = mido.MidiTrack()
@@ -248,6 +389,20 @@ def wav_to_midi(audio_file):
     tempo_message = mido.MetaMessage("set_tempo", tempo=tempo_microseconds)
     track.append(tempo_message)
 
+    return midi, track
+
+
+def beat_note_times(beat_times, tempo):
+    """
+    Helper function to calculate the MIDI time of each note from the beats.
+
+    Args:
+        beat_times (ndarray): Time in seconds of each beat.
+        tempo (float64): Estimated tempo of the audio signal in beats per minute (BPM)
+
+    Returns:
+        list: MIDI time of each note, in the order the notes are written.
+    """
     # Calculate MIDI time based on tempo
     midi_time = [
         (beat_times[i] - beat_times[i - 1]) * 60 / tempo
@@ -255,19 +410,61 @@ def wav_to_midi(audio_file):
     ]
 
     # Reverse the time list
-    midi_new_time = list(reversed(midi_time))
+    return list(reversed(midi_time))
+
+
+def append_midi_notes(
+    midi, track, frequency_list, note_times, tempo, sample_rate, rests=None
+):
+    """
+    Helper function to append one note per valid frequency to the MIDI track.
+
+    Args:
+        midi (MidiFile): The MIDI file that holds the track.
+        track (MidiTrack): The track to append notes to.
+        frequency_list (ndarray): Weighted median frequency of each segment.
+        note_times (iterator): MIDI time of each note, consumed one per note.
+        tempo (float64): Estimated tempo of the audio signal in beats per minute (BPM)
+        sample_rate (int): Number of samples per second (Hz) of the audio data.
+        rests (ndarray): Seconds of silence cut out by the voicing gate before
+                         each segment, or None if nothing was cut out.
+    """
+    if rests is None:
+        rests = np.zeros(len(frequency_list))
+
+    # Filter out invalid frequencies, moving the rest before a dropped
+    # segment on to the next note
+    filtered_frequency_list = []
+    note_rests = []
+    pending_rest = 0.0
+    for freq, rest in zip(frequency_list, rests):
+        pending_rest += rest
+        if freq > 0:
+            filtered_frequency_list.append(freq)
+            note_rests.append(pending_rest)
+            pending_rest = 0.0
+
+    # Set the velocity to determine the volume of output midi file
+    velocity = 127
+
+    # Calculate MIDI notes
+    midi_note = [
+        (int(12 * math.log(freq / 440.0) / math.log(2)) + 69)
+        for freq in filtered_frequency_list
+    ]
 
     # Create MIDI messages
-    for note, time in zip(midi_note, midi_new_time):
+    for note, rest, note_time in zip(midi_note, note_rests, note_times):
 
         # Convert time from seconds to ticks
         ticks_per_beat = midi.ticks_per_beat
-        time_ticks = int(round(time * sample_rate / (60 * tempo / ticks_per_beat)))
+        time_ticks = int(round(note_time * sample_rate / (60 * tempo / ticks_per_beat)))
+        rest_ticks = int(round(rest * tempo / 60 * ticks_per_beat))
 
         # Write MIDI message and append to the MIDI track
         if note > 0:
             message_on = mido.Message(
-                "note_on", note=note, velocity=velocity, time=time_ticks
+                "note_on", note=note, velocity=velocity, time=time_ticks + rest_ticks
             )
             message_off = mido.Message(
                 "note_off", note=note, velocity=velocity, time=time_ticks
@@ -275,8 +472,290 @@ def wav_to_midi(audio_file):
             track.append(message_on)
             track.append(message_off)
 
-    # Save MIDI file
+
+def save_midi(midi, file_name):
+    """
+    Helper function to save MIDI file into the MIDI output folder.
+
+    Args:
+        midi (MidiFile): The MIDI file to save.
+        file_name (str): File name to name converted MIDI file.
+
+    Returns:
+        str: The path to the saved MIDI file.
+    """
+    start = time.perf_counter()
     midi_file_name = os.path.join(midi_folder, file_name + ".mid")
     midi.save(midi_file_name)
+    record_stage("midi_write", time.perf_counter() - start)
 
     return midi_file_name
+
+
+def midi_to_bytes(midi):
+    """
+    Helper function to serialize MIDI file in memory.
+
+    Args:
+        midi (MidiFile): The MIDI file to serialize.
+
+    Returns:
+        bytes: Content of the MIDI file.
+    """
+    start = time.perf_counter()
+    buffer = io.BytesIO()
+    midi.save(file=buffer)
+    record_stage("midi_write", time.perf_counter() - start)
+
+    return buffer.getvalue()
+
+
+def analyze_midi(audio_file, streaming=False, profile=None):
+    """
+    Convert audio file to a MIDI file held in memory.
+
+    Args:
+        audio_file (str): The path to the audio file.
+        streaming (bool): Whether to convert the audio in fixed-size blocks
+                          with analyze_midi_streaming, which keeps memory flat
+                          for long recordings.
+        profile (str or ConversionProfile): Conversion profile, or its name.
+                                            Defaults to the default profile.
+
+    Returns:
+        tuple: File name to name the converted MIDI file and the MidiFile,
+               or None if the audio file cannot be decoded or the profile
+               does not exist.
+    """
+    if streaming:
+        return analyze_midi_streaming(audio_file, profile=profile)
+
+    profile = get_profile(profile)
+    if profile is None:
+        return None
+
+    # Decode audio file into memory
+    start = time.perf_counter()
+    decoded_audio = decode_audio(audio_file, profile.sample_rate, profile.resampler)
+    if decoded_audio is None:
+        return None
+    file_name, audio_data, sample_rate = decoded_audio
+    record_stage("decode", time.perf_counter() - start)
+
+    # Analyse only the active regions of the recording
+    regions = None
+    if profile.voicing_gate:
+        start = time.perf_counter()
+        audio_data, regions = gate_audio(audio_data, sample_rate)
+        record_stage("voicing_gate", time.perf_counter() - start)
+
+    # Share spectral features between the analysis stages
+    context = AnalysisContext(
+        audio_data,
+        sample_rate,
+        profile.yin_frame_length,
+        profile.yin_hop_length,
+        profile.pitch_search,
+    )
+
+    # Pitch and key run alongside beats and segments, on separate threads
+    context.compute_all()
+
+    # Perform pitch detection to determine key signature
+    key_signature = context.key_signature
+
+    # Obtain BPM
+    tempo, _ = context.beats
+
+    # Obtain time
+    beat_times = context.beat_times
+
+    # Weighted median frequency of each two-beat segment
+    frequency_list = context.segment_frequencies
+    record_feature_stages(context.timings)
+
+    # Silence cut out before each segment, to keep the notes in place
+    rests = None
+    if regions is not None:
+        rests = segment_rests(
+            regions,
+            segment_length(sample_rate, tempo),
+            len(frequency_list),
+            sample_rate,
+        )
+
+    # Create MIDI file with one note per segment
+    midi, track = create_midi_track(key_signature, tempo)
+    note_times = iter(beat_note_times(beat_times, tempo))
+    append_midi_notes(
+        midi, track, frequency_list, note_times, tempo, sample_rate, rests
+    )
+
+    return file_name, midi
+
+
+def tap_blocks(blocks, consumer):
+    """
+    Helper function to pass every block of a stream to a consumer on the way.
+
+    Args:
+        blocks (iterable): Consecutive 1D arrays of audio data.
+        consumer (callable): Called with each block before it is yielded.
+
+    Yields:
+        ndarray: The blocks, unchanged.
+    """
+    for block in blocks:
+        consumer(block)
+        yield block
+
+
+def analyze_midi_streaming(audio_file, block_size=stream_block_size, profile=None):
+    """
+    Convert audio file to a MIDI file held in memory, in fixed-size blocks.
+
+    The audio is decoded twice instead of being held in memory. The first
+    pass accumulates the onset envelope and the coarse pitch track to
+    estimate tempo, beats and pitch range. The second pass tracks the pitch
+    over that range for the key signature and analyses the two-beat segments
+    as their samples arrive. Only one frequency per segment is kept until the
+    key signature is known, so peak memory does not grow with recording
+    length.
+
+    Args:
+        audio_file (str): The path to the audio file.
+        block_size (int): Number of samples decoded per block.
+        profile (str or ConversionProfile): Conversion profile, or its name.
+                                            Defaults to the default profile.
+
+    Returns:
+        tuple: File name to name the converted MIDI file and the MidiFile,
+               or None if the audio file cannot be decoded or the profile
+               does not exist. Profiles with a voicing gate, which needs the
+               whole recording to find its silences, raise a ValueError.
+    """
+    file_name = audio_file_name(audio_file)
+    profile = get_profile(profile)
+    if file_name is None or profile is None:
+        return None
+    if profile.voicing_gate:
+        raise ValueError(
+            f"The {profile.name} profile has a voicing gate, which streaming "
+            "conversions do not support"
+        )
+    sample_rate = profile.sample_rate
+
+    # First pass: tempo, beats and pitch range
+    analysis = StreamingAnalysis(
+        sample_rate,
+        profile.yin_frame_length,
+        profile.yin_hop_length,
+        profile.pitch_search,
+    )
+    for block in stream_audio(audio_file, sample_rate, block_size, profile.resampler):
+        analysis.feed(block)
+    if analysis.sample_count == 0:
+        return None
+
+    # Second pass: key signature and the frequency of each segment
+    blocks = stream_audio(audio_file, sample_rate, block_size, profile.resampler)
+    return file_name, finish_streaming_midi(analysis, blocks)
+
+
+def finish_streaming_midi(analysis, blocks):
+    """
+    Finish a streaming analysis and create the MIDI file from a second pass.
+
+    Args:
+        analysis (StreamingAnalysis): Analysis fed with every block of the
+                                      recording by its first pass.
+        blocks (iterable): The same blocks again, for the second pass.
+
+    Returns:
+        MidiFile: The new MIDI file.
+    """
+    analysis.finish()
+
+    # Second pass: key signature and the frequency of each segment
+    tempo = analysis.tempo
+    sample_rate = analysis.sample_rate
+    frequency_lists = list(
+        stream_segment_median_frequencies(
+            tap_blocks(blocks, analysis.feed_pitch), sample_rate, tempo
+        )
+    )
+    analysis.finish_pitch()
+    record_feature_stages(analysis.timings)
+
+    # Create MIDI file with one note per segment
+    midi, track = create_midi_track(analysis.key_signature, tempo)
+    note_times = iter(beat_note_times(analysis.beat_times, tempo))
+    for frequency_list in frequency_lists:
+        append_midi_notes(midi, track, frequency_list, note_times, tempo, sample_rate)
+
+    return midi
+
+
+def wav_to_midi(audio_file, streaming=False, profile=None):
+    """
+    Convert audio file to MIDI format and save it into the MIDI output folder.
+
+    Args:
+        audio_file (str): The path to the audio file.
+        streaming (bool): Whether to convert the audio in fixed-size blocks
+                          with wav_to_midi_streaming, which keeps memory flat
+                          for long recordings.
+        profile (str or ConversionProfile): Conversion profile, or its name.
+                                            Defaults to the default profile.
+
+    Returns:
+        str: The path to the generated MIDI file, or None if the audio file
+             cannot be decoded or the profile does not exist.
+    """
+    converted = analyze_midi(audio_file, streaming, profile)
+    if converted is None:
+        return None
+    file_name, midi = converted
+    return save_midi(midi, file_name)
+
+
+def wav_to_midi_streaming(audio_file, block_size=stream_block_size, profile=None):
+    """
+    Convert audio file to MIDI format in fixed-size blocks and save it into
+    the MIDI output folder.
+
+    Args:
+        audio_file (str): The path to the audio file.
+        block_size (int): Number of samples decoded per block.
+        profile (str or ConversionProfile): Conversion profile, or its name.
+                                            Defaults to the default profile.
+
+    Returns:
+        str: The path to the generated MIDI file, or None if the audio file
+             cannot be decoded or the profile does not exist.
+    """
+    converted = analyze_midi_streaming(audio_file, block_size, profile)
+    if converted is None:
+        return None
+    file_name, midi = converted
+    return save_midi(midi, file_name)
+
+
+def wav_to_midi_bytes(audio_file, streaming=False, profile=None):
+    """
+    Convert audio file to the content of a MIDI file, without touching disk.
+
+    Args:
+        audio_file (str): The path to the audio file.
+        streaming (bool): Whether to convert the audio in fixed-size blocks.
+        profile (str or ConversionProfile): Conversion profile, or its name.
+                                            Defaults to the default profile.
+
+    Returns:
+        bytes: Content of the generated MIDI file, or None if the audio file
+               cannot be decoded or the profile does not exist.
+    """
+    converted = analyze_midi(audio_file, streaming, profile)
+    if converted is None:
+        return None
+    return midi_to_bytes(converted[1])
@@ -0,0 +1,271 @@
+################################################################################
+# Filename: conversion_cache.py
+# Purpose:  Cache converted MIDI and MusicXML files by the audio they came from.
+# Author:   Livia Chandra
+#
+# Description:
+# This file contains the ConversionCache class, a content-addressed store of
+# conversion results. Entries are keyed by a SHA-256 hash of the uploaded
+# file together with the parameters of the conversion pipeline, so the same
+# file uploaded again maps to the same entry, and changing a pipeline
+# parameter never serves a stale result.
+#
+# Usage (Optional):
+#   key = cache_key(audio_file_path)
+#   cached = conversion_cache.get(key)
+#   if cached is None:
+#       conversion_cache.put(key, midi_data, xml_data)
+#
+# Notes:
+# - Entries are stored on disk in CONVERSION_CACHE_DIR. Their total size is
+#   bounded by CONVERSION_CACHE_BYTES; the least recently used entries are
+#   evicted first, using the file modification time as the access time.
+# - The key is computed from the file as uploaded, so that looking it up
+#   costs a read of the file rather than a decode. The same take in another
+#   container or bit rate is converted again.
+# - Hit, miss, store and eviction counts are kept per process.
+#
+###############################################################################
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from app.utils.conversion_profiles import (
+    fmax,
+    fmin,
+    get_profile,
+    hop_length,
+    n_fft,
+    segment_hop_length,
+    segment_window_size,
+)
+
+# Default cache directory and size bound
+default_cache_dir = "conversion_cache"
+default_cache_bytes = 256 * 1024 * 1024
+
+# Size of the blocks the uploaded file is hashed in
+hash_block_size = 1024 * 1024
+
+# File extensions of the cached artifacts
+midi_extension = ".mid"
+xml_extension = ".musicxml"
+
+
+def pipeline_parameters(profile=None):
+    """
+    Collect the parameters that determine the output of a conversion.
+
+    Args:
+        profile (str or ConversionProfile): Conversion profile, or its name.
+                                            Defaults to the default profile.
+
+    Returns:
+        dict: Parameter names and values.
+    """
+    return {
+        **get_profile(profile).parameters(),
+        "n_fft": n_fft,
+        "hop_length": hop_length,
+        "fmin": fmin,
+        "fmax": fmax,
+        "segment_window_size": segment_window_size,
+        "segment_hop_length": segment_hop_length,
+    }
+
+
+def cache_key(audio_file_path, parameters=None):
+    """
+    Hash an uploaded file and pipeline parameters into a cache key.
+
+    Args:
+        audio_file_path (str): Path to the uploaded audio file.
+        parameters (dict): Pipeline parameters, defaults to pipeline_parameters().
+
+    Returns:
+        str: Hexadecimal SHA-256 digest.
+    """
+    if parameters is None:
+        parameters = pipeline_parameters()
+
+    digest = hashlib.sha256()
+    digest.update(json.dumps(parameters, sort_keys=True).encode())
+    with open(audio_file_path, "rb") as audio_file:
+        for block in iter(lambda: audio_file.read(hash_block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ConversionCache:
+    """
+    Size-bounded LRU store of conversion results on disk.
+
+    Attributes:
+        directory (str): Directory the cached files are written to.
+        max_bytes (int): Maximum total size of the cached files.
+        hits (int): Number of lookups that found an entry.
+        misses (int): Number of lookups that found no entry.
+        stores (int): Number of entries written.
+        evictions (int): Number of entries removed to respect max_bytes.
+    """
+
+    def __init__(self, directory=default_cache_dir, max_bytes=default_cache_bytes):
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.configure(directory, max_bytes)
+
+    def init_app(self, app):
+        """
+        Read the cache settings from the application configuration.
+
+        Args:
+            app (Flask): The application to configure the cache for.
+        """
+        self.configure(
+            app.config.get(
+                "CONVERSION_CACHE_DIR",
+                os.environ.get("CONVERSION_CACHE_DIR", default_cache_dir),
+            ),
+            int(
+                app.config.get(
+                    "CONVERSION_CACHE_BYTES",
+                    os.environ.get("CONVERSION_CACHE_BYTES", default_cache_bytes),
+                )
+            ),
+        )
+        app.extensions["conversion_cache"] = self
+
+    def configure(self, directory, max_bytes):
+        """
+        Point the cache at a directory and index the entries already in it.
+
+        Args:
+            directory (str): Directory the cached files are written to.
+            max_bytes (int): Maximum total size of the cached files.
+        """
+        with self.lock:
+            self.directory = directory
+            self.max_bytes = max_bytes
+            self.entries = OrderedDict()
+
+            # Rebuild the LRU order from the modification times on disk
+            if os.path.isdir(directory):
+                sizes = {}
+                for file_name in os.listdir(directory):
+                    key, extension = os.path.splitext(file_name)
+                    if extension not in (midi_extension, xml_extension):
+                        continue
+                    path = os.path.join(directory, file_name)
+                    stat = os.stat(path)
+                    size, last_used = sizes.get(key, (0, 0))
+                    sizes[key] = (size + stat.st_size, max(last_used, stat.st_mtime))
+                for key, (size, _) in sorted(sizes.items(), key=lambda e: e[1][1]):
+                    self.entries[key] = size
+            self.total_bytes = sum(self.entries.values())
+
+    def paths(self, key):
+        """
+        Helper function to build the file paths of an entry.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            tuple: Paths of the MIDI and MusicXML files.
+        """
+        base = os.path.join(self.directory, key)
+        return base + midi_extension, base + xml_extension
+
+    def get(self, key):
+        """
+        Look up the conversion result for a key.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            tuple: MIDI and MusicXML bytes, or None on a miss.
+        """
+        midi_path, xml_path = self.paths(key)
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return None
+            try:
+                with open(midi_path, "rb") as midi_file:
+                    midi_data = midi_file.read()
+                with open(xml_path, "rb") as xml_file:
+                    xml_data = xml_file.read()
+            except OSError:
+                # The entry was removed from disk behind the cache's back
+                self.total_bytes -= self.entries.pop(key)
+                self.misses += 1
+                return None
+
+            # Mark the entry as most recently used, in memory and on disk
+            self.entries.move_to_end(key)
+            os.utime(midi_path)
+            os.utime(xml_path)
+            self.hits += 1
+        return midi_data, xml_data
+
+    def put(self, key, midi_data, xml_data):
+        """
+        Store a conversion result and evict old entries beyond the size bound.
+
+        Args:
+            key (str): The cache key.
+            midi_data (bytes): Content of the MIDI file.
+            xml_data (bytes): Content of the MusicXML file.
+        """
+        size = len(midi_data) + len(xml_data)
+        if size > self.max_bytes:
+            return
+
+        with self.lock:
+            os.makedirs(self.directory, exist_ok=True)
+            for path, data in zip(self.paths(key), (midi_data, xml_data)):
+                # Write beside the target and rename so readers never see
+                # a partial file
+                partial_path = path + ".partial"
+                with open(partial_path, "wb") as cache_file:
+                    cache_file.write(data)
+                os.replace(partial_path, path)
+
+            self.total_bytes += size - self.entries.pop(key, 0)
+            self.entries[key] = size
+            self.stores += 1
+
+            while self.total_bytes > self.max_bytes:
+                old_key, old_size = self.entries.popitem(last=False)
+                for path in self.paths(old_key):
+                    if os.path.exists(path):
+                        os.remove(path)
+                self.total_bytes -= old_size
+                self.evictions += 1
+
+    def stats(self):
+        """
+        Report the cache counters and size.
+
+        Returns:
+            dict: Counter names and values.
+        """
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "stores": self.stores,
+                "evictions": self.evictions,
+                "entries": len(self.entries),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+conversion_cache = ConversionCache()
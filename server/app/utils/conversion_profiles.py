@@ -0,0 +1,158 @@
+################################################################################
+# Filename: conversion_profiles.py
+# Purpose:  Define the speed and accuracy settings of the conversion pipeline.
+# Author:   Livia Chandra
+#
+# Description:
+# This file contains the ConversionProfile class and the named profiles that
+# wav_to_midi can run with. A profile sets the sample rate the audio is
+# analysed at, the quality of the resampler ffmpeg uses to reach that rate,
+# the frame and hop length of the YIN pitch tracker, whether YIN searches
+# the whole C1 to C8 range or only the register a coarse pass finds, and
+# whether the voicing gate cuts silence out before the analysis.
+# Monophonic hums and whistles carry little energy above a few kHz, so the
+# faster profiles analyse them at a lower rate with a cheaper resampler.
+#
+# Usage (Optional):
+#   profile = get_profile("fast")
+#   wav_to_midi(audio_file, profile=profile)
+#
+# Notes:
+# - The accurate profile searches the full C1 to C8 range, so that bass and
+#   piccolo lines in the same recording are both tracked.
+# - Only the phone profile runs the voicing gate. It changes where the
+#   analysis frames and beats fall, and so the notes written, so recordings
+#   are gated only when that profile is asked for. Streaming conversions
+#   reject it, since they cannot find the silences of a recording before
+#   reading all of it.
+# - Run benchmarks.profile_benchmark to measure the speed and pitch accuracy
+#   of each profile.
+# - The analysis parameters every profile shares are defined here too, with
+#   no imports, so that the server can key the conversion cache on them
+#   without loading librosa and scipy.
+#
+###############################################################################
+
+# Pitch search modes
+full_search = "full"
+adaptive_search = "adaptive"
+
+# Spectrogram parameters of the onset, beat and key analysis, matching
+# librosa's onset and beat defaults
+n_fft = 2048
+hop_length = 512
+
+# Min and max frequencies for pitch detection, C1 and C8 (MIDI notes 24 and
+# 108), written out so that the profiles load without librosa
+fmin = 440.0 * 2.0 ** ((24 - 69) / 12)
+fmax = 440.0 * 2.0 ** ((108 - 69) / 12)
+
+# STFT parameters of the segment frequency analysis
+segment_window_size = 512
+segment_hop_length = 128
+
+# ffmpeg aresample options for each resampler quality. The default quality
+# uses ffmpeg's built-in resampler with its default settings.
+resampler_options = {
+    "high": "resampler=soxr:precision=28",
+    "default": "",
+    "fast": "filter_size=8:phase_shift=6:linear_interp=1",
+}
+
+
+class ConversionProfile:
+    """
+    Settings that trade conversion speed against pitch accuracy.
+
+    Attributes:
+        name (str): Name of the profile.
+        sample_rate (int): Sample rate (Hz) the audio is analysed at.
+        resampler (str): Resampler quality, a key of resampler_options.
+        yin_frame_length (int): Samples per YIN analysis frame.
+        yin_hop_length (int): Samples between consecutive YIN frames.
+        pitch_search (str): "adaptive" to search only the register found by
+                            a coarse pass, or "full" to search C1 to C8.
+        voicing_gate (bool): Whether only the active regions of in-memory
+                             and chunked conversions are analysed. Streaming
+                             conversions reject gated profiles.
+    """
+
+    def __init__(
+        self,
+        name,
+        sample_rate,
+        resampler,
+        yin_frame_length,
+        yin_hop_length,
+        pitch_search=full_search,
+        voicing_gate=False,
+    ):
+        self.name = name
+        self.sample_rate = sample_rate
+        self.resampler = resampler
+        self.yin_frame_length = yin_frame_length
+        self.yin_hop_length = yin_hop_length
+        self.pitch_search = pitch_search
+        self.voicing_gate = voicing_gate
+
+    def parameters(self):
+        """
+        Return the settings that determine the output of a conversion.
+
+        Returns:
+            dict: Setting names and values.
+        """
+        return {
+            "sample_rate": self.sample_rate,
+            "resampler": self.resampler,
+            "yin_frame_length": self.yin_frame_length,
+            "yin_hop_length": self.yin_hop_length,
+            "pitch_search": self.pitch_search,
+            "voicing_gate": self.voicing_gate,
+        }
+
+    def __repr__(self):
+        """
+        Return a string representation of the ConversionProfile object.
+        """
+        return f"<ConversionProfile(name='{self.name}', sample_rate={self.sample_rate}, resampler='{self.resampler}', pitch_search='{self.pitch_search}')>"
+
+
+# Named conversion profiles, from most accurate to fastest, then the default
+# settings with the voicing gate for recordings with long silences
+profiles = {
+    "accurate": ConversionProfile("accurate", 22050, "high", 2048, 512, full_search),
+    "default": ConversionProfile(
+        "default", 22050, "default", 2048, 512, adaptive_search
+    ),
+    "fast": ConversionProfile("fast", 11025, "fast", 1024, 256, adaptive_search),
+    "hum": ConversionProfile("hum", 8000, "fast", 512, 128, adaptive_search),
+    "phone": ConversionProfile(
+        "phone", 22050, "default", 2048, 512, adaptive_search, True
+    ),
+}
+
+default_profile = "default"
+
+
+def get_profile(profile=None):
+    """
+    Look up a conversion profile.
+
+    Args:
+        profile (str or ConversionProfile): Name of the profile, a profile,
+                                            or None for the default profile.
+
+    Returns:
+        ConversionProfile: The profile, or None if there is no profile of
+                           that name.
+    """
+    if profile is None:
+        profile = default_profile
+    if isinstance(profile, ConversionProfile):
+        return profile
+
+    if profile not in profiles:
+        print("An error occurred during profile lookup: unknown profile", profile)
+        return None
+    return profiles[profile]
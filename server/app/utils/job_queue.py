@@ -0,0 +1,590 @@
+################################################################################
+# Filename: job_queue.py
+# Purpose:  Run audio to MIDI conversions in a pool of worker processes.
+# Author:   Benjamin Goh
+#
+# Description:
+# This file contains the JobQueue class, which hands uploaded recordings to a
+# process pool so that the request thread returns as soon as the upload is
+# saved. The conversion itself runs in convert_job inside a worker process and
+# only returns the MIDI and MusicXML bytes; the parent process stores the
+# result, adds it to the conversion cache and keeps the ConversionJob row in
+# the database up to date.
+#
+# Usage (Optional):
+#   job_queue.init_app(app)
+#   job_queue.submit(job)
+#   results = job_queue.convert_batch(audio_file_paths, profile)
+#
+# Notes:
+# - The pool size is read from the CONVERSION_WORKERS setting (or the
+#   environment variable of the same name) and defaults to the CPU count.
+#   A size of 0 runs every conversion inline on the calling thread.
+# - If a worker process dies, the pool is replaced and the interrupted jobs
+#   are retried up to CONVERSION_MAX_ATTEMPTS times. Jobs left queued or
+#   running by a previous server process are resubmitted by recover_jobs,
+#   which init_app calls once the job table exists.
+# - A job stays queued until a worker picks it up. Pool workers announce each
+#   job they start on a queue that a thread of the server process watches,
+#   and the thread marks the job as running.
+# - The queue depth, the number of finished jobs by status and the stage
+#   timings each worker returns are recorded in the metrics registry.
+# - Unless warm-up is disabled, each worker process runs warm_up_pipeline
+#   when it starts, so no conversion pays for compiling the analysis kernels.
+# - Recordings longer than CHUNKED_CONVERSION_SECONDS (600 by default, 0
+#   turns it off) are converted by convert_chunked, which splits them into
+#   chunks analysed by every worker of the pool at once. The length is read
+#   from the WAV header, or by ffprobe for at most probe_timeout seconds; a
+#   recording whose length cannot be read is converted whole.
+# - Each conversion is given a thread budget by the thread governor when it
+#   is submitted and runs its BLAS, OpenMP, numba and analysis threads
+#   within it, so the workers do not oversubscribe the cores.
+#
+###############################################################################
+
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from app.database import db
+from app.models.job_model import ConversionJob, QUEUED, RUNNING, SUCCEEDED, FAILED
+from app.models.midi_model import MIDI
+from app.models.user_model import User
+from app.utils.chunked_conversion import (
+    convert_chunked,
+    default_chunked_seconds,
+    recording_seconds,
+)
+from app.utils.conversion_cache import conversion_cache
+from app.utils.isodate_converter import DateConverter
+from app.utils.metrics import metrics, observe_stages, record_stage, recording_stages
+from app.utils.thread_governor import limit_threads, thread_governor
+from app.utils.warmup import warm_up_pipeline, warmup
+
+# Default number of times a job is started before it is marked as failed
+default_max_attempts = 3
+
+# Seconds an upload waits for ffprobe to read the length of its recording
+probe_timeout = 2
+
+# Queue a pool worker announces the jobs it starts on, set when it starts
+started_jobs = None
+
+
+def start_worker(started, warm_up):
+    """
+    Prepare a worker process of the pool.
+
+    Args:
+        started (SimpleQueue): Queue to announce the jobs the worker starts on.
+        warm_up (bool): Whether to warm up the conversion pipeline.
+    """
+    global started_jobs
+    started_jobs = started
+    if warm_up:
+        warm_up_pipeline()
+
+
+def run_job(job_id, conversion, *args):
+    """
+    Announce that a job has started, then run its conversion in the worker.
+
+    Args:
+        job_id (int): The ID of the job.
+        conversion (callable): The conversion to run, usually convert_job.
+        *args: Arguments of the conversion.
+
+    Returns:
+        The result of the conversion.
+    """
+    if started_jobs is not None:
+        started_jobs.put(job_id)
+    return conversion(*args)
+
+
+def convert_job(audio_file_path, profile=None, allocation=None):
+    """
+    Convert an uploaded recording to MIDI inside a worker process.
+
+    Args:
+        audio_file_path (str): The path to the uploaded audio file.
+        profile (str): Name of the conversion profile.
+        allocation (ThreadAllocation): Thread budget of the conversion, or
+                                       None to use every core.
+
+    Returns:
+        tuple: Content of the generated MIDI and MusicXML files, and the
+               seconds spent in each conversion stage.
+    """
+    # Imported here so that only processes that convert load librosa,
+    # scipy, mido and music21
+    from app.utils.conversion import wav_to_midi_bytes
+    from app.utils.midi_to_musicxml import midi_to_musicxml
+
+    # The stage timings go back to the server process with the result,
+    # since the metrics of worker processes are never scraped
+    with limit_threads(allocation), recording_stages() as timings:
+        midi_data = wav_to_midi_bytes(audio_file_path, profile=profile)
+        if midi_data is None:
+            raise RuntimeError(
+                "Conversion failed for " + os.path.basename(audio_file_path)
+            )
+
+        # Convert midi to music xml
+        start = time.perf_counter()
+        xml_data = midi_to_musicxml(midi_data)
+        record_stage("musicxml", time.perf_counter() - start)
+
+    return midi_data, xml_data, timings
+
+
+def create_midi_entry(name, email, title, midi_data, xml_data=None):
+    """
+    Store a converted MIDI along with the user who uploaded it.
+
+    Args:
+        name (str): Name of the user.
+        email (str): Email address of the user.
+        title (str): Title of the song.
+        midi_data (bytes): Content of the MIDI file.
+        xml_data (bytes): Content of the MusicXML file rendered from it.
+
+    Returns:
+        MIDI: The new MIDI entry.
+    """
+    # Create User
+    new_user = User(name=name, email=email)
+    db.session.add(new_user)
+    db.session.commit()
+
+    # Create MIDI
+    new_midi = MIDI(
+        user_id=new_user.user_id,
+        title=title,
+        midi_data=midi_data,
+        xml_data=xml_data,
+        date=DateConverter.current_time(),
+    )
+    db.session.add(new_midi)
+    db.session.commit()
+    return new_midi
+
+
+def create_midi_entries(name, email, results):
+    """
+    Store several converted MIDIs of one user in a single transaction.
+
+    Args:
+        name (str): Name of the user.
+        email (str): Email address of the user.
+        results (list): Title, MIDI content and MusicXML content of each MIDI.
+
+    Returns:
+        list: The new MIDI entries, in the order of results.
+    """
+    new_user = User(name=name, email=email)
+    db.session.add(new_user)
+    db.session.flush()
+
+    new_midis = [
+        MIDI(
+            user_id=new_user.user_id,
+            title=title,
+            midi_data=midi_data,
+            xml_data=xml_data,
+            date=DateConverter.current_time(),
+        )
+        for title, midi_data, xml_data in results
+    ]
+    db.session.add_all(new_midis)
+    db.session.commit()
+    return new_midis
+
+
+class JobQueue:
+    """
+    Process pool that runs conversion jobs and records their outcome.
+
+    Attributes:
+        app (Flask): The application the job results are stored with.
+        workers (int): Number of worker processes, 0 to convert inline.
+        max_attempts (int): Number of times a job is started before it fails.
+        chunked_seconds (float): Length from which recordings are converted
+                                 in chunks, 0 to never split them.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.workers = 0
+        self.max_attempts = default_max_attempts
+        self.chunked_seconds = default_chunked_seconds
+        self.executor = None
+        self.started_jobs = None
+        self.lock = threading.Lock()
+        self.active_jobs = set()
+        self.finished_jobs = metrics.counter(
+            "conversion_jobs_total", "Conversion jobs finished by status.", ("status",)
+        )
+        metrics.gauge(
+            "conversion_queue_depth",
+            "Conversion jobs queued or running in this process.",
+            self.depth,
+        )
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Read the pool settings from the application configuration.
+
+        Args:
+            app (Flask): The application the job results are stored with.
+        """
+        self.app = app
+        workers = app.config.get(
+            "CONVERSION_WORKERS", os.environ.get("CONVERSION_WORKERS")
+        )
+        if workers is None:
+            workers = os.cpu_count() or 1
+        self.workers = int(workers)
+        self.max_attempts = int(
+            app.config.get("CONVERSION_MAX_ATTEMPTS", default_max_attempts)
+        )
+        self.chunked_seconds = float(
+            app.config.get(
+                "CHUNKED_CONVERSION_SECONDS",
+                os.environ.get("CHUNKED_CONVERSION_SECONDS", default_chunked_seconds),
+            )
+        )
+        thread_governor.init_app(app, self.workers)
+        warmup.init_app(app, self.workers)
+        app.extensions["job_queue"] = self
+
+        # Resume conversions interrupted by the previous server process
+        with app.app_context():
+            if db.inspect(db.engine).has_table(ConversionJob.__tablename__):
+                self.recover_jobs()
+
+    def pool(self):
+        """
+        Return the process pool, starting a new one if there is none.
+
+        Returns:
+            ProcessPoolExecutor: The pool the conversions are submitted to.
+        """
+        with self.lock:
+            if self.started_jobs is None:
+                self.started_jobs = multiprocessing.SimpleQueue()
+                threading.Thread(target=self.watch_started, daemon=True).start()
+            if self.executor is None:
+                # Warm up each worker as it starts, loading the compiled
+                # kernels from the numba cache
+                self.executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    initializer=start_worker,
+                    initargs=(self.started_jobs, warmup.enabled),
+                )
+            return self.executor
+
+    def watch_started(self):
+        """
+        Mark the jobs announced by the pool workers as running until the server exits.
+        """
+        while True:
+            job_id = self.started_jobs.get()
+            try:
+                with self.app.app_context():
+                    self.mark_running(job_id)
+            except Exception as e:
+                print("Could not mark conversion job", job_id, "as running:", e)
+
+    def mark_running(self, job_id):
+        """
+        Record that a queued job has started.
+
+        A job that has already finished keeps its status.
+
+        Args:
+            job_id (int): The ID of the job.
+        """
+        ConversionJob.query.filter_by(job_id=job_id, status=QUEUED).update(
+            {"status": RUNNING}
+        )
+        db.session.commit()
+
+    def replace_pool(self, broken_executor):
+        """
+        Discard a pool whose worker died so that the next submit starts afresh.
+
+        Args:
+            broken_executor (ProcessPoolExecutor): The pool that broke.
+        """
+        with self.lock:
+            if self.executor is broken_executor:
+                self.executor = None
+        broken_executor.shutdown(wait=False)
+
+    def submit(self, job):
+        """
+        Start the conversion of a job.
+
+        Args:
+            job (ConversionJob): The job to run. It must already be committed.
+        """
+        job.status = QUEUED
+        job.attempts += 1
+        db.session.commit()
+        job_id = job.job_id
+        with self.lock:
+            self.active_jobs.add(job_id)
+
+        # Split long recordings over the whole pool, from a coordinator thread
+        if self.is_long(job.audio_path):
+            threading.Thread(
+                target=self.run_chunked,
+                args=(job_id, job.audio_path, job.profile, self.pool()),
+                daemon=True,
+            ).start()
+            return
+
+        allocation = thread_governor.acquire()
+        if self.workers == 0:
+            self.mark_running(job_id)
+            try:
+                try:
+                    result = convert_job(job.audio_path, job.profile, allocation)
+                finally:
+                    thread_governor.release(allocation)
+                self.finish(job_id, result)
+            except Exception as e:
+                self.finish(job_id, error=str(e))
+            return
+
+        executor = self.pool()
+        try:
+            future = executor.submit(
+                run_job, job_id, convert_job, job.audio_path, job.profile, allocation
+            )
+        except BrokenProcessPool:
+            self.replace_pool(executor)
+            executor = self.pool()
+            future = executor.submit(
+                run_job, job_id, convert_job, job.audio_path, job.profile, allocation
+            )
+        future.add_done_callback(
+            lambda done: self.handle_result(job_id, executor, done, allocation)
+        )
+
+    def handle_result(self, job_id, executor, future, allocation=None):
+        """
+        Record the outcome of a job once its worker is done.
+
+        Args:
+            job_id (int): The ID of the job.
+            executor (ProcessPoolExecutor): The pool the job ran in.
+            future (Future): The finished conversion.
+            allocation (ThreadAllocation): Thread budget the job ran with.
+        """
+        if allocation is not None:
+            thread_governor.release(allocation)
+        with self.app.app_context():
+            try:
+                self.finish(job_id, future.result())
+            except BrokenProcessPool:
+                # The worker died, so the job never finished: try it again
+                self.replace_pool(executor)
+                job = db.session.get(ConversionJob, job_id)
+                if job.attempts < self.max_attempts:
+                    self.submit(job)
+                else:
+                    self.finish(job_id, error="Worker process terminated")
+            except Exception as e:
+                self.finish(job_id, error=str(e))
+
+    def is_long(self, audio_file_path):
+        """
+        Check whether a recording should be converted in chunks.
+
+        Args:
+            audio_file_path (str): The path to the uploaded audio file.
+
+        Returns:
+            bool: True if the pool has several workers and the recording is
+                  at least chunked_seconds long, False if its length cannot
+                  be read.
+        """
+        if self.workers < 2 or self.chunked_seconds <= 0:
+            return False
+        seconds = recording_seconds(audio_file_path, timeout=probe_timeout)
+        return seconds is not None and seconds >= self.chunked_seconds
+
+    def run_chunked(self, job_id, audio_file_path, profile, executor):
+        """
+        Convert a long recording in chunks and record the outcome of its job.
+
+        Args:
+            job_id (int): The ID of the job.
+            audio_file_path (str): The path to the uploaded audio file.
+            profile (str): Name of the conversion profile.
+            executor (ProcessPoolExecutor): The pool the chunks run in.
+        """
+        with self.app.app_context():
+            self.mark_running(job_id)
+            try:
+                self.finish(
+                    job_id,
+                    convert_chunked(
+                        audio_file_path, executor, self.workers, profile, thread_governor
+                    ),
+                )
+            except BrokenProcessPool:
+                # A worker died, so the job never finished: try it again
+                self.replace_pool(executor)
+                job = db.session.get(ConversionJob, job_id)
+                if job.attempts < self.max_attempts:
+                    self.submit(job)
+                else:
+                    self.finish(job_id, error="Worker process terminated")
+            except Exception as e:
+                self.finish(job_id, error=str(e))
+
+    def finish(self, job_id, result=None, error=None):
+        """
+        Store the MIDI of a successful job, or the error of a failed one.
+
+        Args:
+            job_id (int): The ID of the job.
+            result (tuple): Content of the generated MIDI and MusicXML files,
+                            and the seconds spent in each conversion stage.
+            error (str): Reason the job failed.
+        """
+        job = db.session.get(ConversionJob, job_id)
+
+        if error is None:
+            midi_data, xml_data, timings = result
+            observe_stages(timings)
+            new_midi = create_midi_entry(
+                job.name, job.email, job.title, midi_data, xml_data
+            )
+            if job.cache_key is not None:
+                conversion_cache.put(job.cache_key, midi_data, xml_data)
+
+            job.midi_id = new_midi.midi_id
+            job.status = SUCCEEDED
+        else:
+            print("An error occurred during conversion job", job_id, ":", error)
+            job.error = error
+            job.status = FAILED
+        db.session.commit()
+        self.finished_jobs.inc(job.status)
+        with self.lock:
+            self.active_jobs.discard(job_id)
+
+        # Remove the uploaded file once the job can no longer be retried
+        if os.path.exists(job.audio_path):
+            os.remove(job.audio_path)
+
+    def convert_batch(self, audio_file_paths, profile=None):
+        """
+        Convert several recordings concurrently and wait for all of them.
+
+        The recordings share the process pool with the queued jobs, and are
+        converted inline when the pool size is 0.
+
+        Args:
+            audio_file_paths (list): The paths to the audio files.
+            profile (str): Name of the conversion profile.
+
+        Returns:
+            list: For each recording, the content of the MIDI and MusicXML
+                  files, or the exception that stopped its conversion.
+        """
+        results = []
+        if self.workers == 0:
+            for audio_file_path in audio_file_paths:
+                allocation = thread_governor.acquire()
+                try:
+                    midi_data, xml_data, timings = convert_job(
+                        audio_file_path, profile, allocation
+                    )
+                    observe_stages(timings)
+                    results.append((midi_data, xml_data))
+                except Exception as e:
+                    results.append(e)
+                finally:
+                    thread_governor.release(allocation)
+            return results
+
+        executor = self.pool()
+        allocations = [thread_governor.acquire() for _ in audio_file_paths]
+        try:
+            futures = [
+                executor.submit(convert_job, audio_file_path, profile, allocation)
+                for audio_file_path, allocation in zip(audio_file_paths, allocations)
+            ]
+        except BrokenProcessPool:
+            self.replace_pool(executor)
+            for allocation in allocations:
+                thread_governor.release(allocation)
+            return self.convert_batch(audio_file_paths, profile)
+        wait(futures)
+        for allocation in allocations:
+            thread_governor.release(allocation)
+
+        broken = False
+        for future in futures:
+            try:
+                midi_data, xml_data, timings = future.result()
+                observe_stages(timings)
+                results.append((midi_data, xml_data))
+            except BrokenProcessPool as e:
+                broken = True
+                results.append(e)
+            except Exception as e:
+                results.append(e)
+        if broken:
+            self.replace_pool(executor)
+        return results
+
+    def recover_jobs(self):
+        """
+        Resubmit the jobs that a previous server process left unfinished.
+
+        Must be called inside an application context.
+
+        Returns:
+            int: Number of jobs resubmitted.
+        """
+        jobs = ConversionJob.query.filter(
+            ConversionJob.status.in_([QUEUED, RUNNING])
+        ).all()
+        for job in jobs:
+            if os.path.exists(job.audio_path) and job.attempts < self.max_attempts:
+                self.submit(job)
+            else:
+                self.finish(job.job_id, error="Job interrupted by a server restart")
+        return len(jobs)
+
+    def depth(self):
+        """
+        Count the jobs submitted by this process that have not finished.
+
+        Returns:
+            int: Number of queued or running jobs.
+        """
+        with self.lock:
+            return len(self.active_jobs)
+
+    def shutdown(self):
+        """
+        Stop the worker processes after their current jobs.
+        """
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+job_queue = JobQueue()
@@ -0,0 +1,193 @@
+################################################################################
+# Filename: live_sessions.py
+# Purpose:  Keep track of the live recordings being transcribed.
+# Author:   Benjamin Goh
+#
+# Description:
+# This file contains the LiveSession class, which ties a LiveTranscription
+# to the user, title and recording limits of one live recording, and the
+# LiveSessions registry the live recording routes look sessions up in.
+# Sessions are held in memory by the server process that created them.
+# Sessions that receive no chunk for LIVE_SESSION_TIMEOUT seconds (300 by
+# default) are cancelled, so a browser that never stops its recording does
+# not leave ffmpeg running.
+#
+# Usage (Optional):
+#   live_sessions.init_app(app)
+#   session_id = live_sessions.add(session)
+#   session = live_sessions.get(session_id)
+#   session = live_sessions.pop(session_id)
+#
+# Notes:
+# - LIVE_MAX_SECONDS (600 by default) bounds the length of one recording,
+#   since its decoded audio is kept until the recording stops.
+# - Every chunk of a session must reach the same server process.
+#
+###############################################################################
+
+import os
+import threading
+import time
+import uuid
+
+# Default seconds a session may go without a chunk before it is cancelled
+default_session_timeout = 300
+
+# Default maximum length in seconds of one live recording
+default_max_seconds = 600
+
+
+class LiveSession:
+    """
+    One live recording and what to store once it stops.
+
+    Attributes:
+        name (str): Name of the user.
+        email (str): Email address of the user.
+        title (str): Title of the song.
+        transcription (LiveTranscription): Transcription of the recording.
+        lock (Lock): Held while a chunk is pushed, so chunks apply in order.
+        last_active (float): Value of time.monotonic when last used.
+    """
+
+    def __init__(self, name, email, title, transcription):
+        self.name = name
+        self.email = email
+        self.title = title
+        self.transcription = transcription
+        self.lock = threading.Lock()
+        self.last_active = time.monotonic()
+
+    def __repr__(self):
+        """
+        Return a string representation of the LiveSession object.
+        """
+        return f"<LiveSession(title='{self.title}', duration={self.transcription.duration:.1f})>"
+
+
+class LiveSessions:
+    """
+    Thread-safe registry of the live sessions of this process.
+
+    Attributes:
+        timeout (float): Seconds a session may go without a chunk.
+        max_seconds (float): Maximum length in seconds of one recording.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sessions = {}
+        self.timeout = default_session_timeout
+        self.max_seconds = default_max_seconds
+
+    def init_app(self, app):
+        """
+        Read the session limits from the application configuration.
+
+        Args:
+            app (Flask): The application to configure the sessions for.
+        """
+        self.timeout = float(
+            app.config.get(
+                "LIVE_SESSION_TIMEOUT",
+                os.environ.get("LIVE_SESSION_TIMEOUT", default_session_timeout),
+            )
+        )
+        self.max_seconds = float(
+            app.config.get(
+                "LIVE_MAX_SECONDS",
+                os.environ.get("LIVE_MAX_SECONDS", default_max_seconds),
+            )
+        )
+        app.extensions["live_sessions"] = self
+
+    def add(self, session):
+        """
+        Register a new session.
+
+        Args:
+            session (LiveSession): The session to register.
+
+        Returns:
+            str: The ID of the session.
+        """
+        self.expire()
+        session_id = uuid.uuid4().hex
+        with self.lock:
+            self.sessions[session_id] = session
+        return session_id
+
+    def get(self, session_id):
+        """
+        Look up a session and mark it as active.
+
+        Args:
+            session_id (str): The ID of the session.
+
+        Returns:
+            LiveSession: The session, or None if there is no such session.
+        """
+        self.expire()
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if session is not None:
+                session.last_active = time.monotonic()
+            return session
+
+    def pop(self, session_id):
+        """
+        Remove a session from the registry.
+
+        Args:
+            session_id (str): The ID of the session.
+
+        Returns:
+            LiveSession: The session, or None if there is no such session.
+        """
+        with self.lock:
+            return self.sessions.pop(session_id, None)
+
+    def expire(self):
+        """
+        Cancel the sessions that have gone without a chunk for too long.
+
+        Returns:
+            int: Number of sessions cancelled.
+        """
+        deadline = time.monotonic() - self.timeout
+        with self.lock:
+            expired = [
+                session_id
+                for session_id, session in self.sessions.items()
+                if session.last_active < deadline
+            ]
+            sessions = [self.sessions.pop(session_id) for session_id in expired]
+
+        for session in sessions:
+            with session.lock:
+                session.transcription.cancel()
+        return len(sessions)
+
+    def count(self):
+        """
+        Count the sessions in progress.
+
+        Returns:
+            int: Number of live sessions.
+        """
+        with self.lock:
+            return len(self.sessions)
+
+    def shutdown(self):
+        """
+        Cancel every session.
+        """
+        with self.lock:
+            sessions = list(self.sessions.values())
+            self.sessions.clear()
+        for session in sessions:
+            with session.lock:
+                session.transcription.cancel()
+
+
+live_sessions = LiveSessions()
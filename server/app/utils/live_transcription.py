@@ -0,0 +1,358 @@
+################################################################################
+# Filename: live_transcription.py
+# Purpose:  Transcribe a recording while its chunks are still arriving.
+# Author:   Livia Chandra
+#
+# Description:
+# This file contains the LiveTranscription class used by the live recording
+# routes. The WebM chunks a browser MediaRecorder emits are written to one
+# ffmpeg process that keeps running for the whole recording, so each chunk
+# is decoded as it arrives instead of after the upload. Every decoded block
+# feeds the first pass of a StreamingAnalysis, which accumulates the onset
+# envelope and the coarse pitch track, and a rolling window of the latest
+# audio is tracked for pitch and onsets to return provisional notes. When
+# the recording stops, only beat tracking and the second pass over the
+# decoded audio are left to create the MIDI file.
+#
+# Usage (Optional):
+#   transcription = LiveTranscription(get_profile("default"))
+#   window_start, notes = transcription.push(chunk)
+#   midi_data = transcription.finish()
+#
+# Notes:
+# - Chunks must be pushed in the order the recorder emitted them; only the
+#   first one carries the WebM header.
+# - ffmpeg decodes in the background, so the samples of a chunk may only be
+#   analysed when the next chunk is pushed. finish waits for all of them.
+# - The provisional notes are recomputed over the whole window each time,
+#   so they replace any earlier provisional notes from window_start onwards.
+#   The stored MIDI comes from the same analysis as any other upload.
+#
+###############################################################################
+
+import subprocess
+import threading
+import time
+import librosa
+import numpy as np
+from app.utils.analysis_context import StreamingAnalysis
+from app.utils.conversion import decode_command, finish_streaming_midi, midi_to_bytes
+from app.utils.metrics import record_stage
+from app.utils.pitch_range import fmin, pitch_fmax, voicing_threshold_db
+
+# Seconds of the latest audio tracked for provisional notes
+window_seconds = 4
+
+# Minimum number of voiced YIN frames in a provisional note
+min_note_frames = 3
+
+# Bytes of WebM ffmpeg reads before it starts decoding, small enough that
+# the first chunk of a recording is decoded straight away
+live_probe_size = 4096
+
+
+def live_decode_command(sample_rate, resampler="default"):
+    """
+    Helper function to build the ffmpeg command that decodes WebM from stdin.
+
+    Args:
+        sample_rate (int): Target sample rate (Hz) of the decoded audio.
+        resampler (string): Resampler quality, a key of resampler_options.
+
+    Returns:
+        list: The ffmpeg command.
+    """
+    command = decode_command("pipe:0", sample_rate, resampler)
+
+    # Read the input as it arrives instead of probing ahead, and write every
+    # decoded packet to the pipe straight away
+    input_index = command.index("-i")
+    command[input_index:input_index] = [
+        "-f",
+        "matroska",
+        "-probesize",
+        str(live_probe_size),
+        "-analyzeduration",
+        "0",
+        "-fflags",
+        "nobuffer",
+    ]
+    command[-1:-1] = ["-flush_packets", "1"]
+    return command
+
+
+class LiveDecoder:
+    """
+    ffmpeg process that decodes WebM chunks to mono float32 PCM as they arrive.
+
+    Attributes:
+        process (Popen): The ffmpeg process.
+        output (bytearray): Decoded bytes not yet taken.
+        error_output (bytearray): What ffmpeg wrote to stderr.
+    """
+
+    def __init__(self, sample_rate, resampler="default"):
+        """
+        Start the ffmpeg process.
+
+        Args:
+            sample_rate (int): Target sample rate (Hz) of the decoded audio.
+            resampler (string): Resampler quality, a key of resampler_options.
+        """
+        self.process = subprocess.Popen(
+            live_decode_command(sample_rate, resampler),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        self.lock = threading.Lock()
+        self.output = bytearray()
+        self.error_output = bytearray()
+
+        # Drain both pipes so that ffmpeg never blocks on a full pipe
+        self.readers = [
+            threading.Thread(
+                target=self.drain, args=(self.process.stdout, self.output), daemon=True
+            ),
+            threading.Thread(
+                target=self.drain,
+                args=(self.process.stderr, self.error_output),
+                daemon=True,
+            ),
+        ]
+        for reader in self.readers:
+            reader.start()
+
+    def drain(self, pipe, buffer):
+        """
+        Helper function to copy everything read from a pipe into a buffer.
+
+        Args:
+            pipe (file): The pipe to read.
+            buffer (bytearray): The buffer to append to.
+        """
+        while True:
+            block = pipe.read1(1 << 16)
+            if not block:
+                break
+            with self.lock:
+                buffer += block
+        pipe.close()
+
+    def write(self, chunk):
+        """
+        Send the next chunk of the recording to ffmpeg.
+
+        Args:
+            chunk (bytes): The next chunk of WebM data.
+
+        Returns:
+            bool: Whether ffmpeg accepted the chunk.
+        """
+        try:
+            self.process.stdin.write(chunk)
+            self.process.stdin.flush()
+        except (BrokenPipeError, ValueError):
+            return False
+        return True
+
+    def take(self):
+        """
+        Take the samples decoded since the last call.
+
+        Returns:
+            ndarray: 1D float32 array of the new samples.
+        """
+        with self.lock:
+            whole_length = len(self.output) // 4 * 4
+            block = bytes(self.output[:whole_length])
+            del self.output[:whole_length]
+        return np.frombuffer(block, dtype=np.float32)
+
+    def close(self):
+        """
+        Signal the end of the recording and wait for ffmpeg to finish.
+
+        Returns:
+            ndarray: 1D float32 array of the samples not yet taken, or None
+                     if ffmpeg failed.
+        """
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            pass
+        for reader in self.readers:
+            reader.join()
+        self.process.wait()
+
+        if self.process.returncode != 0:
+            print(
+                "An error occurred during live decoding:",
+                self.error_output.decode(errors="replace").strip(),
+            )
+            return None
+        return self.take()
+
+    def kill(self):
+        """
+        Stop ffmpeg without waiting for the rest of the recording.
+        """
+        self.process.kill()
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            pass
+        for reader in self.readers:
+            reader.join()
+        self.process.wait()
+
+
+class LiveTranscription:
+    """
+    Incremental transcription of one recording received in chunks.
+
+    Attributes:
+        profile (ConversionProfile): Conversion profile of the recording.
+        sample_rate (int): Number of samples per second (Hz) of the audio.
+        analysis (StreamingAnalysis): First pass over every decoded block.
+        blocks (list): Every decoded block, kept for the second pass.
+        window (ndarray): The latest window_seconds of audio.
+        max_rms (float): Loudest frame level so far, for the voicing gate.
+    """
+
+    def __init__(self, profile):
+        """
+        Start decoding a new recording.
+
+        Args:
+            profile (ConversionProfile): Conversion profile of the recording.
+        """
+        self.profile = profile
+        self.sample_rate = profile.sample_rate
+        self.decoder = LiveDecoder(profile.sample_rate, profile.resampler)
+        self.analysis = StreamingAnalysis(
+            profile.sample_rate,
+            profile.yin_frame_length,
+            profile.yin_hop_length,
+            profile.pitch_search,
+        )
+        self.blocks = []
+        self.window = np.zeros(0, dtype=np.float32)
+        self.max_rms = 0.0
+
+    @property
+    def duration(self):
+        """
+        float: Seconds of audio decoded so far.
+        """
+        return self.analysis.sample_count / self.sample_rate
+
+    def push(self, chunk):
+        """
+        Decode the next chunk and track the notes of the latest window.
+
+        Args:
+            chunk (bytes): The next chunk of WebM data.
+
+        Returns:
+            tuple: Time in seconds where the window starts and the
+                   provisional notes in it, or None if ffmpeg stopped.
+        """
+        if not self.decoder.write(chunk):
+            return None
+        self.feed(self.decoder.take())
+        return self.provisional_notes()
+
+    def feed(self, block):
+        """
+        Helper function to add decoded samples to the analysis and the window.
+
+        Args:
+            block (ndarray): 1D float32 array of new samples.
+        """
+        if not len(block):
+            return
+        self.blocks.append(block)
+        self.analysis.feed(block)
+        window_length = int(window_seconds * self.sample_rate)
+        self.window = np.concatenate((self.window, block))[-window_length:]
+
+    def provisional_notes(self):
+        """
+        Track pitch and onsets over the latest window.
+
+        Each span between two onsets becomes one note at the median pitch of
+        its voiced frames.
+
+        Returns:
+            tuple: Time in seconds where the window starts and a list of
+                   notes, each with its time, duration and MIDI note number.
+        """
+        window_start = self.duration - len(self.window) / self.sample_rate
+        frame_length = self.profile.yin_frame_length
+        hop_length = self.profile.yin_hop_length
+        if len(self.window) < frame_length:
+            return window_start, []
+
+        start = time.perf_counter()
+        pitch = librosa.yin(
+            y=self.window,
+            sr=self.sample_rate,
+            fmin=fmin,
+            fmax=pitch_fmax(self.sample_rate),
+            frame_length=frame_length,
+            hop_length=hop_length,
+        )
+        rms = librosa.feature.rms(
+            y=self.window, frame_length=frame_length, hop_length=hop_length
+        )[0][: len(pitch)]
+        onsets = librosa.onset.onset_detect(
+            y=self.window, sr=self.sample_rate, hop_length=hop_length
+        )
+
+        # Frames within voicing_threshold_db of the loudest frame so far
+        self.max_rms = max(self.max_rms, float(rms.max()))
+        voiced = librosa.amplitude_to_db(
+            rms, ref=self.max_rms or 1.0
+        ) > -voicing_threshold_db
+
+        notes = []
+        boundaries = np.unique(np.concatenate(([0], onsets, [len(pitch)])))
+        for first, last in zip(boundaries[:-1], boundaries[1:]):
+            note_pitch = pitch[first:last][voiced[first:last]]
+            if len(note_pitch) < min_note_frames:
+                continue
+            notes.append(
+                {
+                    "time": window_start + first * hop_length / self.sample_rate,
+                    "duration": (last - first) * hop_length / self.sample_rate,
+                    "note": int(np.round(librosa.hz_to_midi(np.median(note_pitch)))),
+                }
+            )
+        record_stage("live_notes", time.perf_counter() - start)
+
+        return window_start, notes
+
+    def finish(self):
+        """
+        Decode the rest of the recording and create its MIDI file.
+
+        Returns:
+            bytes: Content of the MIDI file, or None if no audio was decoded.
+        """
+        remaining = self.decoder.close()
+        if remaining is None:
+            return None
+        self.feed(remaining)
+        if self.analysis.sample_count == 0:
+            return None
+
+        midi = finish_streaming_midi(self.analysis, self.blocks)
+        return midi_to_bytes(midi)
+
+    def cancel(self):
+        """
+        Stop decoding and discard the recording.
+        """
+        self.decoder.kill()
+        self.blocks = []
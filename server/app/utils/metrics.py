@@ -0,0 +1,445 @@
+################################################################################
+# Filename: metrics.py
+# Purpose:  Collect request, database and conversion metrics for Prometheus.
+# Author:   Livia Chandra
+#
+# Description:
+# This file contains a small in-process metrics registry with counters,
+# gauges and histograms, rendered in the Prometheus text exposition format.
+# The registry records the latency of every API route, the time spent in
+# database queries, the time spent in each conversion stage and the depth
+# of the conversion queue.
+#
+# Usage (Optional):
+#   metrics.init_app(app)
+#   with recording_stages() as timings:
+#       ...
+#   record_stage("musicxml", seconds)
+#   metrics.render()
+#
+# Notes:
+# - Recording a value takes a lock and a bisect over the bucket bounds, a
+#   few microseconds, so the metrics are meant to stay on in production.
+# - Conversions run in worker processes, whose registries are never
+#   scraped. convert_job collects the stage timings of its conversion with
+#   recording_stages and returns them, and the server process records them.
+# - Values are kept per server process.
+#
+###############################################################################
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Prefix of every metric name
+namespace = "melodymapper"
+
+# Histogram bucket upper bounds in seconds
+stage_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+request_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+query_buckets = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+
+# Conversion stages and the AnalysisContext and StreamingAnalysis features
+# each one covers
+stage_features = {
+    "yin": ("pitch_range", "pitch", "key_signature"),
+    "beat_track": ("power_spectrogram", "onset_envelope", "beats", "beat_times"),
+    "segment_stft": ("segment_frequencies",),
+}
+
+
+def format_labels(names, values, extra=""):
+    """
+    Helper function to format the label set of a sample.
+
+    Args:
+        names (tuple): Label names.
+        values (tuple): Label values, in the order of names.
+        extra (str): Already formatted label to append, such as le="0.5".
+
+    Returns:
+        str: The label set in braces, or an empty string without labels.
+    """
+    labels = [
+        '{}="{}"'.format(
+            name,
+            str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"),
+        )
+        for name, value in zip(names, values)
+    ]
+    if extra:
+        labels.append(extra)
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+
+def format_value(value):
+    """
+    Helper function to format a sample value.
+
+    Args:
+        value (float): The value.
+
+    Returns:
+        str: The value in Prometheus notation.
+    """
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """
+    Monotonically increasing count, one per label set.
+
+    Attributes:
+        name (str): Metric name.
+        documentation (str): Help text.
+        label_names (tuple): Names of the labels.
+    """
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def inc(self, *label_values, amount=1):
+        """
+        Increase the count of a label set.
+
+        Args:
+            *label_values (str): Label values, in the order of label_names.
+            amount (float): Amount to add.
+        """
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def samples(self):
+        """
+        Render the samples of the metric.
+
+        Returns:
+            list: Lines of the text exposition format.
+        """
+        with self.lock:
+            values = sorted(self.values.items())
+        return [
+            f"{self.name}{format_labels(self.label_names, labels)} {format_value(value)}"
+            for labels, value in values
+        ]
+
+
+class Gauge:
+    """
+    Value that is read from a function at scrape time.
+
+    Attributes:
+        name (str): Metric name.
+        documentation (str): Help text.
+        function (callable): Returns the current value.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name, documentation, function):
+        self.name = name
+        self.documentation = documentation
+        self.function = function
+
+    def samples(self):
+        """
+        Render the samples of the metric.
+
+        Returns:
+            list: Lines of the text exposition format.
+        """
+        return [f"{self.name} {format_value(self.function())}"]
+
+
+class Histogram:
+    """
+    Distribution of observed values in cumulative buckets, one per label set.
+
+    Attributes:
+        name (str): Metric name.
+        documentation (str): Help text.
+        label_names (tuple): Names of the labels.
+        buckets (tuple): Upper bounds of the buckets, in increasing order.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, label_names=(), buckets=stage_buckets):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def observe(self, value, *label_values):
+        """
+        Record a value for a label set.
+
+        Args:
+            value (float): The observed value.
+            *label_values (str): Label values, in the order of label_names.
+        """
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.values.get(label_values)
+            if series is None:
+                # Per-bucket counts, then the sum and count of all values
+                series = self.values[label_values] = [0] * (len(self.buckets) + 1)
+                series.append(0.0)
+            series[index] += 1
+            series[-1] += value
+
+    def samples(self):
+        """
+        Render the samples of the metric.
+
+        Returns:
+            list: Lines of the text exposition format.
+        """
+        with self.lock:
+            values = sorted(
+                (labels, list(series)) for labels, series in self.values.items()
+            )
+
+        lines = []
+        bounds = [format_value(float(bound)) for bound in self.buckets] + ["+Inf"]
+        for labels, series in values:
+            cumulative = 0
+            for bound, count in zip(bounds, series):
+                cumulative += count
+                label_set = format_labels(self.label_names, labels, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{label_set} {cumulative}")
+            label_set = format_labels(self.label_names, labels)
+            lines.append(f"{self.name}_sum{label_set} {format_value(series[-1])}")
+            lines.append(f"{self.name}_count{label_set} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Set of metrics rendered together, with the Flask and SQLAlchemy hooks that feed them.
+
+    Attributes:
+        metrics (dict): Registered metrics, keyed by name.
+        stage_seconds (Histogram): Time spent in each conversion stage.
+        request_seconds (Histogram): Latency of each API route.
+        query_seconds (Histogram): Time spent in database queries.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+        self.query_listeners = False
+        self.stage_seconds = self.register(
+            Histogram(
+                f"{namespace}_conversion_stage_seconds",
+                "Time spent in each stage of a conversion.",
+                ("stage",),
+                stage_buckets,
+            )
+        )
+        self.request_seconds = self.register(
+            Histogram(
+                f"{namespace}_http_request_seconds",
+                "Latency of API requests by route.",
+                ("method", "route", "status"),
+                request_buckets,
+            )
+        )
+        self.query_seconds = self.register(
+            Histogram(
+                f"{namespace}_db_query_seconds",
+                "Time spent in database queries by statement type.",
+                ("statement",),
+                query_buckets,
+            )
+        )
+
+    def register(self, metric):
+        """
+        Add a metric to the registry, replacing any metric of the same name.
+
+        Args:
+            metric (Counter, Gauge or Histogram): The metric to add.
+
+        Returns:
+            The added metric.
+        """
+        with self.lock:
+            self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, label_names=()):
+        """
+        Create and register a counter.
+
+        Args:
+            name (str): Metric name, without the namespace prefix.
+            documentation (str): Help text.
+            label_names (tuple): Names of the labels.
+
+        Returns:
+            Counter: The new counter.
+        """
+        return self.register(Counter(f"{namespace}_{name}", documentation, label_names))
+
+    def gauge(self, name, documentation, function):
+        """
+        Create and register a gauge read from a function.
+
+        Args:
+            name (str): Metric name, without the namespace prefix.
+            documentation (str): Help text.
+            function (callable): Returns the current value.
+
+        Returns:
+            Gauge: The new gauge.
+        """
+        return self.register(Gauge(f"{namespace}_{name}", documentation, function))
+
+    def init_app(self, app):
+        """
+        Time every request of an application and every database query.
+
+        Args:
+            app (Flask): The application to instrument.
+        """
+        from flask import g, request
+
+        @app.before_request
+        def start_request_timer():
+            g.metrics_request_start = time.perf_counter()
+
+        @app.after_request
+        def record_request(response):
+            start = g.pop("metrics_request_start", None)
+            if start is not None:
+                route = request.url_rule.rule if request.url_rule else "unmatched"
+                self.request_seconds.observe(
+                    time.perf_counter() - start,
+                    request.method,
+                    route,
+                    str(response.status_code),
+                )
+            return response
+
+        self.listen_to_queries()
+        app.extensions["metrics"] = self
+
+    def listen_to_queries(self):
+        """
+        Time every statement executed by any SQLAlchemy engine, once per process.
+        """
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+
+        with self.lock:
+            if self.query_listeners:
+                return
+            self.query_listeners = True
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            conn.info.setdefault("metrics_query_start", []).append(time.perf_counter())
+
+        def after_cursor_execute(conn, cursor, statement, *args):
+            starts = conn.info.get("metrics_query_start")
+            if starts:
+                self.query_seconds.observe(
+                    time.perf_counter() - starts.pop(),
+                    statement.lstrip().split(None, 1)[0].upper(),
+                )
+
+        event.listen(Engine, "before_cursor_execute", before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", after_cursor_execute)
+
+    def render(self):
+        """
+        Render every metric in the Prometheus text exposition format.
+
+        Returns:
+            str: The metrics text.
+        """
+        with self.lock:
+            metrics = list(self.metrics.values())
+
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+# Stage timings being collected for a conversion on this thread
+stage_recorder = threading.local()
+
+
+@contextmanager
+def recording_stages():
+    """
+    Collect the stage timings recorded on this thread instead of observing them.
+
+    Yields:
+        dict: Seconds spent in each stage, filled in as the stages run.
+    """
+    timings = {}
+    stage_recorder.timings = timings
+    try:
+        yield timings
+    finally:
+        stage_recorder.timings = None
+
+
+def record_stage(stage, seconds):
+    """
+    Record the time spent in a conversion stage.
+
+    Inside recording_stages the time is collected for the caller, otherwise
+    it is observed straight away.
+
+    Args:
+        stage (str): Name of the stage.
+        seconds (float): Time spent in the stage.
+    """
+    timings = getattr(stage_recorder, "timings", None)
+    if timings is None:
+        metrics.stage_seconds.observe(seconds, stage)
+    else:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+def record_feature_stages(feature_timings):
+    """
+    Record the analysis stages from the feature timings of an analysis.
+
+    Args:
+        feature_timings (dict): Seconds spent on each feature, as in
+                                AnalysisContext.timings.
+    """
+    for stage, features in stage_features.items():
+        seconds = sum(feature_timings.get(name, 0.0) for name in features)
+        if seconds:
+            record_stage(stage, seconds)
+
+
+def observe_stages(timings):
+    """
+    Observe stage timings collected by recording_stages, possibly in another process.
+
+    Args:
+        timings (dict): Seconds spent in each stage.
+    """
+    for stage, seconds in timings.items():
+        metrics.stage_seconds.observe(seconds, stage)
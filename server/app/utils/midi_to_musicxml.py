@@ -4,43 +4,52 @@
 # Author:   Darren Seubert
 #
 # Description:
-# This script converts a MIDI file into a MusicXML file suitable for sheet music
-# using the music21 library.
+# This script converts the content of a MIDI file into MusicXML suitable for
+# sheet music. Both are kept in memory, so no file is written or read back.
+# The single-track melodies the pipeline generates are written directly by
+# musicxml_writer; any other MIDI file is converted with the music21 library.
 #
 # Usage:
-# Run this script with the path to the MIDI file as an argument.
+# Call midi_to_musicxml with the bytes of a MIDI file.
 # Ensure that the music21 library is installed in your Python environment.
 #
 ################################################################################
 
-import os
-from music21 import converter
+from app.utils.musicxml_writer import write_musicxml
 
 
-def midi_to_musicxml(midi_file):
+def music21_musicxml(midi_data):
     """
-    Convert MIDI file to MusicXML format.
+    Convert MIDI file content to MusicXML format with music21.
 
     Args:
-        midi_file (str): The path to the MIDI file.
+        midi_data (bytes): Content of the MIDI file.
 
     Returns:
-        str: The path to the generated MusicXML file.
+        bytes: Content of the generated MusicXML file.
     """
-    # Load MIDI file
-    score = converter.parse(midi_file)
+    # Imported here so that melodies written directly never load music21
+    from music21 import converter
+    from music21.musicxml import m21ToXml
 
-    # Define output directory for MusicXML files
-    musicxml_output_folder = "./musicxml_output"
-
-    # Create the output directory if it doesn't exist
-    if not os.path.exists(musicxml_output_folder):
-        os.makedirs(musicxml_output_folder)
+    # Load MIDI data
+    score = converter.parseData(midi_data, format="midi")
 
     # Convert MIDI to MusicXML
-    musicxml_file = os.path.join(
-        musicxml_output_folder, os.path.basename(midi_file).replace(".mid", ".musicxml")
-    )
-    score.write("musicxml", musicxml_file)
+    return m21ToXml.GeneralObjectExporter(score).parse()
+
+
+def midi_to_musicxml(midi_data):
+    """
+    Convert MIDI file content to MusicXML format.
 
-    return musicxml_file
+    Args:
+        midi_data (bytes): Content of the MIDI file.
+
+    Returns:
+        bytes: Content of the generated MusicXML file.
+    """
+    xml_data = write_musicxml(midi_data)
+    if xml_data is None:
+        xml_data = music21_musicxml(midi_data)
+    return xml_data
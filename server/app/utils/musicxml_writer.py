@@ -0,0 +1,425 @@
+################################################################################
+# Filename: musicxml_writer.py
+# Purpose:  Write MusicXML for the single-track MIDI files of the pipeline.
+# Author:   Livia Chandra
+#
+# Description:
+# This file contains a lightweight MusicXML writer for the MIDI files that
+# wav_to_midi generates: one track with one key signature, one tempo and
+# notes that follow each other without overlapping. The notes are quantized
+# to a sixteenth-note grid, laid out in 4/4 measures and split into tied
+# standard note values, without building a music21 score.
+#
+# Usage (Optional):
+#   xml_data = write_musicxml(midi_data)
+#   if xml_data is None:
+#       ...  # Outside the supported subset, convert with music21 instead
+#
+# Notes:
+# - write_musicxml returns None for any MIDI file outside the subset, such as
+#   several tracks, chords, tempo changes or a time signature, so callers can
+#   fall back to music21.
+# - Unlike music21, which quantizes to sixteenths or eighth-note triplets,
+#   durations are only quantized to sixteenths, so no tuplets are written.
+#
+###############################################################################
+
+import io
+import math
+import mido
+
+# Divisions of a quarter note, the resolution notes are quantized to
+divisions = 4
+
+# Length of a 4/4 measure in divisions
+measure_length = 4 * divisions
+
+# Note type and number of dots of every duration in divisions that can be
+# written as a single note, longest first
+note_values = [
+    (16, "whole", 0),
+    (12, "half", 1),
+    (8, "half", 0),
+    (6, "quarter", 1),
+    (4, "quarter", 0),
+    (3, "eighth", 1),
+    (2, "eighth", 0),
+    (1, "16th", 0),
+]
+
+# Key signature names, as in MIDI key signature messages, by number of fifths
+major_keys = ["Cb", "Gb", "Db", "Ab", "Eb", "Bb", "F", "C"]
+major_keys += ["G", "D", "A", "E", "B", "F#", "C#"]
+minor_keys = ["Abm", "Ebm", "Bbm", "Fm", "Cm", "Gm", "Dm", "Am"]
+minor_keys += ["Em", "Bm", "F#m", "C#m", "G#m", "D#m", "A#m"]
+
+# Step and alteration of each pitch class, spelled with sharps, with flats,
+# and as music21 spells MIDI notes in C major
+sharp_spelling = [
+    ("C", 0), ("C", 1), ("D", 0), ("D", 1), ("E", 0), ("F", 0),
+    ("F", 1), ("G", 0), ("G", 1), ("A", 0), ("A", 1), ("B", 0),
+]  # fmt: skip
+flat_spelling = [
+    ("C", 0), ("D", -1), ("D", 0), ("E", -1), ("E", 0), ("F", 0),
+    ("G", -1), ("G", 0), ("A", -1), ("A", 0), ("B", -1), ("B", 0),
+]  # fmt: skip
+natural_spelling = [
+    ("C", 0), ("C", 1), ("D", 0), ("E", -1), ("E", 0), ("F", 0),
+    ("F", 1), ("G", 0), ("G", 1), ("A", 0), ("B", -1), ("B", 0),
+]  # fmt: skip
+
+# Order in which key signatures add sharps; flats are added in reverse
+sharp_order = "FCGDAEB"
+
+# Accidental names by alteration
+accidental_names = {-1: "flat", 0: "natural", 1: "sharp"}
+
+# Meta messages that carry no notation
+ignored_meta = {"end_of_track", "track_name", "instrument_name"}
+
+
+def read_melody(midi_data):
+    """
+    Read the key, tempo and notes of a MIDI file in the supported subset.
+
+    Args:
+        midi_data (bytes): Content of the MIDI file.
+
+    Returns:
+        dict: Key signature name, tempo in beats per minute and a list of
+              note number, velocity, onset and duration in quarter notes,
+              or None if the file is outside the supported subset.
+    """
+    try:
+        midi = mido.MidiFile(file=io.BytesIO(midi_data))
+    except Exception as e:
+        print("An error occurred during MIDI parsing:", e)
+        return None
+
+    if midi.type == 2 or len(midi.tracks) != 1:
+        return None
+
+    key = "C"
+    tempo = 500000
+    meta_seen = set()
+    channel = None
+    sounding = None
+    notes = []
+    ticks = 0
+    for message in midi.tracks[0]:
+        ticks += message.time
+        if message.is_meta:
+            if message.type in ignored_meta:
+                continue
+            if message.type not in ("key_signature", "set_tempo"):
+                return None
+            # A single key and tempo, set before the first note
+            if message.type in meta_seen or ticks > 0:
+                return None
+            meta_seen.add(message.type)
+            if message.type == "key_signature":
+                key = message.key
+            else:
+                tempo = message.tempo
+        elif message.type in ("note_on", "note_off"):
+            if channel is None:
+                channel = message.channel
+            if message.channel != channel:
+                return None
+            if message.type == "note_on" and message.velocity > 0:
+                # Notes follow each other, so a new note cannot start while
+                # another one sounds
+                if sounding is not None:
+                    return None
+                sounding = (message.note, message.velocity, ticks)
+            else:
+                if sounding is None or sounding[0] != message.note:
+                    return None
+                note, velocity, start = sounding
+                notes.append(
+                    (
+                        note,
+                        velocity,
+                        start / midi.ticks_per_beat,
+                        (ticks - start) / midi.ticks_per_beat,
+                    )
+                )
+                sounding = None
+        else:
+            return None
+
+    if sounding is not None or not notes:
+        return None
+    return {"key": key, "tempo": mido.tempo2bpm(tempo), "notes": notes}
+
+
+def quantize_notes(notes):
+    """
+    Quantize the notes of a melody to the grid of divisions.
+
+    Notes are at least one division long and cut short where the next note
+    starts, as music21 does when it quantizes MIDI files.
+
+    Args:
+        notes (list): Note number, velocity, onset and duration in quarter notes.
+
+    Returns:
+        list: Note number, velocity, onset and duration in divisions, or None
+              if two notes start on the same division.
+    """
+    onsets = [math.floor(onset * divisions + 0.5) for _, _, onset, _ in notes]
+    quantized = []
+    for index, (note, velocity, _, duration) in enumerate(notes):
+        onset = onsets[index]
+        length = max(1, math.floor(duration * divisions + 0.5))
+        if index + 1 < len(notes):
+            if onsets[index + 1] <= onset:
+                return None
+            length = min(length, onsets[index + 1] - onset)
+        quantized.append((note, velocity, onset, length))
+    return quantized
+
+
+def split_duration(duration):
+    """
+    Helper function to split a duration into notes that can be written without ties.
+
+    Args:
+        duration (int): Duration in divisions, no longer than a measure.
+
+    Returns:
+        list: Duration, note type and number of dots of each note.
+    """
+    values = []
+    while duration > 0:
+        value = next(value for value in note_values if value[0] <= duration)
+        values.append(value)
+        duration -= value[0]
+    return values
+
+
+def layout_measures(notes):
+    """
+    Lay out quantized notes and the rests between them in 4/4 measures.
+
+    Args:
+        notes (list): Note number, velocity, onset and duration in divisions.
+
+    Returns:
+        list: For each measure, the note number (None for a rest), velocity,
+              duration, note type, number of dots and tie types of each note.
+    """
+    # Events that fill the timeline, rests included
+    events = []
+    position = 0
+    for note, velocity, onset, duration in notes:
+        if onset > position:
+            events.append((None, 0, onset - position))
+        events.append((note, velocity, duration))
+        position = onset + duration
+    if position % measure_length:
+        events.append((None, 0, measure_length - position % measure_length))
+
+    measures = [[]]
+    filled = 0
+    for note, velocity, duration in events:
+        pieces = []
+        while duration > 0:
+            if filled == measure_length:
+                measures.append([])
+                filled = 0
+            # Split at the barline, then into standard note values
+            part = min(duration, measure_length - filled)
+            for value in split_duration(part):
+                pieces.append((len(measures) - 1, value))
+            duration -= part
+            filled += part
+
+        for index, (measure, (length, note_type, dots)) in enumerate(pieces):
+            ties = []
+            if note is not None and index > 0:
+                ties.append("stop")
+            if note is not None and index < len(pieces) - 1:
+                ties.append("start")
+            measures[measure].append((note, velocity, length, note_type, dots, ties))
+    return measures
+
+
+def key_alterations(fifths):
+    """
+    Helper function to list the steps a key signature alters.
+
+    Args:
+        fifths (int): Number of sharps, or of flats if negative.
+
+    Returns:
+        dict: Alteration of each step altered by the key signature.
+    """
+    if fifths >= 0:
+        return {step: 1 for step in sharp_order[:fifths]}
+    return {step: -1 for step in sharp_order[::-1][:-fifths]}
+
+
+def format_number(value):
+    """
+    Helper function to format a number without trailing zeros.
+
+    Args:
+        value (float): The number.
+
+    Returns:
+        str: The number with at most two decimals.
+    """
+    return f"{value:.2f}".rstrip("0").rstrip(".")
+
+
+def note_xml(note, velocity, length, note_type, dots, ties, spelling, key, accidentals):
+    """
+    Write the MusicXML of a note or rest.
+
+    Args:
+        note (int): MIDI note number, or None for a rest.
+        velocity (int): MIDI velocity of the note.
+        length (int): Duration in divisions.
+        note_type (str): MusicXML note type.
+        dots (int): Number of dots.
+        ties (list): Tie types, "stop" and "start", of the note.
+        spelling (list): Step and alteration of each pitch class.
+        key (dict): Alteration of each step altered by the key signature.
+        accidentals (dict): Alteration of each step and octave changed earlier
+                            in the measure, updated with the note.
+
+    Returns:
+        list: Lines of the note element.
+    """
+    if note is None:
+        lines = ["      <note>", "        <rest />"]
+    else:
+        step, alter = spelling[note % 12]
+        octave = note // 12 - 1
+        dynamics = format_number(velocity / 90 * 100)
+        lines = [f'      <note dynamics="{dynamics}">', "        <pitch>"]
+        lines.append(f"          <step>{step}</step>")
+        # Show an accidental when the alteration differs from the one in
+        # effect, except on a tied continuation, which keeps it
+        current = accidentals.get((step, octave), key.get(step, 0))
+        show_accidental = current != alter
+        if alter or show_accidental:
+            lines.append(f"          <alter>{alter}</alter>")
+        lines.append(f"          <octave>{octave}</octave>")
+        lines.append("        </pitch>")
+        accidentals[(step, octave)] = alter
+
+    lines.append(f"        <duration>{length}</duration>")
+    lines.extend(f'        <tie type="{tie}" />' for tie in ties)
+    lines.append(f"        <type>{note_type}</type>")
+    lines.extend(["        <dot />"] * dots)
+    if note is not None and show_accidental and "stop" not in ties:
+        lines.append(f"        <accidental>{accidental_names[alter]}</accidental>")
+    if ties:
+        lines.append("        <notations>")
+        lines.extend(f'          <tied type="{tie}" />' for tie in ties)
+        lines.append("        </notations>")
+    lines.append("      </note>")
+    return lines
+
+
+def write_musicxml(midi_data):
+    """
+    Convert MIDI file content to MusicXML without music21.
+
+    Args:
+        midi_data (bytes): Content of the MIDI file.
+
+    Returns:
+        bytes: Content of the MusicXML file, or None if the MIDI file is
+               outside the supported subset.
+    """
+    melody = read_melody(midi_data)
+    if melody is None:
+        return None
+    if melody["key"] in major_keys:
+        fifths, mode = major_keys.index(melody["key"]) - 7, "major"
+    elif melody["key"] in minor_keys:
+        fifths, mode = minor_keys.index(melody["key"]) - 7, "minor"
+    else:
+        return None
+    notes = quantize_notes(melody["notes"])
+    if notes is None:
+        return None
+
+    if fifths > 0:
+        spelling = sharp_spelling
+    elif fifths < 0:
+        spelling = flat_spelling
+    else:
+        spelling = natural_spelling
+
+    # Treble clef unless the melody lies mostly below middle C
+    average_note = sum(note for note, _, _, _ in notes) / len(notes)
+    clef = ("G", 2) if average_note >= 60 else ("F", 4)
+    tempo = format_number(melody["tempo"])
+    key = key_alterations(fifths)
+
+    lines = [
+        '<?xml version="1.0" encoding="utf-8"?>',
+        '<!DOCTYPE score-partwise  PUBLIC "-//Recordare//DTD MusicXML 4.0 '
+        'Partwise//EN" "http://www.musicxml.org/dtds/partwise.dtd">',
+        '<score-partwise version="4.0">',
+        "  <identification>",
+        "    <encoding>",
+        "      <software>MelodyMapper</software>",
+        "    </encoding>",
+        "  </identification>",
+        "  <part-list>",
+        '    <score-part id="P1">',
+        "      <part-name>Melody</part-name>",
+        "    </score-part>",
+        "  </part-list>",
+        '  <part id="P1">',
+    ]
+    measures = layout_measures(notes)
+    for number, measure in enumerate(measures, start=1):
+        lines.append(f'    <measure number="{number}">')
+        if number == 1:
+            lines += [
+                "      <attributes>",
+                f"        <divisions>{divisions}</divisions>",
+                "        <key>",
+                f"          <fifths>{fifths}</fifths>",
+                f"          <mode>{mode}</mode>",
+                "        </key>",
+                "        <time>",
+                "          <beats>4</beats>",
+                "          <beat-type>4</beat-type>",
+                "        </time>",
+                "        <clef>",
+                f"          <sign>{clef[0]}</sign>",
+                f"          <line>{clef[1]}</line>",
+                "        </clef>",
+                "      </attributes>",
+                "      <direction>",
+                "        <direction-type>",
+                '          <metronome parentheses="no">',
+                "            <beat-unit>quarter</beat-unit>",
+                f"            <per-minute>{tempo}</per-minute>",
+                "          </metronome>",
+                "        </direction-type>",
+                f'        <sound tempo="{tempo}" />',
+                "      </direction>",
+            ]
+
+        # Accidentals last until the end of the measure
+        accidentals = {}
+        for note in measure:
+            lines += note_xml(*note, spelling, key, accidentals)
+
+        if number == len(measures):
+            lines += [
+                '      <barline location="right">',
+                "        <bar-style>light-heavy</bar-style>",
+                "      </barline>",
+            ]
+        lines.append("    </measure>")
+    lines += ["  </part>", "</score-partwise>"]
+    return ("\n".join(lines) + "\n").encode("utf-8")
@@ -0,0 +1,200 @@
+################################################################################
+# Filename: pitch_range.py
+# Purpose:  Narrow the YIN pitch search to the register of the recording.
+# Author:   Livia Chandra
+#
+# Description:
+# This file contains the coarse pass of the coarse-to-fine pitch search. A
+# cheap YIN pass over a half-rate copy of the audio, with four times fewer
+# frames, estimates the register the recording actually uses. The full
+# resolution YIN pass then only searches that range: a higher lowest pitch
+# means a shorter longest period, so the frames, their FFTs and the lags of
+# the difference function all shrink.
+#
+# Usage (Optional):
+#   low, high = estimate_pitch_range(audio_data, sample_rate, 2048, 512)
+#   frame_length = range_frame_length(sample_rate, low, 2048)
+#
+# Notes:
+# - Only frames within voicing_threshold_db of the loudest coarse frame count
+#   towards the range, so silence and breath noise do not widen it.
+# - The full C1 to C8 range is still searched when it is explicitly requested
+#   with the "full" pitch search, or when no frame is voiced.
+#
+###############################################################################
+
+import numpy as np
+from app.utils.conversion_profiles import adaptive_search, fmax, fmin, full_search
+
+# The coarse pass runs at half the sample rate with a four times longer hop
+coarse_decimation = 2
+coarse_hop_factor = 4
+
+# Coarse frames quieter than this many dB below the loudest are unvoiced
+voicing_threshold_db = 30
+
+# Percentiles of the voiced coarse pitch that bound the register, and the
+# margin in octaves added on both sides
+range_percentiles = (5, 95)
+range_margin = 0.5
+
+# Fine YIN frame lengths are rounded up to a multiple of this many samples
+frame_length_multiple = 32
+
+
+def pitch_fmax(sample_rate):
+    """
+    Helper function to cap the highest detectable pitch at the Nyquist frequency.
+
+    Args:
+        sample_rate (int): Number of samples per second (Hz) of the audio data.
+
+    Returns:
+        float: Max frequency (Hz) for pitch detection.
+    """
+    return min(fmax, sample_rate / 2)
+
+
+def coarse_framing(sample_rate, frame_length, hop_length):
+    """
+    Helper function to derive the framing of the coarse pass.
+
+    The coarse frames last as long as the fine frames, at half the rate.
+
+    Args:
+        sample_rate (int): Number of samples per second (Hz) of the audio data.
+        frame_length (int): Samples per fine YIN frame.
+        hop_length (int): Samples between consecutive fine YIN frames.
+
+    Returns:
+        tuple: Sample rate, frame length and hop length of the coarse pass.
+    """
+    return (
+        sample_rate / coarse_decimation,
+        frame_length // coarse_decimation,
+        hop_length * coarse_hop_factor // coarse_decimation,
+    )
+
+
+def decimate(audio_data):
+    """
+    Halve the sample rate by averaging pairs of samples.
+
+    Averaging is a crude low-pass filter, but the coarse pass only needs the
+    register, not the exact pitch. A trailing odd sample is dropped.
+
+    Args:
+        audio_data (ndarray): 1D array that contains audio signal information.
+
+    Returns:
+        ndarray: 1D array at half the sample rate.
+    """
+    pair_count = len(audio_data) // coarse_decimation
+    return (
+        audio_data[: pair_count * coarse_decimation]
+        .reshape(pair_count, -1)
+        .mean(axis=1, dtype=np.float32)
+    )
+
+
+def coarse_pitch(frames, sample_rate, frame_length, hop_length):
+    """
+    Estimate the pitch and loudness of a run of whole coarse frames.
+
+    Args:
+        frames (ndarray): Decimated samples spanning a whole number of frames.
+        sample_rate (float): Sample rate (Hz) of the decimated samples.
+        frame_length (int): Samples per coarse frame.
+        hop_length (int): Samples between consecutive coarse frames.
+
+    Returns:
+        tuple: YIN pitch (Hz) and RMS level of each frame.
+    """
+    import librosa
+
+    pitch = librosa.yin(
+        y=frames,
+        sr=sample_rate,
+        fmin=fmin,
+        fmax=pitch_fmax(sample_rate),
+        frame_length=frame_length,
+        hop_length=hop_length,
+        center=False,
+    )
+    framed = np.lib.stride_tricks.sliding_window_view(frames, frame_length)[
+        ::hop_length
+    ]
+    rms = np.sqrt(np.mean(np.square(framed, dtype=np.float64), axis=-1))
+    return pitch, rms
+
+
+def pitch_range(pitch, rms, sample_rate):
+    """
+    Bound the register of a recording from its coarse pitch track.
+
+    Args:
+        pitch (ndarray): Coarse YIN pitch (Hz) of each frame.
+        rms (ndarray): RMS level of each coarse frame.
+        sample_rate (int): Number of samples per second (Hz) of the audio data.
+
+    Returns:
+        tuple: Lowest and highest frequency (Hz) to search.
+    """
+    full_range = fmin, pitch_fmax(sample_rate)
+    if len(rms) == 0 or rms.max() == 0:
+        return full_range
+
+    voiced = rms >= rms.max() * 10 ** (-voicing_threshold_db / 20)
+    low, high = np.percentile(np.log2(pitch[voiced]), range_percentiles)
+    low = max(fmin, 2 ** (low - range_margin))
+    high = min(pitch_fmax(sample_rate), 2 ** (high + range_margin))
+    if low >= high:
+        return full_range
+    return low, high
+
+
+def estimate_pitch_range(audio_data, sample_rate, frame_length, hop_length):
+    """
+    Estimate the register of a recording with the coarse pass.
+
+    Args:
+        audio_data (ndarray): 1D array that contains audio signal information.
+        sample_rate (int): Number of samples per second (Hz) of audio_data.
+        frame_length (int): Samples per fine YIN frame.
+        hop_length (int): Samples between consecutive fine YIN frames.
+
+    Returns:
+        tuple: Lowest and highest frequency (Hz) to search.
+    """
+    coarse_rate, coarse_frame, coarse_hop = coarse_framing(
+        sample_rate, frame_length, hop_length
+    )
+
+    # Centre the frames with zero padding, as librosa.yin does
+    padded = np.pad(decimate(audio_data), coarse_frame // 2)
+    if len(padded) < coarse_frame:
+        return fmin, pitch_fmax(sample_rate)
+
+    pitch, rms = coarse_pitch(padded, coarse_rate, coarse_frame, coarse_hop)
+    return pitch_range(pitch, rms, sample_rate)
+
+
+def range_frame_length(sample_rate, low, frame_length):
+    """
+    Shorten the YIN frame to the longest period the range needs.
+
+    YIN compares each frame against itself shifted by up to one period of
+    the lowest pitch, over an integration window of half the frame, so a
+    frame of twice that period suffices.
+
+    Args:
+        sample_rate (int): Number of samples per second (Hz) of the audio data.
+        low (float): Lowest frequency (Hz) to search.
+        frame_length (int): Samples per YIN frame for the full range.
+
+    Returns:
+        int: Samples per YIN frame.
+    """
+    needed = 2 * (int(np.ceil(sample_rate / low)) + 2)
+    needed = -(-needed // frame_length_multiple) * frame_length_multiple
+    return min(frame_length, needed)
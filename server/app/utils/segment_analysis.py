@@ -0,0 +1,241 @@
+################################################################################
+# Filename: segment_analysis.py
+# Purpose:  Compute the weighted median frequency of every two-beat segment.
+# Author:   Livia Chandra
+#
+# Description:
+# This file contains the spectral analysis used by wav_to_midi to pick one
+# frequency per two-beat segment of audio. segment_median_frequency analyses
+# a single segment with scipy.signal.stft. segment_median_frequencies frames
+# every segment of the signal at once, runs one batched FFT over the frames
+# and reduces all segments in a single vectorized pass, giving the same
+# result as calling segment_median_frequency on each segment in a loop.
+#
+# Usage (Optional):
+#   frequencies = segment_median_frequencies(audio_data, sample_rate, tempo)
+#
+# Notes:
+# - Each segment is analysed in isolation: frames never read samples from a
+#   neighbouring segment, exactly as when the segments are sliced apart.
+# - Segments shorter than one STFT window are analysed one at a time with
+#   segment_median_frequency, since their window size differs.
+#
+###############################################################################
+
+import numpy as np
+import scipy.fft
+import scipy.signal as signal
+from app.utils.conversion_profiles import (
+    segment_hop_length as hop_length,
+    segment_window_size as window_size,
+)
+
+# Maximum number of STFT frames transformed in one batch, which bounds the
+# memory used by the spectra of long recordings
+max_batch_frames = 1024
+
+
+def segment_length(sample_rate, tempo):
+    """
+    Helper function to calculate the number of samples in a two-beat segment.
+
+    Args:
+        sample_rate (int): Number of samples per second (Hz) of the audio data.
+        tempo (float64): Estimated tempo of the audio signal in beats per minute (BPM)
+
+    Returns:
+        int: Number of samples in each segment.
+    """
+    # Calculate the duration of one beat in seconds
+    beat_duration = 60 / tempo
+
+    return int(sample_rate * beat_duration * 2)
+
+
+def median_frequency(magnitude_spectrum, sample_rate):
+    """
+    Helper function to find the weighted median frequency of magnitude spectra.
+
+    Args:
+        magnitude_spectrum (ndarray): Magnitude spectra, one per row, or a
+                                      single 1D magnitude spectrum.
+        sample_rate (int): Number of samples per second (Hz) of the audio data.
+
+    Returns:
+        ndarray: Weighted median frequency of each magnitude spectrum.
+    """
+    # Convert to frequency domain
+    frequency_bins = np.fft.fftfreq(magnitude_spectrum.shape[-1]) * sample_rate
+
+    # Weighted median frequency
+    median_freq_index = np.argmax(
+        np.cumsum(magnitude_spectrum, axis=-1)
+        >= np.sum(magnitude_spectrum, axis=-1, keepdims=True) / 2,
+        axis=-1,
+    )
+    return frequency_bins[median_freq_index]
+
+
+def segment_median_frequency(segment, sample_rate):
+    """
+    Compute the weighted median frequency of a single segment.
+
+    Args:
+        segment (ndarray): 1D array that contains one segment of audio data.
+        sample_rate (int): Number of samples per second (Hz) of the audio data.
+
+    Returns:
+        float64: Weighted median frequency of the segment.
+    """
+    # Adjust nperseg and noverlap based on the length of the segment
+    nperseg = min(len(segment), window_size)
+    noverlap = nperseg - hop_length
+    _, _, stft = signal.stft(
+        segment, fs=sample_rate, nperseg=nperseg, noverlap=noverlap
+    )
+
+    # Sum across time axis to get magnitude spectrum
+    magnitude_spectrum = np.abs(stft).mean(axis=1)
+
+    return median_frequency(magnitude_spectrum, sample_rate)
+
+
+def segment_frame_counts(lengths):
+    """
+    Helper function to count the STFT frames of zero-padded segments.
+
+    Segments are padded with half a window of zeros on both sides and then
+    up to a whole number of hops, as scipy.signal.stft does.
+
+    Args:
+        lengths (ndarray): Number of samples in each segment.
+
+    Returns:
+        tuple: Padded length and number of frames of each segment.
+    """
+    boundary_length = lengths + 2 * (window_size // 2)
+    padded_length = boundary_length + (-(boundary_length - window_size) % hop_length)
+    frame_count = (padded_length - window_size) // hop_length + 1
+    return padded_length, frame_count
+
+
+def batch_magnitude_spectra(audio_data, starts, lengths, sample_rate):
+    """
+    Compute the mean magnitude spectrum of a batch of full-window segments.
+
+    The segments are laid out back to back in one zero-padded buffer and
+    framed with a single strided view. Frames that straddle two segments are
+    transformed along with the rest but masked out before averaging.
+
+    Args:
+        audio_data (ndarray): 1D array that contains audio signal information.
+        starts (ndarray): First sample of each segment in audio_data.
+        lengths (ndarray): Number of samples in each segment.
+        sample_rate (int): Number of samples per second (Hz) of the audio data.
+
+    Returns:
+        ndarray: Mean magnitude spectrum of each segment, one per row.
+    """
+    padded_length, frame_count = segment_frame_counts(lengths)
+    offsets = np.concatenate(([0], np.cumsum(padded_length)[:-1]))
+
+    # Copy every segment into its own zero-padded block of the buffer
+    buffer = np.zeros(int(padded_length.sum()), dtype=np.float32)
+    for start, length, offset in zip(starts, lengths, offsets):
+        block_start = offset + window_size // 2
+        buffer[block_start : block_start + length] = audio_data[start : start + length]
+
+    # Every block length is a whole number of hops, so one strided view
+    # frames all segments on a shared hop grid
+    frames = np.lib.stride_tricks.sliding_window_view(buffer, window_size)[::hop_length]
+    window = signal.get_window("hann", window_size)
+
+    # Scale by the window sum as scipy.signal.stft does, in single precision
+    # to match the spectrum it returns
+    window = (window / window.sum()).astype(np.float32)
+    magnitudes = np.abs(scipy.fft.rfft(frames * window, axis=-1))
+
+    # Keep only the frames that lie entirely inside one segment
+    first_frame = offsets // hop_length
+    frame_segment = np.zeros(len(frames), dtype=bool)
+    frame_segment[first_frame] = True
+    segment_index = np.cumsum(frame_segment) - 1
+    frame_position = np.arange(len(frames)) - first_frame[segment_index]
+    magnitudes[frame_position >= frame_count[segment_index]] = 0
+
+    # Average the frames of each segment
+    return np.add.reduceat(magnitudes, first_frame, axis=0) / frame_count[:, None]
+
+
+def segment_median_frequencies(audio_data, sample_rate, tempo):
+    """
+    Compute the weighted median frequency of every two-beat segment.
+
+    Equivalent to applying segment_median_frequency to each segment yielded
+    by divide_audio_data, but transforms all full-window segments in batches.
+
+    Args:
+        audio_data (ndarray): 1D array that contains audio signal information
+        sample_rate (int): Number of samples per second (Hz) used when loading the
+                           audio file.
+        tempo (float64): Estimated tempo of the audio signal in beats per minute (BPM)
+
+    Returns:
+        ndarray: Weighted median frequency of each segment.
+    """
+    desired_len = segment_length(sample_rate, tempo)
+    starts = np.arange(0, len(audio_data), desired_len)
+    lengths = np.minimum(desired_len, len(audio_data) - starts)
+    frequency_list = np.zeros(len(starts))
+
+    # Segments shorter than one window use a smaller STFT window
+    short_segments = np.flatnonzero(lengths < window_size)
+    for index in short_segments:
+        segment = audio_data[starts[index] : starts[index] + lengths[index]]
+        frequency_list[index] = segment_median_frequency(segment, sample_rate)
+
+    # Transform the remaining segments in batches of bounded size
+    full_segments = np.flatnonzero(lengths >= window_size)
+    _, frame_count = segment_frame_counts(lengths[full_segments])
+    batch_id = np.cumsum(frame_count) // max_batch_frames
+    for batch in np.unique(batch_id):
+        indices = full_segments[batch_id == batch]
+        magnitude_spectra = batch_magnitude_spectra(
+            audio_data, starts[indices], lengths[indices], sample_rate
+        )
+        frequency_list[indices] = median_frequency(magnitude_spectra, sample_rate)
+
+    return frequency_list
+
+
+def stream_segment_median_frequencies(blocks, sample_rate, tempo):
+    """
+    Compute the weighted median frequency of every two-beat segment of a stream.
+
+    Samples that do not yet fill a whole segment are carried over to the next
+    block, so the result matches segment_median_frequencies on the whole
+    signal while holding at most one block and one segment in memory.
+
+    Args:
+        blocks (iterable): Consecutive 1D arrays of audio data.
+        sample_rate (int): Number of samples per second (Hz) of the audio data.
+        tempo (float64): Estimated tempo of the audio signal in beats per minute (BPM)
+
+    Yields:
+        ndarray: Weighted median frequency of each segment completed by a block.
+    """
+    desired_len = segment_length(sample_rate, tempo)
+    carry = np.zeros(0, dtype=np.float32)
+
+    for block in blocks:
+        buffer = np.concatenate((carry, block))
+
+        # Analyse the whole segments and carry the rest to the next block
+        whole_length = len(buffer) // desired_len * desired_len
+        if whole_length:
+            yield segment_median_frequencies(buffer[:whole_length], sample_rate, tempo)
+        carry = buffer[whole_length:]
+
+    # The trailing segment may be shorter than the others
+    if len(carry):
+        yield segment_median_frequencies(carry, sample_rate, tempo)
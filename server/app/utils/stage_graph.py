@@ -0,0 +1,132 @@
+################################################################################
+# Filename: stage_graph.py
+# Purpose:  Run the independent stages of one conversion concurrently.
+# Author:   Livia Chandra
+#
+# Description:
+# This file contains the StageGraph class, a small executor for a graph of
+# analysis stages. Each stage names the stages whose results it needs, and
+# the graph runs every stage on a thread pool as soon as those are done.
+# The pitch and beat stages of a conversion share no data until the notes
+# are written, and their work happens in NumPy, SciPy and numba kernels that
+# release the GIL, so running them side by side shortens a single
+# conversion on a multi-core machine.
+#
+# Usage (Optional):
+#   graph = StageGraph()
+#   graph.add("beats", lambda: context.beats)
+#   graph.add("segments", lambda: context.segment_frequencies, ("beats",))
+#   results = graph.run(threads=2)
+#
+# Notes:
+# - ANALYSIS_THREADS sets the number of threads per conversion (3 by
+#   default, one per independent stage). A value of 1 runs the stages in
+#   order on the calling thread. limit_analysis_threads lowers it further
+#   for the conversions of one thread, which the thread governor uses to
+#   keep a conversion within its thread budget.
+# - Stages are submitted in dependency order and the pool hands them out
+#   in that order, so a stage that waits for its dependencies only ever
+#   waits for stages that are already running.
+#
+###############################################################################
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+# Default number of threads that run the stages of one conversion
+default_analysis_threads = 3
+
+# Upper bound on the analysis threads set for the conversions of this thread
+analysis_thread_limit = threading.local()
+
+
+def analysis_threads():
+    """
+    Read the number of threads per conversion from the environment.
+
+    Returns:
+        int: Number of threads, at least 1.
+    """
+    threads = int(os.environ.get("ANALYSIS_THREADS", default_analysis_threads))
+    limit = getattr(analysis_thread_limit, "threads", None)
+    if limit is not None:
+        threads = min(threads, limit)
+    return max(1, threads)
+
+
+@contextmanager
+def limit_analysis_threads(threads):
+    """
+    Run the conversions of this thread on at most a number of analysis threads.
+
+    Args:
+        threads (int): Maximum number of threads.
+    """
+    previous = getattr(analysis_thread_limit, "threads", None)
+    analysis_thread_limit.threads = threads
+    try:
+        yield
+    finally:
+        analysis_thread_limit.threads = previous
+
+
+class StageGraph:
+    """
+    Stages of a computation and the stages each one depends on.
+
+    Attributes:
+        stages (dict): Function and dependency names of each stage, keyed by
+                       name, in the order they were added.
+    """
+
+    def __init__(self):
+        self.stages = {}
+
+    def add(self, name, function, dependencies=()):
+        """
+        Add a stage that runs once all of its dependencies are done.
+
+        Args:
+            name (str): Name of the stage.
+            function (callable): Computes the result of the stage.
+            dependencies (tuple): Names of stages added before this one.
+        """
+        missing = [
+            dependency for dependency in dependencies if dependency not in self.stages
+        ]
+        if missing:
+            raise ValueError(f"Stage {name} depends on unknown stages {missing}")
+        self.stages[name] = (function, tuple(dependencies))
+
+    def run(self, threads=None):
+        """
+        Run every stage and wait for all of them.
+
+        Args:
+            threads (int): Number of threads, defaults to analysis_threads().
+
+        Returns:
+            dict: Result of each stage, keyed by name.
+        """
+        if threads is None:
+            threads = analysis_threads()
+        if threads <= 1 or len(self.stages) <= 1:
+            return {name: function() for name, (function, _) in self.stages.items()}
+
+        futures = {}
+
+        def run_stage(function, dependencies):
+            for dependency in dependencies:
+                futures[dependency].result()
+            return function()
+
+        # Dependencies always come first, since add only accepts known stages
+        with ThreadPoolExecutor(
+            max_workers=min(threads, len(self.stages)),
+            thread_name_prefix="analysis",
+        ) as executor:
+            for name, (function, dependencies) in self.stages.items():
+                futures[name] = executor.submit(run_stage, function, dependencies)
+            return {name: future.result() for name, future in futures.items()}
@@ -29,6 +29,7 @@ OK = 200
 CREATED = 201
 ACCEPTED = 202
 NO_CONTENT = 204
+MULTI_STATUS = 207
 
 # Client Error
 BAD_REQUEST = 400
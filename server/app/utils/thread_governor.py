@@ -0,0 +1,281 @@
+################################################################################
+# Filename: thread_governor.py
+# Purpose:  Give each conversion a share of the cores instead of all of them.
+# Author:   Livia Chandra
+#
+# Description:
+# This file contains the ThreadGovernor class, which hands out a thread
+# budget to every conversion the job queue starts. BLAS, OpenMP and numba
+# each start a thread per core in every worker process, so a pool of one
+# worker per core would otherwise run hundreds of threads on a 16-core
+# machine. The budget of a conversion is the number of cores divided by the
+# number of worker processes, so however many conversions and chunk tasks
+# run at once, the pool never runs more threads than there are cores. The
+# worker applies the budget with limit_threads: it splits it between the
+# analysis stage threads and the BLAS, OpenMP and numba pools of each
+# stage, and can pin the worker to the cores it was given.
+#
+# Usage (Optional):
+#   thread_governor.init_app(app, workers)
+#   allocation = thread_governor.acquire()
+#   with limit_threads(allocation):
+#       ...
+#   thread_governor.release(allocation)
+#
+# Notes:
+# - CONVERSION_CORES sets the number of cores to share out (or the
+#   environment variable of the same name) and defaults to the cores this
+#   process may run on. CONVERSION_CPU_AFFINITY=1 pins each conversion to
+#   the least loaded cores; it is ignored when conversions run inline, so
+#   the server process is never pinned.
+# - The budget does not grow when the pool is idle: a budget given out at
+#   acquire time cannot shrink when more conversions start, so a larger one
+#   would oversubscribe the cores in a burst of uploads. Long recordings are
+#   split into chunk tasks to use the idle workers instead.
+# - The numba limit is only set in pool worker processes, on the main
+#   thread where they run their conversions. numba.set_num_threads starts
+#   numba's threading layer, which keeps the interpreter from exiting when
+#   it was started on another thread, such as a request thread of an
+#   inline conversion, or when the process forks a pool afterwards.
+#   numba's limit is per thread anyway, and librosa's kernels are not
+#   parallel, so inline conversions lose nothing.
+# - The cores, the budget of the next conversion and the threads allocated
+#   to running conversions are exported as metrics.
+#
+###############################################################################
+
+import itertools
+import multiprocessing
+import os
+import threading
+from contextlib import contextmanager
+from app.utils.metrics import metrics
+from app.utils.stage_graph import analysis_threads, limit_analysis_threads
+
+
+def available_cpus():
+    """
+    List the cores this process may run on.
+
+    Returns:
+        list: Core IDs, in increasing order.
+    """
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+class ThreadAllocation:
+    """
+    Thread budget of one conversion, sent to the worker process with the job.
+
+    Attributes:
+        key (int): Identifies the allocation to the governor.
+        threads (int): Number of threads the conversion may run.
+        cpus (tuple): Cores to pin the worker to, or None to leave it unpinned.
+    """
+
+    def __init__(self, key, threads, cpus=None):
+        self.key = key
+        self.threads = threads
+        self.cpus = cpus
+
+    def __repr__(self):
+        """
+        Return a string representation of the ThreadAllocation object.
+        """
+        return f"<ThreadAllocation(key={self.key}, threads={self.threads}, cpus={self.cpus})>"
+
+
+class ThreadGovernor:
+    """
+    Shares the cores of the machine out between running conversions.
+
+    Attributes:
+        cpus (list): Cores the conversions run on.
+        workers (int): Number of conversion processes, 0 to convert inline.
+        affinity (bool): Whether conversions are pinned to their cores.
+        allocations (dict): Allocation of each running conversion, by key.
+    """
+
+    def __init__(self):
+        self.cpus = available_cpus()
+        self.workers = 0
+        self.affinity = False
+        self.lock = threading.Lock()
+        self.keys = itertools.count(1)
+        self.allocations = {}
+        metrics.gauge(
+            "conversion_cores",
+            "Cores shared out between conversions.",
+            lambda: len(self.cpus),
+        )
+        metrics.gauge(
+            "conversion_thread_budget",
+            "Threads the next conversion would be given.",
+            self.next_budget,
+        )
+        metrics.gauge(
+            "conversion_threads_allocated",
+            "Threads allocated to running conversions.",
+            self.allocated_threads,
+        )
+
+    def init_app(self, app, workers):
+        """
+        Read the governor settings from the application configuration.
+
+        Args:
+            app (Flask): The application the conversions run for.
+            workers (int): Number of conversion processes, 0 to convert inline.
+        """
+        cpus = available_cpus()
+        cores = app.config.get("CONVERSION_CORES", os.environ.get("CONVERSION_CORES"))
+        if cores is not None:
+            cpus = cpus[: max(1, int(cores))]
+        affinity = app.config.get(
+            "CONVERSION_CPU_AFFINITY", os.environ.get("CONVERSION_CPU_AFFINITY", "0")
+        )
+
+        with self.lock:
+            self.cpus = cpus
+            self.workers = workers
+            self.affinity = str(affinity).lower() not in ("0", "false", "no")
+        app.extensions["thread_governor"] = self
+
+    def budget(self):
+        """
+        Helper function to compute the budget of a conversion.
+
+        Must be called with the lock held.
+
+        Returns:
+            int: Number of threads, at least 1.
+        """
+        return max(1, len(self.cpus) // max(1, self.workers))
+
+    def acquire(self):
+        """
+        Allocate a thread budget to a conversion that is about to start.
+
+        Returns:
+            ThreadAllocation: The budget, to pass to the conversion and release
+                              when it finishes.
+        """
+        with self.lock:
+            threads = self.budget()
+            cpus = None
+            if self.affinity and self.workers:
+                cpus = self.least_loaded_cpus(threads)
+            allocation = ThreadAllocation(next(self.keys), threads, cpus)
+            self.allocations[allocation.key] = allocation
+        return allocation
+
+    def release(self, allocation):
+        """
+        Return the budget of a finished conversion.
+
+        Args:
+            allocation (ThreadAllocation): The budget from acquire.
+        """
+        with self.lock:
+            self.allocations.pop(allocation.key, None)
+
+    def least_loaded_cpus(self, count):
+        """
+        Helper function to pick the cores running the fewest conversions.
+
+        Must be called with the lock held.
+
+        Args:
+            count (int): Number of cores to pick.
+
+        Returns:
+            tuple: Core IDs, in increasing order.
+        """
+        load = dict.fromkeys(self.cpus, 0)
+        for allocation in self.allocations.values():
+            for cpu in allocation.cpus or ():
+                if cpu in load:
+                    load[cpu] += 1
+        least_loaded = sorted(self.cpus, key=lambda cpu: (load[cpu], cpu))[:count]
+        return tuple(sorted(least_loaded))
+
+    def next_budget(self):
+        """
+        Compute the budget the next conversion would be given.
+
+        Returns:
+            int: Number of threads.
+        """
+        with self.lock:
+            return self.budget()
+
+    def allocated_threads(self):
+        """
+        Count the threads allocated to running conversions.
+
+        Returns:
+            int: Number of threads.
+        """
+        with self.lock:
+            return sum(allocation.threads for allocation in self.allocations.values())
+
+
+def in_pool_worker():
+    """
+    Helper function to check whether this is the converting thread of a pool worker.
+
+    Returns:
+        bool: True on the main thread of a process started by multiprocessing.
+    """
+    return (
+        multiprocessing.parent_process() is not None
+        and threading.current_thread() is threading.main_thread()
+    )
+
+
+@contextmanager
+def limit_threads(allocation):
+    """
+    Run a conversion within its thread budget.
+
+    The budget is split between the analysis stage threads and the BLAS,
+    OpenMP and numba threads each stage may use, so the product of the two
+    stays within the budget. The numba limit is only set in pool workers.
+
+    Args:
+        allocation (ThreadAllocation): The budget, or None to leave the
+                                       thread pools as they are.
+    """
+    if allocation is None:
+        yield
+        return
+
+    # Imported here so that only processes that convert load them
+    import numba
+    from threadpoolctl import threadpool_limits
+
+    stage_threads = min(analysis_threads(), allocation.threads)
+    library_threads = max(1, allocation.threads // stage_threads)
+
+    previous_cpus = None
+    if allocation.cpus and hasattr(os, "sched_setaffinity"):
+        previous_cpus = os.sched_getaffinity(0)
+        os.sched_setaffinity(0, allocation.cpus)
+    previous_numba_threads = None
+    if in_pool_worker():
+        previous_numba_threads = numba.get_num_threads()
+        numba.set_num_threads(min(library_threads, numba.config.NUMBA_NUM_THREADS))
+    try:
+        with threadpool_limits(limits=library_threads):
+            with limit_analysis_threads(stage_threads):
+                yield
+    finally:
+        if previous_numba_threads is not None:
+            numba.set_num_threads(previous_numba_threads)
+        if previous_cpus is not None:
+            os.sched_setaffinity(0, previous_cpus)
+
+
+thread_governor = ThreadGovernor()
@@ -0,0 +1,215 @@
+################################################################################
+# Filename: voicing_gate.py
+# Purpose:  Find the active regions of a recording before it is analysed.
+# Author:   Livia Chandra
+#
+# Description:
+# This file contains the voicing gate that wav_to_midi runs before the pitch,
+# beat and segment stages. Phone recordings often start and end with seconds
+# of dead air, and every stage used to run over it. The gate measures the
+# RMS level of each frame from the energy of each hop, keeps the runs of
+# frames within gate_threshold_db of the loudest frame, and joins the runs
+# into active regions. Only the active regions are concatenated and
+# analysed; segment_rests maps the silence that was cut out back onto the
+# notes, so they keep their absolute timing.
+#
+# Usage (Optional):
+#   active_audio, regions = gate_audio(audio_data, sample_rate)
+#   active_length, regions = gate_in_place(shared_audio, sample_rate)
+#   rests = segment_rests(regions, segment_length, segment_count, sample_rate)
+#
+# Notes:
+# - Silences shorter than min_gap_seconds are rests within the melody and
+#   stay in the analysed audio, so beat tracking still sees them.
+# - A recording without any active region is analysed whole, as before.
+# - Run benchmarks.voicing_gate_benchmark to measure the share of audio and
+#   of conversion time the gate skips.
+#
+###############################################################################
+
+import numpy as np
+
+# Frame and hop length in samples of the RMS level, matching the onset STFT
+gate_frame_length = 2048
+gate_hop_length = 512
+
+# Frames quieter than this many dB below the loudest frame are silent
+gate_threshold_db = 40
+
+# Silences shorter than this many seconds are kept in the analysed audio
+min_gap_seconds = 1.0
+
+# Seconds of audio kept on both sides of every active region
+region_margin_seconds = 0.1
+
+# Number of samples squared or moved at a time, a multiple of gate_hop_length
+gate_block_size = 1 << 18
+
+
+def frame_rms(audio_data):
+    """
+    Measure the RMS level of centred frames from the energy of each hop.
+
+    Frames are centred on every hop boundary and span a whole number of
+    hops, so the energy of a frame is the sum of the energy of its hops.
+    The samples are squared a block at a time, so only arrays one value
+    per hop long are created for the whole recording.
+
+    Args:
+        audio_data (ndarray): 1D array that contains audio signal information.
+
+    Returns:
+        ndarray: RMS level of each frame, one every gate_hop_length samples.
+    """
+    hop_energy = np.zeros(-(-len(audio_data) // gate_hop_length))
+    for start in range(0, len(audio_data), gate_block_size):
+        squares = np.square(audio_data[start : start + gate_block_size], dtype=np.float64)
+        sums = np.add.reduceat(squares, np.arange(0, len(squares), gate_hop_length))
+        first_hop = start // gate_hop_length
+        hop_energy[first_hop : first_hop + len(sums)] = sums
+
+    # Frames reaching past either end are zero padded, as librosa does
+    frame_hops = gate_frame_length // gate_hop_length
+    padding = np.zeros(frame_hops // 2)
+    energy = np.cumsum(np.concatenate(([0.0], padding, hop_energy, padding)))
+    frame_count = len(audio_data) // gate_hop_length + 1
+    energy = energy[frame_hops : frame_hops + frame_count] - energy[:frame_count]
+    return np.sqrt(np.maximum(energy, 0.0) / gate_frame_length)
+
+
+def active_regions(audio_data, sample_rate):
+    """
+    Find the regions of a recording that contain sound.
+
+    Args:
+        audio_data (ndarray): 1D array that contains audio signal information.
+        sample_rate (int): Number of samples per second (Hz) of audio_data.
+
+    Returns:
+        list: First and past-the-end sample of each active region, in order,
+              or an empty list if the recording is silent.
+    """
+    rms = frame_rms(audio_data)
+    if len(audio_data) == 0 or rms.max() == 0:
+        return []
+
+    # Runs of frames within the threshold of the loudest frame
+    voiced = rms >= rms.max() * 10 ** (-gate_threshold_db / 20)
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], voiced.astype(np.int8), [0]))))
+    first_frames, stop_frames = edges[::2], edges[1::2]
+
+    # Samples covered by the runs, widened by the margin
+    margin = int(region_margin_seconds * sample_rate)
+    starts = np.maximum(first_frames * gate_hop_length - gate_frame_length // 2 - margin, 0)
+    stops = np.minimum(
+        (stop_frames - 1) * gate_hop_length + gate_frame_length // 2 + margin,
+        len(audio_data),
+    )
+
+    # Join regions separated by less than the shortest gap
+    min_gap = int(min_gap_seconds * sample_rate)
+    regions = []
+    for start, stop in zip(starts, stops):
+        if regions and start - regions[-1][1] < min_gap:
+            regions[-1][1] = max(regions[-1][1], int(stop))
+        else:
+            regions.append([int(start), int(stop)])
+    return [(start, stop) for start, stop in regions]
+
+
+def gate_audio(audio_data, sample_rate):
+    """
+    Keep only the active regions of a recording.
+
+    Args:
+        audio_data (ndarray): 1D array that contains audio signal information.
+        sample_rate (int): Number of samples per second (Hz) of audio_data.
+
+    Returns:
+        tuple: The active regions concatenated, and the first and
+               past-the-end sample of each region in audio_data. The audio
+               is returned unchanged if it is all active or all silent.
+    """
+    regions = active_regions(audio_data, sample_rate)
+    whole = [(0, len(audio_data))]
+    if not regions or regions == whole:
+        return audio_data, whole
+
+    return np.concatenate([audio_data[start:stop] for start, stop in regions]), regions
+
+
+def gate_in_place(audio_data, sample_rate):
+    """
+    Move the active regions of a recording to its start, without a copy.
+
+    Regions only ever move towards the start, so they are moved a block at
+    a time and no more than one block is held besides audio_data.
+
+    Args:
+        audio_data (ndarray): Writable 1D array that contains audio signal
+                              information, such as a memory map.
+        sample_rate (int): Number of samples per second (Hz) of audio_data.
+
+    Returns:
+        tuple: Number of samples the active regions fill at the start of
+               audio_data, and the regions as gate_audio returns them.
+    """
+    regions = active_regions(audio_data, sample_rate)
+    whole = [(0, len(audio_data))]
+    if not regions or regions == whole:
+        return len(audio_data), whole
+
+    active_length = 0
+    for start, stop in regions:
+        if start != active_length:
+            for block_start in range(start, stop, gate_block_size):
+                block = audio_data[block_start : min(block_start + gate_block_size, stop)]
+                offset = active_length + block_start - start
+                audio_data[offset : offset + len(block)] = block
+        active_length += stop - start
+    return active_length, regions
+
+
+def skipped_fraction(regions, sample_count):
+    """
+    Measure the share of a recording the gate cut out.
+
+    Args:
+        regions (list): First and past-the-end sample of each active region.
+        sample_count (int): Number of samples in the recording.
+
+    Returns:
+        float: Fraction of the samples outside every active region.
+    """
+    if sample_count == 0:
+        return 0.0
+    return 1 - sum(stop - start for start, stop in regions) / sample_count
+
+
+def segment_rests(regions, segment_length, segment_count, sample_rate):
+    """
+    Map the silence cut out by the gate onto the segments of the gated audio.
+
+    The silence before a region is added before the first segment that
+    starts inside it, so the notes that follow keep their absolute time.
+    Trailing silence has no segment after it and is dropped.
+
+    Args:
+        regions (list): First and past-the-end sample of each active region.
+        segment_length (int): Number of samples in each segment.
+        segment_count (int): Number of segments of the gated audio.
+        sample_rate (int): Number of samples per second (Hz) of the audio.
+
+    Returns:
+        ndarray: Seconds of silence before each segment.
+    """
+    rests = np.zeros(segment_count)
+    offset = 0
+    previous_stop = 0
+    for start, stop in regions:
+        segment = -(-offset // segment_length)
+        if segment < segment_count:
+            rests[segment] += (start - previous_stop) / sample_rate
+        offset += stop - start
+        previous_stop = stop
+    return rests
@@ -0,0 +1,174 @@
+################################################################################
+# Filename: warmup.py
+# Purpose:  Compile the analysis kernels before the first conversion request.
+# Author:   Livia Chandra
+#
+# Description:
+# This file contains the Warmup class, which runs the analysis pipeline of
+# every conversion profile on a short synthetic melody when the server
+# starts. librosa compiles its numba kernels the first time they are called,
+# which otherwise adds several seconds to the first conversion after a
+# restart. Compiled kernels are written to the numba cache directory, so
+# later restarts and worker processes load them from disk instead of
+# compiling them again. The ready flag only turns on once warm-up finishes.
+#
+# Usage (Optional):
+#   warmup.init_app(app)
+#   warmup.wait()
+#   warmup.status()
+#
+# Notes:
+# - The numba cache directory is set with the NUMBA_CACHE_DIR environment
+#   variable. It must be set before librosa is imported, so the app package
+#   defaults it to numba_cache in the server directory before importing
+#   anything else.
+# - Warm-up runs on a background thread unless the WARMUP setting (or the
+#   environment variable of the same name) is "0", in which case the server
+#   is ready straight away.
+# - When conversions run in a pool of worker processes, each worker warms
+#   up as it starts and the server process does not convert, so the server
+#   process skips its own warm-up and is ready straight away.
+#
+###############################################################################
+
+import os
+import threading
+import time
+import numpy as np
+from app.utils.conversion_profiles import profiles
+
+# Synthetic warm-up melody: decaying notes, one every half second, so that
+# the beat tracker finds a tempo
+warmup_frequencies = (220.0, 246.94, 261.63, 293.66, 329.63, 293.66, 261.63, 246.94)
+warmup_note_seconds = 0.5
+warmup_decay_seconds = 0.15
+
+
+def warmup_signal(sample_rate):
+    """
+    Synthesise the warm-up melody.
+
+    Args:
+        sample_rate (int): Number of samples per second (Hz).
+
+    Returns:
+        ndarray: 1D float32 array of audio data.
+    """
+    note_length = int(warmup_note_seconds * sample_rate)
+    frequency = np.repeat(warmup_frequencies, note_length)
+    envelope = np.tile(
+        np.exp(-np.arange(note_length) / (warmup_decay_seconds * sample_rate)),
+        len(warmup_frequencies),
+    )
+    phase = 2 * np.pi * np.cumsum(frequency) / sample_rate
+    return (0.3 * envelope * np.sin(phase)).astype(np.float32)
+
+
+def warm_up_pipeline():
+    """
+    Run every analysis stage of every conversion profile once.
+
+    Returns:
+        bool: True if every profile ran, False if one of them failed.
+    """
+    try:
+        # Imported here, off the request path, so that importing librosa is
+        # part of the warm-up rather than of booting the API
+        from app.utils.analysis_context import AnalysisContext
+        from app.utils.conversion import create_midi_track
+
+        for profile in profiles.values():
+            audio_data = warmup_signal(profile.sample_rate)
+            context = AnalysisContext(
+                audio_data,
+                profile.sample_rate,
+                profile.yin_frame_length,
+                profile.yin_hop_length,
+                profile.pitch_search,
+            )
+            tempo, _ = context.beats
+            context.beat_times
+            context.segment_frequencies
+            create_midi_track(context.key_signature, tempo)
+    except Exception as e:
+        print("An error occurred during warm-up:", e)
+        return False
+    return True
+
+
+class Warmup:
+    """
+    Background warm-up of the analysis pipeline with a readiness flag.
+
+    Attributes:
+        enabled (bool): Whether init_app starts a warm-up.
+        ready (Event): Set once warm-up has finished.
+        seconds (float): Time the warm-up took.
+        succeeded (bool): Whether every profile warmed up without error.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.ready = threading.Event()
+        self.seconds = None
+        self.succeeded = None
+        self.thread = None
+
+    def init_app(self, app, workers=0):
+        """
+        Read the warm-up setting and start warming up in the background.
+
+        Args:
+            app (Flask): The application to warm up for.
+            workers (int): Number of conversion processes, 0 if conversions
+                           run in the server process.
+        """
+        self.enabled = str(
+            app.config.get("WARMUP", os.environ.get("WARMUP", "1"))
+        ).lower() not in ("0", "false", "no")
+        app.extensions["warmup"] = self
+
+        if not self.enabled or workers > 0:
+            self.ready.set()
+        elif self.thread is None and not self.ready.is_set():
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+
+    def run(self):
+        """
+        Warm up the pipeline and set the ready flag.
+        """
+        start = time.perf_counter()
+        self.succeeded = warm_up_pipeline()
+        self.seconds = time.perf_counter() - start
+        self.ready.set()
+
+    def wait(self, timeout=None):
+        """
+        Block until warm-up has finished.
+
+        Args:
+            timeout (float): Seconds to wait at most, or None to wait forever.
+
+        Returns:
+            bool: Whether the server is ready.
+        """
+        return self.ready.wait(timeout)
+
+    def status(self):
+        """
+        Report whether warm-up has finished and how it went.
+
+        Returns:
+            dict: Readiness, warm-up time and outcome, and the numba cache directory.
+        """
+        return {
+            "ready": self.ready.is_set(),
+            "warmup": self.enabled,
+            "seconds": self.seconds,
+            "succeeded": self.succeeded,
+            "jit_cache_dir": os.environ.get("NUMBA_CACHE_DIR"),
+        }
+
+
+warmup = Warmup()
@@ -0,0 +1,237 @@
+################################################################################
+# Filename: wav_mapping.py
+# Purpose:  Read the PCM data of WAV files through a memory map.
+# Author:   Livia Chandra
+#
+# Description:
+# This file contains the WAV fast path of decode_audio and stream_audio.
+# When an upload is a mono WAV file already at the analysis sample rate,
+# there is nothing for ffmpeg to resample or downmix, so the data chunk is
+# memory-mapped and read as a NumPy array instead of being piped through
+# ffmpeg. Float32 data is returned as a view of the mapped file without any
+# copy; other sample formats are converted to float32 in one pass of
+# fixed-size blocks, so peak memory is about one float32 copy of the audio.
+#
+# Usage (Optional):
+#   mapped = map_wav(audio_file, 22050)
+#   if mapped is not None:
+#       audio_data = wav_samples(mapped)
+#
+# Notes:
+# - 16 and 32-bit integer and 32 and 64-bit float WAV files are read,
+#   including WAVE_FORMAT_EXTENSIBLE ones. Other formats and sample rates
+#   are left to ffmpeg, so the resampler of the conversion profile applies.
+# - Files with several channels are left to ffmpeg too. Its downmix weights
+#   depend on the channel layout and have changed between releases, so a
+#   downmix here would decode the same file differently on the two paths.
+# - Integer samples are scaled to [-1, 1) the way ffmpeg converts them, so
+#   files decode to the same samples on both paths.
+#
+###############################################################################
+
+import os
+import struct
+import numpy as np
+
+# WAVE format tags
+wave_format_pcm = 1
+wave_format_float = 3
+wave_format_extensible = 0xFFFE
+
+# Sample formats the fast path reads, keyed by format tag and bits per sample
+wav_dtypes = {
+    (wave_format_pcm, 16): np.dtype("<i2"),
+    (wave_format_pcm, 32): np.dtype("<i4"),
+    (wave_format_float, 32): np.dtype("<f4"),
+    (wave_format_float, 64): np.dtype("<f8"),
+}
+
+# Number of frames converted at a time
+conversion_block_size = 1 << 16
+
+
+class WavHeader:
+    """
+    Layout of the PCM data in a WAV file.
+
+    Attributes:
+        dtype (dtype): Type of one sample.
+        channels (int): Number of interleaved channels.
+        sample_rate (int): Number of frames per second (Hz).
+        data_offset (int): Position of the first sample in the file.
+        frame_count (int): Number of whole frames in the data chunk.
+    """
+
+    def __init__(self, dtype, channels, sample_rate, data_offset, frame_count):
+        self.dtype = dtype
+        self.channels = channels
+        self.sample_rate = sample_rate
+        self.data_offset = data_offset
+        self.frame_count = frame_count
+
+    def __repr__(self):
+        """
+        Return a string representation of the WavHeader object.
+        """
+        return f"<WavHeader(dtype='{self.dtype}', channels={self.channels}, sample_rate={self.sample_rate}, frame_count={self.frame_count})>"
+
+
+def parse_format(fmt):
+    """
+    Helper function to find the sample type described by a fmt chunk.
+
+    Args:
+        fmt (bytes): Content of the fmt chunk.
+
+    Returns:
+        tuple: Sample type, channel count and sample rate, or None if the
+               fast path cannot read the format.
+    """
+    if len(fmt) < 16:
+        return None
+    format_tag, channels, sample_rate, _, block_align, bits = struct.unpack(
+        "<HHIIHH", fmt[:16]
+    )
+
+    # The format tag of an extensible file is the start of its subformat GUID
+    if format_tag == wave_format_extensible:
+        if len(fmt) < 26:
+            return None
+        format_tag = struct.unpack("<H", fmt[24:26])[0]
+
+    dtype = wav_dtypes.get((format_tag, bits))
+    if dtype is None or channels == 0 or block_align != channels * dtype.itemsize:
+        return None
+    return dtype, channels, sample_rate
+
+
+def read_wav_header(audio_file):
+    """
+    Locate the PCM data of a WAV file.
+
+    Args:
+        audio_file (str): The path to the audio file.
+
+    Returns:
+        WavHeader: Layout of the data, or None if the file is not a WAV
+                   file the fast path can read.
+    """
+    try:
+        with open(audio_file, "rb") as wav_file:
+            riff = wav_file.read(12)
+            if len(riff) < 12 or riff[:4] != b"RIFF" or riff[8:12] != b"WAVE":
+                return None
+
+            # Walk the chunks up to the data chunk
+            sample_format = None
+            while True:
+                chunk_header = wav_file.read(8)
+                if len(chunk_header) < 8:
+                    return None
+                chunk_id, chunk_size = struct.unpack("<4sI", chunk_header)
+                if chunk_id == b"data":
+                    break
+                if chunk_id == b"fmt ":
+                    sample_format = parse_format(wav_file.read(chunk_size))
+                else:
+                    wav_file.seek(chunk_size, os.SEEK_CUR)
+
+                # Chunks are padded to an even length
+                if chunk_size % 2:
+                    wav_file.seek(1, os.SEEK_CUR)
+
+            data_offset = wav_file.tell()
+            file_size = os.fstat(wav_file.fileno()).st_size
+    except OSError as e:
+        print("An error occurred during WAV header parsing:", e)
+        return None
+
+    if sample_format is None:
+        return None
+    dtype, channels, sample_rate = sample_format
+
+    # Streamed WAV files may leave the data size at 0 or the maximum
+    data_size = file_size - data_offset
+    if 0 < chunk_size < data_size:
+        data_size = chunk_size
+    frame_count = data_size // (channels * dtype.itemsize)
+
+    return WavHeader(dtype, channels, sample_rate, data_offset, frame_count)
+
+
+def map_wav(audio_file, sample_rate):
+    """
+    Memory-map the PCM data of a mono WAV file that is already at a sample rate.
+
+    Args:
+        audio_file (str): The path to the audio file.
+        sample_rate (int): Sample rate (Hz) the audio is needed at.
+
+    Returns:
+        ndarray: Read-only array of frames by channels backed by the file,
+                 or None if the file needs ffmpeg to decode, downmix or
+                 resample it.
+    """
+    if os.path.splitext(audio_file)[1].lower() != ".wav":
+        return None
+    header = read_wav_header(audio_file)
+    if header is None or header.channels != 1 or header.sample_rate != sample_rate:
+        return None
+
+    if header.frame_count == 0:
+        return np.zeros((0, header.channels), dtype=header.dtype)
+
+    # A plain ndarray view, so that results computed from it are not memmaps
+    return np.asarray(
+        np.memmap(
+            audio_file,
+            dtype=header.dtype,
+            mode="r",
+            offset=header.data_offset,
+            shape=(header.frame_count, header.channels),
+        )
+    )
+
+
+def frames_to_mono(frames):
+    """
+    Convert mono frames of any supported sample type to float32.
+
+    Args:
+        frames (ndarray): Array of frames by one channel.
+
+    Returns:
+        ndarray: 1D float32 array, a view of frames when they are already
+                 float32.
+    """
+    if frames.dtype == np.float32:
+        return frames[:, 0]
+
+    samples = frames[:, 0].astype(np.float32)
+    if frames.dtype.kind == "i":
+        # Scale integers by 2 ** (1 - bits), as ffmpeg does
+        samples *= np.float32(2.0 ** (1 - 8 * frames.dtype.itemsize))
+    return samples
+
+
+def wav_samples(mapped):
+    """
+    Read a memory-mapped WAV file as mono float32 samples.
+
+    Args:
+        mapped (ndarray): Array of frames by channels, from map_wav.
+
+    Returns:
+        ndarray: 1D float32 array of the samples, without a copy for float32
+                 files.
+    """
+    if mapped.dtype == np.float32:
+        return mapped[:, 0]
+
+    # Convert block by block into the output, so that no temporary array
+    # of the whole recording is created
+    audio_data = np.empty(len(mapped), dtype=np.float32)
+    for start in range(0, len(mapped), conversion_block_size):
+        stop = start + conversion_block_size
+        audio_data[start:stop] = frames_to_mono(mapped[start:stop])
+    return audio_data
@@ -0,0 +1,159 @@
+################################################################################
+# Filename: backfill_musicxml.py
+# Purpose:  Store the MusicXML of MIDI entries created before it was persisted.
+# Author:   Benjamin Goh
+#
+# Description:
+# This script adds the xml_data and version columns to the midis table of an
+# existing database if they are missing, then renders the MusicXML of every MIDI entry
+# that has none and stores it, so that GET /api/v1/midis/<id> can serve it
+# straight from the database.
+#
+# Usage (Optional):
+# Run from the server directory with the same DATABASE_URL as the server:
+#   python backfill_musicxml.py [--batch-size N]
+#
+# Notes:
+# - The script can be stopped and run again; it only renders entries whose
+#   xml_data is still empty.
+# - Entries whose MIDI data cannot be rendered are reported and left empty.
+#
+###############################################################################
+
+import argparse
+import os
+import sys
+from sqlalchemy import LargeBinary, inspect, text
+from app.database import db
+from app.models.midi_model import MIDI
+
+# Number of entries rendered and committed together
+default_batch_size = 50
+
+
+def add_xml_column():
+    """
+    Add the xml_data column to the midis table if it does not exist yet.
+
+    Must be called inside an application context.
+
+    Returns:
+        bool: True if the column was added.
+    """
+    columns = [column["name"] for column in inspect(db.engine).get_columns("midis")]
+    if "xml_data" in columns:
+        return False
+
+    # LONGBLOB as in database/init.sql, since a MySQL BLOB holds only 64 KB
+    if db.engine.dialect.name == "mysql":
+        column_type = "LONGBLOB"
+    else:
+        column_type = LargeBinary().compile(dialect=db.engine.dialect)
+    with db.engine.begin() as connection:
+        connection.execute(
+            text(f"ALTER TABLE midis ADD COLUMN xml_data {column_type} NULL")
+        )
+    return True
+
+
+def add_version_column():
+    """
+    Add the version column to the midis table if it does not exist yet.
+
+    Existing entries start at version 1. Must be called inside an
+    application context.
+
+    Returns:
+        bool: True if the column was added.
+    """
+    columns = [column["name"] for column in inspect(db.engine).get_columns("midis")]
+    if "version" in columns:
+        return False
+
+    with db.engine.begin() as connection:
+        connection.execute(
+            text("ALTER TABLE midis ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+        )
+    return True
+
+
+def backfill_musicxml(batch_size=default_batch_size):
+    """
+    Render and store the MusicXML of every MIDI entry that has none.
+
+    Must be called inside an application context.
+
+    Args:
+        batch_size (int): Number of entries rendered and committed together.
+
+    Returns:
+        tuple: Number of entries filled in and number that failed.
+    """
+    # Imported here so that the MIDI parser only loads when there is work
+    from app.utils.midi_to_musicxml import midi_to_musicxml
+
+    filled = 0
+    failed = 0
+    last_id = 0
+    while True:
+        midis = (
+            MIDI.query.filter(MIDI.xml_data.is_(None), MIDI.midi_id > last_id)
+            .order_by(MIDI.midi_id)
+            .limit(batch_size)
+            .all()
+        )
+        if not midis:
+            break
+
+        for midi in midis:
+            try:
+                midi.xml_data = midi_to_musicxml(midi.midi_data)
+                filled += 1
+            except Exception as e:
+                print(
+                    "An error occurred during MusicXML backfill of MIDI",
+                    midi.midi_id,
+                    ":",
+                    e,
+                )
+                failed += 1
+        last_id = midis[-1].midi_id
+        db.session.commit()
+
+        # Release the rendered entries before loading the next batch
+        db.session.expunge_all()
+        print(f"Filled in {filled} MIDI entries, up to ID {last_id}")
+
+    return filled, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Store the MusicXML of MIDI entries that have none."
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=default_batch_size,
+        help="entries rendered and committed together",
+    )
+    args = parser.parse_args()
+
+    # The script converts no recordings, so skip the pipeline warm-up
+    os.environ.setdefault("WARMUP", "0")
+    from app import create_app
+
+    app = create_app()
+    with app.app_context():
+        if add_xml_column():
+            print("Added the xml_data column to the midis table")
+        if add_version_column():
+            print("Added the version column to the midis table")
+        filled, failed = backfill_musicxml(args.batch_size)
+
+    print(f"Done: {filled} filled in, {failed} failed")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,450 @@
+################################################################################
+# Filename: batch_convert.py
+# Purpose:  Convert a directory tree of recordings to MIDI and MusicXML.
+# Author:   Livia Chandra
+#
+# Description:
+# This script converts every recording under a directory with the same
+# pipeline as the API, spread over a pool of worker processes. The MIDI and
+# MusicXML of each recording are written to an output directory that mirrors
+# the input tree, and each finished file is appended to a manifest, so a run
+# that stops part way can be started again and skips the files it already
+# converted. The results can also be inserted into the database in batches.
+#
+# Usage (Optional):
+# Run from the server directory:
+#   python batch_convert.py INPUT_DIR OUTPUT_DIR [--workers N] [--profile P]
+#                           [--database] [--batch-size N]
+#
+# Notes:
+# - The manifest is a JSON Lines file, OUTPUT_DIR/manifest.jsonl by default.
+#   A file is skipped when the manifest records it as converted with the same
+#   size and modification time; failed files are tried again.
+# - Each worker converts one recording at a time, so throughput grows with the
+#   number of workers up to the number of cores. Every conversion runs its
+#   BLAS, OpenMP, numba and analysis threads within an equal share of the
+#   cores, so the workers do not oversubscribe them. --workers 0 converts
+#   the recordings one at a time in the script's own process.
+# - --database stores every result as a MIDI entry of one import user, using
+#   DATABASE_URL as the server does. Converted files that the manifest does
+#   not yet link to a MIDI entry are inserted on the next run.
+#
+###############################################################################
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from app.utils.conversion_profiles import default_profile, get_profile
+from app.utils.job_queue import convert_job
+from app.utils.thread_governor import ThreadAllocation, available_cpus
+from app.utils.warmup import warm_up_pipeline
+
+# Extensions of the recordings that are converted
+audio_extensions = {".wav", ".mp3", ".m4a", ".webm"}
+
+# Default manifest file name, in the output directory
+manifest_name = "manifest.jsonl"
+
+# Default number of results inserted into the database together
+default_batch_size = 50
+
+# Name and email of the user batch imports are stored under
+import_name = "Batch import"
+import_email = "batch-import@melodymapper"
+
+
+def find_recordings(input_dir):
+    """
+    List the recordings in a directory tree.
+
+    Args:
+        input_dir (str): The directory to search.
+
+    Returns:
+        list: Paths of the recordings relative to input_dir, sorted.
+    """
+    recordings = []
+    for directory, _, file_names in os.walk(input_dir):
+        for file_name in file_names:
+            if os.path.splitext(file_name)[1].lower() in audio_extensions:
+                path = os.path.join(directory, file_name)
+                recordings.append(os.path.relpath(path, input_dir))
+    return sorted(recordings)
+
+
+def file_signature(path):
+    """
+    Helper function to identify the version of a file.
+
+    Args:
+        path (str): The path to the file.
+
+    Returns:
+        dict: Size in bytes and modification time in nanoseconds.
+    """
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def read_manifest(manifest_path):
+    """
+    Read the latest record of every file in a manifest.
+
+    Args:
+        manifest_path (str): The path to the manifest.
+
+    Returns:
+        dict: Latest record of each recording, keyed by relative path.
+    """
+    records = {}
+    if not os.path.exists(manifest_path):
+        return records
+    with open(manifest_path) as manifest_file:
+        for line in manifest_file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A line cut short by a crash
+                continue
+            records[record["path"]] = {**records.get(record["path"], {}), **record}
+    return records
+
+
+def append_manifest(manifest_file, record):
+    """
+    Append a record to the manifest and flush it to disk.
+
+    Args:
+        manifest_file (file): The manifest, opened for appending.
+        record (dict): The record to append.
+    """
+    manifest_file.write(json.dumps(record, sort_keys=True) + "\n")
+    manifest_file.flush()
+    os.fsync(manifest_file.fileno())
+
+
+def write_output(path, data):
+    """
+    Helper function to write a file without leaving a partial file behind.
+
+    Args:
+        path (str): The path to write.
+        data (bytes): Content of the file.
+    """
+    partial_path = path + ".partial"
+    with open(partial_path, "wb") as output_file:
+        output_file.write(data)
+    os.replace(partial_path, path)
+
+
+def convert_file(audio_path, output_base, profile, allocation=None):
+    """
+    Convert one recording and write its MIDI and MusicXML, inside a worker.
+
+    Args:
+        audio_path (str): The path to the recording.
+        output_base (str): Path of the output files, without extension.
+        profile (str): Name of the conversion profile.
+        allocation (ThreadAllocation): Thread budget of the conversion.
+
+    Returns:
+        tuple: Content of the MIDI and MusicXML files.
+    """
+    midi_data, xml_data, _ = convert_job(audio_path, profile, allocation)
+    os.makedirs(os.path.dirname(output_base), exist_ok=True)
+    write_output(output_base + ".mid", midi_data)
+    write_output(output_base + ".musicxml", xml_data)
+    return midi_data, xml_data
+
+
+def insert_results(results):
+    """
+    Store converted recordings as MIDI entries of the import user.
+
+    Must be called inside an application context.
+
+    Args:
+        results (list): Title, MIDI and MusicXML content of each recording.
+
+    Returns:
+        list: IDs of the new MIDI entries, in the order of results.
+    """
+    from app.database import db
+    from app.models.midi_model import MIDI
+    from app.models.user_model import User
+    from app.utils.isodate_converter import DateConverter
+
+    user = User.query.filter_by(name=import_name, email=import_email).first()
+    if user is None:
+        user = User(name=import_name, email=import_email)
+        db.session.add(user)
+        db.session.flush()
+
+    midis = [
+        MIDI(
+            user_id=user.user_id,
+            title=title,
+            midi_data=midi_data,
+            xml_data=xml_data,
+            date=DateConverter.current_time(),
+        )
+        for title, midi_data, xml_data in results
+    ]
+    db.session.add_all(midis)
+    db.session.commit()
+    return [midi.midi_id for midi in midis]
+
+
+class Progress:
+    """
+    Progress line printed as recordings finish.
+
+    Attributes:
+        total (int): Number of recordings to convert.
+        done (int): Number of recordings finished so far.
+    """
+
+    def __init__(self, total):
+        self.total = total
+        self.done = 0
+        self.start = time.perf_counter()
+
+    def update(self, path, status):
+        """
+        Count a finished recording and print the progress.
+
+        Args:
+            path (str): Relative path of the recording.
+            status (str): "converted" or "failed".
+        """
+        self.done += 1
+        elapsed = time.perf_counter() - self.start
+        rate = self.done / elapsed if elapsed else 0.0
+        remaining = (self.total - self.done) / rate if rate else 0.0
+        print(
+            f"[{self.done}/{self.total}] {status} {path} "
+            f"({rate:.2f} files/s, {remaining:.0f} s left)",
+            file=sys.stderr,
+            flush=True,
+        )
+
+
+def batch_convert(
+    input_dir,
+    output_dir,
+    workers=None,
+    profile=default_profile,
+    manifest_path=None,
+    app=None,
+    batch_size=default_batch_size,
+):
+    """
+    Convert every recording under a directory that the manifest does not list as converted.
+
+    Args:
+        input_dir (str): The directory of recordings.
+        output_dir (str): The directory the MIDI and MusicXML files are written to.
+        workers (int): Number of worker processes, defaults to the CPU count,
+                       or 0 to convert inline.
+        profile (str): Name of the conversion profile.
+        manifest_path (str): The manifest, defaults to manifest.jsonl in output_dir.
+        app (Flask): Application whose database the results are inserted
+                     into, or None to only write files.
+        batch_size (int): Number of results inserted into the database together.
+
+    Returns:
+        dict: Number of recordings converted, skipped, failed and inserted.
+    """
+    if manifest_path is None:
+        manifest_path = os.path.join(output_dir, manifest_name)
+    os.makedirs(output_dir, exist_ok=True)
+    records = read_manifest(manifest_path)
+    summary = {"converted": 0, "skipped": 0, "failed": 0, "inserted": 0}
+
+    pending = []
+    uninserted = []
+    for path in find_recordings(input_dir):
+        record = records.get(path, {})
+        signature = file_signature(os.path.join(input_dir, path))
+        if record.get("status") == "converted" and all(
+            record.get(name) == value for name, value in signature.items()
+        ):
+            summary["skipped"] += 1
+            if app is not None and record.get("midi_id") is None:
+                uninserted.append(path)
+        else:
+            pending.append((path, signature))
+
+    with open(manifest_path, "a") as manifest_file:
+        batch = []
+
+        def flush_batch():
+            # Insert the batch, then link its files to their MIDI entries
+            with app.app_context():
+                midi_ids = insert_results([result for _, result in batch])
+            for (path, _), midi_id in zip(batch, midi_ids):
+                append_manifest(manifest_file, {"path": path, "midi_id": midi_id})
+            summary["inserted"] += len(batch)
+            batch.clear()
+
+        def add_result(path, midi_data, xml_data):
+            if app is None:
+                return
+            title = os.path.splitext(os.path.basename(path))[0]
+            batch.append((path, (title, midi_data, xml_data)))
+            if len(batch) >= batch_size:
+                flush_batch()
+
+        def finish(path, signature, start, result):
+            # Record the outcome of a conversion, from a callable that
+            # returns its MIDI and MusicXML or raises its error
+            try:
+                midi_data, xml_data = result()
+            except Exception as e:
+                error = e
+            else:
+                error = None
+            record = {
+                "path": path,
+                **signature,
+                "seconds": round(time.perf_counter() - start, 3),
+                "midi_id": None,
+            }
+            if error is not None:
+                print("An error occurred during conversion of", path, ":", error)
+                append_manifest(
+                    manifest_file, {**record, "status": "failed", "error": str(error)}
+                )
+                summary["failed"] += 1
+                progress.update(path, "failed")
+                return
+
+            append_manifest(manifest_file, {**record, "status": "converted"})
+            summary["converted"] += 1
+            progress.update(path, "converted")
+            add_result(path, midi_data, xml_data)
+
+        def job_args(path):
+            return (
+                os.path.abspath(os.path.join(input_dir, path)),
+                os.path.join(output_dir, os.path.splitext(path)[0]),
+                profile,
+            )
+
+        # Results converted by an earlier run that never reached the database
+        for path in uninserted:
+            output_base = os.path.join(output_dir, os.path.splitext(path)[0])
+            try:
+                with open(output_base + ".mid", "rb") as midi_file:
+                    midi_data = midi_file.read()
+                with open(output_base + ".musicxml", "rb") as xml_file:
+                    xml_data = xml_file.read()
+            except OSError as e:
+                print("An error occurred during reading of", path, ":", e)
+                continue
+            add_result(path, midi_data, xml_data)
+
+        progress = Progress(len(pending))
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if workers == 0:
+            # Without a pool the recordings are converted one at a time with
+            # every core
+            allocation = ThreadAllocation(0, len(available_cpus()))
+            for path, signature in pending:
+                finish(
+                    path,
+                    signature,
+                    time.perf_counter(),
+                    lambda: convert_file(*job_args(path), allocation),
+                )
+        else:
+            allocation = ThreadAllocation(0, max(1, len(available_cpus()) // workers))
+            with ProcessPoolExecutor(
+                max_workers=workers, initializer=warm_up_pipeline
+            ) as executor:
+                # Keep a bounded number of recordings in flight, so that a
+                # large archive does not queue every result in memory at once
+                queue = iter(pending)
+                futures = {}
+                while True:
+                    while len(futures) < 2 * workers:
+                        item = next(queue, None)
+                        if item is None:
+                            break
+                        path, signature = item
+                        future = executor.submit(
+                            convert_file, *job_args(path), allocation
+                        )
+                        futures[future] = (path, signature, time.perf_counter())
+                    if not futures:
+                        break
+
+                    done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        path, signature, start = futures.pop(future)
+                        finish(path, signature, start, future.result)
+
+        if batch:
+            flush_batch()
+
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert a directory tree of recordings to MIDI and MusicXML."
+    )
+    parser.add_argument("input_dir", help="directory of recordings")
+    parser.add_argument("output_dir", help="directory to write the results to")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="worker processes, defaults to the CPU count, 0 converts inline",
+    )
+    parser.add_argument("--profile", default=default_profile, help="conversion profile")
+    parser.add_argument("--manifest", help="manifest file, in OUTPUT_DIR by default")
+    parser.add_argument(
+        "--database", action="store_true", help="insert the results into the database"
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=default_batch_size,
+        help="results inserted into the database together",
+    )
+    args = parser.parse_args()
+
+    if get_profile(args.profile) is None:
+        print("Unknown conversion profile:", args.profile)
+        sys.exit(2)
+
+    app = None
+    if args.database:
+        # The workers warm up on their own, so skip the server warm-up
+        os.environ.setdefault("WARMUP", "0")
+        from app import create_app
+
+        app = create_app()
+
+    summary = batch_convert(
+        args.input_dir,
+        args.output_dir,
+        args.workers,
+        args.profile,
+        args.manifest,
+        app,
+        args.batch_size,
+    )
+    print(
+        f"Done: {summary['converted']} converted, {summary['skipped']} skipped, "
+        f"{summary['failed']} failed, {summary['inserted']} inserted"
+    )
+    sys.exit(1 if summary["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+################################################################################
+# Filename: batch_convert_benchmark.py
+# Purpose:  Measure how batch conversion throughput scales with workers.
+# Author:   Livia Chandra
+#
+# Description:
+# This script writes a directory of synthetic recordings, hummed melodies of
+# equal length, and converts it with batch_convert inline and then with
+# process pools of increasing size, each into a fresh output directory. It
+# reports the wall time, the throughput in files per second, the speedup
+# over the inline run and the parallel efficiency of each pool.
+#
+# Usage (Optional):
+# Run from the server directory:
+#   python -m benchmarks.batch_convert_benchmark [--files N] [--seconds S]
+#                                                [--workers 1 2 4]
+#
+# Notes:
+# - Each pooled run includes starting and warming up its workers, as a real
+#   batch run does. The inline run is warmed up before it is timed.
+# - The speedup is bounded by the number of cores the script may use, which
+#   is printed with the results.
+#
+###############################################################################
+
+import argparse
+import os
+import tempfile
+import time
+import soundfile
+from batch_convert import batch_convert
+from app.utils.conversion_profiles import get_profile
+from app.utils.thread_governor import available_cpus
+from app.utils.warmup import warm_up_pipeline
+from benchmarks.synthetic_audio import hummed_melody, melody_frequencies
+
+
+def write_recordings(input_dir, files, seconds, sample_rate):
+    """
+    Write a directory of hummed melodies, one seed per file.
+
+    Args:
+        input_dir (str): The directory to write the recordings to.
+        files (int): Number of recordings.
+        seconds (float): Length of each recording in seconds.
+        sample_rate (int): Number of samples per second (Hz).
+    """
+    for seed in range(files):
+        frequencies = melody_frequencies(seconds, sample_rate, 100, seed, 45, 72)
+        soundfile.write(
+            os.path.join(input_dir, f"take{seed:03d}.wav"),
+            hummed_melody(frequencies, sample_rate, 6, seed),
+            sample_rate,
+            subtype="FLOAT",
+        )
+
+
+def timed_run(input_dir, output_dir, workers, profile):
+    """
+    Helper function to convert the recordings once and time it.
+
+    Args:
+        input_dir (str): The directory of recordings.
+        output_dir (str): A fresh directory for the results.
+        workers (int): Number of worker processes, 0 to convert inline.
+        profile (str): Name of the conversion profile.
+
+    Returns:
+        float: Wall time of the run in seconds.
+    """
+    start = time.perf_counter()
+    summary = batch_convert(input_dir, output_dir, workers, profile)
+    elapsed = time.perf_counter() - start
+    assert summary["failed"] == 0, "a recording failed to convert"
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure how batch conversion throughput scales with workers."
+    )
+    parser.add_argument("--files", type=int, default=16, help="number of recordings")
+    parser.add_argument(
+        "--seconds", type=float, default=20, help="length of each recording"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        nargs="+",
+        default=[1, 2, 4, os.cpu_count() or 1],
+        help="pool sizes to time",
+    )
+    parser.add_argument("--profile", default="default", help="conversion profile")
+    args = parser.parse_args()
+
+    profile = get_profile(args.profile)
+    if profile is None:
+        return
+
+    with tempfile.TemporaryDirectory() as work_directory:
+        input_dir = os.path.join(work_directory, "recordings")
+        os.makedirs(input_dir)
+        write_recordings(input_dir, args.files, args.seconds, profile.sample_rate)
+
+        warm_up_pipeline()
+        inline_time = timed_run(
+            input_dir, os.path.join(work_directory, "inline"), 0, profile.name
+        )
+
+        print(f"{len(available_cpus())} cores, {args.files} files of {args.seconds:g} s")
+        print(
+            f"{'workers':>8}{'time (s)':>10}{'files/s':>10}"
+            f"{'speedup':>10}{'efficiency':>12}"
+        )
+        print(
+            f"{'inline':>8}{inline_time:>10.1f}{args.files / inline_time:>10.2f}"
+            f"{1:>9.2f}x{100:>11.0f}%"
+        )
+        for workers in sorted(set(args.workers)):
+            pool_time = timed_run(
+                input_dir,
+                os.path.join(work_directory, f"pool{workers}"),
+                workers,
+                profile.name,
+            )
+            speedup = inline_time / pool_time
+            print(
+                f"{workers:>8}{pool_time:>10.1f}{args.files / pool_time:>10.2f}"
+                f"{speedup:>9.2f}x{speedup / workers * 100:>11.0f}%"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+################################################################################
+# Filename: chunked_benchmark.py
+# Purpose:  Measure how chunked conversion of a long recording scales with cores.
+# Author:   Livia Chandra
+#
+# Description:
+# This script converts one long synthetic recording, hummed phrases with
+# short pauses between them, once whole in a single worker and then with
+# convert_chunked on process pools of increasing size. It reports the wall
+# time, the speedup over the single worker and the parallel efficiency of
+# each pool, and checks that every chunked conversion finds the tempo and
+# key of the whole one.
+#
+# Usage (Optional):
+# Run from the server directory:
+#   python -m benchmarks.chunked_benchmark [--minutes N] [--workers 2 4 8]
+#
+# Notes:
+# - The pools are warmed up with warm_up_pipeline before they are timed,
+#   so compiling the analysis kernels is excluded.
+# - The recording is written as a float32 WAV at the profile's sample rate,
+#   so it is read through a memory map rather than decoded by ffmpeg.
+#
+###############################################################################
+
+import argparse
+import io
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import mido
+import numpy as np
+import soundfile
+from app.utils.chunked_conversion import convert_chunked
+from app.utils.conversion_profiles import get_profile
+from app.utils.job_queue import convert_job
+from app.utils.warmup import warm_up_pipeline
+from benchmarks.synthetic_audio import hummed_melody, melody_frequencies
+
+# Tempo of the hummed phrases, in notes per minute
+tempo = 100
+
+# Seconds of each phrase and of the pause after it
+phrase_seconds = 20
+pause_seconds = 1.5
+
+
+def long_recording(minutes, sample_rate, seed=0):
+    """
+    Generate a recording of hummed phrases separated by short pauses.
+
+    Args:
+        minutes (float): Length of the recording in minutes.
+        sample_rate (int): Number of samples per second (Hz).
+        seed (int): Seed of the melody.
+
+    Returns:
+        ndarray: 1D float32 array that contains the recording.
+    """
+    pause = np.zeros(int(pause_seconds * sample_rate), dtype=np.float32)
+    pieces = []
+    phrase = 0
+    while sum(map(len, pieces)) < minutes * 60 * sample_rate:
+        frequencies = melody_frequencies(
+            phrase_seconds, sample_rate, tempo, seed * 1000 + phrase, 45, 72
+        )
+        pieces.append(hummed_melody(frequencies, sample_rate, 6, seed))
+        pieces.append(pause)
+        phrase += 1
+    return np.concatenate(pieces)[: int(minutes * 60 * sample_rate)]
+
+
+def meta_messages(midi_data):
+    """
+    Helper function to read the key signature and tempo of a MIDI file.
+
+    Args:
+        midi_data (bytes): Content of the MIDI file.
+
+    Returns:
+        tuple: Key signature and tempo in microseconds per beat.
+    """
+    track = mido.MidiFile(file=io.BytesIO(midi_data)).tracks[0]
+    key = next(message.key for message in track if message.type == "key_signature")
+    tempo = next(message.tempo for message in track if message.type == "set_tempo")
+    return key, tempo
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure how chunked conversion scales with cores."
+    )
+    parser.add_argument("--minutes", type=float, default=20, help="recording length")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        nargs="+",
+        default=[2, 4, os.cpu_count() or 1],
+        help="pool sizes to time",
+    )
+    parser.add_argument("--profile", default="default", help="conversion profile")
+    args = parser.parse_args()
+
+    profile = get_profile(args.profile)
+    if profile is None:
+        return
+
+    with tempfile.TemporaryDirectory() as work_directory:
+        audio_file = os.path.join(work_directory, "long.wav")
+        soundfile.write(
+            audio_file,
+            long_recording(args.minutes, profile.sample_rate),
+            profile.sample_rate,
+            subtype="FLOAT",
+        )
+
+        with ProcessPoolExecutor(
+            max_workers=1, initializer=warm_up_pipeline
+        ) as executor:
+            executor.submit(time.sleep, 0.1).result()
+            start = time.perf_counter()
+            expected_midi, _, _ = executor.submit(
+                convert_job, audio_file, profile.name
+            ).result()
+            single_time = time.perf_counter() - start
+        expected = meta_messages(expected_midi)
+
+        print(f"{'workers':>8}{'time (s)':>10}{'speedup':>10}{'efficiency':>12}")
+        print(f"{1:>8}{single_time:>10.1f}{1:>9.2f}x{100:>11.0f}%")
+        for workers in sorted(set(args.workers)):
+            with ProcessPoolExecutor(
+                max_workers=workers, initializer=warm_up_pipeline
+            ) as executor:
+                # Start every worker before timing
+                list(executor.map(time.sleep, [0.1] * workers))
+                start = time.perf_counter()
+                midi_data, _, _ = convert_chunked(
+                    audio_file, executor, workers, profile
+                )
+                chunked_time = time.perf_counter() - start
+
+            key, midi_tempo = meta_messages(midi_data)
+            assert key == expected[0], "key signature differs"
+            assert abs(midi_tempo - expected[1]) <= 0.02 * expected[1], "tempo differs"
+
+            speedup = single_time / chunked_time
+            print(
+                f"{workers:>8}{chunked_time:>10.1f}{speedup:>9.2f}x"
+                f"{speedup / workers * 100:>11.0f}%"
+            )
+
+
+if __name__ == "__main__":
+    main()
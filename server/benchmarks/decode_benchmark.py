@@ -0,0 +1,121 @@
+################################################################################
+# Filename: decode_benchmark.py
+# Purpose:  Compare the in-memory decoder against the WAV export decode path.
+# Author:   Livia Chandra
+#
+# Description:
+# This script times the previous decode path (pydub exports a WAV copy with
+# audio_to_wav, then librosa.load reads it back) against decode_audio, which
+# pipes ffmpeg's PCM output straight into a NumPy array. For each supported
+# sample file it reports the latency of both paths and the bytes the old path
+# wrote to disk.
+#
+# Usage (Optional):
+# Run from the server directory:
+#   python -m benchmarks.decode_benchmark [--repeat N]
+#
+# Notes:
+# - Requires ffmpeg on the PATH.
+# - The WAV copies written by the old path are placed in a temporary
+#   directory and removed afterwards.
+#
+###############################################################################
+
+import argparse
+import os
+import tempfile
+import time
+import librosa
+from app.utils.conversion import audio_to_wav, decode_audio
+
+# Sample audio files to benchmark, keyed by format
+sample_folder = os.path.join(
+    os.path.dirname(__file__), "..", "app", "utils", "audio_sample"
+)
+sample_files = {
+    "wav": "sample_wav.wav",
+    "mp3": "sample_mp3.mp3",
+    "m4a": "sample_m4a.m4a",
+    "webm": "sample_webm.webm",
+}
+
+
+def time_export_path(audio_file, work_directory):
+    """
+    Time the audio_to_wav export followed by librosa.load.
+
+    Args:
+        audio_file (str): The path to the audio file.
+        work_directory (str): Directory the WAV copy is written to.
+
+    Returns:
+        tuple: Elapsed seconds and the number of bytes written to disk.
+    """
+    current_directory = os.getcwd()
+    os.chdir(work_directory)
+    try:
+        start = time.perf_counter()
+        _, wav_file = audio_to_wav(audio_file)
+        librosa.load(wav_file)
+        elapsed = time.perf_counter() - start
+        bytes_written = os.path.getsize(wav_file)
+        os.remove(wav_file)
+    finally:
+        os.chdir(current_directory)
+    return elapsed, bytes_written
+
+
+def time_pipe_path(audio_file):
+    """
+    Time decode_audio for the audio file.
+
+    Args:
+        audio_file (str): The path to the audio file.
+
+    Returns:
+        float: Elapsed seconds.
+    """
+    start = time.perf_counter()
+    decode_audio(audio_file)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare the WAV export and in-memory decode paths."
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="runs per format")
+    args = parser.parse_args()
+
+    print(
+        f"{'format':<8}{'export (ms)':>14}{'pipe (ms)':>12}{'speedup':>10}{'disk I/O saved':>18}"
+    )
+    with tempfile.TemporaryDirectory() as work_directory:
+        for extension, file_name in sample_files.items():
+            audio_file = os.path.abspath(os.path.join(sample_folder, file_name))
+            if not os.path.exists(audio_file):
+                print(f"{extension:<8}{'sample missing':>14}")
+                continue
+
+            # Warm up both paths so that import and cache costs are excluded
+            time_export_path(audio_file, work_directory)
+            time_pipe_path(audio_file)
+
+            export_runs = [
+                time_export_path(audio_file, work_directory) for _ in range(args.repeat)
+            ]
+            pipe_runs = [time_pipe_path(audio_file) for _ in range(args.repeat)]
+
+            export_time = min(elapsed for elapsed, _ in export_runs)
+            pipe_time = min(pipe_runs)
+            bytes_written = export_runs[0][1]
+
+            # The WAV copy is written once and read back once per upload
+            print(
+                f"{extension:<8}{export_time * 1000:>14.1f}{pipe_time * 1000:>12.1f}"
+                f"{export_time / pipe_time:>9.1f}x{2 * bytes_written / 1e6:>15.2f} MB"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,368 @@
+################################################################################
+# Filename: pipeline_benchmark.py
+# Purpose:  Time every stage of the conversion pipeline against a baseline.
+# Author:   Livia Chandra
+#
+# Description:
+# This script converts deterministic synthetic recordings of several lengths
+# and containers, and times each stage of wav_to_midi separately: decode,
+# YIN pitch tracking, beat tracking, segment STFT, MIDI write and MusicXML
+# export. The run command prints the timings and writes them to a JSON
+# baseline; the compare command reads two baselines and flags every stage
+# that became slower than a threshold.
+#
+# Usage (Optional):
+# Run from the server directory:
+#   python -m benchmarks.pipeline_benchmark run [--output FILE] [--repeat N]
+#   python -m benchmarks.pipeline_benchmark compare BASELINE CURRENT [--threshold T]
+#
+# Notes:
+# - Requires ffmpeg on the PATH.
+# - The recordings are a sine melody, a hummed melody with vibrato and a
+#   sine melody over a noise bed, generated with benchmarks.synthetic_audio.
+# - Each stage keeps its fastest run. Stages faster than min_seconds in both
+#   baselines are never flagged, since their timing is mostly noise.
+# - compare exits with status 1 when it flags a regression, so it can gate
+#   a CI job. baselines/pipeline.json holds a reference run.
+#
+###############################################################################
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import librosa
+import numpy as np
+import soundfile
+from app.utils.analysis_context import AnalysisContext
+from app.utils.conversion import (
+    append_midi_notes,
+    beat_note_times,
+    create_midi_track,
+    decode_audio,
+    midi_to_bytes,
+)
+from app.utils.conversion_profiles import get_profile
+from app.utils.midi_to_musicxml import midi_to_musicxml
+from benchmarks.synthetic_audio import (
+    hummed_melody,
+    melody_frequencies,
+    noise_bed,
+    sine_melody,
+)
+
+# Sample rate the synthetic recordings are written at
+corpus_sample_rate = 44100
+
+# Default recording lengths in seconds
+durations = [10, 60]
+
+# Containers the recordings are encoded in, with their ffmpeg codec options
+formats = {
+    "wav": [],
+    "mp3": ["-codec:a", "libmp3lame", "-b:a", "128k"],
+    "m4a": ["-codec:a", "aac", "-b:a", "128k"],
+    "webm": ["-codec:a", "libopus", "-b:a", "64k"],
+}
+
+# Timed stages, in pipeline order, with the AnalysisContext features each covers
+stages = {
+    "decode": [],
+    "yin": ["pitch_range", "pitch", "key_signature"],
+    "beat_tracking": ["power_spectrogram", "onset_envelope", "beats", "beat_times"],
+    "segment_stft": ["segment_frequencies"],
+    "midi_write": [],
+    "musicxml": [],
+}
+
+# Default slowdown, as a fraction, above which compare flags a stage
+default_threshold = 0.10
+
+# Stages faster than this in both baselines are not flagged
+min_seconds = 0.005
+
+# Default baseline written by run
+default_output = os.path.join(os.path.dirname(__file__), "baselines", "pipeline.json")
+
+
+def synthetic_signals(duration):
+    """
+    Generate the synthetic recordings of one length.
+
+    Args:
+        duration (float): Length of each recording in seconds.
+
+    Returns:
+        dict: 1D float32 arrays at corpus_sample_rate, keyed by signal name.
+    """
+    return {
+        "sine": sine_melody(duration, corpus_sample_rate),
+        "vibrato": hummed_melody(
+            melody_frequencies(duration, corpus_sample_rate, seed=1, low=45, high=69),
+            corpus_sample_rate,
+            seed=1,
+        ),
+        "noise": noise_bed(sine_melody(duration, corpus_sample_rate, seed=2), seed=2),
+    }
+
+
+def write_recording(audio_data, path, audio_format):
+    """
+    Write a recording to disk in one of the benchmarked containers.
+
+    Args:
+        audio_data (ndarray): 1D array that contains the recording.
+        path (str): Path of the file to write, without extension.
+        audio_format (str): Key of formats.
+
+    Returns:
+        str: Path of the written file.
+    """
+    wav_path = path + ".wav"
+    if not os.path.exists(wav_path):
+        soundfile.write(wav_path, audio_data, corpus_sample_rate, subtype="PCM_16")
+    if audio_format == "wav":
+        return wav_path
+
+    encoded_path = f"{path}.{audio_format}"
+    subprocess.run(
+        ["ffmpeg", "-v", "error", "-y", "-i", wav_path]
+        + formats[audio_format]
+        + [encoded_path],
+        check=True,
+    )
+    return encoded_path
+
+
+def time_stages(audio_file, profile):
+    """
+    Run the conversion pipeline once and time each stage.
+
+    Args:
+        audio_file (str): The path to the audio file.
+        profile (ConversionProfile): The profile to convert with.
+
+    Returns:
+        dict: Seconds spent in each stage, keyed by stage name.
+    """
+    timings = {}
+
+    start = time.perf_counter()
+    _, audio_data, sample_rate = decode_audio(
+        audio_file, profile.sample_rate, profile.resampler
+    )
+    timings["decode"] = time.perf_counter() - start
+
+    # Compute the features in wav_to_midi order, then group their timings
+    context = AnalysisContext(
+        audio_data,
+        sample_rate,
+        profile.yin_frame_length,
+        profile.yin_hop_length,
+        profile.pitch_search,
+    )
+    key_signature = context.key_signature
+    tempo, _ = context.beats
+    beat_times = context.beat_times
+    frequency_list = context.segment_frequencies
+    for stage, features in stages.items():
+        if features:
+            timings[stage] = sum(context.timings.get(name, 0.0) for name in features)
+
+    start = time.perf_counter()
+    midi, track = create_midi_track(key_signature, tempo)
+    note_times = iter(beat_note_times(beat_times, tempo))
+    append_midi_notes(midi, track, frequency_list, note_times, tempo, sample_rate)
+    midi_data = midi_to_bytes(midi)
+    timings["midi_write"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    midi_to_musicxml(midi_data)
+    timings["musicxml"] = time.perf_counter() - start
+
+    return timings
+
+
+def run(args):
+    """
+    Benchmark every recording and write the timings to a baseline.
+
+    Args:
+        args (Namespace): Parsed command line arguments of the run command.
+
+    Returns:
+        int: Exit status.
+    """
+    profile = get_profile(args.profile)
+    if profile is None:
+        return 2
+
+    results = {}
+    current_directory = os.getcwd()
+    with tempfile.TemporaryDirectory() as work_directory:
+        os.chdir(work_directory)
+        try:
+            # Warm up so that import and JIT costs are excluded
+            warmup_path = write_recording(
+                sine_melody(5, corpus_sample_rate), "warmup", "wav"
+            )
+            time_stages(warmup_path, profile)
+
+            print(f"{'recording':<22}" + "".join(f"{stage:>15}" for stage in stages))
+            for duration in args.durations:
+                for signal, audio_data in synthetic_signals(duration).items():
+                    for audio_format in args.formats:
+                        path = write_recording(
+                            audio_data, f"{signal}_{duration:g}", audio_format
+                        )
+                        runs = [time_stages(path, profile) for _ in range(args.repeat)]
+                        case = f"{signal}/{audio_format}/{duration:g}s"
+                        results[case] = {
+                            stage: min(timings[stage] for timings in runs)
+                            for stage in stages
+                        }
+                        print(
+                            f"{case:<22}"
+                            + "".join(
+                                f"{results[case][stage] * 1000:>12.1f} ms"
+                                for stage in stages
+                            )
+                        )
+        finally:
+            os.chdir(current_directory)
+
+    baseline = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "machine": {
+            "platform": platform.platform(),
+            "processor": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "librosa": librosa.__version__,
+        },
+        "profile": profile.parameters(),
+        "repeat": args.repeat,
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as baseline_file:
+        json.dump(baseline, baseline_file, indent=2, sort_keys=True)
+        baseline_file.write("\n")
+    print("Wrote", args.output)
+    return 0
+
+
+def find_regressions(baseline, current, threshold=default_threshold):
+    """
+    Compare the stage timings of two baselines.
+
+    Args:
+        baseline (dict): Reference baseline, as written by run.
+        current (dict): Baseline to check against the reference.
+        threshold (float): Slowdown, as a fraction, above which a stage is flagged.
+
+    Returns:
+        list: Recording, stage, reference seconds, current seconds and whether
+              the stage regressed, for every stage present in both.
+    """
+    rows = []
+    for case, reference_timings in baseline["results"].items():
+        current_timings = current["results"].get(case, {})
+        for stage, reference in reference_timings.items():
+            if stage not in current_timings:
+                continue
+            measured = current_timings[stage]
+            regressed = max(
+                reference, measured
+            ) >= min_seconds and measured > reference * (1 + threshold)
+            rows.append((case, stage, reference, measured, regressed))
+    return rows
+
+
+def compare(args):
+    """
+    Print the stage timings of two baselines and flag regressions.
+
+    Args:
+        args (Namespace): Parsed command line arguments of the compare command.
+
+    Returns:
+        int: 1 if any stage regressed, else 0.
+    """
+    with open(args.baseline) as baseline_file:
+        baseline = json.load(baseline_file)
+    with open(args.current) as current_file:
+        current = json.load(current_file)
+
+    if baseline.get("profile") != current.get("profile"):
+        print("Warning: the baselines were measured with different profiles")
+
+    rows = find_regressions(baseline, current, args.threshold)
+    print(
+        f"{'recording':<22}{'stage':<15}{'baseline (ms)':>15}"
+        f"{'current (ms)':>14}{'change':>9}"
+    )
+    for case, stage, reference, measured, regressed in rows:
+        change = (measured / reference - 1) * 100 if reference else 0.0
+        print(
+            f"{case:<22}{stage:<15}{reference * 1000:>15.1f}{measured * 1000:>14.1f}"
+            f"{change:>+8.1f}%" + ("  REGRESSION" if regressed else "")
+        )
+
+    regressions = sum(row[-1] for row in rows)
+    print(
+        f"{regressions} of {len(rows)} stages slower than "
+        f"{args.threshold * 100:.0f}% over the baseline"
+    )
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time each stage of the conversion pipeline against a baseline."
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="benchmark and write a baseline")
+    run_parser.add_argument("--output", default=default_output, help="baseline file")
+    run_parser.add_argument("--repeat", type=int, default=3, help="runs per recording")
+    run_parser.add_argument("--profile", help="conversion profile to benchmark")
+    run_parser.add_argument(
+        "--durations",
+        type=float,
+        nargs="+",
+        default=durations,
+        help="recording lengths in seconds",
+    )
+    run_parser.add_argument(
+        "--formats",
+        nargs="+",
+        choices=list(formats),
+        default=list(formats),
+        help="containers to encode the recordings in",
+    )
+    run_parser.set_defaults(handler=run)
+
+    compare_parser = commands.add_parser("compare", help="flag slower stages")
+    compare_parser.add_argument("baseline", help="reference baseline file")
+    compare_parser.add_argument("current", help="baseline file to check")
+    compare_parser.add_argument(
+        "--threshold",
+        type=float,
+        default=default_threshold,
+        help="slowdown fraction to flag, 0.10 for 10%%",
+    )
+    compare_parser.set_defaults(handler=compare)
+
+    args = parser.parse_args()
+    sys.exit(args.handler(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+################################################################################
+# Filename: pitch_range_benchmark.py
+# Purpose:  Measure the cost and accuracy of the adaptive YIN pitch search.
+# Author:   Livia Chandra
+#
+# Description:
+# This script runs the pitch stage of every conversion profile over the
+# synthetic corpus of sung, hummed and whistled melodies twice: once
+# searching the full C1 to C8 range and once searching only the register the
+# coarse pass finds. For each profile and voice it reports the searched
+# range, the YIN frame length, the time per frame (including the coarse pass
+# for the adaptive search) and the raw pitch accuracy of both searches.
+#
+# Usage (Optional):
+# Run from the server directory:
+#   python -m benchmarks.pitch_range_benchmark [--repeat N] [--duration SECONDS]
+#
+# Notes:
+# - Requires ffmpeg on the PATH.
+# - Audio is decoded once per profile and voice, outside the timed region.
+#
+###############################################################################
+
+import argparse
+import tempfile
+import time
+import numpy as np
+from app.utils.analysis_context import AnalysisContext
+from app.utils.conversion import decode_audio
+from app.utils.conversion_profiles import ConversionProfile, profiles
+from app.utils.pitch_range import adaptive_search, full_search
+from benchmarks.profile_benchmark import pitch_errors, write_corpus
+
+
+def with_search(profile, pitch_search):
+    """
+    Helper function to copy a profile with another pitch search.
+
+    Args:
+        profile (ConversionProfile): The profile to copy.
+        pitch_search (str): "adaptive" or "full" pitch search.
+
+    Returns:
+        ConversionProfile: The copied profile.
+    """
+    return ConversionProfile(
+        profile.name,
+        profile.sample_rate,
+        profile.resampler,
+        profile.yin_frame_length,
+        profile.yin_hop_length,
+        pitch_search,
+        profile.voicing_gate,
+    )
+
+
+def time_pitch(audio_data, sample_rate, profile, repeat):
+    """
+    Time the pitch stage, coarse pass included, on decoded audio.
+
+    Args:
+        audio_data (ndarray): 1D array that contains audio signal information.
+        sample_rate (int): Number of samples per second (Hz) of audio_data.
+        profile (ConversionProfile): The profile to analyse with.
+        repeat (int): Number of timed runs.
+
+    Returns:
+        tuple: Fastest elapsed seconds, and the context of the last run.
+    """
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        context = AnalysisContext(
+            audio_data,
+            sample_rate,
+            profile.yin_frame_length,
+            profile.yin_hop_length,
+            profile.pitch_search,
+        )
+        context.pitch
+        runs.append(time.perf_counter() - start)
+    return min(runs), context
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure the cost and accuracy of the adaptive pitch search."
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per search")
+    parser.add_argument("--duration", type=float, default=30, help="seconds per melody")
+    args = parser.parse_args()
+
+    print(
+        f"{'profile':<10}{'voice':<10}{'range (Hz)':>16}{'frame':>12}"
+        f"{'us/frame':>16}{'reduction':>11}{'RPA 50c':>16}"
+    )
+    with tempfile.TemporaryDirectory() as work_directory:
+        paths = write_corpus(work_directory, args.duration)
+        for name, profile in profiles.items():
+            full = with_search(profile, full_search)
+            adaptive = with_search(profile, adaptive_search)
+            for seed, (voice, path) in enumerate(paths.items()):
+                _, audio_data, sample_rate = decode_audio(
+                    path, profile.sample_rate, profile.resampler
+                )
+
+                # Warm up so that import and JIT costs are excluded
+                time_pitch(audio_data, sample_rate, adaptive, 1)
+                full_time, full_context = time_pitch(
+                    audio_data, sample_rate, full, args.repeat
+                )
+                adaptive_time, adaptive_context = time_pitch(
+                    audio_data, sample_rate, adaptive, args.repeat
+                )
+
+                frame_count = len(full_context.pitch)
+                low, high = adaptive_context.pitch_range
+                full_errors = pitch_errors(path, full, args.duration, seed)
+                adaptive_errors = pitch_errors(path, adaptive, args.duration, seed)
+                print(
+                    f"{name:<10}{voice:<10}{low:>8.0f}-{high:<7.0f}"
+                    f"{full_context.pitch_frame_length:>6}"
+                    f"->{adaptive_context.pitch_frame_length:<4}"
+                    f"{full_time / frame_count * 1e6:>8.1f}"
+                    f"->{adaptive_time / frame_count * 1e6:<6.1f}"
+                    f"{full_time / adaptive_time:>10.2f}x"
+                    f"{np.mean(full_errors < 50) * 100:>8.1f}%"
+                    f"->{np.mean(adaptive_errors < 50) * 100:.1f}%"
+                )
+
+
+if __name__ == "__main__":
+    main()
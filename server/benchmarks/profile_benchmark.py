@@ -0,0 +1,195 @@
+################################################################################
+# Filename: profile_benchmark.py
+# Purpose:  Compare the speed and pitch accuracy of the conversion profiles.
+# Author:   Livia Chandra
+#
+# Description:
+# This script converts a synthetic corpus of sung, hummed and whistled
+# melodies with every conversion profile. For each profile it reports the
+# time wav_to_midi takes on the whole corpus and how well the YIN pitch
+# track follows the true melody: the share of frames within 50 cents of the
+# true fundamental (raw pitch accuracy) and the median error in cents.
+#
+# Usage (Optional):
+# Run from the server directory:
+#   python -m benchmarks.profile_benchmark [--repeat N] [--duration SECONDS]
+#
+# Notes:
+# - Requires ffmpeg on the PATH.
+# - The corpus is written at 44.1 kHz, so every profile resamples it.
+# - Frames within 30 ms of a note change are left out of the accuracy,
+#   since the true pitch is ambiguous there.
+#
+###############################################################################
+
+import argparse
+import os
+import tempfile
+import time
+import numpy as np
+import soundfile
+from app.utils.analysis_context import AnalysisContext
+from app.utils.conversion import decode_audio, wav_to_midi
+from app.utils.conversion_profiles import profiles
+from benchmarks.synthetic_audio import hummed_melody, melody_frequencies
+
+# Sample rate of the synthetic corpus
+corpus_sample_rate = 44100
+
+# Tempo of the synthetic melodies, in notes per minute
+tempo = 100
+
+# Corpus entries: MIDI note range and number of harmonics of each voice
+voices = {
+    "sung": (45, 72, 10),
+    "hummed": (40, 64, 4),
+    "whistled": (72, 96, 1),
+}
+
+# Frames this close to a note change (seconds) are not scored
+transition_margin = 0.03
+
+
+def write_corpus(directory, duration):
+    """
+    Write the synthetic corpus as WAV files.
+
+    Args:
+        directory (str): Directory the WAV files are written to.
+        duration (float): Length of each melody in seconds.
+
+    Returns:
+        dict: Path of each WAV file, keyed by voice.
+    """
+    paths = {}
+    for seed, (voice, (low, high, harmonics)) in enumerate(voices.items()):
+        path = os.path.join(directory, f"{voice}.wav")
+        frequencies = melody_frequencies(
+            duration, corpus_sample_rate, tempo, seed, low, high
+        )
+        soundfile.write(
+            path,
+            hummed_melody(frequencies, corpus_sample_rate, harmonics, seed),
+            corpus_sample_rate,
+        )
+        paths[voice] = path
+    return paths
+
+
+def pitch_errors(audio_file, profile, duration, seed):
+    """
+    Compare the YIN pitch track of a profile against the true melody.
+
+    Args:
+        audio_file (str): The path to the WAV file.
+        profile (ConversionProfile): The profile to analyse with.
+        duration (float): Length of the melody in seconds.
+        seed (int): Seed the melody was generated with.
+
+    Returns:
+        ndarray: Error in cents of every scored frame.
+    """
+    low, high, _ = list(voices.values())[seed]
+    _, audio_data, sample_rate = decode_audio(
+        audio_file, profile.sample_rate, profile.resampler
+    )
+    context = AnalysisContext(
+        audio_data,
+        sample_rate,
+        profile.yin_frame_length,
+        profile.yin_hop_length,
+        profile.pitch_search,
+    )
+    pitch = context.pitch
+
+    # YIN frames are centred every hop, so frame i is at i * hop samples
+    frame_times = np.arange(len(pitch)) * profile.yin_hop_length / sample_rate
+    true_frequencies = melody_frequencies(duration, sample_rate, tempo, seed, low, high)
+    frame_samples = np.minimum(
+        (frame_times * sample_rate).astype(int), len(true_frequencies) - 1
+    )
+
+    # Score frames away from note changes and the ends of the recording
+    note_position = (frame_times * tempo / 60) % 1
+    margin = transition_margin * tempo / 60
+    scored = (
+        (note_position > margin)
+        & (note_position < 1 - margin)
+        & (frame_times > profile.yin_frame_length / sample_rate)
+        & (frame_times < duration - profile.yin_frame_length / sample_rate)
+    )
+    return 1200 * np.abs(
+        np.log2(pitch[scored] / true_frequencies[frame_samples[scored]])
+    )
+
+
+def time_profile(paths, profile, repeat):
+    """
+    Time wav_to_midi on the whole corpus with a profile.
+
+    Args:
+        paths (dict): Path of each WAV file, keyed by voice.
+        profile (ConversionProfile): The profile to convert with.
+        repeat (int): Number of timed runs.
+
+    Returns:
+        float: Fastest elapsed seconds for the corpus.
+    """
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for path in paths.values():
+            wav_to_midi(path, profile=profile)
+        runs.append(time.perf_counter() - start)
+    return min(runs)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare the speed and pitch accuracy of conversion profiles."
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="runs per profile")
+    parser.add_argument("--duration", type=float, default=30, help="seconds per melody")
+    args = parser.parse_args()
+
+    current_directory = os.getcwd()
+    with tempfile.TemporaryDirectory() as work_directory:
+        os.chdir(work_directory)
+        os.makedirs("midi_output")
+        try:
+            paths = write_corpus(work_directory, args.duration)
+
+            # Warm up every profile so that import and JIT costs are excluded
+            for profile in profiles.values():
+                time_profile(paths, profile, 1)
+
+            results = {}
+            for name, profile in profiles.items():
+                elapsed = time_profile(paths, profile, args.repeat)
+                errors = np.concatenate(
+                    [
+                        pitch_errors(path, profile, args.duration, seed)
+                        for seed, path in enumerate(paths.values())
+                    ]
+                )
+                results[name] = (elapsed, errors)
+        finally:
+            os.chdir(current_directory)
+
+    default_time = results["default"][0]
+    print(
+        f"{'profile':<10}{'rate':>7}{'resampler':>11}{'yin':>10}"
+        f"{'time (ms)':>11}{'speedup':>9}{'RPA 50c':>9}{'median err':>12}"
+    )
+    for name, (elapsed, errors) in results.items():
+        profile = profiles[name]
+        yin = f"{profile.yin_frame_length}/{profile.yin_hop_length}"
+        print(
+            f"{name:<10}{profile.sample_rate:>7}{profile.resampler:>11}{yin:>10}"
+            f"{elapsed * 1000:>11.1f}{default_time / elapsed:>8.2f}x"
+            f"{np.mean(errors < 50) * 100:>8.1f}%{np.median(errors):>9.1f} c"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+################################################################################
+# Filename: segment_stft_benchmark.py
+# Purpose:  Compare the per-segment STFT loop against the batched STFT engine.
+# Author:   Livia Chandra
+#
+# Description:
+# wav_to_midi used to run scipy.signal.stft once per two-beat segment in a
+# Python loop. This script times that loop against
+# segment_median_frequencies, which frames all segments at once and reduces
+# them in a single vectorized pass, on synthetic recordings of several
+# lengths, and checks that both produce the same frequencies.
+#
+# Usage (Optional):
+# Run from the server directory:
+#   python -m benchmarks.segment_stft_benchmark [--repeat N]
+#
+# Notes:
+# - The synthetic recordings are generated with benchmarks.synthetic_audio.
+#
+###############################################################################
+
+import argparse
+import time
+import numpy as np
+from app.utils.conversion import analysis_sample_rate, divide_audio_data
+from app.utils.segment_analysis import (
+    segment_median_frequencies,
+    segment_median_frequency,
+)
+from benchmarks.synthetic_audio import sine_melody
+
+# Recording lengths to benchmark in seconds
+durations = [15, 60, 300, 1800]
+
+# Tempo used for segmentation, in beats per minute
+tempo = 117.45
+
+
+def loop_median_frequencies(audio_data, sample_rate, tempo):
+    """
+    Compute segment median frequencies with one STFT per segment.
+
+    Args:
+        audio_data (ndarray): 1D array that contains audio signal information.
+        sample_rate (int): Number of samples per second (Hz) of the audio data.
+        tempo (float64): Estimated tempo of the audio signal in beats per minute (BPM)
+
+    Returns:
+        ndarray: Weighted median frequency of each segment.
+    """
+    return np.array(
+        [
+            segment_median_frequency(segment, sample_rate)
+            for segment in divide_audio_data(audio_data, sample_rate, tempo)
+        ]
+    )
+
+
+def best_time(function, repeat):
+    """
+    Run a function several times and keep the fastest run.
+
+    Args:
+        function (callable): Function to time.
+        repeat (int): Number of runs.
+
+    Returns:
+        tuple: Fastest elapsed seconds and the function result.
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare the per-segment STFT loop and the batched engine."
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="runs per length")
+    args = parser.parse_args()
+
+    sample_rate = analysis_sample_rate
+    print(
+        f"{'length':>8}{'segments':>10}{'loop (ms)':>12}{'batched (ms)':>14}{'speedup':>10}"
+    )
+    for duration in durations:
+        audio_data = sine_melody(duration, sample_rate)
+
+        loop_time, expected = best_time(
+            lambda: loop_median_frequencies(audio_data, sample_rate, tempo),
+            args.repeat,
+        )
+        batched_time, result = best_time(
+            lambda: segment_median_frequencies(audio_data, sample_rate, tempo),
+            args.repeat,
+        )
+        assert np.array_equal(expected, result), "batched output differs from loop"
+
+        print(
+            f"{duration:>7}s{len(result):>10}{loop_time * 1000:>12.1f}"
+            f"{batched_time * 1000:>14.1f}{loop_time / batched_time:>9.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
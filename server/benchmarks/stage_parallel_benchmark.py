@@ -0,0 +1,133 @@
+################################################################################
+# Filename: stage_parallel_benchmark.py
+# Purpose:  Measure how much running the analysis stages concurrently saves.
+# Author:   Livia Chandra
+#
+# Description:
+# This script computes the features wav_to_midi needs with
+# AnalysisContext.compute_all on synthetic recordings of several lengths,
+# once with the stages run in order on one thread and once with the stage
+# graph running the pitch and beat stages on separate threads. It checks
+# that both produce the same features and reports the speedup, which shows
+# how much single-request latency drops on a multi-core machine.
+#
+# Usage (Optional):
+# Run from the server directory:
+#   python -m benchmarks.stage_parallel_benchmark [--repeat N] [--threads N]
+#
+# Notes:
+# - The synthetic recordings are generated with benchmarks.synthetic_audio.
+# - Each run uses a fresh context, so no feature is reused between runs.
+#
+###############################################################################
+
+import argparse
+import time
+import numpy as np
+from app.utils.analysis_context import AnalysisContext
+from app.utils.conversion_profiles import get_profile
+from app.utils.stage_graph import default_analysis_threads
+from benchmarks.synthetic_audio import sine_melody
+
+# Recording lengths to benchmark in seconds
+durations = [15, 60, 300]
+
+
+def compute_features(audio_data, profile, threads):
+    """
+    Compute every feature wav_to_midi needs in a fresh context.
+
+    Args:
+        audio_data (ndarray): 1D array that contains audio signal information.
+        profile (ConversionProfile): Profile that sets the analysis parameters.
+        threads (int): Number of threads running the stages.
+
+    Returns:
+        tuple: Elapsed seconds and the key signature, tempo, beat frames and
+               segment frequencies.
+    """
+    context = AnalysisContext(
+        audio_data,
+        profile.sample_rate,
+        profile.yin_frame_length,
+        profile.yin_hop_length,
+        profile.pitch_search,
+    )
+    start = time.perf_counter()
+    context.compute_all(threads)
+    elapsed = time.perf_counter() - start
+
+    tempo, beat_frames = context.beats
+    return elapsed, (
+        context.key_signature,
+        tempo,
+        beat_frames,
+        context.segment_frequencies,
+    )
+
+
+def best_time(audio_data, profile, threads, repeat):
+    """
+    Compute the features several times and keep the fastest run.
+
+    Args:
+        audio_data (ndarray): 1D array that contains audio signal information.
+        profile (ConversionProfile): Profile that sets the analysis parameters.
+        threads (int): Number of threads running the stages.
+        repeat (int): Number of runs.
+
+    Returns:
+        tuple: Fastest elapsed seconds and the features of the last run.
+    """
+    best = None
+    for _ in range(repeat):
+        elapsed, features = compute_features(audio_data, profile, threads)
+        best = elapsed if best is None else min(best, elapsed)
+    return best, features
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare sequential and concurrent analysis stages."
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="runs per length")
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=default_analysis_threads,
+        help="threads of the concurrent runs",
+    )
+    parser.add_argument("--profile", default="default", help="conversion profile")
+    args = parser.parse_args()
+
+    profile = get_profile(args.profile)
+    if profile is None:
+        return
+
+    # Warm up so that import and JIT costs are excluded
+    compute_features(sine_melody(5, profile.sample_rate), profile, args.threads)
+
+    print(
+        f"{'length':>8}{'sequential (ms)':>17}{'concurrent (ms)':>17}{'speedup':>10}"
+    )
+    for duration in durations:
+        audio_data = sine_melody(duration, profile.sample_rate)
+
+        sequential_time, expected = best_time(audio_data, profile, 1, args.repeat)
+        concurrent_time, result = best_time(
+            audio_data, profile, args.threads, args.repeat
+        )
+        assert expected[0] == result[0], "key signature differs"
+        assert expected[1] == result[1], "tempo differs"
+        assert np.array_equal(expected[2], result[2]), "beats differ"
+        assert np.array_equal(expected[3], result[3]), "segments differ"
+
+        print(
+            f"{duration:>7}s{sequential_time * 1000:>17.1f}"
+            f"{concurrent_time * 1000:>17.1f}"
+            f"{sequential_time / concurrent_time:>9.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
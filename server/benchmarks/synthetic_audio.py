@@ -0,0 +1,121 @@
+################################################################################
+# Filename: synthetic_audio.py
+# Purpose:  Generate deterministic synthetic recordings for the benchmarks.
+# Author:   Livia Chandra
+#
+# Description:
+# This file contains NumPy generators for synthetic monophonic recordings, so
+# that benchmarks run on inputs of any length without shipping large audio
+# files. The same seed always produces the same signal.
+#
+# Usage (Optional):
+#   from benchmarks.synthetic_audio import sine_melody
+#   audio_data = sine_melody(duration=60, sample_rate=22050)
+#   audio_data = hummed_melody(melody_frequencies(60, 44100), 44100)
+#   audio_data = noise_bed(sine_melody(60, 22050), snr_db=10)
+#
+# Notes:
+# - Signals are float32 in the range [-1, 1], like decode_audio output.
+#
+###############################################################################
+
+import numpy as np
+import scipy.signal
+
+
+def melody_frequencies(duration, sample_rate, tempo=120, seed=0, low=48, high=84):
+    """
+    Generate the fundamental frequency of a random melody, one note per beat.
+
+    Args:
+        duration (float): Length of the signal in seconds.
+        sample_rate (int): Number of samples per second (Hz).
+        tempo (float): Number of notes per minute.
+        seed (int): Seed of the random note sequence.
+        low (int): Lowest MIDI note of the melody.
+        high (int): MIDI note above the highest note of the melody.
+
+    Returns:
+        ndarray: Fundamental frequency (Hz) at every sample.
+    """
+    rng = np.random.default_rng(seed)
+    note_length = int(sample_rate * 60 / tempo)
+    note_count = int(np.ceil(duration * sample_rate / note_length))
+
+    # Random MIDI notes between low and high
+    notes = rng.integers(low, high, size=note_count)
+    frequencies = 440.0 * 2 ** ((notes - 69) / 12)
+    return np.repeat(frequencies, note_length)[: int(duration * sample_rate)]
+
+
+def sine_melody(duration, sample_rate, tempo=120, seed=0):
+    """
+    Generate a melody of sine tones, one note per beat.
+
+    Args:
+        duration (float): Length of the signal in seconds.
+        sample_rate (int): Number of samples per second (Hz).
+        tempo (float): Number of notes per minute.
+        seed (int): Seed of the random note sequence.
+
+    Returns:
+        ndarray: 1D float32 array that contains the melody.
+    """
+    instantaneous_frequency = melody_frequencies(duration, sample_rate, tempo, seed)
+
+    # Continuous phase keeps note transitions free of clicks
+    phase = 2 * np.pi * np.cumsum(instantaneous_frequency) / sample_rate
+    return (0.5 * np.sin(phase)).astype(np.float32)
+
+
+def hummed_melody(frequencies, sample_rate, harmonics=6, seed=0):
+    """
+    Render a fundamental frequency track as a hum-like voice.
+
+    The tone has harmonics falling off with their number, a 5 Hz vibrato of
+    20 cents and a little breath noise.
+
+    Args:
+        frequencies (ndarray): Fundamental frequency (Hz) at every sample.
+        sample_rate (int): Number of samples per second (Hz).
+        harmonics (int): Number of harmonics, including the fundamental.
+        seed (int): Seed of the breath noise.
+
+    Returns:
+        ndarray: 1D float32 array that contains the melody.
+    """
+    rng = np.random.default_rng(seed)
+    time = np.arange(len(frequencies)) / sample_rate
+    vibrato = 2 ** (0.2 / 12 * np.sin(2 * np.pi * 5 * time))
+    phase = 2 * np.pi * np.cumsum(frequencies * vibrato) / sample_rate
+
+    # Only harmonics below the Nyquist frequency are rendered
+    audio_data = np.zeros(len(frequencies))
+    for harmonic in range(1, harmonics + 1):
+        audible = harmonic * frequencies < sample_rate / 2
+        audio_data += audible * np.sin(harmonic * phase) / harmonic
+    audio_data += 0.01 * rng.standard_normal(len(frequencies))
+    return (0.5 * audio_data / np.abs(audio_data).max()).astype(np.float32)
+
+
+def noise_bed(audio_data, snr_db=10, seed=0):
+    """
+    Mix a melody over a bed of low-passed background noise.
+
+    Args:
+        audio_data (ndarray): 1D array that contains the melody.
+        snr_db (float): Ratio of melody to noise power in decibels.
+        seed (int): Seed of the noise.
+
+    Returns:
+        ndarray: 1D float32 array that contains the noisy melody.
+    """
+    rng = np.random.default_rng(seed)
+    noise = rng.standard_normal(len(audio_data))
+
+    # A one-pole low-pass tilts the white noise towards room rumble
+    noise = scipy.signal.lfilter([1.0], [1.0, -0.9], noise)
+    noise *= np.sqrt(np.mean(audio_data**2) / np.mean(noise**2) / 10 ** (snr_db / 10))
+
+    mixed = audio_data + noise
+    return (0.5 * mixed / np.abs(mixed).max()).astype(np.float32)
@@ -0,0 +1,186 @@
+################################################################################
+# Filename: voicing_gate_benchmark.py
+# Purpose:  Measure how much audio and conversion time the voicing gate skips.
+# Author:   Livia Chandra
+#
+# Description:
+# This script converts a synthetic corpus of phone-style takes: hummed
+# phrases separated by pauses, with a few seconds of dead air before and
+# after, over a quiet room noise floor. For each take it reports the share
+# of the audio the voicing gate cuts out, and the time wav_to_midi takes
+# with the gate and without it.
+#
+# Usage (Optional):
+# Run from the server directory:
+#   python -m benchmarks.voicing_gate_benchmark [--repeat N] [--takes N]
+#
+# Notes:
+# - Requires ffmpeg on the PATH.
+# - The takes are generated with benchmarks.synthetic_audio, so the same
+#   seed always produces the same corpus.
+#
+###############################################################################
+
+import argparse
+import os
+import tempfile
+import time
+import numpy as np
+import soundfile
+from app.utils.conversion import decode_audio, wav_to_midi_bytes
+from app.utils.conversion_profiles import ConversionProfile, get_profile
+from app.utils.voicing_gate import gate_audio, skipped_fraction
+from benchmarks.synthetic_audio import hummed_melody, melody_frequencies
+
+# Sample rate of the synthetic corpus
+corpus_sample_rate = 44100
+
+# Tempo of the hummed phrases, in notes per minute
+tempo = 100
+
+# Level of the room noise floor, in dB below full scale
+noise_floor_db = -60
+
+# Ranges in seconds of the lead-in, the phrases, the pauses between them and
+# the trailing silence of a take
+lead_in_range = (1, 5)
+phrase_range = (4, 12)
+pause_range = (1.5, 4)
+trailing_range = (2, 6)
+
+
+def phone_take(seed, sample_rate=corpus_sample_rate):
+    """
+    Generate a take of two to four hummed phrases with silence around them.
+
+    Args:
+        seed (int): Seed of the take.
+        sample_rate (int): Number of samples per second (Hz).
+
+    Returns:
+        ndarray: 1D float32 array that contains the take.
+    """
+    rng = np.random.default_rng(seed)
+
+    def silence(bounds):
+        return np.zeros(int(rng.uniform(*bounds) * sample_rate), dtype=np.float32)
+
+    pieces = [silence(lead_in_range)]
+    phrase_count = rng.integers(2, 5)
+    for phrase in range(phrase_count):
+        if phrase:
+            pieces.append(silence(pause_range))
+        frequencies = melody_frequencies(
+            rng.uniform(*phrase_range), sample_rate, tempo, seed * 10 + phrase, 45, 72
+        )
+        pieces.append(hummed_melody(frequencies, sample_rate, 6, seed))
+    pieces.append(silence(trailing_range))
+
+    audio_data = np.concatenate(pieces)
+    audio_data += 10 ** (noise_floor_db / 20) * rng.standard_normal(len(audio_data))
+    return audio_data.astype(np.float32)
+
+
+def with_gate(profile, voicing_gate):
+    """
+    Helper function to copy a profile with the voicing gate turned on or off.
+
+    Args:
+        profile (ConversionProfile): The profile to copy.
+        voicing_gate (bool): Whether the copy runs the voicing gate.
+
+    Returns:
+        ConversionProfile: The copied profile.
+    """
+    return ConversionProfile(
+        profile.name,
+        profile.sample_rate,
+        profile.resampler,
+        profile.yin_frame_length,
+        profile.yin_hop_length,
+        profile.pitch_search,
+        voicing_gate,
+    )
+
+
+def time_conversion(audio_file, profile, repeat):
+    """
+    Time wav_to_midi_bytes on one take.
+
+    Args:
+        audio_file (str): The path to the WAV file.
+        profile (ConversionProfile): The profile to convert with.
+        repeat (int): Number of timed runs.
+
+    Returns:
+        float: Fastest elapsed seconds.
+    """
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        wav_to_midi_bytes(audio_file, profile=profile)
+        runs.append(time.perf_counter() - start)
+    return min(runs)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure the audio and time the voicing gate skips."
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="runs per take")
+    parser.add_argument("--takes", type=int, default=8, help="takes in the corpus")
+    parser.add_argument("--profile", default="phone", help="conversion profile")
+    args = parser.parse_args()
+
+    profile = get_profile(args.profile)
+    if profile is None:
+        return
+    gated = with_gate(profile, True)
+    ungated = with_gate(profile, False)
+
+    results = []
+    with tempfile.TemporaryDirectory() as work_directory:
+        for seed in range(args.takes):
+            audio_file = os.path.join(work_directory, f"take_{seed}.wav")
+            soundfile.write(audio_file, phone_take(seed), corpus_sample_rate)
+
+            # Warm up so that import and JIT costs are excluded
+            if seed == 0:
+                time_conversion(audio_file, gated, 1)
+                time_conversion(audio_file, ungated, 1)
+
+            _, audio_data, sample_rate = decode_audio(
+                audio_file, gated.sample_rate, gated.resampler
+            )
+            _, regions = gate_audio(audio_data, sample_rate)
+            results.append(
+                (
+                    len(audio_data) / sample_rate,
+                    skipped_fraction(regions, len(audio_data)),
+                    time_conversion(audio_file, gated, args.repeat),
+                    time_conversion(audio_file, ungated, args.repeat),
+                )
+            )
+
+    print(
+        f"{'take':<6}{'length (s)':>11}{'skipped':>9}"
+        f"{'gated (ms)':>12}{'ungated (ms)':>14}{'saved':>8}"
+    )
+    for seed, (duration, skipped, gated_time, ungated_time) in enumerate(results):
+        print(
+            f"{seed:<6}{duration:>11.1f}{skipped * 100:>8.1f}%"
+            f"{gated_time * 1000:>12.1f}{ungated_time * 1000:>14.1f}"
+            f"{(1 - gated_time / ungated_time) * 100:>7.1f}%"
+        )
+
+    durations, skipped, gated_times, ungated_times = map(np.array, zip(*results))
+    print(
+        f"{'total':<6}{durations.sum():>11.1f}"
+        f"{(skipped * durations).sum() / durations.sum() * 100:>8.1f}%"
+        f"{gated_times.sum() * 1000:>12.1f}{ungated_times.sum() * 1000:>14.1f}"
+        f"{(1 - gated_times.sum() / ungated_times.sum()) * 100:>7.1f}%"
+    )
+
+
+if __name__ == "__main__":
+    main()
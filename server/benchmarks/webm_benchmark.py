@@ -0,0 +1,155 @@
+################################################################################
+# Filename: webm_benchmark.py
+# Purpose:  Compare the WEBM to MP3 to WAV chain against the direct WEBM decode.
+# Author:   Livia Chandra
+#
+# Description:
+# Browser recordings arrive as WEBM/Opus. The previous pipeline encoded them
+# to a 192k MP3, decoded the MP3 to a WAV file with pydub and then loaded the
+# WAV with librosa. This script times each of those stages separately and
+# compares their total against decode_audio, which decodes the Opus stream
+# straight to PCM in one step.
+#
+# Usage (Optional):
+# Run from the server directory:
+#   python -m benchmarks.webm_benchmark [--repeat N] [webm_file]
+#
+# Notes:
+# - Requires ffmpeg (and ffprobe for the pydub stage) on the PATH.
+# - Defaults to the sample WEBM recording in app/utils/audio_sample.
+#
+###############################################################################
+
+import argparse
+import os
+import subprocess
+import tempfile
+import time
+import librosa
+import pydub
+from app.utils.conversion import decode_audio
+
+# Default WEBM recording to benchmark
+sample_file = os.path.join(
+    os.path.dirname(__file__), "..", "app", "utils", "audio_sample", "sample_webm.webm"
+)
+
+
+def convert_webm_to_mp3(webm_file, mp3_file):
+    """
+    Helper function to encode a WEBM file to MP3, as the previous pipeline did.
+
+    Args:
+        webm_file (str): The path to the WEBM file.
+        mp3_file (str): The path to store the MP3 file.
+    """
+    command = [
+        "ffmpeg",
+        "-i",
+        webm_file,
+        "-vn",
+        "-ab",
+        "192k",
+        "-ar",
+        "44100",
+        "-y",
+        mp3_file,
+    ]
+    subprocess.run(command, check=True, capture_output=True)
+
+
+def time_mp3_chain(webm_file, work_directory):
+    """
+    Time every stage of the WEBM to MP3 to WAV decode chain.
+
+    Args:
+        webm_file (str): The path to the WEBM file.
+        work_directory (str): Directory the intermediate files are written to.
+
+    Returns:
+        dict: Elapsed seconds for each stage.
+    """
+    mp3_file = os.path.join(work_directory, "chain.mp3")
+    wav_file = os.path.join(work_directory, "chain.wav")
+    timings = {}
+
+    start = time.perf_counter()
+    convert_webm_to_mp3(webm_file, mp3_file)
+    timings["webm -> mp3 encode"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    pydub.AudioSegment.from_file(mp3_file, "mp3").export(wav_file, format="wav")
+    timings["mp3 -> wav decode"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    librosa.load(wav_file)
+    timings["wav load + resample"] = time.perf_counter() - start
+
+    os.remove(mp3_file)
+    os.remove(wav_file)
+    return timings
+
+
+def time_direct_decode(webm_file):
+    """
+    Time decode_audio for the WEBM file.
+
+    Args:
+        webm_file (str): The path to the WEBM file.
+
+    Returns:
+        dict: Elapsed seconds of the single decode stage.
+    """
+    start = time.perf_counter()
+    decode_audio(webm_file)
+    return {"webm -> pcm decode": time.perf_counter() - start}
+
+
+def best_timings(runs):
+    """
+    Reduce repeated runs to the fastest time of every stage.
+
+    Args:
+        runs (list): Dictionaries of stage timings.
+
+    Returns:
+        dict: Fastest elapsed seconds for each stage.
+    """
+    return {stage: min(run[stage] for run in runs) for stage in runs[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare the WEBM to MP3 to WAV chain and the direct decode."
+    )
+    parser.add_argument("webm_file", nargs="?", default=sample_file)
+    parser.add_argument("--repeat", type=int, default=5, help="runs per path")
+    args = parser.parse_args()
+
+    webm_file = os.path.abspath(args.webm_file)
+    with tempfile.TemporaryDirectory() as work_directory:
+        # Warm up both paths so that import and cache costs are excluded
+        time_mp3_chain(webm_file, work_directory)
+        time_direct_decode(webm_file)
+
+        chain = best_timings(
+            [time_mp3_chain(webm_file, work_directory) for _ in range(args.repeat)]
+        )
+        direct = best_timings(
+            [time_direct_decode(webm_file) for _ in range(args.repeat)]
+        )
+
+    for title, timings in (
+        ("WEBM -> MP3 -> WAV chain", chain),
+        ("Direct decode", direct),
+    ):
+        print(title)
+        for stage, elapsed in timings.items():
+            print(f"  {stage:<24}{elapsed * 1000:>10.1f} ms")
+        print(f"  {'total':<24}{sum(timings.values()) * 1000:>10.1f} ms")
+
+    print(f"Speedup: {sum(chain.values()) / sum(direct.values()):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+################################################################################
+# Filename: test_analysis_context.py
+# Purpose:  Contains pytest test cases for the shared analysis context.
+# Author:   Livia Chandra
+#
+# Description:
+# This file contains pytest test cases for AnalysisContext, checking that
+# features read from the shared context match the standalone librosa calls,
+# that every feature is computed only once, that compute timings are
+# recorded per feature, and that every key signature can be written to MIDI.
+#
+# Usage (Optional):
+# Run the tests using the pytest command:
+#   python -m pytest
+#
+# Notes:
+#
+###############################################################################
+
+import librosa
+import mido
+import numpy as np
+import pytest
+from app.utils.analysis_context import AnalysisContext, key_map
+
+SAMPLE_RATE = 22050
+
+
+@pytest.fixture
+def audio_data():
+    """
+    Fixture to provide a synthetic melody of one note per half second.
+
+    Returns:
+        ndarray: 1D float32 array that contains the melody.
+    """
+    notes = np.repeat([220.0, 330.0, 262.0, 392.0] * 3, SAMPLE_RATE // 2)
+    phase = 2 * np.pi * np.cumsum(notes) / SAMPLE_RATE
+    return (0.5 * np.sin(phase)).astype(np.float32)
+
+
+def test_shared_features_match_librosa(audio_data):
+    """
+    Test that the context derives the same beats and pitch as librosa alone.
+
+    Args:
+        audio_data (ndarray): Synthetic melody.
+    """
+    context = AnalysisContext(audio_data, SAMPLE_RATE)
+
+    tempo, beat_frames = librosa.beat.beat_track(y=audio_data, sr=SAMPLE_RATE)
+    assert context.beats[0] == tempo
+    np.testing.assert_array_equal(context.beats[1], beat_frames)
+
+    pitch = librosa.yin(
+        y=audio_data,
+        sr=SAMPLE_RATE,
+        fmin=librosa.note_to_hz("C1"),
+        fmax=librosa.note_to_hz("C8"),
+    )
+    np.testing.assert_array_equal(context.pitch, pitch)
+
+
+def test_features_are_memoized(audio_data, monkeypatch):
+    """
+    Test that the spectrogram is computed once and shared between stages.
+
+    Args:
+        audio_data (ndarray): Synthetic melody.
+        monkeypatch (MonkeyPatch): Pytest fixture to count STFT calls.
+    """
+    stft_calls = []
+    stft = librosa.stft
+
+    def counting_stft(*args, **kwargs):
+        stft_calls.append(1)
+        return stft(*args, **kwargs)
+
+    monkeypatch.setattr(librosa, "stft", counting_stft)
+
+    context = AnalysisContext(audio_data, SAMPLE_RATE)
+    context.onset_envelope
+    context.beats
+    context.beat_times
+    context.segment_frequencies
+
+    assert len(stft_calls) == 1
+    assert context.beats is context.beats
+
+
+def test_feature_timings(audio_data):
+    """
+    Test that a compute timing is recorded for every requested feature.
+
+    Args:
+        audio_data (ndarray): Synthetic melody.
+    """
+    context = AnalysisContext(audio_data, SAMPLE_RATE)
+    context.key_signature
+    context.segment_frequencies
+
+    assert set(context.timings) == {
+        "pitch",
+        "key_signature",
+        "power_spectrogram",
+        "onset_envelope",
+        "beats",
+        "segment_frequencies",
+    }
+    assert all(elapsed >= 0 for elapsed in context.timings.values())
+
+
+def test_key_map_spellings_are_valid_midi():
+    """
+    Test that every key signature the analysis reports is accepted by mido.
+    """
+    for key in key_map.values():
+        assert mido.MetaMessage("key_signature", key=key).key == key
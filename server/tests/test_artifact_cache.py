@@ -0,0 +1,214 @@
+################################################################################
+# Filename: test_artifact_cache.py
+# Purpose:  Contains pytest test cases for the artifact cache.
+# Author:   Livia Chandra
+#
+# Description:
+# This file contains pytest test cases for the in-process cache of the
+# MusicXML get_midi renders for MIDI entries stored without it. It checks
+# that the cache is bounded by size and evicts the least recently used
+# entries, that concurrent use keeps its size consistent, that repeated
+# reads of a legacy MIDI are rendered once, that entries with stored
+# MusicXML are not cached, and that updating or deleting a MIDI entry drops
+# its rendering and moves it to a new version.
+#
+# Usage (Optional):
+# Run the tests using the pytest command:
+#   python -m pytest
+#
+###############################################################################
+
+import io
+import threading
+from datetime import datetime
+import mido
+import pytest
+from app import create_app
+from app.database import db
+from app.test_config import TestingConfig
+from app.models.midi_model import MIDI
+from app.models.user_model import User
+from app.utils import midi_to_musicxml
+from app.utils.artifact_cache import ArtifactCache, artifact_cache, artifact_key
+from app.utils.base64_converter import BinaryConverter
+from app.utils.status_codes import OK
+
+MIDIS_API_URL = "api/v1/midis"
+ARTIFACT_CACHE_API_URL = "api/v1/cache/artifacts"
+
+
+@pytest.fixture
+def app():
+    app = create_app(TestingConfig)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def melody_midi(notes):
+    """Write a MIDI file of a short melody and return its content."""
+    midi_file = mido.MidiFile()
+    track = mido.MidiTrack()
+    midi_file.tracks.append(track)
+    for note in notes:
+        track.append(mido.Message("note_on", note=note, velocity=64, time=0))
+        track.append(mido.Message("note_off", note=note, velocity=0, time=480))
+    buffer = io.BytesIO()
+    midi_file.save(file=buffer)
+    return buffer.getvalue()
+
+
+def add_midi(midi_data, xml_data=None):
+    """Store a MIDI entry, by default without MusicXML, and return it."""
+    user = User(name="John", email="john@gmail.com")
+    db.session.add(user)
+    db.session.commit()
+    midi = MIDI(
+        user_id=user.user_id,
+        title="A Random Song",
+        date=datetime.now(),
+        midi_data=midi_data,
+        xml_data=xml_data,
+    )
+    db.session.add(midi)
+    db.session.commit()
+    return midi
+
+
+def test_lru_eviction_by_size():
+    """
+    Test that the least recently used entries are evicted to respect the size bound.
+    """
+    cache = ArtifactCache(max_bytes=10)
+    cache.put((1, "a"), b"1234")
+    cache.put((2, "b"), b"1234")
+    assert cache.get((1, "a")) == b"1234"
+
+    cache.put((3, "c"), b"1234")
+    assert cache.get((2, "b")) is None
+    assert cache.get((1, "a")) is not None
+    cache.put((4, "d"), b"12345678901")
+    assert cache.get((4, "d")) is None
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["stores"]) == (2, 2, 3)
+    assert (stats["evictions"], stats["entries"], stats["bytes"]) == (1, 2, 8)
+
+
+def test_concurrent_use():
+    """
+    Test that concurrent stores and lookups keep the cache size consistent.
+    """
+    cache = ArtifactCache(max_bytes=1000)
+
+    def worker(offset):
+        for index in range(500):
+            key = ((offset + index) % 200, "hash")
+            if cache.get(key) is None:
+                cache.put(key, b"x" * 10)
+            if index % 50 == 0:
+                cache.invalidate(index % 200)
+
+    threads = [threading.Thread(target=worker, args=(i * 7,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    stats = cache.stats()
+    assert stats["bytes"] == stats["entries"] * 10 <= 1000
+    assert stats["hits"] + stats["misses"] == 8 * 500
+
+
+def test_get_midi_served_from_cache(client, monkeypatch):
+    """
+    Test that reading a legacy MIDI again reuses its rendered MusicXML.
+
+    Args:
+        client (FlaskClient): The test client for the application.
+        monkeypatch (MonkeyPatch): Fixture to count the renderings.
+    """
+    midi = add_midi(melody_midi([60, 62, 64]))
+    renders = []
+    render = midi_to_musicxml.midi_to_musicxml
+
+    def counted_render(midi_data):
+        renders.append(midi_data)
+        return render(midi_data)
+
+    monkeypatch.setattr(midi_to_musicxml, "midi_to_musicxml", counted_render)
+
+    # The counters are shared by every app in the process
+    before = client.get(ARTIFACT_CACHE_API_URL).json
+
+    response = client.get(f"{MIDIS_API_URL}/{midi.midi_id}")
+    assert response.status_code == OK
+    first = response.json
+    response = client.get(f"{MIDIS_API_URL}/{midi.midi_id}")
+    assert response.json == first
+    assert len(renders) == 1
+
+    stats = client.get(ARTIFACT_CACHE_API_URL).json
+    assert stats["hits"] == before["hits"] + 1
+    assert stats["misses"] == before["misses"] + 1
+    assert stats["stores"] == before["stores"] + 1
+    assert midi.version == 1
+    xml_data = BinaryConverter.decode_binary(first["xml_data"])
+    assert artifact_cache.get(artifact_key(midi.midi_id, 1)) == xml_data
+
+
+def test_stored_musicxml_not_cached(client):
+    """
+    Test that an entry with stored MusicXML is served without the cache.
+
+    Args:
+        client (FlaskClient): The test client for the application.
+    """
+    midi = add_midi(melody_midi([60]), b"<score-partwise />")
+    before = artifact_cache.stats()
+
+    response = client.get(f"{MIDIS_API_URL}/{midi.midi_id}")
+    xml_data = BinaryConverter.decode_binary(response.json["xml_data"])
+    assert xml_data == b"<score-partwise />"
+    stats = artifact_cache.stats()
+    assert (stats["misses"], stats["stores"]) == (before["misses"], before["stores"])
+    assert artifact_cache.get(artifact_key(midi.midi_id, 1)) is None
+
+
+def test_update_and_delete_invalidate(client):
+    """
+    Test that updating or deleting a MIDI entry drops its rendering.
+
+    Args:
+        client (FlaskClient): The test client for the application.
+    """
+    midi = add_midi(melody_midi([60, 62]))
+    other = add_midi(melody_midi([67]))
+    client.get(f"{MIDIS_API_URL}/{midi.midi_id}")
+    client.get(f"{MIDIS_API_URL}/{other.midi_id}")
+    stats = artifact_cache.stats()
+    assert stats["entries"] == 2
+
+    midi.title = "Renamed"
+    db.session.commit()
+    assert midi.version == 2
+    assert artifact_cache.get(artifact_key(midi.midi_id, 1)) is None
+    assert artifact_cache.get(artifact_key(other.midi_id, 1)) is not None
+
+    # The next read stores the rendering of the new version
+    assert client.get(f"{MIDIS_API_URL}/{midi.midi_id}").json["title"] == "Renamed"
+    assert artifact_cache.get(artifact_key(midi.midi_id, 2)) is not None
+
+    db.session.delete(other)
+    db.session.commit()
+    db.session.delete(midi)
+    db.session.commit()
+    assert artifact_cache.stats()["entries"] == 0
+    assert artifact_cache.stats()["invalidations"] == stats["invalidations"] + 3
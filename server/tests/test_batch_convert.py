@@ -0,0 +1,137 @@
+################################################################################
+# Filename: test_batch_convert.py
+# Purpose:  Contains pytest test cases for the batch conversion script.
+# Author:   Livia Chandra
+#
+# Description:
+# This file contains pytest test cases for batch_convert, checking that a
+# directory tree of recordings is converted into a mirrored output tree,
+# that a second run skips what the manifest lists as converted, that files
+# a crashed run never finished are converted on the next one, and that the
+# results are inserted into the database in batches. The recordings are
+# two-second synthetic melodies converted inline, with one run through a
+# single-worker pool.
+#
+# Usage (Optional):
+# Run the tests using the pytest command:
+#   python -m pytest
+#
+###############################################################################
+
+import json
+import os
+import numpy as np
+import pytest
+import soundfile
+from app import create_app
+from app.database import db
+from app.test_config import TestingConfig
+from app.models.midi_model import MIDI
+from batch_convert import batch_convert, read_manifest
+
+SAMPLE_RATE = 22050
+
+
+def write_melody(path, duration=2):
+    """
+    Write a WAV file of sine tones, one note per half second.
+
+    Args:
+        path (str): The path to store WAV file.
+        duration (float): Length of the melody in seconds.
+    """
+    rng = np.random.default_rng(0)
+    note_length = SAMPLE_RATE // 2
+    notes = rng.integers(48, 84, size=int(duration * 2))
+    frequencies = np.repeat(440.0 * 2 ** ((notes - 69) / 12), note_length)
+    phase = 2 * np.pi * np.cumsum(frequencies) / SAMPLE_RATE
+    soundfile.write(path, (0.5 * np.sin(phase)).astype(np.float32), SAMPLE_RATE)
+
+
+@pytest.fixture
+def recordings(tmp_path):
+    input_dir = tmp_path / "lessons"
+    os.makedirs(input_dir / "week1")
+    os.makedirs(input_dir / "week2")
+    write_melody(str(input_dir / "week1" / "scale.wav"))
+    write_melody(str(input_dir / "week2" / "song.WAV"))
+    (input_dir / "week2" / "notes.txt").write_text("not a recording")
+    (input_dir / "week2" / "broken.mp3").write_bytes(b"not audio")
+    return str(input_dir)
+
+
+def test_batch_convert_and_resume(recordings, tmp_path):
+    """
+    Test that recordings are converted once and failures are tried again.
+
+    Args:
+        recordings (str): Directory of test recordings.
+        tmp_path (pathlib.Path): Temporary directory for the output.
+    """
+    output_dir = str(tmp_path / "output")
+    summary = batch_convert(recordings, output_dir, workers=1)
+    assert summary == {"converted": 2, "skipped": 0, "failed": 1, "inserted": 0}
+
+    for base in ("week1/scale", "week2/song"):
+        with open(os.path.join(output_dir, base + ".mid"), "rb") as midi_file:
+            assert midi_file.read(4) == b"MThd"
+        assert os.path.exists(os.path.join(output_dir, base + ".musicxml"))
+    records = read_manifest(os.path.join(output_dir, "manifest.jsonl"))
+    assert records["week1/scale.wav"]["status"] == "converted"
+    assert records["week2/broken.mp3"]["status"] == "failed"
+
+    summary = batch_convert(recordings, output_dir, workers=0)
+    assert summary == {"converted": 0, "skipped": 2, "failed": 1, "inserted": 0}
+
+
+def test_resume_after_crash(recordings, tmp_path):
+    """
+    Test that a run converts only the files a crashed run did not finish.
+
+    Args:
+        recordings (str): Directory of test recordings.
+        tmp_path (pathlib.Path): Temporary directory for the output.
+    """
+    os.remove(os.path.join(recordings, "week2", "broken.mp3"))
+    output_dir = str(tmp_path / "output")
+    batch_convert(recordings, output_dir, workers=0)
+
+    # Keep the first record and a line cut short, as a crash would leave them
+    manifest_path = os.path.join(output_dir, "manifest.jsonl")
+    with open(manifest_path) as manifest_file:
+        first = manifest_file.readline()
+    with open(manifest_path, "w") as manifest_file:
+        manifest_file.write(first + '{"path": "week')
+
+    summary = batch_convert(recordings, output_dir, workers=0)
+    assert summary["converted"] == 1
+    assert summary["skipped"] == 1
+    assert json.loads(first)["path"] in read_manifest(manifest_path)
+
+
+def test_batch_insert(recordings, tmp_path):
+    """
+    Test that the results are inserted into the database once.
+
+    Args:
+        recordings (str): Directory of test recordings.
+        tmp_path (pathlib.Path): Temporary directory for the output.
+    """
+    output_dir = str(tmp_path / "output")
+    app = create_app(TestingConfig)
+    with app.app_context():
+        db.create_all()
+
+    # Convert without the database first, then insert on the next run
+    batch_convert(recordings, output_dir, workers=0)
+    summary = batch_convert(recordings, output_dir, workers=0, app=app, batch_size=1)
+    assert summary["inserted"] == 2
+
+    summary = batch_convert(recordings, output_dir, workers=0, app=app)
+    assert summary["inserted"] == 0
+    with app.app_context():
+        titles = sorted(midi.title for midi in MIDI.query.all())
+        assert titles == ["scale", "song"]
+        assert all(midi.xml_data for midi in MIDI.query.all())
+        db.session.remove()
+        db.drop_all()
@@ -0,0 +1,138 @@
+################################################################################
+# Filename: test_batch_upload.py
+# Purpose:  Test the batch upload API.
+# Author:   Benjamin Goh
+#
+# Description:
+# This file contains pytest test cases for POST /api/v1/midis/batch. It
+# checks that several recordings in one request are converted and stored
+# under one user, that a file that fails is reported on its own while the
+# others are stored, and that invalid batches are rejected.
+#
+# Usage (Optional):
+# Run the tests using the pytest command:
+#   python -m pytest
+#
+###############################################################################
+
+import os
+from io import BytesIO
+import pytest
+from app import create_app
+from app.database import db
+from app.test_config import TestingConfig
+from app.models.midi_model import MIDI
+from app.models.user_model import User
+from app.utils.base64_converter import BinaryConverter
+from app.utils.job_queue import job_queue
+from app.utils.status_codes import CREATED, MULTI_STATUS, BAD_REQUEST
+
+SAMPLE_WAV = os.path.abspath(
+    os.path.join(
+        os.path.dirname(__file__),
+        "..",
+        "app",
+        "utils",
+        "audio_sample",
+        "sample_wav.wav",
+    )
+)
+BATCH_API_URL = "api/v1/midis/batch"
+
+
+class BatchConfig(TestingConfig):
+    MAX_BATCH_FILES = 3
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    app = create_app(BatchConfig)
+    with app.app_context():
+        db.create_all()
+        yield app.test_client()
+        job_queue.shutdown()
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture(scope="module")
+def audio_data():
+    with open(SAMPLE_WAV, "rb") as audio_file:
+        return audio_file.read()
+
+
+def upload_batch(client, files, **fields):
+    """Post a batch of files to the batch API and return the response."""
+    form = {"name": "John", "email": "john@gmail.com", **fields}
+    form["files"] = [(BytesIO(data), file_name) for data, file_name in files]
+    return client.post(BATCH_API_URL, data=form, content_type="multipart/form-data")
+
+
+def test_batch_upload(client, audio_data):
+    """
+    Test that every file of a batch is converted and stored under one user.
+
+    Args:
+        client (FlaskClient): The test client for the application.
+        audio_data (bytes): Content of the sample recording.
+    """
+    response = upload_batch(
+        client,
+        [(audio_data, "first.wav"), (audio_data, "second.wav")],
+        titles=["First Song", "Second Song"],
+    )
+    assert response.status_code == CREATED
+    assert [result["status"] for result in response.json] == ["created", "created"]
+    assert [result["title"] for result in response.json] == [
+        "First Song",
+        "Second Song",
+    ]
+
+    assert User.query.count() == 1
+    for result in response.json:
+        midi = db.session.get(MIDI, result["midi_id"])
+        assert midi.midi_data == BinaryConverter.decode_binary(result["midi_data"])
+        assert midi.xml_data.startswith(b"<?xml")
+
+    # The uploads are removed once converted
+    assert os.listdir("app/utils/audio_sample") == []
+
+
+def test_partial_failure(client, audio_data):
+    """
+    Test that a file that fails is reported while the others are stored.
+
+    Args:
+        client (FlaskClient): The test client for the application.
+        audio_data (bytes): Content of the sample recording.
+    """
+    response = upload_batch(
+        client, [(b"not audio", "broken.mp3"), (audio_data, "song.wav")]
+    )
+    assert response.status_code == MULTI_STATUS
+    failed, created = response.json
+    assert failed["file"] == "broken.mp3"
+    assert failed["status"] == "failed"
+    assert failed["error"]
+    assert created["status"] == "created"
+    assert created["title"] == "song"
+    assert MIDI.query.count() == 1
+
+
+def test_invalid_batch(client, audio_data):
+    """
+    Test that batches without files, with too many files, with mismatched titles or with an unknown profile are rejected.
+
+    Args:
+        client (FlaskClient): The test client for the application.
+        audio_data (bytes): Content of the sample recording.
+    """
+    assert upload_batch(client, []).status_code == BAD_REQUEST
+    files = [(audio_data, f"{index}.wav") for index in range(4)]
+    assert upload_batch(client, files).status_code == BAD_REQUEST
+    files = [(audio_data, "song.wav")]
+    assert upload_batch(client, files, titles=["a", "b"]).status_code == BAD_REQUEST
+    assert upload_batch(client, files, profile="opera").status_code == BAD_REQUEST
+    assert MIDI.query.count() == 0
@@ -0,0 +1,304 @@
+################################################################################
+# Filename: test_chunked_conversion.py
+# Purpose:  Contains pytest test cases for chunked conversion of long recordings.
+# Author:   Livia Chandra
+#
+# Description:
+# This file contains pytest test cases for convert_chunked, checking that
+# recordings are split in their quietest frames, that segment chunks start
+# on segment boundaries, that a recording is prepared in a fraction of its
+# size in memory, that the register is estimated as for the whole
+# recording, that a chunked conversion in a process pool finds the same
+# tempo, key and notes as converting the recording whole, without leaving
+# its shared memory file behind, and that every task runs within a budget
+# from the thread governor.
+#
+# Usage (Optional):
+# Run the tests using the pytest command:
+#   python -m pytest
+#
+# Notes:
+# - Every conversion runs in a process pool, as in the server, so each
+#   task limits its threads the way a pool worker does.
+#
+###############################################################################
+
+import io
+import os
+import subprocess
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+import mido
+import numpy as np
+import pytest
+import soundfile
+from app.utils import chunked_conversion
+from app.utils.chunked_conversion import (
+    ChunkPlan,
+    convert_chunked,
+    prepare_chunks,
+    recording_pitch_range,
+    recording_seconds,
+    segment_split_points,
+    split_points,
+)
+from app.utils.conversion_profiles import get_profile
+from app.utils.job_queue import convert_job
+from app.utils.pitch_range import estimate_pitch_range
+from app.utils.thread_governor import ThreadGovernor
+
+SAMPLE_RATE = 22050
+
+
+def melody(duration, seed=0):
+    """
+    Helper function to generate a melody of sine tones, two notes per second.
+
+    Args:
+        duration (float): Length of the melody in seconds.
+        seed (int): Seed of the random note sequence.
+
+    Returns:
+        ndarray: 1D float32 array that contains the melody.
+    """
+    rng = np.random.default_rng(seed)
+    notes = rng.integers(57, 77, size=int(duration * 2))
+    frequencies = np.repeat(440.0 * 2 ** ((notes - 69) / 12), SAMPLE_RATE // 2)
+    phase = 2 * np.pi * np.cumsum(frequencies) / SAMPLE_RATE
+    return (0.5 * np.sin(phase)).astype(np.float32)
+
+
+def notes_of(midi_data):
+    """
+    Helper function to read the notes and meta messages of a MIDI file.
+
+    Args:
+        midi_data (bytes): Content of the MIDI file.
+
+    Returns:
+        tuple: Key signature, tempo in microseconds per beat, and the start
+               tick and note number of each note.
+    """
+    midi = mido.MidiFile(file=io.BytesIO(midi_data))
+    messages = list(midi.tracks[0])
+    key = next(message.key for message in messages if message.type == "key_signature")
+    tempo = next(message.tempo for message in messages if message.type == "set_tempo")
+    notes = []
+    tick = 0
+    for message in messages:
+        tick += message.time
+        if message.type == "note_on" and message.velocity > 0:
+            notes.append((tick, message.note))
+    return key, tempo, notes
+
+
+@pytest.fixture
+def shared_directory(tmp_path, monkeypatch):
+    """
+    Fixture to keep the shared memory files of a test in its own directory.
+
+    Returns:
+        Path: The directory the shared memory files are written to.
+    """
+    directory = tmp_path / "shared"
+    directory.mkdir()
+    monkeypatch.setattr(chunked_conversion, "shared_memory_directory", str(directory))
+    return directory
+
+
+def test_split_points_fall_in_silence():
+    """
+    Test that a recording is split in the pause closest to the even split.
+    """
+    pause = np.zeros(2 * SAMPLE_RATE, dtype=np.float32)
+    audio_data = np.concatenate((melody(31), pause, melody(29, seed=1)))
+
+    points = split_points(audio_data, SAMPLE_RATE, 2)
+
+    assert points[0] == 0 and points[-1] == len(audio_data)
+    assert len(points) == 3
+    assert 31 * SAMPLE_RATE <= points[1] <= 33 * SAMPLE_RATE
+    assert points[1] % 512 == 0
+
+
+def test_short_recording_is_one_chunk():
+    """
+    Test that no chunk is shorter than the minimum chunk length.
+    """
+    audio_data = melody(40)
+
+    assert split_points(audio_data, SAMPLE_RATE, 8) == [0, len(audio_data)]
+
+
+def test_segment_split_points():
+    """
+    Test that segment chunks start on the segment boundary nearest each split.
+    """
+    plan = ChunkPlan("unused", "unused", 100000, SAMPLE_RATE, [0, 30100, 61000, 100000])
+
+    assert segment_split_points(plan, 10000) == [0, 30000, 60000, 100000]
+
+
+def test_recording_seconds(tmp_path):
+    """
+    Test that the duration of a WAV file is read from its header.
+
+    Args:
+        tmp_path (Path): Pytest fixture for a temporary directory.
+    """
+    audio_file = str(tmp_path / "melody.wav")
+    soundfile.write(audio_file, melody(3), SAMPLE_RATE, subtype="FLOAT")
+
+    assert recording_seconds(audio_file) == pytest.approx(3.0, abs=1e-3)
+
+
+def test_recording_seconds_probe_timeout(tmp_path, monkeypatch):
+    """
+    Test that a recording ffprobe does not read in time has no duration.
+
+    Args:
+        tmp_path (Path): Pytest fixture for a temporary directory.
+        monkeypatch (MonkeyPatch): Fixture to replace ffprobe.
+    """
+
+    def hung_probe(command, timeout=None, **kwargs):
+        raise subprocess.TimeoutExpired(command, timeout)
+
+    monkeypatch.setattr(subprocess, "run", hung_probe)
+    audio_file = tmp_path / "take.mp3"
+    audio_file.write_bytes(b"not audio")
+
+    assert recording_seconds(str(audio_file), timeout=0.1) is None
+
+
+def test_recording_pitch_range():
+    """
+    Test that the register estimated a block at a time matches that of the whole recording.
+    """
+    profile = get_profile("default")
+    audio_data = melody(70)
+
+    assert recording_pitch_range(audio_data, SAMPLE_RATE, profile) == estimate_pitch_range(
+        audio_data, SAMPLE_RATE, profile.yin_frame_length, profile.yin_hop_length
+    )
+
+
+def test_prepare_chunks_peak_memory(tmp_path, shared_directory):
+    """
+    Test that decoding, gating and planning a recording allocates less than half a copy of it.
+
+    Args:
+        tmp_path (Path): Pytest fixture for a temporary directory.
+        shared_directory (Path): Directory of the shared memory files.
+    """
+    pause = np.zeros(10 * SAMPLE_RATE, dtype=np.float32)
+    audio_data = np.concatenate((pause, melody(120), pause))
+    audio_file = str(tmp_path / "long.wav")
+    soundfile.write(audio_file, audio_data, SAMPLE_RATE, subtype="PCM_16")
+    profile = get_profile("phone")
+
+    # Import the decoder and pitch stages before measuring
+    plan, _ = prepare_chunks(audio_file, profile, 4)
+    os.remove(plan.path)
+
+    tracemalloc.start()
+    plan, _ = prepare_chunks(audio_file, profile, 4)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    os.remove(plan.path)
+
+    assert plan.sample_count < len(audio_data)
+    assert peak < audio_data.nbytes / 2
+
+
+@pytest.mark.parametrize("profile", ["default", "phone"])
+def test_chunked_matches_whole_conversion(tmp_path, shared_directory, profile):
+    """
+    Test that a chunked conversion in a process pool writes the notes of the whole recording.
+
+    Args:
+        tmp_path (Path): Pytest fixture for a temporary directory.
+        shared_directory (Path): Directory of the shared memory files.
+        profile (str): Name of the conversion profile, with and without the voicing gate.
+    """
+    # Silence before and between the takes, for the voicing gate to cut out
+    pause = np.zeros(3 * SAMPLE_RATE, dtype=np.float32)
+    audio_data = np.concatenate((pause, melody(60), pause, melody(50, seed=1)))
+    audio_file = str(tmp_path / "long.wav")
+    soundfile.write(audio_file, audio_data, SAMPLE_RATE, subtype="FLOAT")
+
+    with ProcessPoolExecutor(max_workers=3) as executor:
+        midi_data, xml_data, timings = convert_chunked(
+            audio_file, executor, 3, profile
+        )
+    expected_midi, _, expected_timings = convert_job(audio_file, profile)
+
+    key, tempo, notes = notes_of(midi_data)
+    expected_key, expected_tempo, expected_notes = notes_of(expected_midi)
+    assert key == expected_key
+    assert tempo == expected_tempo
+    assert notes == expected_notes
+    assert xml_data
+    assert set(expected_timings) - {"midi_write"} <= set(timings)
+    assert os.listdir(shared_directory) == []
+
+
+def test_undecodable_recording(tmp_path, shared_directory):
+    """
+    Test that a recording that cannot be decoded fails without a shared file.
+
+    Args:
+        tmp_path (Path): Pytest fixture for a temporary directory.
+        shared_directory (Path): Directory of the shared memory files.
+    """
+    audio_file = tmp_path / "broken.wav"
+    audio_file.write_bytes(b"not audio")
+
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        with pytest.raises(RuntimeError):
+            convert_chunked(str(audio_file), executor, 2)
+    assert os.listdir(shared_directory) == []
+
+
+class CountingGovernor(ThreadGovernor):
+    """
+    Thread governor that counts the budgets it hands out.
+
+    Attributes:
+        acquired (int): Number of budgets handed out.
+    """
+
+    def __init__(self, workers):
+        super().__init__()
+        self.workers = workers
+        self.acquired = 0
+
+    def acquire(self):
+        """
+        Allocate a thread budget and count it.
+
+        Returns:
+            ThreadAllocation: The budget.
+        """
+        self.acquired += 1
+        return super().acquire()
+
+
+def test_tasks_use_governor_budgets(tmp_path, shared_directory):
+    """
+    Test that every task of a chunked conversion acquires and releases a budget.
+
+    Args:
+        tmp_path (Path): Pytest fixture for a temporary directory.
+        shared_directory (Path): Directory of the shared memory files.
+    """
+    audio_file = str(tmp_path / "short.wav")
+    soundfile.write(audio_file, melody(5), SAMPLE_RATE, subtype="FLOAT")
+    governor = CountingGovernor(workers=2)
+
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        convert_chunked(audio_file, executor, 2, "fast", governor)
+
+    # Prepare, one analysis chunk, beats, one segment chunk and writing
+    assert governor.acquired == 5
+    assert governor.allocated_threads() == 0
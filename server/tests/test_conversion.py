@@ -16,7 +16,13 @@
 
 import pytest
 import os
-from app.utils.conversion import audio_to_wav, convert_webm_to_mp3, divide_audio_data, wav_to_midi
+import numpy as np
+from app.utils.conversion import (
+    audio_to_wav,
+    decode_audio,
+    divide_audio_data,
+    wav_to_midi,
+)
 
 @pytest.fixture
 def audio_files():
@@ -68,6 +74,56 @@ def test_audio_input(audio_files):
     assert flac_output is None
 
 
+def test_broken_webm_is_rejected(tmp_path, monkeypatch):
+    """
+    Test that audio_to_wav returns None when ffmpeg cannot decode a WEBM file,
+    rather than a WAV file left over from an earlier conversion.
+
+    Args:
+        tmp_path (Path): Pytest fixture for a temporary directory.
+        monkeypatch (MonkeyPatch): Pytest fixture to change directory.
+    """
+    monkeypatch.chdir(tmp_path)
+    webm_file = tmp_path / "broken.webm"
+    webm_file.write_bytes(b"not a recording")
+    (tmp_path / "broken.wav").write_bytes(b"stale")
+
+    assert audio_to_wav(str(webm_file)) is None
+
+
+def test_decode_audio(audio_files):
+    """
+    Test decode_audio function for decoding audio files straight into memory.
+    Reject audio files other than the accepted file formats.
+
+    Args:
+        audio_files (dict): Dictionary containing sample audio file paths.
+    """
+
+    files_before = set(os.listdir(os.getcwd()))
+
+    # Valid test case - WAV decoded to mono float32 at the analysis sample rate
+    file_name, audio_data, sample_rate = decode_audio(audio_files["wav"])
+    assert file_name == "sample_wav"
+    assert sample_rate == 22050
+    assert audio_data.dtype == np.float32
+    assert audio_data.ndim == 1
+    assert len(audio_data) > 0
+
+    # Valid test case - WEBM decoded from Opus in a single step
+    _, webm_data, webm_sample_rate = decode_audio(audio_files["webm"])
+    assert webm_sample_rate == 22050
+    assert webm_data.dtype == np.float32
+    assert abs(len(webm_data) - len(audio_data)) < webm_sample_rate * 0.1
+
+    # No intermediate file is written to the working directory
+    assert set(os.listdir(os.getcwd())) == files_before
+
+    # Invalid test case - FLAC
+    flac_output = decode_audio(audio_files["flac"])
+    assert flac_output is None
+
+
 def test_divide_audio_data():
     """
     Test divide_audio_data helper function for segmenting audio data.
@@ -0,0 +1,86 @@
+################################################################################
+# Filename: test_conversion_cache.py
+# Purpose:  Contains pytest test cases for the conversion cache.
+# Author:   Livia Chandra
+#
+# Description:
+# This file contains pytest test cases for the ConversionCache class and the
+# cache_key function, checking that keys follow the uploaded file and the pipeline
+# parameters, that entries survive a restart, and that the least recently
+# used entries are evicted once the size bound is reached.
+#
+# Usage (Optional):
+# Run the tests using the pytest command:
+#   python -m pytest
+#
+###############################################################################
+
+from app.utils.conversion_cache import ConversionCache, cache_key, pipeline_parameters
+
+
+def test_cache_key(tmp_path):
+    """
+    Test that the key depends on the uploaded file and the pipeline parameters.
+
+    Args:
+        tmp_path (pathlib.Path): Temporary directory for the uploads.
+    """
+    first_upload = tmp_path / "first.wav"
+    second_upload = tmp_path / "second.wav"
+    other_upload = tmp_path / "other.wav"
+    first_upload.write_bytes(bytes(range(256)) * 10000)
+    second_upload.write_bytes(bytes(range(256)) * 10000)
+    other_upload.write_bytes(bytes(range(256))[::-1] * 10000)
+    key = cache_key(first_upload)
+
+    assert key == cache_key(second_upload)
+    assert key != cache_key(other_upload)
+    assert key != cache_key(first_upload, dict(pipeline_parameters(), hop_length=256))
+
+
+def test_get_and_put(tmp_path):
+    """
+    Test that stored entries are found again, also after a restart.
+
+    Args:
+        tmp_path (pathlib.Path): Temporary cache directory.
+    """
+    cache = ConversionCache(str(tmp_path), 1024)
+    assert cache.get("a") is None
+
+    cache.put("a", b"midi", b"xml")
+    assert cache.get("a") == (b"midi", b"xml")
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+    assert cache.stats()["bytes"] == 7
+
+    restarted = ConversionCache(str(tmp_path), 1024)
+    assert restarted.get("a") == (b"midi", b"xml")
+
+
+def test_lru_eviction(tmp_path):
+    """
+    Test that the least recently used entry is evicted beyond the size bound.
+
+    Args:
+        tmp_path (pathlib.Path): Temporary cache directory.
+    """
+    cache = ConversionCache(str(tmp_path), 20)
+    cache.put("a", b"a" * 5, b"a" * 5)
+    cache.put("b", b"b" * 5, b"b" * 5)
+
+    # Reading "a" makes "b" the least recently used entry
+    cache.get("a")
+    cache.put("c", b"c" * 5, b"c" * 5)
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["bytes"] == 20
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "a.mid",
+        "a.musicxml",
+        "c.mid",
+        "c.musicxml",
+    ]
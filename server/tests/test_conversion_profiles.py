@@ -0,0 +1,101 @@
+################################################################################
+# Filename: test_conversion_profiles.py
+# Purpose:  Contains pytest test cases for the conversion profiles.
+# Author:   Livia Chandra
+#
+# Description:
+# This file contains pytest test cases for the conversion profiles, checking
+# profile lookup, the ffmpeg resampler options each profile selects, that
+# every profile converts a recording to MIDI, and that the MIDI and MusicXML
+# can be produced in memory without writing any file.
+#
+# Usage (Optional):
+# Run the tests using the pytest command:
+#   python -m pytest
+#
+###############################################################################
+
+import os
+import pytest
+from app.utils.conversion import (
+    decode_audio,
+    decode_command,
+    wav_to_midi,
+    wav_to_midi_bytes,
+)
+from app.utils.midi_to_musicxml import midi_to_musicxml
+from app.utils.conversion_profiles import get_profile, profiles
+
+SAMPLE_WAV = os.path.join(
+    os.path.dirname(__file__), "..", "app", "utils", "audio_sample", "sample_wav.wav"
+)
+
+
+def test_get_profile():
+    """
+    Test looking up profiles by name, by object and by default.
+    """
+    assert get_profile() is profiles["default"]
+    assert get_profile("fast") is profiles["fast"]
+    assert get_profile(profiles["hum"]) is profiles["hum"]
+    assert get_profile("missing") is None
+
+
+def test_decode_command_resampler():
+    """
+    Test that only non-default resamplers add an aresample filter.
+    """
+    assert "-af" not in decode_command("a.wav", 22050)
+    command = decode_command("a.wav", 11025, "fast")
+    assert command[command.index("-af") + 1].startswith("aresample=11025:")
+    assert "-ar" in command
+
+
+@pytest.mark.parametrize("name", sorted(profiles))
+def test_wav_to_midi_with_profile(tmp_path, monkeypatch, name):
+    """
+    Test that every profile decodes at its sample rate and writes a MIDI file.
+
+    Args:
+        tmp_path (pathlib.Path): Temporary working directory.
+        monkeypatch (MonkeyPatch): Fixture to change the working directory.
+        name (str): Name of the conversion profile.
+    """
+    audio_file = os.path.abspath(SAMPLE_WAV)
+    os.makedirs(tmp_path / "midi_output")
+    monkeypatch.chdir(tmp_path)
+    profile = profiles[name]
+
+    _, audio_data, sample_rate = decode_audio(
+        audio_file, profile.sample_rate, profile.resampler
+    )
+    assert sample_rate == profile.sample_rate
+    assert (
+        abs(len(audio_data) - len(decode_audio(audio_file)[1]) * sample_rate / 22050)
+        < 64
+    )
+
+    with open(wav_to_midi(audio_file, profile=name), "rb") as midi_file:
+        assert midi_file.read(4) == b"MThd"
+
+
+def test_wav_to_midi_bytes(tmp_path, monkeypatch):
+    """
+    Test that the in-memory conversion matches the saved MIDI file and writes nothing.
+
+    Args:
+        tmp_path (pathlib.Path): Temporary working directory.
+        monkeypatch (MonkeyPatch): Fixture to change the working directory.
+    """
+    audio_file = os.path.abspath(SAMPLE_WAV)
+    monkeypatch.chdir(tmp_path)
+
+    midi_data = wav_to_midi_bytes(audio_file)
+    xml_data = midi_to_musicxml(midi_data)
+    assert not os.listdir(tmp_path)
+    assert midi_data.startswith(b"MThd")
+    assert b"<score-partwise" in xml_data
+
+    os.makedirs(tmp_path / "midi_output")
+    with open(wav_to_midi(audio_file), "rb") as midi_file:
+        assert midi_file.read() == midi_data
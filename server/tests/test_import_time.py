@@ -0,0 +1,96 @@
+################################################################################
+# Filename: test_import_time.py
+# Purpose:  Keep the API boot time within budget.
+# Author:   Livia Chandra
+#
+# Description:
+# This file contains a pytest test case that creates the Flask application
+# in a fresh interpreter under python -X importtime. It checks that the
+# audio analysis and notation libraries are not imported until a conversion
+# runs, and that the total import time stays under a fixed budget.
+#
+# Usage (Optional):
+# Run the tests using the pytest command:
+#   python -m pytest
+#
+# Notes:
+# The budget is generous for a development machine, where importing the app
+# takes about 0.7 seconds; importing librosa and music21 eagerly more than
+# doubles that.
+#
+###############################################################################
+
+import os
+import subprocess
+import sys
+
+SERVER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# Seconds create_app may spend importing modules
+IMPORT_BUDGET = 1.5
+
+# Libraries that only conversions need
+HEAVY_MODULES = {"librosa", "scipy", "numba", "music21", "mido", "pydub"}
+
+CREATE_APP = (
+    "from app import create_app\n"
+    "from app.test_config import TestingConfig\n"
+    "create_app(TestingConfig)\n"
+)
+
+# What an upload does before its job is queued
+CACHE_LOOKUP = (
+    CREATE_APP
+    + "from app.utils.conversion_cache import pipeline_parameters\n"
+    + "pipeline_parameters('default')\n"
+)
+
+
+def import_times(script=CREATE_APP):
+    """
+    Helper function to run a script in a fresh interpreter and collect its import times.
+
+    Args:
+        script (str): Python code to run, by default creating the app.
+
+    Returns:
+        list: Name, cumulative microseconds and nesting depth of every import.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", script],
+        cwd=SERVER_DIR,
+        env={**os.environ, "PYTHONPATH": SERVER_DIR},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        imports.append((name.strip(), int(cumulative), depth))
+    return imports
+
+
+def test_create_app_import_budget():
+    """
+    Test that creating the app neither loads the conversion libraries nor exceeds the import budget.
+    """
+    imports = import_times()
+
+    loaded = {name.split(".")[0] for name, _, _ in imports}
+    assert not loaded & HEAVY_MODULES
+
+    total = sum(cumulative for _, cumulative, depth in imports if depth == 0)
+    assert total / 1e6 < IMPORT_BUDGET
+
+
+def test_cache_lookup_loads_no_conversion_libraries():
+    """
+    Test that building the cache key of an upload does not load the conversion libraries.
+    """
+    loaded = {name.split(".")[0] for name, _, _ in import_times(CACHE_LOOKUP)}
+    assert not loaded & HEAVY_MODULES
@@ -0,0 +1,350 @@
+################################################################################
+# Filename: test_jobs.py
+# Purpose:  Test the asynchronous conversion job API.
+# Author:   Benjamin Goh
+#
+# Description:
+# This file contains pytest test cases for the background conversion jobs
+# started by POST /api/v1/midis. It checks that uploads are accepted with a
+# job ID, that GET /api/v1/jobs/<id> reports the status and resulting MIDI,
+# that a job stays queued until a worker starts it, that failed conversions
+# are reported, and that jobs survive both a server restart and a worker
+# process that dies mid-conversion.
+#
+# Usage (Optional):
+# Run the tests using the pytest command:
+#   python -m pytest
+#
+# Notes:
+# Most tests run with CONVERSION_WORKERS set to 0, so each conversion
+# finishes before the POST request returns. The queueing and crash tests
+# start a real process pool.
+#
+###############################################################################
+
+import os
+import shutil
+import time
+from io import BytesIO
+import pytest
+from app import create_app
+from app.database import db
+from app.test_config import TestingConfig
+from app.models.job_model import ConversionJob, QUEUED, RUNNING, SUCCEEDED, FAILED
+from app.models.midi_model import MIDI
+from app.utils.base64_converter import BinaryConverter
+from app.utils.conversion_cache import conversion_cache
+from app.utils.job_queue import job_queue
+from app.utils.status_codes import OK, CREATED, ACCEPTED, BAD_REQUEST, NOT_FOUND
+
+SAMPLE_WAV = os.path.abspath(
+    os.path.join(
+        os.path.dirname(__file__),
+        "..",
+        "app",
+        "utils",
+        "audio_sample",
+        "sample_wav.wav",
+    )
+)
+JOBS_API_URL = "api/v1/jobs"
+MIDIS_API_URL = "api/v1/midis"
+
+
+def crash_job(audio_file_path, profile=None, allocation=None):
+    """Stand-in conversion that kills the worker process."""
+    os._exit(1)
+
+
+def slow_job(audio_file_path, profile=None, allocation=None):
+    """Stand-in conversion that keeps its worker busy for a while, then fails."""
+    time.sleep(2)
+    raise RuntimeError("Stand-in conversion")
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    os.makedirs(tmp_path / "midi_output")
+    monkeypatch.chdir(tmp_path)
+
+    app = create_app(TestingConfig)
+    with app.app_context():
+        db.create_all()
+        yield app
+        job_queue.shutdown()
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def upload(client, data, file_name):
+    """Post an upload to the MIDI API and return the response."""
+    form = {
+        "name": "John",
+        "email": "john@gmail.com",
+        "title": "A Random Song",
+        "file": (BytesIO(data), file_name),
+    }
+    return client.post(MIDIS_API_URL, data=form, content_type="multipart/form-data")
+
+
+def wait_for_status(client, job_id, statuses, timeout=60):
+    """Poll a job until it reaches one of the statuses and return its JSON."""
+    deadline = time.monotonic() + timeout
+    while True:
+        job = client.get(f"{JOBS_API_URL}/{job_id}").json
+        if job["status"] in statuses or time.monotonic() > deadline:
+            return job
+        time.sleep(0.05)
+
+
+def test_create_midi_returns_job(client):
+    """
+    Test that an upload is accepted and its job reports the created MIDI.
+
+    Args:
+        client (FlaskClient): The test client for the application.
+    """
+    with open(SAMPLE_WAV, "rb") as audio_file:
+        response = upload(client, audio_file.read(), "sample_wav.wav")
+    assert response.status_code == ACCEPTED
+    job_id = response.json["job_id"]
+    assert response.headers["Location"] == f"/api/v1/jobs/{job_id}"
+
+    response = client.get(f"{JOBS_API_URL}/{job_id}")
+    assert response.status_code == OK
+    assert response.json["status"] == SUCCEEDED
+    assert response.json["error"] is None
+
+    midi = db.session.get(MIDI, response.json["midi_id"])
+    assert midi.title == "A Random Song"
+    assert midi.midi_data.startswith(b"MThd")
+
+    # The upload is removed once the job is done
+    assert os.listdir("app/utils/audio_sample") == []
+
+
+def test_cached_conversion(client):
+    """
+    Test that uploading the same audio again is served from the cache.
+
+    Args:
+        client (FlaskClient): The test client for the application.
+    """
+    with open(SAMPLE_WAV, "rb") as audio_file:
+        audio_data = audio_file.read()
+
+    # The counters are shared by every app in the process
+    stats = conversion_cache.stats()
+
+    response = upload(client, audio_data, "first.wav")
+    assert response.status_code == ACCEPTED
+    job = client.get(f"{JOBS_API_URL}/{response.json['job_id']}").json
+    assert conversion_cache.stats()["stores"] == stats["stores"] + 1
+
+    response = upload(client, audio_data, "second.wav")
+    assert response.status_code == CREATED
+    assert response.json["midi_id"] == job["midi_id"] + 1
+    assert response.json["title"] == "A Random Song"
+    midi = db.session.get(MIDI, job["midi_id"])
+    assert BinaryConverter.decode_binary(response.json["midi_data"]) == midi.midi_data
+    assert response.json["xml_data"]
+    assert conversion_cache.stats()["hits"] == stats["hits"] + 1
+    assert ConversionJob.query.count() == 1
+
+
+def test_failed_job(client):
+    """
+    Test that a conversion error is reported through the job status.
+
+    Args:
+        client (FlaskClient): The test client for the application.
+    """
+    response = upload(client, b"not audio", "broken.wav")
+    assert response.status_code == ACCEPTED
+
+    response = client.get(f"{JOBS_API_URL}/{response.json['job_id']}")
+    assert response.json["status"] == FAILED
+    assert response.json["midi_id"] is None
+    assert response.json["error"]
+    assert MIDI.query.count() == 0
+
+
+def test_unknown_profile(client):
+    """
+    Test that an upload naming an unknown conversion profile is rejected.
+
+    Args:
+        client (FlaskClient): The test client for the application.
+    """
+    form = {
+        "name": "John",
+        "email": "john@gmail.com",
+        "title": "A Random Song",
+        "profile": "turbo",
+        "file": (BytesIO(b"audio"), "song.wav"),
+    }
+    response = client.post(MIDIS_API_URL, data=form, content_type="multipart/form-data")
+    assert response.status_code == BAD_REQUEST
+    assert ConversionJob.query.count() == 0
+
+
+def test_get_missing_job(client):
+    """
+    Test that an unknown job ID is reported as not found.
+
+    Args:
+        client (FlaskClient): The test client for the application.
+    """
+    response = client.get(f"{JOBS_API_URL}/42")
+    assert response.status_code == NOT_FOUND
+
+
+def test_unreadable_length_is_not_long(app, tmp_path):
+    """
+    Test that a recording whose length cannot be read is converted whole.
+
+    Args:
+        app (Flask): The Flask application instance.
+        tmp_path (pathlib.Path): Temporary working directory.
+    """
+    audio_file = tmp_path / "broken.mp3"
+    audio_file.write_bytes(b"not audio")
+    job_queue.workers = 2
+    job_queue.chunked_seconds = 1
+
+    assert not job_queue.is_long(str(audio_file))
+
+
+def test_recover_jobs(app, tmp_path):
+    """
+    Test that jobs left running by a previous server process are resumed.
+
+    Args:
+        app (Flask): The Flask application instance.
+        tmp_path (pathlib.Path): Temporary working directory.
+    """
+    audio_path = str(tmp_path / "upload.wav")
+    shutil.copy(SAMPLE_WAV, audio_path)
+    interrupted = ConversionJob(
+        name="John",
+        email="john@gmail.com",
+        title="Song",
+        audio_path=audio_path,
+        status=RUNNING,
+        attempts=1,
+    )
+    lost = ConversionJob(
+        name="Jane",
+        email="jane@gmail.com",
+        title="Song",
+        audio_path="missing.wav",
+        status=RUNNING,
+        attempts=1,
+    )
+    db.session.add_all([interrupted, lost])
+    db.session.commit()
+
+    assert job_queue.recover_jobs() == 2
+    assert interrupted.status == SUCCEEDED
+    assert interrupted.attempts == 2
+    assert lost.status == FAILED
+
+
+def test_recover_jobs_on_start(tmp_path, monkeypatch):
+    """
+    Test that creating the app resumes the jobs left in its database.
+
+    Args:
+        tmp_path (pathlib.Path): Temporary working directory.
+        monkeypatch (MonkeyPatch): Fixture to change the working directory.
+    """
+    os.makedirs(tmp_path / "midi_output")
+    monkeypatch.chdir(tmp_path)
+
+    class FileConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = "sqlite:///" + str(tmp_path / "jobs.db")
+
+    audio_path = str(tmp_path / "upload.wav")
+    shutil.copy(SAMPLE_WAV, audio_path)
+    app = create_app(FileConfig)
+    with app.app_context():
+        db.create_all()
+        db.session.add(
+            ConversionJob(
+                name="John",
+                email="john@gmail.com",
+                title="Song",
+                audio_path=audio_path,
+                status=RUNNING,
+                attempts=1,
+            )
+        )
+        db.session.commit()
+        db.session.remove()
+
+    # A new server process on the same database
+    app = create_app(FileConfig)
+    with app.app_context():
+        job = ConversionJob.query.one()
+        assert job.status == SUCCEEDED
+        assert job.attempts == 2
+        db.session.remove()
+        db.drop_all()
+
+
+def test_job_is_queued_until_started(app, client, monkeypatch):
+    """
+    Test that a job waiting for a busy worker is reported as queued.
+
+    Args:
+        app (Flask): The Flask application instance.
+        client (FlaskClient): The test client for the application.
+        monkeypatch (MonkeyPatch): Fixture to replace the conversion.
+    """
+    monkeypatch.setattr("app.utils.job_queue.convert_job", slow_job)
+    job_queue.workers = 1
+
+    first = upload(client, b"first", "first.wav").json["job_id"]
+    second = upload(client, b"second", "second.wav").json["job_id"]
+
+    assert wait_for_status(client, first, (RUNNING, FAILED))["status"] == RUNNING
+    assert client.get(f"{JOBS_API_URL}/{second}").json["status"] == QUEUED
+
+    # The second job runs once the first is done
+    assert wait_for_status(client, second, (RUNNING, FAILED))["status"] == RUNNING
+    assert wait_for_status(client, second, (FAILED,))["error"] == "Stand-in conversion"
+
+
+def test_worker_crash_is_retried(app, client, monkeypatch):
+    """
+    Test that a job whose worker dies is retried in a new pool, then failed.
+
+    Args:
+        app (Flask): The Flask application instance.
+        client (FlaskClient): The test client for the application.
+        monkeypatch (MonkeyPatch): Fixture to replace the conversion.
+    """
+    monkeypatch.setattr("app.utils.job_queue.convert_job", crash_job)
+    job_queue.workers = 1
+    job_queue.max_attempts = 2
+
+    response = upload(client, b"audio", "crash.wav")
+    assert response.status_code == ACCEPTED
+    job_id = response.json["job_id"]
+
+    # Wait for both attempts to crash
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        response = client.get(f"{JOBS_API_URL}/{job_id}")
+        if response.json["status"] == FAILED:
+            break
+        time.sleep(0.1)
+
+    assert response.json["status"] == FAILED
+    assert response.json["error"] == "Worker process terminated"
+    assert db.session.get(ConversionJob, job_id).attempts == 2
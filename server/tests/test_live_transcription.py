@@ -0,0 +1,161 @@
+################################################################################
+# Filename: test_live_transcription.py
+# Purpose:  Test the live recording API.
+# Author:   Benjamin Goh
+#
+# Description:
+# This file contains pytest test cases for the /api/v1/live routes. It posts
+# a WebM recording in chunks, as a browser MediaRecorder emits them, and
+# checks that provisional notes come back while recording, that finishing
+# the session stores the MIDI entry, and that cancelled or unknown sessions
+# are handled.
+#
+# Usage (Optional):
+# Run the tests using the pytest command:
+#   python -m pytest
+#
+###############################################################################
+
+import os
+import time
+import pytest
+from app import create_app
+from app.database import db
+from app.test_config import TestingConfig
+from app.models.midi_model import MIDI
+from app.utils.base64_converter import BinaryConverter
+from app.utils.job_queue import job_queue
+from app.utils.live_sessions import live_sessions
+from app.utils.status_codes import OK, CREATED, NO_CONTENT, BAD_REQUEST, NOT_FOUND
+
+SAMPLE_WEBM = os.path.abspath(
+    os.path.join(
+        os.path.dirname(__file__),
+        "..",
+        "app",
+        "utils",
+        "audio_sample",
+        "sample_webm.webm",
+    )
+)
+LIVE_API_URL = "api/v1/live"
+
+# Number of chunks the recording is posted in
+CHUNK_COUNT = 8
+
+
+@pytest.fixture
+def client():
+    app = create_app(TestingConfig)
+    with app.app_context():
+        db.create_all()
+        yield app.test_client()
+        live_sessions.shutdown()
+        job_queue.shutdown()
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture(scope="module")
+def chunks():
+    with open(SAMPLE_WEBM, "rb") as audio_file:
+        audio_data = audio_file.read()
+    chunk_size = -(-len(audio_data) // CHUNK_COUNT)
+    return [
+        audio_data[start : start + chunk_size]
+        for start in range(0, len(audio_data), chunk_size)
+    ]
+
+
+def start_session(client, **fields):
+    """Start a live session and return the response."""
+    form = {"name": "John", "email": "john@gmail.com", "title": "Live Song", **fields}
+    return client.post(LIVE_API_URL, data=form)
+
+
+def wait_for_samples(session_id, timeout=10):
+    """
+    Wait until ffmpeg has decoded samples of the chunks posted so far.
+
+    ffmpeg decodes in the background, so the next chunk picks them up.
+
+    Args:
+        session_id (str): The ID of the live session.
+        timeout (float): Longest time to wait in seconds.
+    """
+    decoder = live_sessions.get(session_id).transcription.decoder
+    deadline = time.monotonic() + timeout
+    while not decoder.output and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_live_transcription(client, chunks):
+    """
+    Test that chunks return provisional notes and finishing stores the MIDI.
+
+    Args:
+        client (FlaskClient): The test client for the application.
+        chunks (list): The sample recording, split into chunks.
+    """
+    response = start_session(client)
+    assert response.status_code == CREATED
+    session_id = response.json["session_id"]
+
+    durations = []
+    for index, chunk in enumerate(chunks):
+        if index == len(chunks) - 1:
+            wait_for_samples(session_id)
+        response = client.post(f"{LIVE_API_URL}/{session_id}/chunks", data=chunk)
+        assert response.status_code == OK
+        durations.append(response.json["duration"])
+        for note in response.json["notes"]:
+            assert note["time"] >= response.json["window_start"]
+            assert 0 <= note["note"] < 128
+    assert durations == sorted(durations)
+    assert durations[-1] > 0
+
+    response = client.post(f"{LIVE_API_URL}/{session_id}/finish")
+    assert response.status_code == CREATED
+    midi = db.session.get(MIDI, response.json["midi_id"])
+    assert midi.title == "Live Song"
+    assert midi.midi_data == BinaryConverter.decode_binary(response.json["midi_data"])
+    assert midi.xml_data.startswith(b"<?xml")
+
+    # The session is gone once finished
+    response = client.post(f"{LIVE_API_URL}/{session_id}/finish")
+    assert response.status_code == NOT_FOUND
+    assert live_sessions.count() == 0
+
+
+def test_cancel_live_session(client, chunks):
+    """
+    Test that a cancelled session stores nothing.
+
+    Args:
+        client (FlaskClient): The test client for the application.
+        chunks (list): The sample recording, split into chunks.
+    """
+    session_id = start_session(client).json["session_id"]
+    client.post(f"{LIVE_API_URL}/{session_id}/chunks", data=chunks[0])
+
+    response = client.delete(f"{LIVE_API_URL}/{session_id}")
+    assert response.status_code == NO_CONTENT
+    response = client.post(f"{LIVE_API_URL}/{session_id}/chunks", data=chunks[1])
+    assert response.status_code == NOT_FOUND
+    assert MIDI.query.count() == 0
+
+
+def test_invalid_live_session(client):
+    """
+    Test that invalid sessions and recordings without audio are rejected.
+
+    Args:
+        client (FlaskClient): The test client for the application.
+    """
+    assert start_session(client, title="").status_code == BAD_REQUEST
+    assert start_session(client, profile="unknown").status_code == BAD_REQUEST
+
+    session_id = start_session(client).json["session_id"]
+    response = client.post(f"{LIVE_API_URL}/{session_id}/finish")
+    assert response.status_code == BAD_REQUEST
+    assert MIDI.query.count() == 0
@@ -0,0 +1,128 @@
+################################################################################
+# Filename: test_metrics.py
+# Purpose:  Contains pytest test cases for the metrics registry and endpoint.
+# Author:   Livia Chandra
+#
+# Description:
+# This file contains pytest test cases for the metrics registry, checking
+# the Prometheus text format of histograms and counters, and that a
+# conversion through the API records its stages, request latency, database
+# queries and queue depth at GET /api/v1/metrics.
+#
+# Usage (Optional):
+# Run the tests using the pytest command:
+#   python -m pytest
+#
+###############################################################################
+
+import os
+from io import BytesIO
+import pytest
+from app import create_app
+from app.database import db
+from app.test_config import TestingConfig
+from app.utils.job_queue import job_queue
+from app.utils.metrics import Counter, Histogram, record_stage, recording_stages
+from app.utils.status_codes import OK, ACCEPTED
+
+SAMPLE_WAV = os.path.abspath(
+    os.path.join(
+        os.path.dirname(__file__),
+        "..",
+        "app",
+        "utils",
+        "audio_sample",
+        "sample_wav.wav",
+    )
+)
+METRICS_API_URL = "api/v1/metrics"
+MIDIS_API_URL = "api/v1/midis"
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    os.makedirs(tmp_path / "midi_output")
+    monkeypatch.chdir(tmp_path)
+
+    app = create_app(TestingConfig)
+    with app.app_context():
+        db.create_all()
+        yield app.test_client()
+        job_queue.shutdown()
+        db.session.remove()
+        db.drop_all()
+
+
+def test_histogram_format():
+    """
+    Test that histogram buckets are cumulative and labels are escaped.
+    """
+    histogram = Histogram("test_seconds", "Test histogram.", ("stage",), (0.1, 1))
+    histogram.observe(0.05, 'a"b')
+    histogram.observe(0.1, 'a"b')
+    histogram.observe(5, 'a"b')
+
+    assert histogram.samples() == [
+        'test_seconds_bucket{stage="a\\"b",le="0.1"} 2',
+        'test_seconds_bucket{stage="a\\"b",le="1.0"} 2',
+        'test_seconds_bucket{stage="a\\"b",le="+Inf"} 3',
+        'test_seconds_sum{stage="a\\"b"} 5.15',
+        'test_seconds_count{stage="a\\"b"} 3',
+    ]
+
+
+def test_counter_format():
+    """
+    Test that counters keep one value per label set.
+    """
+    counter = Counter("test_total", "Test counter.", ("status",))
+    counter.inc("failed")
+    counter.inc("succeeded", amount=2)
+    assert counter.samples() == [
+        'test_total{status="failed"} 1',
+        'test_total{status="succeeded"} 2',
+    ]
+
+
+def test_recording_stages():
+    """
+    Test that stage timings are collected instead of observed while recording.
+    """
+    with recording_stages() as timings:
+        record_stage("decode", 0.5)
+        record_stage("decode", 0.25)
+    assert timings == {"decode": 0.75}
+
+
+def test_metrics_endpoint(client):
+    """
+    Test that a conversion shows up in every metric family.
+
+    Args:
+        client (FlaskClient): The test client for the application.
+    """
+    with open(SAMPLE_WAV, "rb") as audio_file:
+        form = {
+            "name": "John",
+            "email": "john@gmail.com",
+            "title": "A Random Song",
+            "file": (BytesIO(audio_file.read()), "sample_wav.wav"),
+        }
+    response = client.post(MIDIS_API_URL, data=form, content_type="multipart/form-data")
+    assert response.status_code == ACCEPTED
+
+    response = client.get(METRICS_API_URL)
+    assert response.status_code == OK
+    assert response.content_type.startswith("text/plain; version=0.0.4")
+    text = response.get_data(as_text=True)
+
+    assert "# TYPE melodymapper_conversion_stage_seconds histogram" in text
+    stages = ("decode", "yin", "beat_track", "segment_stft", "midi_write", "musicxml")
+    for stage in stages:
+        assert f'melodymapper_conversion_stage_seconds_count{{stage="{stage}"}}' in text
+    assert (
+        'melodymapper_http_request_seconds_count{method="POST",'
+        'route="/api/v1/midis",status="' in text
+    )
+    assert 'melodymapper_db_query_seconds_count{statement="INSERT"}' in text
+    assert "melodymapper_conversion_queue_depth 0" in text
@@ -0,0 +1,179 @@
+################################################################################
+# Filename: test_musicxml_storage.py
+# Purpose:  Test that MusicXML is stored with each MIDI entry.
+# Author:   Benjamin Goh
+#
+# Description:
+# This file contains pytest test cases for the MusicXML stored alongside the
+# MIDI data. It checks that a conversion stores the MusicXML, that
+# GET /api/v1/midis/<id> serves it without rendering it again, that entries
+# without it are rendered on read without being written to, and that the
+# backfill script adds the column to an existing table and fills in the old
+# entries.
+#
+# Usage (Optional):
+# Run the tests using the pytest command:
+#   python -m pytest
+#
+###############################################################################
+
+import os
+from datetime import datetime
+from io import BytesIO
+import pytest
+from sqlalchemy import text
+from app import create_app
+from app.database import db
+from app.test_config import TestingConfig
+from app.models.midi_model import MIDI
+from app.models.user_model import User
+from app.utils import midi_to_musicxml
+from app.utils.base64_converter import BinaryConverter
+from app.utils.conversion import wav_to_midi_bytes
+from app.utils.job_queue import job_queue
+from app.utils.status_codes import OK, ACCEPTED, NOT_FOUND
+from backfill_musicxml import add_version_column, add_xml_column, backfill_musicxml
+
+SAMPLE_WAV = os.path.abspath(
+    os.path.join(
+        os.path.dirname(__file__),
+        "..",
+        "app",
+        "utils",
+        "audio_sample",
+        "sample_wav.wav",
+    )
+)
+JOBS_API_URL = "api/v1/jobs"
+MIDIS_API_URL = "api/v1/midis"
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    app = create_app(TestingConfig)
+    with app.app_context():
+        db.create_all()
+        yield app
+        job_queue.shutdown()
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture(scope="module")
+def midi_data():
+    return wav_to_midi_bytes(SAMPLE_WAV)
+
+
+def add_midi(midi_data, xml_data=None):
+    """Store a MIDI entry and return its ID."""
+    user = User(name="John", email="john@gmail.com")
+    db.session.add(user)
+    db.session.commit()
+    midi = MIDI(
+        user_id=user.user_id,
+        title="A Random Song",
+        date=datetime.now(),
+        midi_data=midi_data,
+        xml_data=xml_data,
+    )
+    db.session.add(midi)
+    db.session.commit()
+    return midi.midi_id
+
+
+def test_conversion_stores_musicxml(client, monkeypatch):
+    """
+    Test that a converted upload is served with the MusicXML stored at creation.
+
+    Args:
+        client (FlaskClient): The test client for the application.
+        monkeypatch (MonkeyPatch): Fixture to forbid rendering on read.
+    """
+    with open(SAMPLE_WAV, "rb") as audio_file:
+        form = {
+            "name": "John",
+            "email": "john@gmail.com",
+            "title": "A Random Song",
+            "file": (BytesIO(audio_file.read()), "sample_wav.wav"),
+        }
+    response = client.post(MIDIS_API_URL, data=form, content_type="multipart/form-data")
+    assert response.status_code == ACCEPTED
+    midi_id = client.get(f"{JOBS_API_URL}/{response.json['job_id']}").json["midi_id"]
+    assert db.session.get(MIDI, midi_id).xml_data.startswith(b"<?xml")
+
+    def render(midi_data):
+        raise AssertionError("MusicXML rendered on read")
+
+    monkeypatch.setattr(midi_to_musicxml, "midi_to_musicxml", render)
+    response = client.get(f"{MIDIS_API_URL}/{midi_id}")
+    assert response.status_code == OK
+    xml_data = BinaryConverter.decode_binary(response.json["xml_data"])
+    assert xml_data == db.session.get(MIDI, midi_id).xml_data
+
+
+def test_get_midi_renders_missing_musicxml(client, midi_data):
+    """
+    Test that an entry without MusicXML is rendered on read but not stored.
+
+    Args:
+        client (FlaskClient): The test client for the application.
+        midi_data (bytes): Content of a converted MIDI file.
+    """
+    midi_id = add_midi(midi_data)
+
+    response = client.get(f"{MIDIS_API_URL}/{midi_id}")
+    assert response.status_code == OK
+    xml_data = BinaryConverter.decode_binary(response.json["xml_data"])
+    assert xml_data.startswith(b"<?xml")
+    db.session.expire_all()
+    midi = db.session.get(MIDI, midi_id)
+    assert midi.xml_data is None
+    assert midi.version == 1
+
+
+def test_get_missing_midi(client):
+    """
+    Test that an unknown MIDI ID is reported as not found.
+
+    Args:
+        client (FlaskClient): The test client for the application.
+    """
+    response = client.get(f"{MIDIS_API_URL}/1")
+    assert response.status_code == NOT_FOUND
+
+
+def test_backfill(app, midi_data):
+    """
+    Test that the backfill adds the columns and fills in only the empty entries.
+
+    Args:
+        app (Flask): The application, with an application context.
+        midi_data (bytes): Content of a converted MIDI file.
+    """
+    assert not add_xml_column()
+
+    # A table created before the column existed
+    with db.engine.begin() as connection:
+        connection.execute(text("ALTER TABLE midis DROP COLUMN xml_data"))
+    assert add_xml_column()
+    assert not add_version_column()
+    with db.engine.begin() as connection:
+        connection.execute(text("ALTER TABLE midis DROP COLUMN version"))
+    assert add_version_column()
+
+    old_ids = [add_midi(midi_data) for _ in range(3)]
+    stored_id = add_midi(midi_data, b"<stored />")
+    broken_id = add_midi(b"not a MIDI file")
+
+    assert backfill_musicxml(batch_size=2) == (3, 1)
+    for midi_id in old_ids:
+        assert db.session.get(MIDI, midi_id).xml_data.startswith(b"<?xml")
+    assert db.session.get(MIDI, stored_id).xml_data == b"<stored />"
+    assert db.session.get(MIDI, broken_id).xml_data is None
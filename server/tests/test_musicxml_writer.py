@@ -0,0 +1,157 @@
+################################################################################
+# Filename: test_musicxml_writer.py
+# Purpose:  Contains pytest test cases for the direct MusicXML writer.
+# Author:   Livia Chandra
+#
+# Description:
+# This file contains pytest test cases for the MusicXML writer used for the
+# single-track melodies of the pipeline. The output is compared against the
+# MusicXML music21 writes for the same MIDI file: both are read back with
+# music21 and must agree on key, tempo, meter and notes. MIDI files outside
+# the supported subset must fall back to music21.
+#
+# Usage (Optional):
+# Run the tests using the pytest command:
+#   python -m pytest
+#
+###############################################################################
+
+import io
+import os
+import mido
+import pytest
+from music21 import converter
+from app.utils.conversion import wav_to_midi_bytes
+from app.utils.midi_to_musicxml import midi_to_musicxml, music21_musicxml
+from app.utils.musicxml_writer import write_musicxml
+
+SAMPLE_WAV = os.path.join(
+    os.path.dirname(__file__), "..", "app", "utils", "audio_sample", "sample_wav.wav"
+)
+
+# Ticks of a sixteenth note at the default 480 ticks per beat
+SIXTEENTH = 120
+
+# Melodies on the sixteenth-note grid: key, then rest and note lengths in
+# sixteenths with the note number. They cross barlines, need dots and ties,
+# and use sharp, flat, minor and bass clef keys.
+GRID_MELODIES = {
+    "c_major": ("C", [(0, 4, 60), (0, 2, 62), (2, 2, 64), (1, 3, 66), (0, 8, 70)]),
+    "ties": ("G", [(12, 8, 67), (0, 20, 71), (5, 1, 78), (3, 13, 74)]),
+    "flats": ("Eb", [(0, 6, 63), (0, 2, 66), (4, 4, 68), (0, 12, 61), (0, 4, 71)]),
+    "minor": ("F#m", [(2, 2, 66), (0, 2, 65), (0, 10, 69), (7, 7, 73)]),
+    "bass": ("F", [(0, 4, 41), (0, 4, 46), (4, 8, 38), (0, 16, 43)]),
+}
+
+
+def melody_midi(key, events, tempo=500000):
+    """
+    Helper function to build a MIDI file the way the pipeline does.
+
+    Args:
+        key (str): Key signature name.
+        events (list): Rest length in sixteenths, note length in sixteenths
+                       and note number of each note.
+        tempo (int): Tempo in microseconds per beat.
+
+    Returns:
+        bytes: Content of the MIDI file.
+    """
+    midi = mido.MidiFile()
+    track = mido.MidiTrack()
+    midi.tracks.append(track)
+    track.append(mido.MetaMessage("key_signature", key=key, time=0))
+    track.append(mido.MetaMessage("set_tempo", tempo=tempo))
+    for rest, length, note in events:
+        track.append(
+            mido.Message("note_on", note=note, velocity=127, time=rest * SIXTEENTH)
+        )
+        track.append(
+            mido.Message("note_off", note=note, velocity=127, time=length * SIXTEENTH)
+        )
+
+    buffer = io.BytesIO()
+    midi.save(file=buffer)
+    return buffer.getvalue()
+
+
+def read_score(xml_data):
+    """
+    Helper function to read back the notation of a MusicXML file with music21.
+
+    Args:
+        xml_data (bytes): Content of the MusicXML file.
+
+    Returns:
+        dict: Key, tempo, time signature, clef and notes of the score, with
+              tied notes merged.
+    """
+    score = converter.parseData(xml_data, format="musicxml")
+    flat = score.stripTies().flatten()
+    key = flat.getElementsByClass("KeySignature").first()
+    return {
+        "key": (key.sharps, getattr(key, "mode", None)),
+        "tempo": flat.getElementsByClass("MetronomeMark").first().number,
+        "time": flat.getElementsByClass("TimeSignature").first().ratioString,
+        "clef": flat.getElementsByClass("Clef").first().sign,
+        "notes": [
+            (note.pitch.midi, float(note.offset), float(note.quarterLength))
+            for note in flat.notes
+        ],
+    }
+
+
+@pytest.mark.parametrize("name", sorted(GRID_MELODIES))
+def test_matches_music21_on_grid(name):
+    """
+    Test that melodies on the sixteenth-note grid read back exactly as music21 writes them.
+
+    Args:
+        name (str): Name of the melody in GRID_MELODIES.
+    """
+    midi_data = melody_midi(*GRID_MELODIES[name])
+
+    xml_data = write_musicxml(midi_data)
+    assert xml_data is not None
+    assert read_score(xml_data) == read_score(music21_musicxml(midi_data))
+
+
+def test_matches_music21_on_pipeline_output():
+    """
+    Test that a converted recording keeps music21's notes, up to quantization.
+
+    music21 may quantize an onset to an eighth-note triplet where the writer
+    uses the nearest sixteenth, so onsets agree within a sixteenth.
+    """
+    midi_data = wav_to_midi_bytes(os.path.abspath(SAMPLE_WAV))
+    written = read_score(write_musicxml(midi_data))
+    expected = read_score(music21_musicxml(midi_data))
+
+    assert {key: written[key] for key in ("key", "tempo", "time", "clef")} == {
+        key: expected[key] for key in ("key", "tempo", "time", "clef")
+    }
+    assert [note for note, _, _ in written["notes"]] == [
+        note for note, _, _ in expected["notes"]
+    ]
+    for (_, onset, _), (_, expected_onset, _) in zip(
+        written["notes"], expected["notes"]
+    ):
+        assert abs(onset - expected_onset) <= 0.25
+
+
+def test_falls_back_to_music21():
+    """
+    Test that MIDI files outside the supported subset are converted by music21.
+    """
+    midi = mido.MidiFile(file=io.BytesIO(melody_midi(*GRID_MELODIES["c_major"])))
+    chord = midi.tracks[0]
+    chord.insert(3, mido.Message("note_on", note=67, velocity=127, time=0))
+    chord.insert(5, mido.Message("note_off", note=67, velocity=127, time=0))
+    buffer = io.BytesIO()
+    midi.save(file=buffer)
+    midi_data = buffer.getvalue()
+
+    assert write_musicxml(midi_data) is None
+    score = converter.parseData(midi_to_musicxml(midi_data), format="musicxml")
+    first = score.flatten().notes.first()
+    assert [pitch.midi for pitch in first.pitches] == [60, 67]
@@ -0,0 +1,121 @@
+################################################################################
+# Filename: test_pitch_range.py
+# Purpose:  Contains pytest test cases for the adaptive pitch-range search.
+# Author:   Livia Chandra
+#
+# Description:
+# This file contains pytest test cases for the coarse pitch pass, checking
+# that it narrows the search to the register of a melody, falls back to the
+# full C1 to C8 range on silence, shortens the YIN frame accordingly, and
+# that streaming analysis frames the audio exactly like in-memory analysis.
+#
+# Usage (Optional):
+# Run the tests using the pytest command:
+#   python -m pytest
+#
+###############################################################################
+
+import numpy as np
+from app.utils.analysis_context import AnalysisContext, FrameCarry, StreamingAnalysis
+from app.utils.pitch_range import (
+    adaptive_search,
+    estimate_pitch_range,
+    fmin,
+    pitch_fmax,
+    range_frame_length,
+)
+
+SAMPLE_RATE = 22050
+
+
+def hum(frequencies, note_seconds=0.5, sample_rate=SAMPLE_RATE):
+    """
+    Helper function to synthesise a hummed melody with a few harmonics.
+
+    Args:
+        frequencies (list): Frequency (Hz) of each note.
+        note_seconds (float): Length of each note in seconds.
+        sample_rate (int): Number of samples per second (Hz).
+
+    Returns:
+        ndarray: 1D float32 array of audio data.
+    """
+    note_length = int(note_seconds * sample_rate)
+    frequency = np.repeat(frequencies, note_length)
+    phase = 2 * np.pi * np.cumsum(frequency) / sample_rate
+    audio = sum(np.sin(k * phase) / k for k in range(1, 4))
+    return (0.3 * audio).astype(np.float32)
+
+
+def test_range_narrows_to_register():
+    """
+    Test that the coarse pass brackets the melody and excludes the extremes.
+    """
+    audio = hum([196.0, 220.0, 261.63, 293.66, 246.94])
+    low, high = estimate_pitch_range(audio, SAMPLE_RATE, 2048, 512)
+
+    assert fmin < low < 196.0
+    assert 293.66 < high < pitch_fmax(SAMPLE_RATE)
+    assert high / low < 4
+
+
+def test_silence_searches_full_range():
+    """
+    Test that a recording with no voiced frames falls back to C1 to C8.
+    """
+    audio = np.zeros(SAMPLE_RATE, dtype=np.float32)
+    assert estimate_pitch_range(audio, SAMPLE_RATE, 2048, 512) == (
+        fmin,
+        pitch_fmax(SAMPLE_RATE),
+    )
+
+
+def test_range_frame_length():
+    """
+    Test that the YIN frame covers two periods of the lowest pitch, capped at the full frame.
+    """
+    assert range_frame_length(SAMPLE_RATE, 10.0, 2048) == 2048
+    frame_length = range_frame_length(SAMPLE_RATE, 150.0, 2048)
+    assert frame_length % 32 == 0
+    assert 2 * SAMPLE_RATE / 150.0 < frame_length < 2048
+
+
+def test_frame_carry_matches_centred_frames():
+    """
+    Test that framing a stream block by block covers the same frames as padding the whole array.
+    """
+    audio = np.arange(5000, dtype=np.float32)
+    frames = FrameCarry(256, 64)
+    runs = [frames.push(block) for block in np.array_split(audio, 7)]
+    runs.append(frames.finish())
+
+    # Rebuild every frame from the runs and compare with the padded array
+    streamed = np.concatenate(
+        [
+            np.lib.stride_tricks.sliding_window_view(run, 256)[::64]
+            for run in runs
+            if run is not None
+        ]
+    )
+    padded = np.pad(audio, 128)
+    expected = np.lib.stride_tricks.sliding_window_view(padded, 256)[::64]
+    np.testing.assert_array_equal(streamed, expected)
+
+
+def test_streaming_range_matches_context():
+    """
+    Test that streaming analysis finds the same pitch range and key as AnalysisContext.
+    """
+    audio = hum([110.0, 130.81, 146.83, 164.81, 130.81, 98.0])
+    context = AnalysisContext(audio, SAMPLE_RATE, pitch_search=adaptive_search)
+
+    analysis = StreamingAnalysis(SAMPLE_RATE, pitch_search=adaptive_search)
+    for block in np.array_split(audio, 9):
+        analysis.feed(block)
+    analysis.finish()
+    for block in np.array_split(audio, 5):
+        analysis.feed_pitch(block)
+    analysis.finish_pitch()
+
+    np.testing.assert_allclose(analysis.pitch_range, context.pitch_range)
+    assert analysis.key_signature == context.key_signature
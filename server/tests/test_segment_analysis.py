@@ -0,0 +1,75 @@
+################################################################################
+# Filename: test_segment_analysis.py
+# Purpose:  Contains pytest test cases for the segment spectral analysis.
+# Author:   Livia Chandra
+#
+# Description:
+# This file contains pytest test cases for the batched segment STFT engine,
+# checking that it returns the same weighted median frequencies as running
+# scipy.signal.stft on each two-beat segment in a loop.
+#
+# Usage (Optional):
+# Run the tests using the pytest command:
+#   python -m pytest
+#
+# Notes:
+#
+###############################################################################
+
+import numpy as np
+import pytest
+from app.utils.conversion import divide_audio_data
+from app.utils.segment_analysis import (
+    segment_median_frequencies,
+    segment_median_frequency,
+)
+
+SAMPLE_RATE = 22050
+
+
+def synthetic_signal(duration, seed=0):
+    """
+    Generate a vibrato tone over a noise bed.
+
+    Args:
+        duration (float): Length of the signal in seconds.
+        seed (int): Seed of the noise bed.
+
+    Returns:
+        ndarray: 1D float32 array that contains the signal.
+    """
+    rng = np.random.default_rng(seed)
+    time = np.arange(int(duration * SAMPLE_RATE)) / SAMPLE_RATE
+    tone = 0.5 * np.sin(2 * np.pi * (220 + 100 * np.sin(time)) * time)
+    noise = 0.05 * rng.standard_normal(len(time))
+    return (tone + noise).astype(np.float32)
+
+
+@pytest.mark.parametrize(
+    "duration, tempo",
+    [
+        (10, 120.0),  # Whole number of segments
+        (7.3, 97.3),  # Short trailing segment
+        (0.01, 120.0),  # Shorter than one STFT window
+        (0.5, 400.0),  # Segments close to the window size
+        (61, 143.55),  # Several batches
+    ],
+)
+def test_segment_median_frequencies(duration, tempo):
+    """
+    Test segment_median_frequencies against the per-segment STFT loop.
+
+    Args:
+        duration (float): Length of the signal in seconds.
+        tempo (float): Tempo used to divide the signal into segments.
+    """
+    audio_data = synthetic_signal(duration)
+
+    expected = [
+        segment_median_frequency(segment, SAMPLE_RATE)
+        for segment in divide_audio_data(audio_data, SAMPLE_RATE, tempo)
+    ]
+    result = segment_median_frequencies(audio_data, SAMPLE_RATE, tempo)
+
+    assert len(result) == len(expected)
+    np.testing.assert_array_equal(result, expected)
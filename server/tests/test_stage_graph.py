@@ -0,0 +1,130 @@
+################################################################################
+# Filename: test_stage_graph.py
+# Purpose:  Contains pytest test cases for the stage graph executor.
+# Author:   Livia Chandra
+#
+# Description:
+# This file contains pytest test cases for StageGraph, checking that stages
+# run after their dependencies, that independent stages run concurrently,
+# that unknown dependencies are rejected, and that the analysis features
+# computed concurrently match the ones computed in order.
+#
+# Usage (Optional):
+# Run the tests using the pytest command:
+#   python -m pytest
+#
+# Notes:
+#
+###############################################################################
+
+import threading
+import numpy as np
+import pytest
+from app.utils.analysis_context import AnalysisContext
+from app.utils.stage_graph import StageGraph, analysis_threads
+
+SAMPLE_RATE = 22050
+
+
+def test_dependencies_run_first():
+    """
+    Test that every stage starts after the stages it depends on finished.
+    """
+    order = []
+    lock = threading.Lock()
+
+    def stage(name):
+        def run():
+            with lock:
+                order.append(name)
+            return name
+
+        return run
+
+    graph = StageGraph()
+    graph.add("a", stage("a"))
+    graph.add("b", stage("b"), ("a",))
+    graph.add("c", stage("c"))
+    graph.add("d", stage("d"), ("b", "c"))
+
+    results = graph.run(threads=3)
+
+    assert results == {"a": "a", "b": "b", "c": "c", "d": "d"}
+    assert order.index("a") < order.index("b") < order.index("d")
+    assert order.index("c") < order.index("d")
+
+
+def test_independent_stages_run_concurrently():
+    """
+    Test that independent stages run at the same time on separate threads.
+    """
+    barrier = threading.Barrier(2, timeout=5)
+
+    graph = StageGraph()
+    graph.add("a", barrier.wait)
+    graph.add("b", barrier.wait)
+
+    # Each stage waits for the other, so this only returns if both run at once
+    graph.run(threads=2)
+
+
+def test_unknown_dependency():
+    """
+    Test that a stage cannot depend on a stage that was not added.
+    """
+    graph = StageGraph()
+    with pytest.raises(ValueError):
+        graph.add("b", lambda: None, ("a",))
+
+
+def test_stage_error_is_raised():
+    """
+    Test that an error in a stage is raised by run.
+    """
+
+    def fail():
+        raise RuntimeError("stage failed")
+
+    graph = StageGraph()
+    graph.add("a", fail)
+    graph.add("b", lambda: None, ("a",))
+
+    with pytest.raises(RuntimeError):
+        graph.run(threads=2)
+
+
+def test_analysis_threads(monkeypatch):
+    """
+    Test that ANALYSIS_THREADS sets the number of threads, with at least one.
+
+    Args:
+        monkeypatch (MonkeyPatch): Pytest fixture to set the environment.
+    """
+    monkeypatch.setenv("ANALYSIS_THREADS", "4")
+    assert analysis_threads() == 4
+
+    monkeypatch.setenv("ANALYSIS_THREADS", "0")
+    assert analysis_threads() == 1
+
+
+def test_concurrent_features_match_sequential():
+    """
+    Test that computing the analysis features concurrently changes nothing.
+    """
+    notes = np.repeat([220.0, 330.0, 262.0, 392.0] * 3, SAMPLE_RATE // 2)
+    phase = 2 * np.pi * np.cumsum(notes) / SAMPLE_RATE
+    audio_data = (0.5 * np.sin(phase)).astype(np.float32)
+
+    sequential = AnalysisContext(audio_data, SAMPLE_RATE)
+    sequential.compute_all(threads=1)
+    concurrent = AnalysisContext(audio_data, SAMPLE_RATE)
+    concurrent.compute_all(threads=3)
+
+    assert concurrent.key_signature == sequential.key_signature
+    assert concurrent.beats[0] == sequential.beats[0]
+    np.testing.assert_array_equal(concurrent.beats[1], sequential.beats[1])
+    np.testing.assert_array_equal(
+        concurrent.segment_frequencies, sequential.segment_frequencies
+    )
+    assert set(concurrent.timings) == set(sequential.timings)
+    assert all(elapsed >= 0 for elapsed in concurrent.timings.values())
@@ -0,0 +1,142 @@
+################################################################################
+# Filename: test_streaming_conversion.py
+# Purpose:  Contains pytest test cases for the streaming MIDI conversion.
+# Author:   Livia Chandra
+#
+# Description:
+# This file contains pytest test cases for wav_to_midi_streaming, checking
+# that converting a recording block by block produces the same MIDI file as
+# converting it in memory, that peak memory stays within a fixed budget
+# however long the recording is, and that gated profiles are rejected.
+#
+# Usage (Optional):
+# Run the tests using the pytest command:
+#   python -m pytest
+#
+# Notes:
+# - Memory is measured with tracemalloc, which traces the NumPy buffers that
+#   make up the growth of the worker's resident set size.
+#
+###############################################################################
+
+import os
+import tracemalloc
+import numpy as np
+import pytest
+import soundfile
+from app.utils.conversion import wav_to_midi, wav_to_midi_streaming
+
+SAMPLE_RATE = 22050
+
+# Peak memory allowed for a streaming conversion, in bytes
+MEMORY_BUDGET = 48 * 1024 * 1024
+
+
+def write_melody(path, duration):
+    """
+    Write a WAV file of sine tones, one note per half second.
+
+    Args:
+        path (str): The path to store WAV file.
+        duration (float): Length of the melody in seconds.
+    """
+    rng = np.random.default_rng(0)
+    note_length = SAMPLE_RATE // 2
+    notes = rng.integers(48, 84, size=int(duration * 2))
+    frequencies = np.repeat(440.0 * 2 ** ((notes - 69) / 12), note_length)
+    phase = 2 * np.pi * np.cumsum(frequencies) / SAMPLE_RATE
+    soundfile.write(path, (0.5 * np.sin(phase)).astype(np.float32), SAMPLE_RATE)
+
+
+@pytest.fixture
+def work_directory(tmp_path, monkeypatch):
+    """
+    Fixture to run conversions in a temporary directory with a MIDI output folder.
+
+    Returns:
+        pathlib.Path: The temporary directory.
+    """
+    os.makedirs(tmp_path / "midi_output")
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def test_streaming_matches_in_memory(work_directory):
+    """
+    Test that the streaming conversion writes the same MIDI file.
+
+    Args:
+        work_directory (pathlib.Path): Temporary working directory.
+    """
+    audio_file = str(work_directory / "melody.wav")
+    write_melody(audio_file, 20)
+
+    with open(wav_to_midi(audio_file), "rb") as midi_file:
+        expected = midi_file.read()
+    with open(wav_to_midi(audio_file, streaming=True), "rb") as midi_file:
+        streamed = midi_file.read()
+
+    assert streamed == expected
+
+
+@pytest.mark.parametrize("profile", ["fast", "hum"])
+def test_streaming_matches_in_memory_with_profile(work_directory, profile):
+    """
+    Test that both conversions also agree when YIN and the STFT use different frames.
+
+    Args:
+        work_directory (pathlib.Path): Temporary working directory.
+        profile (str): Name of the conversion profile.
+    """
+    audio_file = str(work_directory / "melody.wav")
+    write_melody(audio_file, 20)
+
+    with open(wav_to_midi(audio_file, profile=profile), "rb") as midi_file:
+        expected = midi_file.read()
+    with open(
+        wav_to_midi(audio_file, streaming=True, profile=profile), "rb"
+    ) as midi_file:
+        streamed = midi_file.read()
+
+    assert streamed == expected
+
+
+def test_streaming_rejects_voicing_gate(work_directory):
+    """
+    Test that a streaming conversion with a gated profile fails instead of
+    silently analysing every sample.
+
+    Args:
+        work_directory (pathlib.Path): Temporary working directory.
+    """
+    audio_file = str(work_directory / "melody.wav")
+    write_melody(audio_file, 5)
+
+    with pytest.raises(ValueError, match="voicing gate"):
+        wav_to_midi_streaming(audio_file, profile="phone")
+
+
+def test_streaming_memory_budget(work_directory):
+    """
+    Test that peak memory of the streaming conversion does not grow with length.
+
+    Args:
+        work_directory (pathlib.Path): Temporary working directory.
+    """
+    # Warm up so that one-time allocations such as filter banks are excluded
+    write_melody(str(work_directory / "warm_up.wav"), 5)
+    wav_to_midi_streaming(str(work_directory / "warm_up.wav"))
+
+    peaks = []
+    for duration in (60, 240):
+        audio_file = str(work_directory / f"melody_{duration}.wav")
+        write_melody(audio_file, duration)
+
+        tracemalloc.start()
+        assert wav_to_midi_streaming(audio_file) is not None
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        peaks.append(peak)
+
+    assert max(peaks) < MEMORY_BUDGET
+    assert peaks[1] < peaks[0] * 1.25
@@ -0,0 +1,212 @@
+################################################################################
+# Filename: test_thread_governor.py
+# Purpose:  Contains pytest test cases for the conversion thread governor.
+# Author:   Livia Chandra
+#
+# Description:
+# This file contains pytest test cases for ThreadGovernor, checking that the
+# cores are shared out between the workers, that pinned
+# conversions get the least loaded cores, that the allocation is exported
+# as metrics, that limit_threads keeps a conversion within its budget, and
+# that a conversion on another thread than the main one lets the process
+# exit.
+#
+# Usage (Optional):
+# Run the tests using the pytest command:
+#   python -m pytest
+#
+# Notes:
+#
+###############################################################################
+
+import os
+import subprocess
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import pytest
+from flask import Flask
+from threadpoolctl import threadpool_info
+from app.utils.metrics import metrics
+from app.utils.stage_graph import analysis_threads
+from app.utils.thread_governor import (
+    ThreadAllocation,
+    ThreadGovernor,
+    limit_threads,
+)
+
+
+def governor(workers, cores=8, affinity=False):
+    """
+    Helper function to create a governor for a number of workers and cores.
+
+    Args:
+        workers (int): Number of conversion processes.
+        cores (int): Number of cores to share out.
+        affinity (bool): Whether conversions are pinned to their cores.
+
+    Returns:
+        ThreadGovernor: The configured governor.
+    """
+    app = Flask(__name__)
+    app.config["CONVERSION_CORES"] = cores
+    app.config["CONVERSION_CPU_AFFINITY"] = "1" if affinity else "0"
+    thread_governor = ThreadGovernor()
+    thread_governor.init_app(app, workers)
+
+    # The test machine may have fewer cores than the test shares out
+    thread_governor.cpus = list(range(cores))
+    return thread_governor
+
+
+def test_budget_is_a_share_per_worker():
+    """
+    Test that every conversion gets the same share of the cores, however many run.
+    """
+    thread_governor = governor(workers=4)
+
+    allocations = [thread_governor.acquire() for _ in range(5)]
+
+    # A conversion on an idle pool gets no more than one in a burst
+    assert [allocation.threads for allocation in allocations] == [2, 2, 2, 2, 2]
+    thread_governor.release(allocations.pop())
+    assert thread_governor.allocated_threads() == 8
+
+    for allocation in allocations:
+        thread_governor.release(allocation)
+    assert thread_governor.allocated_threads() == 0
+    assert thread_governor.next_budget() == 2
+
+
+def test_inline_conversions_are_not_pinned():
+    """
+    Test that conversions run inline get every core and are never pinned.
+    """
+    thread_governor = governor(workers=0, affinity=True)
+
+    allocation = thread_governor.acquire()
+
+    assert allocation.threads == 8
+    assert allocation.cpus is None
+
+
+def test_affinity_picks_least_loaded_cores():
+    """
+    Test that pinned conversions are given the cores other conversions do not use.
+    """
+    thread_governor = governor(workers=2, cores=4, affinity=True)
+
+    first = thread_governor.acquire()
+    second = thread_governor.acquire()
+
+    assert first.cpus == (0, 1)
+    assert second.cpus == (2, 3)
+    thread_governor.release(first)
+    third = thread_governor.acquire()
+    assert third.cpus == (0, 1)
+
+
+def test_allocation_metrics():
+    """
+    Test that the cores and allocated threads are exported as metrics.
+    """
+    thread_governor = governor(workers=2)
+    allocation = thread_governor.acquire()
+
+    text = metrics.render()
+
+    assert "melodymapper_conversion_cores 8" in text
+    assert "melodymapper_conversion_threads_allocated 4" in text
+    assert "melodymapper_conversion_thread_budget 4" in text
+    thread_governor.release(allocation)
+
+
+def numba_threads_within(allocation):
+    """
+    Helper function to read the numba thread count inside limit_threads.
+
+    Args:
+        allocation (ThreadAllocation): The budget to run with.
+
+    Returns:
+        tuple: numba thread count before, inside and after the budget.
+    """
+    import numba
+
+    before = numba.get_num_threads()
+    with limit_threads(allocation):
+        inside = numba.get_num_threads()
+    return before, inside, numba.get_num_threads()
+
+
+def test_limit_threads(monkeypatch):
+    """
+    Test that a conversion runs its library and analysis threads within its budget.
+
+    Args:
+        monkeypatch (MonkeyPatch): Pytest fixture to set the environment.
+    """
+    monkeypatch.setenv("ANALYSIS_THREADS", "3")
+
+    with limit_threads(ThreadAllocation(1, 2)):
+        assert analysis_threads() == 2
+        assert all(pool["num_threads"] == 1 for pool in threadpool_info())
+
+    assert analysis_threads() == 3
+
+    # The numba limit is only set in pool workers
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        before, inside, after = executor.submit(
+            numba_threads_within, ThreadAllocation(1, 2)
+        ).result()
+    assert inside == 1
+    assert after == before
+
+
+def test_limit_threads_off_the_main_thread_exits():
+    """
+    Test that limiting a conversion on another thread leaves numba alone, so the process exits.
+    """
+    server_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    script = (
+        "import threading\n"
+        "from app.utils.thread_governor import ThreadAllocation, limit_threads\n"
+        "def convert():\n"
+        "    with limit_threads(ThreadAllocation(1, 1)):\n"
+        "        pass\n"
+        "thread = threading.Thread(target=convert)\n"
+        "thread.start()\n"
+        "thread.join()\n"
+    )
+
+    # Use numba's default threading layer, which hangs at exit once it has
+    # been started on another thread
+    environment = {
+        key: value
+        for key, value in os.environ.items()
+        if key != "NUMBA_THREADING_LAYER"
+    }
+    environment["PYTHONPATH"] = server_directory
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=server_directory,
+        env=environment,
+        capture_output=True,
+        timeout=60,
+    )
+    assert result.returncode == 0
+
+
+@pytest.mark.skipif(
+    not hasattr(os, "sched_setaffinity"), reason="CPU affinity is not supported"
+)
+def test_limit_threads_restores_affinity():
+    """
+    Test that a pinned conversion restores the cores of the worker afterwards.
+    """
+    cpus = os.sched_getaffinity(0)
+    first_cpu = min(cpus)
+
+    with limit_threads(ThreadAllocation(1, 1, (first_cpu,))):
+        assert os.sched_getaffinity(0) == {first_cpu}
+
+    assert os.sched_getaffinity(0) == cpus
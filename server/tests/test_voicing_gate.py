@@ -0,0 +1,189 @@
+################################################################################
+# Filename: test_voicing_gate.py
+# Purpose:  Contains pytest test cases for the voicing gate.
+# Author:   Livia Chandra
+#
+# Description:
+# This file contains pytest test cases for the voicing gate, checking that
+# it finds the active regions of a recording with lead-in, trailing and
+# inner silence, that it leaves fully active recordings untouched, that
+# gating in place keeps the same audio, that the silence it cuts out is
+# mapped back onto the segments, and that a gated conversion keeps its notes
+# at their absolute time.
+#
+# Usage (Optional):
+# Run the tests using the pytest command:
+#   python -m pytest
+#
+###############################################################################
+
+import io
+import mido
+import numpy as np
+import soundfile
+from app.utils.conversion import wav_to_midi_bytes
+from app.utils.conversion_profiles import ConversionProfile, get_profile
+from app.utils.voicing_gate import (
+    active_regions,
+    frame_rms,
+    gate_audio,
+    gate_frame_length,
+    gate_hop_length,
+    gate_in_place,
+    min_gap_seconds,
+    region_margin_seconds,
+    segment_rests,
+    skipped_fraction,
+)
+
+SAMPLE_RATE = 22050
+
+
+def tone(duration, frequency=440.0):
+    """
+    Helper function to generate a sine tone.
+
+    Args:
+        duration (float): Length of the tone in seconds.
+        frequency (float): Frequency of the tone (Hz).
+
+    Returns:
+        ndarray: 1D float32 array that contains the tone.
+    """
+    time = np.arange(int(duration * SAMPLE_RATE)) / SAMPLE_RATE
+    return (0.5 * np.sin(2 * np.pi * frequency * time)).astype(np.float32)
+
+
+def silence(duration):
+    """
+    Helper function to generate near-silent room noise.
+
+    Args:
+        duration (float): Length of the silence in seconds.
+
+    Returns:
+        ndarray: 1D float32 array that contains the silence.
+    """
+    rng = np.random.default_rng(0)
+    return (1e-4 * rng.standard_normal(int(duration * SAMPLE_RATE))).astype(np.float32)
+
+
+def test_active_regions():
+    """
+    Test that lead-in, trailing and long inner silence are cut out while short rests are kept.
+    """
+    audio_data = np.concatenate(
+        (
+            silence(3),
+            tone(2),
+            silence(min_gap_seconds / 2),
+            tone(2),
+            silence(3),
+            tone(2),
+            silence(4),
+        )
+    )
+    regions = active_regions(audio_data, SAMPLE_RATE)
+    assert len(regions) == 2
+
+    # Each region starts and ends within the margin and one frame of the tones
+    tolerance = (region_margin_seconds + 0.2) * SAMPLE_RATE
+    first_start = 3 * SAMPLE_RATE
+    first_stop = (7 + min_gap_seconds / 2) * SAMPLE_RATE
+    second_start = first_stop + 3 * SAMPLE_RATE
+    assert abs(regions[0][0] - first_start) < tolerance
+    assert abs(regions[0][1] - first_stop) < tolerance
+    assert abs(regions[1][0] - second_start) < tolerance
+    assert abs(regions[1][1] - (second_start + 2 * SAMPLE_RATE)) < tolerance
+    assert skipped_fraction(regions, len(audio_data)) > 0.5
+
+
+def test_gate_keeps_active_audio():
+    """
+    Test that fully active and fully silent recordings are analysed whole.
+    """
+    audio_data = tone(5)
+    gated, regions = gate_audio(audio_data, SAMPLE_RATE)
+    assert gated is audio_data
+    assert regions == [(0, len(audio_data))]
+
+    audio_data = np.zeros(SAMPLE_RATE, dtype=np.float32)
+    gated, regions = gate_audio(audio_data, SAMPLE_RATE)
+    assert gated is audio_data
+    assert skipped_fraction(regions, len(audio_data)) == 0
+
+
+def test_frame_rms():
+    """
+    Test that the frame levels match the RMS of zero-padded centred frames.
+    """
+    audio_data = np.concatenate((tone(1), silence(1), tone(0.5, 660.0)))[:-100]
+    padded = np.pad(audio_data.astype(np.float64), gate_frame_length // 2)
+    frames = np.lib.stride_tricks.sliding_window_view(padded, gate_frame_length)
+    expected = np.sqrt(np.mean(np.square(frames[::gate_hop_length]), axis=-1))
+
+    np.testing.assert_allclose(frame_rms(audio_data), expected, rtol=1e-6, atol=1e-9)
+
+
+def test_gate_in_place():
+    """
+    Test that gating in place leaves the gated audio at the start of the array.
+    """
+    audio_data = np.concatenate((silence(3), tone(2), silence(3), tone(2), silence(4)))
+    gated, regions = gate_audio(audio_data, SAMPLE_RATE)
+
+    shared = audio_data.copy()
+    active_length, in_place_regions = gate_in_place(shared, SAMPLE_RATE)
+
+    assert in_place_regions == regions
+    assert active_length == len(gated)
+    np.testing.assert_array_equal(shared[:active_length], gated)
+
+
+def test_segment_rests():
+    """
+    Test that the silence before each region lands on the next segment boundary.
+    """
+    # Lead-in of 100 samples, then a gap of 50 samples after 250 active samples
+    regions = [(100, 350), (400, 500)]
+    rests = segment_rests(regions, 100, 4, 100)
+    assert list(rests) == [1.0, 0.0, 0.0, 0.5]
+
+    # Silence after the last segment is dropped
+    assert list(segment_rests([(0, 100), (300, 400)], 100, 1, 100)) == [0.0]
+
+
+def test_gated_conversion_keeps_note_time(tmp_path):
+    """
+    Test that a gated conversion places the first note after the lead-in silence.
+
+    Args:
+        tmp_path (pathlib.Path): Temporary working directory.
+    """
+    audio_file = str(tmp_path / "phone.wav")
+    melody = np.concatenate([tone(1, 440.0 * 2 ** (step / 12)) for step in range(8)])
+    soundfile.write(
+        audio_file, np.concatenate((silence(5), melody, silence(5))), SAMPLE_RATE
+    )
+
+    profile = get_profile("phone")
+    assert profile.voicing_gate
+    assert not get_profile("default").voicing_gate
+    midi = mido.MidiFile(file=io.BytesIO(wav_to_midi_bytes(audio_file, profile=profile)))
+
+    # The lead-in silence is five seconds, less the margin and one frame
+    tempo = next(message.tempo for message in midi if message.type == "set_tempo")
+    first_note = next(message for message in midi.tracks[0] if message.type == "note_on")
+    lead_in = mido.tick2second(first_note.time, midi.ticks_per_beat, tempo)
+    assert lead_in > 4.5
+
+    ungated = ConversionProfile(
+        "ungated",
+        profile.sample_rate,
+        profile.resampler,
+        profile.yin_frame_length,
+        profile.yin_hop_length,
+        profile.pitch_search,
+    )
+    assert not ungated.voicing_gate
+    assert wav_to_midi_bytes(audio_file, profile=ungated) is not None
@@ -0,0 +1,118 @@
+################################################################################
+# Filename: test_warmup.py
+# Purpose:  Contains pytest test cases for the startup warm-up.
+# Author:   Livia Chandra
+#
+# Description:
+# This file contains pytest test cases for the warm-up of the analysis
+# pipeline, checking that every profile warms up on the synthetic melody,
+# that the numba cache directory is set before librosa is imported, and
+# that GET /api/v1/ready only reports ready once warm-up has finished.
+#
+# Usage (Optional):
+# Run the tests using the pytest command:
+#   python -m pytest
+#
+###############################################################################
+
+import os
+import subprocess
+import sys
+import pytest
+from app import create_app
+from app.controllers import health_controller
+from app.test_config import TestingConfig
+from app.utils.status_codes import OK, SERVICE_UNAVAILABLE
+from app.utils.warmup import Warmup, warm_up_pipeline
+
+READY_API_URL = "api/v1/ready"
+
+
+@pytest.fixture
+def client():
+    return create_app(TestingConfig).test_client()
+
+
+def test_warm_up_pipeline():
+    """
+    Test that every profile runs on the warm-up melody.
+    """
+    assert warm_up_pipeline()
+
+
+def test_jit_cache_dir():
+    """
+    Test that the numba cache directory is configured once the app is imported.
+    """
+    import numba
+
+    assert os.environ["NUMBA_CACHE_DIR"]
+    assert numba.config.CACHE_DIR == os.environ["NUMBA_CACHE_DIR"]
+
+
+def test_ready_without_warmup(client):
+    """
+    Test that the server is ready straight away when warm-up is disabled.
+
+    Args:
+        client (FlaskClient): The test client for the application.
+    """
+    response = client.get(READY_API_URL)
+    assert response.status_code == OK
+    assert response.json["ready"]
+    assert not response.json["warmup"]
+
+
+def test_jit_cache_dir_in_server_directory(tmp_path):
+    """
+    Test that the default numba cache directory does not depend on the working directory.
+    """
+    import app
+
+    server_directory = os.path.dirname(os.path.dirname(os.path.abspath(app.__file__)))
+    environment = {key: value for key, value in os.environ.items() if key != "NUMBA_CACHE_DIR"}
+    environment["PYTHONPATH"] = server_directory
+    cache_dir = subprocess.run(
+        [sys.executable, "-c", "import os, app; print(os.environ['NUMBA_CACHE_DIR'])"],
+        cwd=tmp_path,
+        env=environment,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout.strip()
+
+    assert cache_dir == os.path.join(server_directory, "numba_cache")
+
+
+def test_pool_workers_skip_server_warmup():
+    """
+    Test that the server process does not warm up when a worker pool converts.
+    """
+    pool_warmup = Warmup()
+    pool_warmup.init_app(create_app(TestingConfig), workers=2)
+
+    assert pool_warmup.thread is None
+    assert pool_warmup.wait(0)
+
+
+def test_ready_after_warmup(client, monkeypatch):
+    """
+    Test that the readiness route reports unavailable until warm-up finishes.
+
+    Args:
+        client (FlaskClient): The test client for the application.
+        monkeypatch (MonkeyPatch): Fixture to replace the warm-up singleton.
+    """
+    pending = Warmup()
+    monkeypatch.setattr(health_controller, "warmup", pending)
+
+    response = client.get(READY_API_URL)
+    assert response.status_code == SERVICE_UNAVAILABLE
+    assert not response.json["ready"]
+
+    pending.run()
+    assert pending.wait(0)
+    response = client.get(READY_API_URL)
+    assert response.status_code == OK
+    assert response.json["succeeded"]
+    assert response.json["seconds"] > 0
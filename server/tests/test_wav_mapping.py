@@ -0,0 +1,161 @@
+################################################################################
+# Filename: test_wav_mapping.py
+# Purpose:  Contains pytest test cases for the memory-mapped WAV fast path.
+# Author:   Livia Chandra
+#
+# Description:
+# This file contains pytest test cases for the WAV fast path of
+# decode_audio, checking that mono WAV files at the analysis sample rate are
+# read through a memory map with the same samples ffmpeg decodes, that
+# float32 files are not copied at all, that files needing a downmix or
+# resampling still go through ffmpeg, and that peak memory stays at about
+# one copy of the audio.
+#
+# Usage (Optional):
+# Run the tests using the pytest command:
+#   python -m pytest
+#
+###############################################################################
+
+import subprocess
+import tracemalloc
+import numpy as np
+import pytest
+import soundfile
+from app.utils.conversion import decode_audio, decode_command, stream_audio
+from app.utils.wav_mapping import map_wav, read_wav_header
+
+SAMPLE_RATE = 22050
+
+
+def ffmpeg_decode(audio_file, sample_rate=SAMPLE_RATE):
+    """
+    Helper function to decode audio file with ffmpeg, bypassing the fast path.
+
+    Args:
+        audio_file (str): The path to the audio file.
+        sample_rate (int): Target sample rate (Hz) of the decoded audio.
+
+    Returns:
+        ndarray: 1D float32 array of the decoded samples.
+    """
+    output = subprocess.run(
+        decode_command(audio_file, sample_rate), capture_output=True, check=True
+    ).stdout
+    return np.frombuffer(output, dtype=np.float32)
+
+
+def write_noise(path, channels, subtype, duration=2, sample_rate=SAMPLE_RATE):
+    """
+    Helper function to write a WAV file of random samples.
+
+    Args:
+        path (str): The path to store WAV file.
+        channels (int): Number of channels.
+        subtype (str): soundfile sample format, such as "PCM_16" or "FLOAT".
+        duration (float): Length of the file in seconds.
+        sample_rate (int): Sample rate (Hz) of the file.
+    """
+    rng = np.random.default_rng(0)
+    audio_data = rng.uniform(-0.5, 0.5, size=(int(duration * sample_rate), channels))
+    soundfile.write(path, audio_data, sample_rate, subtype=subtype)
+
+
+@pytest.mark.parametrize("subtype", ["PCM_16", "PCM_32", "FLOAT", "DOUBLE"])
+def test_mono_matches_ffmpeg(tmp_path, subtype):
+    """
+    Test that mono WAV files decode to the same samples as through ffmpeg.
+
+    Args:
+        tmp_path (pathlib.Path): Temporary working directory.
+        subtype (str): soundfile sample format.
+    """
+    audio_file = str(tmp_path / "mono.wav")
+    write_noise(audio_file, 1, subtype)
+    assert map_wav(audio_file, SAMPLE_RATE) is not None
+
+    _, audio_data, sample_rate = decode_audio(audio_file)
+    assert sample_rate == SAMPLE_RATE
+    assert audio_data.dtype == np.float32
+    np.testing.assert_array_equal(audio_data, ffmpeg_decode(audio_file))
+
+    # The streaming decoder reads the same samples
+    streamed = np.concatenate(list(stream_audio(audio_file, block_size=4096)))
+    np.testing.assert_array_equal(streamed, audio_data)
+
+
+def test_stereo_uses_ffmpeg(tmp_path):
+    """
+    Test that stereo WAV files are downmixed by ffmpeg on every decode path.
+
+    Args:
+        tmp_path (pathlib.Path): Temporary working directory.
+    """
+    audio_file = str(tmp_path / "stereo.wav")
+    write_noise(audio_file, 2, "PCM_16")
+    assert read_wav_header(audio_file).channels == 2
+    assert map_wav(audio_file, SAMPLE_RATE) is None
+
+    _, audio_data, _ = decode_audio(audio_file)
+    assert audio_data.ndim == 1
+    np.testing.assert_array_equal(audio_data, ffmpeg_decode(audio_file))
+
+    streamed = np.concatenate(list(stream_audio(audio_file, block_size=4096)))
+    np.testing.assert_array_equal(streamed, audio_data)
+
+
+def test_float_mono_is_not_copied(tmp_path):
+    """
+    Test that mono float32 WAV files are returned as a view of the mapped file.
+
+    Args:
+        tmp_path (pathlib.Path): Temporary working directory.
+    """
+    audio_file = str(tmp_path / "float.wav")
+    write_noise(audio_file, 1, "FLOAT")
+
+    _, audio_data, _ = decode_audio(audio_file)
+    assert not audio_data.flags.owndata
+    assert not audio_data.flags.writeable
+
+
+def test_other_rates_use_ffmpeg(tmp_path):
+    """
+    Test that WAV files at another sample rate and other formats are left to ffmpeg.
+
+    Args:
+        tmp_path (pathlib.Path): Temporary working directory.
+    """
+    audio_file = str(tmp_path / "cd.wav")
+    write_noise(audio_file, 1, "PCM_16", sample_rate=44100)
+    assert read_wav_header(audio_file).sample_rate == 44100
+    assert map_wav(audio_file, SAMPLE_RATE) is None
+
+    _, audio_data, _ = decode_audio(audio_file)
+    assert abs(len(audio_data) - 2 * SAMPLE_RATE) < 64
+
+    # 24-bit samples have no NumPy type
+    audio_file = str(tmp_path / "pcm24.wav")
+    write_noise(audio_file, 1, "PCM_24")
+    assert map_wav(audio_file, SAMPLE_RATE) is None
+    assert decode_audio(audio_file) is not None
+
+
+def test_peak_memory(tmp_path):
+    """
+    Test that decoding a 16-bit WAV file allocates about one float32 copy.
+
+    Args:
+        tmp_path (pathlib.Path): Temporary working directory.
+    """
+    audio_file = str(tmp_path / "long.wav")
+    write_noise(audio_file, 1, "PCM_16", duration=120)
+    output_size = 120 * SAMPLE_RATE * 4
+
+    tracemalloc.start()
+    decoded = decode_audio(audio_file)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert decoded is not None
+    assert peak < output_size * 1.25